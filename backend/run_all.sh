@@ -8,6 +8,8 @@ export VIDGO_URL="${VIDGO_URL:-https://vidgo.cemp.top}"
 
 # 你的项目用的是 vid_go.settings -> 对应的 WSGI 入口如下
 APP_MODULE="vid_go.wsgi:application"
+# gthread 线程数；task_events 按它计算长轮询 / SSE 的阻塞名额，两边必须一致
+export GUNICORN_THREADS="${GUNICORN_THREADS:-$(( 2*$(nproc) + 1 ))}"
 LOG="./logs/gunicorn_$(date +%Y%m%d_%H%M%S).log"
 
 echo "Using $(python -V) at $(which python)"
@@ -27,7 +29,7 @@ fi
 nohup python -m gunicorn "$APP_MODULE" \
   --bind "0.0.0.0:${PORT}" \
   --workers 1 \
-  --threads "$(( 2*$(nproc) + 1 ))" \
+  --threads "$GUNICORN_THREADS" \
   --worker-class gthread \
   --timeout 300 \
   --access-logfile - --log-level info \
@@ -1,15 +1,20 @@
 import json
 import subprocess
+import wave
 import numpy as np
 import os
 from typing import List, Tuple, Optional
 
+# Frames read per chunk from a decoded WAV (~1 min at 16 kHz), keeps memory flat for long videos
+PEAK_READ_FRAMES = 16000 * 60
+
 
 def generate_waveform_peaks(
     audio_path: str,
     output_path: Optional[str] = None,
     samples_per_second: int = 20,
-    bit_depth: int = 16
+    bit_depth: int = 16,
+    decoded_wav: Optional[str] = None
 ) -> List[float]:
     """
     Generate waveform peak data for audio files for frontend visualization
@@ -19,6 +24,9 @@ def generate_waveform_peaks(
         output_path: Optional JSON output file path, auto-generated if not provided
         samples_per_second: Samples per second (controls waveform precision)
         bit_depth: Audio bit depth
+        decoded_wav: Already-decoded mono 16-bit PCM WAV of audio_path (e.g. the
+            shared audio_artifacts PCM decode); when given, peaks are read from it and no
+            FFmpeg decode is run
 
     Returns:
         List[float]: Peak data array, each value in range [-1.0, 1.0]
@@ -37,16 +45,20 @@ def generate_waveform_peaks(
         os.makedirs(output_dir, exist_ok=True)
         output_path = os.path.join(output_dir, f"{base_name}.peaks.json")
     
-    # Get audio information
-    duration = _get_audio_duration(audio_path)
-    if duration <= 0:
-        raise ValueError(f"Invalid audio duration: {duration}")
-    
-    # Extract audio data using FFmpeg
-    raw_audio_data = _extract_audio_data(audio_path, samples_per_second)
-    
-    # Calculate peak data
-    peaks = _calculate_peaks(raw_audio_data, samples_per_second, duration)
+    if decoded_wav is not None:
+        # Reuse a decode shared with other stages (no FFmpeg run here)
+        peaks, duration = _pcm_wav_peaks(decoded_wav, samples_per_second)
+        if duration <= 0:
+            raise ValueError(f"Invalid audio duration: {duration}")
+    else:
+        # Get audio information
+        duration = _get_audio_duration(audio_path)
+        if duration <= 0:
+            raise ValueError(f"Invalid audio duration: {duration}")
+        # Extract audio data using FFmpeg
+        raw_audio_data = _extract_audio_data(audio_path, samples_per_second)
+        # Calculate peak data
+        peaks = _calculate_peaks(raw_audio_data, samples_per_second, duration)
     
     # Save peak data to JSON file
     peak_data = {
@@ -109,6 +121,41 @@ def _extract_audio_data(audio_path: str, sample_rate: int) -> np.ndarray:
         raise RuntimeError(f"FFmpeg failed to extract audio data: {e}")
 
 
+def _pcm_wav_peaks(wav_path: str, samples_per_second: int) -> Tuple[List[float], float]:
+    """
+    RMS peaks of a mono 16-bit PCM WAV, windowed like _calculate_peaks.
+
+    The file is read in window-aligned chunks of about PEAK_READ_FRAMES, so memory
+    does not grow with the audio length. Returns (peaks, duration).
+    """
+    with wave.open(wav_path, 'rb') as wav:
+        if wav.getsampwidth() != 2 or wav.getnchannels() != 1:
+            raise ValueError(f"Expected mono 16-bit PCM WAV: {wav_path}")
+        total_samples = wav.getnframes()
+        duration = total_samples / wav.getframerate()
+        target_peaks = int(duration * samples_per_second)
+        samples_per_peak = total_samples // target_peaks if target_peaks > 0 else total_samples
+        if samples_per_peak <= 0:
+            return [], duration
+
+        frames_per_read = samples_per_peak * max(1, PEAK_READ_FRAMES // samples_per_peak)
+        peaks = []
+        while True:
+            frames = wav.readframes(frames_per_read)
+            if not frames:
+                break
+            samples = np.frombuffer(frames, dtype='<i2').astype(np.float32) / 32768.0
+            full = len(samples) // samples_per_peak * samples_per_peak
+            if full:
+                windows = samples[:full].reshape(-1, samples_per_peak)
+                peaks.extend(np.clip(np.sqrt(np.mean(windows ** 2, axis=1)), -1.0, 1.0).tolist())
+            if full < len(samples):
+                # 只有最后一次读取会剩下不满一个窗口的样本
+                tail = samples[full:]
+                peaks.append(float(np.clip(np.sqrt(np.mean(tail ** 2)), -1.0, 1.0)))
+    return peaks, duration
+
+
 def _calculate_peaks(audio_data: np.ndarray, samples_per_second: int, duration: float) -> List[float]:
     """Calculate peaks from raw audio data"""
     if len(audio_data) == 0:
@@ -134,6 +181,18 @@ def _calculate_peaks(audio_data: np.ndarray, samples_per_second: int, duration:
     return peaks
 
 
+def _generate_peaks_file(file_path: str, peaks_path: str) -> List[float]:
+    """Generate peaks from the shared decoded-audio artifact, so waveform and ASR decode once"""
+    from django.conf import settings
+    if not settings.configured:
+        # Running outside Django (e.g. this module's __main__): decode directly
+        return generate_waveform_peaks(file_path, peaks_path)
+
+    from video.services import audio_artifacts
+    with audio_artifacts.acquire(file_path) as artifacts:
+        return generate_waveform_peaks(file_path, peaks_path, decoded_wav=artifacts.pcm_audio())
+
+
 def get_waveform_for_file(filename: str) -> Optional[dict]:
     """
     Get or generate waveform data for a given audio or video filename
@@ -202,7 +261,7 @@ def get_waveform_for_file(filename: str) -> Optional[dict]:
     # If peak file doesn't exist or is older than audio/video file, regenerate
     if not os.path.exists(peaks_path) or os.path.getmtime(peaks_path) < os.path.getmtime(file_path):
         try:
-            generate_waveform_peaks(file_path, peaks_path)
+            _generate_peaks_file(file_path, peaks_path)
         except Exception as e:
             print(f"Failed to generate waveform peaks: {e}")
             return None
@@ -0,0 +1,155 @@
+"""
+共享的 asyncio LLM 调用引擎。
+
+所有断句/翻译请求都在同一个后台事件循环线程里用 openai.AsyncOpenAI 发出，
+并发度由每个服务商（base_url）的信号量和令牌桶限速决定，而不是线程池大小。
+429 / 5xx / 连接错误按指数退避加随机抖动重试（优先遵守 Retry-After）。
+
+同步代码通过 run_sync() / wait_result() 调用，可传入 cancel_check，
+任务被删除时取消仍在进行的请求。
+"""
+import asyncio
+import concurrent.futures
+import random
+import threading
+from typing import Callable, Optional
+
+import openai
+
+# 每个服务商同时进行的请求数
+PROVIDER_CONCURRENCY = 16
+# 每个服务商的令牌桶：平均每分钟请求数、突发容量
+PROVIDER_REQUESTS_PER_MINUTE = 300
+PROVIDER_BURST = 20
+MAX_RETRIES = 5
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+REQUEST_TIMEOUT = 600
+CANCEL_POLL_INTERVAL = 0.5
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+# 以下字典只在事件循环线程内访问
+_providers: dict = {}
+_clients: dict = {}
+
+
+class LLMCancelled(Exception):
+    """所属任务已被删除，LLM 请求被取消"""
+
+
+class TokenBucket:
+    """异步令牌桶：rate 为每秒补充的令牌数，capacity 为突发上限"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = None
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self.lock:
+            loop = asyncio.get_running_loop()
+            while True:
+                now = loop.time()
+                if self.updated is not None:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _Provider:
+    def __init__(self):
+        self.semaphore = asyncio.Semaphore(PROVIDER_CONCURRENCY)
+        self.bucket = TokenBucket(PROVIDER_REQUESTS_PER_MINUTE / 60, PROVIDER_BURST)
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+            _loop = loop
+        return _loop
+
+
+def _get_provider(base_url: str) -> _Provider:
+    provider = _providers.get(base_url)
+    if provider is None:
+        provider = _providers[base_url] = _Provider()
+    return provider
+
+
+def _get_client(api_key: str, base_url: str) -> openai.AsyncOpenAI:
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is None:
+        # 重试由本模块统一处理（受限速器约束），关闭 SDK 自带重试
+        client = _clients[key] = openai.AsyncOpenAI(
+            api_key=api_key, base_url=base_url, max_retries=0, timeout=REQUEST_TIMEOUT
+        )
+    return client
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, 'response', None)
+    if response is None:
+        return None
+    try:
+        return min(MAX_BACKOFF, float(response.headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return None
+
+
+async def chat_completion(api_key: str, base_url: str, model: str, messages: list, **kwargs):
+    """发送一次 chat completion（受服务商并发/限速约束，失败自动重试）"""
+    provider = _get_provider(base_url)
+    client = _get_client(api_key, base_url)
+    for attempt in range(MAX_RETRIES + 1):
+        async with provider.semaphore:
+            await provider.bucket.acquire()
+            try:
+                return await client.chat.completions.create(model=model, messages=messages, **kwargs)
+            except Exception as exc:
+                if attempt == MAX_RETRIES or not _is_retryable(exc):
+                    raise
+                delay = _retry_after(exc)
+                if delay is None:
+                    # full jitter
+                    delay = random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+                print(f"[LLM] {type(exc).__name__}, retry {attempt + 1}/{MAX_RETRIES} in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+
+def submit(coro) -> concurrent.futures.Future:
+    """把协程提交到共享事件循环，立即返回 Future"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def wait_result(future: concurrent.futures.Future, cancel_check: Callable[[], bool] = None):
+    """阻塞等待 Future；cancel_check() 为 True 时取消请求并抛出 LLMCancelled"""
+    if cancel_check is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=CANCEL_POLL_INTERVAL)
+        except concurrent.futures.TimeoutError:
+            if cancel_check():
+                future.cancel()
+                raise LLMCancelled()
+
+
+def run_sync(coro, cancel_check: Callable[[], bool] = None):
+    """同步调用协程（供线程池中的旧代码使用）"""
+    return wait_result(submit(coro), cancel_check)
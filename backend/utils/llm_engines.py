@@ -15,4 +15,23 @@ ENGINES={
         "normal": "gpt-4o",
         "thinking": "o4-mini",
     }
-}
\ No newline at end of file
+}
+
+# 各模型的上下文窗口与单次输出上限（token），用于规划分块大小和 max_tokens。
+# reasoning=True 的模型思考过程也计入输出，规划时需要预留额外余量。
+MODEL_LIMITS = {
+    "deepseek-chat": {"context": 65536, "max_output": 8192},
+    "deepseek-reasoner": {"context": 65536, "max_output": 32768, "reasoning": True},
+    "glm-4.5": {"context": 131072, "max_output": 16384},
+    "glm-4.5-airx": {"context": 131072, "max_output": 16384},
+    "qwen3-235b-a22b-instruct-2507": {"context": 131072, "max_output": 32768},
+    "qwen3-235b-a22b-thinking-2507": {"context": 131072, "max_output": 32768, "reasoning": True},
+    "gpt-4o": {"context": 128000, "max_output": 16384},
+    "o4-mini": {"context": 200000, "max_output": 32768, "reasoning": True},
+}
+# 未登记的模型按最保守的 deepseek-chat 处理
+DEFAULT_MODEL_LIMITS = {"context": 65536, "max_output": 8192}
+
+
+def get_model_limits(model: str) -> dict:
+    return {"reasoning": False, **MODEL_LIMITS.get(model, DEFAULT_MODEL_LIMITS)}
@@ -1,8 +1,103 @@
+import math
 import re
+from functools import lru_cache
 from typing import List
 
+import numpy as np
+
+# 时间行 "HH:MM:SS,mmm --> HH:MM:SS,mmm"（秒允许 1 位，分隔符允许 . 或 ,）
+_SRT_TIME_RE = re.compile(
+    r'(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})\s-->\s(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})'
+)
+_VTT_TIME_RE = re.compile(
+    r'(\d{2}):(\d{2}):(\d{2})\.(\d{3})\s-->\s(\d{2}):(\d{2}):(\d{2})\.(\d{3})'
+)
+_BLOCK_SEPARATOR_RE = re.compile(r'\n\s*\n')
+# 除 \n 以外 str.splitlines() 也会切分的字符
+_EXTRA_LINE_BREAK_RE = re.compile('[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+_VTT_TAG_RE = re.compile(r'<[^>]+>')
+_WHITESPACE_RE = re.compile(r'\s+')
+_DIGITS_RE = re.compile(r'^\d+$')
+
+# 定宽时间行中各数字列（相对每个时间戳的起点）及其毫秒权重
+_FIXED_LINE_LEN = 29
+_DIGIT_COLUMNS = [0, 1, 3, 4, 6, 7, 9, 10, 11]
+_DIGIT_WEIGHTS = np.array([36000000, 3600000, 600000, 60000, 10000, 1000, 100, 10, 1], dtype=np.int64)
+_COLON_COLUMNS = [2, 5, 19, 22]
+_ARROW = np.frombuffer(b' --> ', dtype=np.uint8)
+
+
+@lru_cache(maxsize=65536)
+def _hms(total_seconds: int) -> str:
+    """秒数转 HH:MM:SS；字级字幕里大量分段落在同一秒，缓存格式化结果"""
+    minutes, seconds = divmod(total_seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+
+def _ms_to_time(ms, sep: str) -> str:
+    """毫秒转 HH:MM:SS<sep>mmm；小数毫秒向下取整（与 divmod 后 int() 的结果一致）"""
+    if ms.__class__ is not int:
+        ms = math.floor(ms)
+    total_seconds, milliseconds = divmod(ms, 1000)
+    return f"{_hms(total_seconds)}{sep}{milliseconds:03}"
+
+
+def _parse_time_line(line: str, pattern):
+    """解析单个时间行，返回 (start_ms, end_ms)；格式不符时返回 None"""
+    match = pattern.match(line)
+    if not match:
+        return None
+    h1, m1, s1, ms1, h2, m2, s2, ms2 = map(int, match.groups())
+    return (h1 * 3600000 + m1 * 60000 + s1 * 1000 + ms1,
+            h2 * 3600000 + m2 * 60000 + s2 * 1000 + ms2)
+
+
+def _parse_time_lines(lines: List[str], pattern) -> list:
+    """
+    批量解析时间行，返回与 lines 等长的 [(start_ms, end_ms) 或 None]。
+    标准定宽格式的行拼成一个 uint8 矩阵一次算完；其余（1 位秒数、行尾带样式等）逐行走正则。
+    """
+    results = [None] * len(lines)
+    fixed = [i for i, line in enumerate(lines) if len(line) == _FIXED_LINE_LEN]
+    if fixed:
+        # 非 ASCII 字符替换成 '?'，保证每行正好 29 字节（这些行在校验时会被排除）
+        buf = ''.join([lines[i] for i in fixed]).encode('ascii', 'replace')
+        grid = np.frombuffer(buf, dtype=np.uint8).reshape(len(fixed), _FIXED_LINE_LEN)
+        digits = grid[:, _DIGIT_COLUMNS + [c + 17 for c in _DIGIT_COLUMNS]].astype(np.int64) - ord('0')
+        separators = grid[:, [8, 25]]
+        valid = ((digits >= 0) & (digits <= 9)).all(axis=1)
+        valid &= (grid[:, _COLON_COLUMNS] == ord(':')).all(axis=1)
+        valid &= (grid[:, 12:17] == _ARROW).all(axis=1)
+        if pattern is _SRT_TIME_RE:
+            valid &= ((separators == ord(',')) | (separators == ord('.'))).all(axis=1)
+        else:
+            valid &= (separators == ord('.')).all(axis=1)
+        starts = (digits[:, :9] @ _DIGIT_WEIGHTS).tolist()
+        ends = (digits[:, 9:] @ _DIGIT_WEIGHTS).tolist()
+        for row, ok in enumerate(valid.tolist()):
+            if ok:
+                results[fixed[row]] = (starts[row], ends[row])
+    for i, line in enumerate(lines):
+        if results[i] is None:
+            results[i] = _parse_time_line(line, pattern)
+    return results
+
+
+def _split_blocks(text: str) -> List[List[str]]:
+    """按空行（只含空白的行）切分字幕块，返回每块的行列表"""
+    text = text.strip()
+    blocks = _BLOCK_SEPARATOR_RE.split(text)
+    if not text or _EXTRA_LINE_BREAK_RE.search(text):
+        return [block.splitlines() for block in blocks]
+    # 只有 \n 换行时（文本模式读入的文件都是如此），split 与 splitlines 结果相同且更快
+    return [block.split('\n') for block in blocks]
+
 
 class ASRDataSeg:
+    # 长字幕会有上百万个字级分段，用 __slots__ 去掉每个对象的 __dict__
+    __slots__ = ('text', 'start_time', 'end_time', 'direct', 'reflected', 'free')
+
     def __init__(self, text, start_time, end_time, direct="",free="", reflected=""):
         """
         Combine of two type,
@@ -35,10 +130,11 @@ class ASRDataSeg:
     @staticmethod
     def _ms_to_srt_time(ms) -> str:
         """Convert milliseconds to SRT time format (HH:MM:SS,mmm)"""
-        total_seconds, milliseconds = divmod(ms, 1000)
-        minutes, seconds = divmod(total_seconds, 60)
-        hours, minutes = divmod(minutes, 60)
-        return f"{int(hours):02}:{int(minutes):02}:{int(seconds):02},{int(milliseconds):03}"
+        return _ms_to_time(ms, ',')
+
+    def to_vtt_ts(self) -> str:
+        """Convert to WebVTT timestamp format"""
+        return f"{_ms_to_time(self.start_time, '.')} --> {_ms_to_time(self.end_time, '.')}"
 
     def to_lrc_ts(self) -> str:
         """Convert to LRC timestamp format"""
@@ -77,23 +173,34 @@ class ASRData:
 
     def to_txt(self) -> str:
         """Convert to plain text subtitle format (without timestamps)"""
-        return "\n".join(seg.transcript for seg in self.segments)
+        return "\n".join([seg.transcript for seg in self.segments])
 
     def to_srt(self, save_path=None, use_translation=False) -> str:
         """Convert to SRT subtitle format"""
-        def get_text(seg):
-            if use_translation and seg.free:
-                return seg.free
-            return seg.text
-        
-        srt_text = "\n".join(
-            f"{n}\n{seg.to_srt_ts()}\n{get_text(seg)}\n"
-            for n, seg in enumerate(self.segments, 1))
+        parts = []
+        append = parts.append
+        for n, seg in enumerate(self.segments, 1):
+            text = seg.free if use_translation and seg.free else seg.text
+            append(f"{n}\n{_ms_to_time(seg.start_time, ',')} --> {_ms_to_time(seg.end_time, ',')}\n{text}\n")
+        srt_text = "\n".join(parts)
         if save_path:
             with open(save_path, 'w', encoding='utf-8') as f:
                 f.write(srt_text)
         return srt_text
 
+    def to_vtt(self, save_path=None, use_translation=False) -> str:
+        """Convert to WebVTT subtitle format"""
+        parts = ["WEBVTT\n"]
+        append = parts.append
+        for seg in self.segments:
+            text = seg.free if use_translation and seg.free else seg.text
+            append(f"{_ms_to_time(seg.start_time, '.')} --> {_ms_to_time(seg.end_time, '.')}\n{text}\n")
+        vtt_text = "\n".join(parts)
+        if save_path:
+            with open(save_path, 'w', encoding='utf-8') as f:
+                f.write(vtt_text)
+        return vtt_text
+
     def to_lrc(self) -> str:
         """Convert to LRC subtitle format"""
         return "\n".join(
@@ -165,42 +272,26 @@ class ASRData:
 def from_srt(srt_str: str) -> 'ASRData':
     """
     从SRT格式的字符串创建ASRData实例。
+    先切分字幕块，再批量解析全部时间行，最后一次性创建分段。
 
     :param srt_str: 包含SRT格式字幕的字符串。
     :return: 解析后的ASRData实例。
     """
-    segments = []
-    srt_time_pattern = re.compile(
-        r'(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})\s-->\s(\d{2}):(\d{2}):(\d{1,2})[.,](\d{3})'
-    )
-
-    for block in re.split(r'\n\s*\n', srt_str.strip()):
-        lines = block.splitlines()
-        if len(lines) < 3:
-            print("lines length:",len(lines))
-            raise ValueError(f"无效的SRT块格式: {block}")
-
-        match = srt_time_pattern.match(lines[1])
-        if not match:
-            raise ValueError(f"无效的时间戳格式: {lines[1]}")
-
-        time_parts = list(map(int, match.groups()))
-        start_time = sum([
-            time_parts[0] * 3600000,
-            time_parts[1] * 60000,
-            time_parts[2] * 1000,
-            time_parts[3]
-        ])
-        end_time = sum([
-            time_parts[4] * 3600000,
-            time_parts[5] * 60000,
-            time_parts[6] * 1000,
-            time_parts[7]
-        ])
-
-        text = '\n'.join(lines[2:]).strip()
-        segments.append(ASRDataSeg(text, start_time, end_time))
-
+    blocks = _split_blocks(srt_str)
+    # 行数不足的块之前的时间戳错误优先报告，与逐块解析时的报错顺序一致
+    invalid = next((i for i, lines in enumerate(blocks) if len(lines) < 3), len(blocks))
+    times = _parse_time_lines([lines[1] for lines in blocks[:invalid]], _SRT_TIME_RE)
+    for i, ts in enumerate(times):
+        if ts is None:
+            raise ValueError(f"无效的时间戳格式: {blocks[i][1]}")
+    if invalid < len(blocks):
+        print("lines length:",len(blocks[invalid]))
+        raise ValueError(f"无效的SRT块格式: {_BLOCK_SEPARATOR_RE.split(srt_str.strip())[invalid]}")
+
+    segments = [
+        ASRDataSeg(lines[2].strip() if len(lines) == 3 else '\n'.join(lines[2:]).strip(), start, end)
+        for lines, (start, end) in zip(blocks, times)
+    ]
     return ASRData(segments)
 
 def from_vtt(vtt_str: str) -> 'ASRData':
@@ -210,58 +301,40 @@ def from_vtt(vtt_str: str) -> 'ASRData':
     :param vtt_str: 包含WebVTT格式字幕的字符串。
     :return: 解析后的ASRData实例。
     """
-    segments = []
-    # 正则表达式匹配时间码行
-    vtt_time_pattern = re.compile(
-        r'(\d{2}):(\d{2}):(\d{2})\.(\d{3})\s-->\s(\d{2}):(\d{2}):(\d{2})\.(\d{3})'
-    )
-    
-    # 分割字幕块，VTT 使用两个换行符分隔块
-    blocks = re.split(r'\n\s*\n', vtt_str.strip())
-    # for i in range(len(blocks)):
-    #     print(f"block {i}: {repr(blocks[i])}")
-    
-    for block in blocks:
-        lines = block.splitlines()
+    cues = []
+    for lines in _split_blocks(vtt_str):
         if not lines:
             continue
         # 跳过文件头和注释块
         if lines[0].startswith('WEBVTT') or lines[0].startswith('NOTE'):
             continue
         # 如果块以数字开头（可选标识符），则跳过第一行
-        if re.match(r'^\d+$', lines[0]):
+        if _DIGITS_RE.match(lines[0]):
             lines = lines[1:]
         if len(lines) < 2:
             continue  # 无效的块
-        
-        # 匹配时间码
-        match = vtt_time_pattern.match(lines[0])
-        if not match:
+        cues.append(lines)
+
+    segments = []
+    for lines, ts in zip(cues, _parse_time_lines([lines[0] for lines in cues], _VTT_TIME_RE)):
+        if ts is None:
             continue  # 无效的时间码格式
-        
-        time_parts = list(map(int, match.groups()))
-        start_time = (
-            time_parts[0] * 3600000 +
-            time_parts[1] * 60000 +
-            time_parts[2] * 1000 +
-            time_parts[3]
-        )
-        end_time = (
-            time_parts[4] * 3600000 +
-            time_parts[5] * 60000 +
-            time_parts[6] * 1000 +
-            time_parts[7]
-        )
-        
-        # 合并文本行并去除样式和HTML标签
+        # 合并文本行，去除尖括号内的样式/时间戳标签和多余的空格
         raw_text = ' '.join(lines[1:]).strip()
-        # 去除尖括号内的内容（如样式标签和时间戳标签）
-        clean_text = re.sub(r'<[^>]+>', '', raw_text)
-        # 去除多余的空格
-        clean_text = re.sub(r'\s+', ' ', clean_text)
-        
-        segments.append(ASRDataSeg(clean_text, start_time, end_time))
-    
+        clean_text = _WHITESPACE_RE.sub(' ', _VTT_TAG_RE.sub('', raw_text))
+        segments.append(ASRDataSeg(clean_text, ts[0], ts[1]))
+    return ASRData(segments)
+
+def from_json(data: dict) -> 'ASRData':
+    """
+    从 ASRData.to_json() 的结果重建ASRData实例（按序号排序）。
+    """
+    segments = []
+    for _, item in sorted(data.items(), key=lambda kv: int(kv[0])):
+        seg = ASRDataSeg(item.get("original", ""), item["start_time"], item["end_time"],
+                         direct=item.get("direct", ""), free=item.get("free", ""),
+                         reflected=item.get("reflect", ""))
+        segments.append(seg)
     return ASRData(segments)
 
 
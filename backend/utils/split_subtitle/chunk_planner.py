@@ -0,0 +1,140 @@
+"""
+按 token 数规划 LLM 调用的分块大小。
+
+分块越大，调用次数和重复的提示词越少；但输出一旦超过模型的单次输出上限就会被截断。
+这里根据 utils.llm_engines.MODEL_LIMITS 中的上下文/输出上限，估算每块的输出 token，
+把分块做到"不截断的前提下尽量大"；真的发生截断时只把出问题的那一块对半拆开重试。
+"""
+import asyncio
+import math
+from typing import Callable, List, Sequence, Tuple
+
+from utils.llm_engines import get_model_limits
+from utils.split_subtitle.cnt_tokens import count_tokens
+
+# 只使用输出上限的一部分，抵消分词器差异和估算误差
+OUTPUT_SAFETY_RATIO = 0.7
+# 思考模型的推理过程也占用输出额度
+REASONING_OUTPUT_RATIO = 0.4
+# 断句：输出 = 原文 + <br> 标记 + JSON 外壳
+SPLIT_OUTPUT_RATIO = 1.15
+SPLIT_OUTPUT_OVERHEAD = 50
+# 断句分块的下限，太小的分块会让句子在块边界被切断
+MIN_SPLIT_CHUNK_TOKENS = 400
+# 翻译：直译输出 original + direct；意译输出 original + free + reflected
+TRANSLATE_OUTPUT_RATIO = {"direct": 2.5, "free": 5.0}
+TRANSLATE_ITEM_OVERHEAD = {"direct": 20, "free": 40}
+MAX_BATCH_SENTENCES = 40
+MAX_SHRINK_DEPTH = 4
+
+
+class LLMOutputTruncated(Exception):
+    """LLM 输出达到 max_tokens 被截断（finish_reason == 'length'）"""
+
+
+def max_output_tokens(model: str) -> int:
+    """请求时使用的 max_tokens"""
+    return get_model_limits(model)["max_output"]
+
+
+def output_budget(model: str) -> int:
+    """单次调用中可用于"答案本身"的输出 token 预算"""
+    limits = get_model_limits(model)
+    budget = limits["max_output"] * OUTPUT_SAFETY_RATIO
+    if limits["reasoning"]:
+        budget *= REASONING_OUTPUT_RATIO
+    return int(budget)
+
+
+def plan_split_chunks(text: str, model: str, prompt_tokens: int, num_threads: int) -> int:
+    """
+    返回断句阶段的分块数量。
+    每块的输出（约等于输入原文）不能超过输出预算，输入加提示词加输出不能超过上下文；
+    文本足够长时至少切成 num_threads 块，让线程池跑满。
+    """
+    limits = get_model_limits(model)
+    total_tokens = count_tokens(text)
+    by_output = (output_budget(model) - SPLIT_OUTPUT_OVERHEAD) / SPLIT_OUTPUT_RATIO
+    by_context = limits["context"] - prompt_tokens - limits["max_output"]
+    chunk_tokens = max(MIN_SPLIT_CHUNK_TOKENS, int(min(by_output, by_context)))
+
+    num_chunks = math.ceil(total_tokens / chunk_tokens)
+    fill_threads = min(num_threads, total_tokens // MIN_SPLIT_CHUNK_TOKENS)
+    return max(1, num_chunks, fill_threads)
+
+
+def plan_split_points(segments: Sequence, words_per_chunk: int, num_chunks: int,
+                      search_range: int) -> List[int]:
+    """
+    返回 split_asr_data 的切分下标（每块最后一个分段的下标，升序去重）。
+
+    第 i 个平均分割点取 i * words_per_chunk（与原实现一致，直接作为分段下标），
+    在其前后 search_range 个间隔内取时间间隔最大的位置（并列取最前），
+    窗口为空或间隔都不大于 -1 时保留平均分割点。
+    时间间隔只在窗口覆盖的区间内计算，相互重叠的窗口（块较小时）合并后只算一次。
+    """
+    total_segs = len(segments)
+    windows = []
+    for i in range(1, num_chunks):
+        split_point = i * words_per_chunk
+        windows.append((split_point, max(0, split_point - search_range), min(total_segs - 1, split_point + search_range)))
+
+    points = set()
+    span_start, span_end, gaps = 0, 0, []   # 已计算的间隔 gaps[k] 对应分段 span_start + k 与下一段
+    for split_point, start, end in windows:
+        best_index = split_point
+        if start < end:
+            if start >= span_end:
+                span_start, span_end, gaps = start, start, []
+            if end > span_end:
+                part = segments[span_end:end + 1]
+                gaps += [nxt.start_time - seg.end_time for seg, nxt in zip(part, part[1:])]
+                span_end = end
+            window = gaps[start - span_start:end - span_start]
+            max_gap = max(window)
+            if max_gap > -1:
+                best_index = start + window.index(max_gap)
+        points.add(best_index)
+    return sorted(points)
+
+
+def plan_translate_batches(texts: Sequence[str], model: str, stage: str, num_threads: int,
+                           max_sentences: int = MAX_BATCH_SENTENCES) -> List[Tuple[int, int]]:
+    """
+    把句子列表切成若干批次，返回 [(start, end), ...]（左闭右开）。
+    每批估算的输出 token 不超过预算，句数不超过 max_sentences；
+    句子足够多时批次数至少为 num_threads。
+    """
+    if not texts:
+        return []
+    budget = output_budget(model)
+    ratio = TRANSLATE_OUTPUT_RATIO[stage]
+    overhead = TRANSLATE_ITEM_OVERHEAD[stage]
+    per_batch = max(1, min(max_sentences, math.ceil(len(texts) / max(1, num_threads))))
+
+    batches = []
+    start, used = 0, 0
+    for i, text in enumerate(texts):
+        cost = count_tokens(text) * ratio + overhead
+        if i > start and (i - start >= per_batch or used + cost > budget):
+            batches.append((start, i))
+            start, used = i, 0
+        used += cost
+    batches.append((start, len(texts)))
+    return batches
+
+
+async def run_with_shrink(run: Callable, chunk, split: Callable, depth: int = MAX_SHRINK_DEPTH) -> list:
+    """
+    await run(chunk, allow_truncated) -> result。输出被截断（抛出 LLMOutputTruncated）时，
+    用 split(chunk) 对半拆分后并发重试，其余分块不受影响。
+    返回按原顺序排列的结果列表；无法再拆分时以 allow_truncated=True 尽量使用已有输出。
+    """
+    try:
+        return [await run(chunk, depth <= 0)]
+    except LLMOutputTruncated:
+        parts = split(chunk)
+        if len(parts) < 2:
+            return [await run(chunk, True)]
+        nested = await asyncio.gather(*(run_with_shrink(run, part, split, depth - 1) for part in parts))
+        return [result for results in nested for result in results]
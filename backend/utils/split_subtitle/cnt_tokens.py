@@ -1,27 +1,69 @@
 # 数整个段落中有多少个词。
+import math
 import re
-import re
+from functools import lru_cache
 from spellchecker import SpellChecker  # 或使用 nltk.corpus.words
 
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False  # tiktoken 可选，缺失时按字符估算 token 数
+
+_CJK_RE = re.compile(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\u31f0-\u31ff\uac00-\ud7af\u1100-\u11ff\u3130-\u318f]')
+
+_ENGLISH_WORD_RE = re.compile(r'\b[a-zA-Z]{2,}\b')
+# 批量接口的跨调用缓存：字幕里同一段文本会被反复计数
+MEMO_SIZE = 16384
+
+
 def count_words(text: str) -> int:
     """
     统计混合文本内英文单词数、中文字符数、日文字符数和韩文字符数的总和
     优化版本：不使用SpellChecker，直接统计所有字母组合为单词
     """
-    # 统计CJK字符（每个字符算1个词）
-    chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-    japanese_chars = len(re.findall(r'[\u3040-\u309f\u30a0-\u30ff\u31f0-\u31ff]', text))
-    korean_chars = len(re.findall(r'[\uac00-\ud7af\u1100-\u11ff\u3130-\u318f]', text))
-
-    # 移除CJK字符后统计英文单词
-    english_text = re.sub(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\u31f0-\u31ff\uac00-\ud7af\u1100-\u11ff\u3130-\u318f]', ' ', text)
+    # CJK字符每个算1个词；替换为空格的同时得到个数，一次扫描
+    english_text, cjk_chars = _CJK_RE.subn(' ', text)
 
     # 提取所有英文单词（2个字母以上，避免单字母噪声）
-    words = re.findall(r'\b[a-zA-Z]{2,}\b', english_text.lower())
-    english_words = len(words)
+    english_words = len(_ENGLISH_WORD_RE.findall(english_text.lower()))
+    return english_words + cjk_chars
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _count_words_memo(text: str) -> int:
+    return count_words(text)
+
+
+def count_words_batch(texts) -> list:
+    """[count_words(text) for text in texts]，重复文本只计算一次"""
+    return list(map(_count_words_memo, texts))
 
-    total = english_words + chinese_chars + japanese_chars + korean_chars
-    return total
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    if not TIKTOKEN_AVAILABLE:
+        return None
+    try:
+        # o200k_base 需要首次下载词表，离线时回退到估算
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    统计文本的 LLM token 数。
+    装有 tiktoken 时使用真实分词器（不同厂商分词器略有差异，调用方会预留余量），
+    否则按 CJK 每字 1 token、其余每 4 个字符 1 token 估算。
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    cjk_chars = len(_CJK_RE.findall(text))
+    return cjk_chars + math.ceil((len(text) - cjk_chars) / 4)
 
 def is_cjk_char(char):
     """判断字符是否为CJK字符（中文、日文、韩文）"""
@@ -75,29 +117,135 @@ def get_char_display_width(char):
         # 其他字符默认按英文处理
         return 1.0
 
+# cnt_display_words 按 1/4 格计数：CJK 7, 英文/数字/其他 4, 英文标点 2
+_DISPLAY_CJK_RE = re.compile(r'[\u4e00-\u9fff\u3400-\u4dbf\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af\u1100-\u11ff]')
+_ENGLISH_PUNCT = ".,;:!?\"'()[]{}/-_+=*&^%$#@~`|\\<>"
+_ENGLISH_PUNCT_RE = re.compile(f'[{re.escape(_ENGLISH_PUNCT)}]')
+# token 以这些字符结尾时，与下一个 token 之间的空格算 0.5 格（另加 str.isdigit 为真的字符）
+_PAD_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789' + _ENGLISH_PUNCT)
+
+
 def cnt_display_words(text: str) -> float:
     """
     基于display宽度统计文本长度
     中文/日文/韩文: 1.75格, 英文/数字: 1格, 空格/标点: 0.5格
+
+    与逐字符累加 get_char_display_width 的结果完全相同：token 内每个非空白字符先按 1 格计，
+    CJK 再加 0.75、英文标点减 0.5；各类字符数由预编译的正则在 C 层统计。
+    宽度都是 0.25 的倍数，按整数 1/4 格求和后再换算，没有浮点误差。
     """
     if not text:
         return 0.0
-        
+
     # 将文本按token分割，这里简化处理，按空格分割
     tokens = text.split()
-    total_width = 0.0
-    
-    for i, token in enumerate(tokens):
-        # 计算token本身的宽度
-        for char in token:
-            total_width += get_char_display_width(char)
-        
-        # 判断是否需要在token后添加空格
-        if i < len(tokens) - 1:  # 不是最后一个token
-            if token:  # token不为空
-                last_char = token[-1]
-                # 如果以英文、数字或英文标点结尾，添加空格
-                if is_english_char(last_char) or is_digit(last_char) or is_english_punctuation(last_char):
-                    total_width += 0.5  # 空格占0.5格
-    
-    return total_width
\ No newline at end of file
+    if not tokens:
+        return 0.0
+    chars = sum(map(len, tokens))
+    cjk = _DISPLAY_CJK_RE.subn('', text)[1]
+    punct = _ENGLISH_PUNCT_RE.subn('', text)[1]
+    # 以英文、数字或英文标点结尾的 token（最后一个除外）后面加 0.5 格空格
+    pads = 0
+    for token in tokens[:-1]:
+        last = token[-1]
+        if last in _PAD_CHARS or last.isdigit():
+            pads += 1
+    return (4 * chars + 3 * cjk - 2 * punct + 2 * pads) / 4
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _cnt_display_words_memo(text: str) -> float:
+    return cnt_display_words(text)
+
+
+def cnt_display_words_batch(texts) -> list:
+    """[cnt_display_words(text) for text in texts]，重复文本只计算一次"""
+    return list(map(_cnt_display_words_memo, texts))
+
+# ---------------------------------------------------------------------------
+# 拼接文本的 display 宽度
+#
+# cnt_display_words 只在相邻 token 之间（前一个 token 以英文/数字/英文标点结尾）加 0.5，
+# 所以拼接文本的宽度 = 各段宽度之和 + 段与段交界处新增的空格宽度，无需重新扫描整段文本。
+# 各字符宽度都是 0.25 的倍数，浮点求和没有误差，结果与直接调用 cnt_display_words 完全相同。
+# ---------------------------------------------------------------------------
+class DisplaySpan(tuple):
+    """
+    一段文本的 display 宽度摘要：(width, has_token, starts_ws, ends_ws, last_pads, empty)
+    last_pads: 最后一个 token 的结尾字符是否会在其后的空格处加 0.5
+    """
+    __slots__ = ()
+
+    @classmethod
+    def of(cls, text: str, width: float = None) -> 'DisplaySpan':
+        """width 为已知的 cnt_display_words(text) 时可直接传入"""
+        stripped = text.rstrip()
+        last = stripped[-1:] if stripped else ''
+        return cls((
+            cnt_display_words(text) if width is None else width,
+            bool(stripped),
+            text[:1].isspace(),
+            text[-1:].isspace(),
+            bool(last) and (is_english_char(last) or is_digit(last) or is_english_punctuation(last)),
+            not text,
+        ))
+
+    @property
+    def width(self) -> float:
+        return self[0]
+
+    def __add__(self, other: 'DisplaySpan') -> 'DisplaySpan':
+        """self 的文本后拼接 other 的文本"""
+        width, has_token, starts_ws, ends_ws, last_pads, empty = self
+        o_width, o_has_token, o_starts_ws, o_ends_ws, o_last_pads, o_empty = other
+        if has_token and o_has_token and last_pads and (ends_ws or o_starts_ws):
+            width = width + o_width + 0.5
+        else:
+            width = width + o_width
+        return DisplaySpan((
+            width,
+            has_token or o_has_token,
+            o_starts_ws if empty else starts_ws,
+            ends_ws if o_empty else o_ends_ws,
+            o_last_pads if o_has_token else last_pads,
+            empty and o_empty,
+        ))
+
+
+class DisplayPrefix:
+    """
+    一组文本的前缀和，O(1) 求任意连续区间 ''.join(texts[lo:hi]) 的 display 宽度。
+    """
+
+    def __init__(self, texts: list):
+        spans = [DisplaySpan.of(text, width) for text, width in zip(texts, cnt_display_words_batch(texts))]
+        n = len(spans)
+        self._widths = [0.0] * (n + 1)       # 各段自身宽度的前缀和
+        self._joins = [0] * (n + 1)          # 与前一个含 token 的段之间需补空格的交界数的前缀和
+        self._join_at = [False] * n          # 段 i 与前一个含 token 的段之间是否补空格
+        self._next_token = [n] * (n + 1)     # i 及之后第一个含 token 的段
+        prev_pads = False                    # 前一个含 token 的段是否以需补空格的字符结尾
+        has_prev = False
+        ws_between = False                   # 与前一个含 token 的段之间是否有空白
+        for i, (width, has_token, starts_ws, ends_ws, last_pads, empty) in enumerate(spans):
+            self._widths[i + 1] = self._widths[i] + width
+            join = False
+            if has_token:
+                join = has_prev and prev_pads and (ws_between or starts_ws)
+                has_prev, prev_pads, ws_between = True, last_pads, ends_ws
+            elif not empty:
+                ws_between = True             # 纯空白段
+            self._join_at[i] = join
+            self._joins[i + 1] = self._joins[i] + join
+        for i in range(n - 1, -1, -1):
+            self._next_token[i] = i if spans[i][1] else self._next_token[i + 1]
+
+    def width(self, lo: int, hi: int) -> float:
+        """cnt_display_words(''.join(texts[lo:hi]))"""
+        if hi <= lo:
+            return 0.0
+        joins = self._joins[hi] - self._joins[lo]
+        first = self._next_token[lo]
+        if first < hi and self._join_at[first]:
+            joins -= 1                        # 区间内第一个 token 段的交界在区间外
+        return self._widths[hi] - self._widths[lo] + 0.5 * joins
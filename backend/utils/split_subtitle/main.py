@@ -4,16 +4,19 @@ import re
 import difflib
 from typing import List, Tuple
 import sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils.split_subtitle.ASRData import ASRData, from_srt, ASRDataSeg
-from utils.split_subtitle.split_by_llm import split_by_llm
+from utils.split_subtitle.split_by_llm import split_by_llm, split_by_llm_async
+from utils import llm_async
 from utils.split_subtitle.merge_english_words import WordMerger
+from utils.split_subtitle.chunk_planner import plan_split_chunks, plan_split_points, run_with_shrink
+from utils.split_subtitle.prompt import VIDEO_SPLIT_PROMPT_TEMPLATE
 
 MAX_DISPLAY_COUNT = 60  # display长度的最大数量
 MIN_DISPLAY_COUNT = 10   # display长度的最小数量
-SEGMENT_THRESHOLD = 800  # 每个分段的最大字数
+SEGMENT_THRESHOLD = 800  # 每个分段的最大字数（determine_num_segments 的默认分块，optimise_srt 改为按 token 规划）
 FIXED_NUM_THREADS = 4  # 固定的线程数量
 SPLIT_RANGE = 50  # 在分割点前后寻找最大时间间隔的范围
+CARRY_MAX_TOKENS = 10  # 分块对齐时带入下一块的未匹配 token 上限，不超过对齐的最大偏移量(max_shift)
 
 import logging
 logger = logging.getLogger('subtitle_split')
@@ -45,7 +48,7 @@ def is_pure_punctuation(s: str) -> bool:
     return not re.search(r'\w', s, flags=re.UNICODE)
 
 
-from utils.split_subtitle.cnt_tokens import count_words, cnt_display_words
+from utils.split_subtitle.cnt_tokens import count_words, count_tokens, cnt_display_words_batch, DisplayPrefix, DisplaySpan
 
 def preprocess_text(s: str) -> str:
     """
@@ -59,9 +62,18 @@ def merge_segments_based_on_sentences(asr_data: ASRData, sentences: List[str]) -
     基于LLM返回的句子列表，合并ASR分段。
     asr_data: ASRData，ASRDataSeg List，段落中所有的token
     sentences: List[str],LLM根据完整句子生成的分句列表
-    这里已经粗筛过一次，asr_data和sentence都是这个800字左右的Section
     """
-    asr_texts = [seg.text for seg in asr_data.segments]
+    seg_groups, _ = align_sentences_to_segments(asr_data.segments, sentences)
+    return finalize_segments(split_long_groups(seg_groups))
+
+
+def align_sentences_to_segments(segments: List[ASRDataSeg], sentences: List[str]) -> Tuple[List[List[ASRDataSeg]], int]:
+    """
+    用滑动窗口把每个句子对齐到一段连续的 token。
+    返回 (每个句子匹配到的 token 列表, 第一个未被消费的 token 下标)；
+    分块对齐时，下标之后的 token 会带入下一块继续匹配。
+    """
+    asr_texts = [seg.text for seg in segments]
     asr_len = len(asr_texts)
     asr_index = 0  # 当前分段索引位置
     threshold = 0.5  # 相似度阈值
@@ -73,6 +85,7 @@ def merge_segments_based_on_sentences(asr_data: ASRData, sentences: List[str]) -
         logger.info(f"[+] 处理句子: {sentence}")
         sentence_proc = preprocess_text(sentence)
         word_count = count_words(sentence_proc)
+        substr_proc, ratio = '', 0.0
         best_ratio = 0.0
         best_pos = None
         best_window_size = 0
@@ -107,7 +120,7 @@ def merge_segments_based_on_sentences(asr_data: ASRData, sentences: List[str]) -
             end_seg_index = best_pos + best_window_size - 1
 
             # 保留原始的ASRDataSeg列表，保持token级别的时间信息
-            matched_segments = asr_data.segments[start_seg_index:end_seg_index + 1]
+            matched_segments = segments[start_seg_index:end_seg_index + 1]
             merged_text = ''.join(seg.text for seg in matched_segments)
 
             print(f"[+] 合并分段: {merged_text}")
@@ -123,14 +136,24 @@ def merge_segments_based_on_sentences(asr_data: ASRData, sentences: List[str]) -
             # 匹配失败时只前进1步，而不是跳过整个窗口
             asr_index += 1
 
-    # 统一处理过长和过短的分段
-    print("[+] 正在处理过长分段...")
+    return new_segments, min(asr_index, asr_len)
+
+
+def split_carry(leftover: List[ASRDataSeg]) -> Tuple[List[ASRDataSeg], List[ASRDataSeg]]:
+    """
+    把块尾未匹配的 token 分为 (带入下一块的最后 CARRY_MAX_TOKENS 个, 超出上限的部分)。
+    超出部分不能丢弃，由调用方单独成组输出。
+    """
+    cut = max(0, len(leftover) - CARRY_MAX_TOKENS)
+    return leftover[cut:], leftover[:cut]
+
+
+def split_long_groups(seg_groups: List[List[ASRDataSeg]]) -> List[ASRDataSeg]:
+    """把每组 token 合并为一条字幕，display 长度超限的按时间间隔继续拆分"""
     processed_segments = []
-    for seg_list in new_segments:
-        # 计算整个句子的display长度
-        total_text = ''.join(seg.text for seg in seg_list)
-        display_len = cnt_display_words(total_text)
-        
+    # 计算每个句子的display长度（批量计数）
+    total_texts = [''.join(seg.text for seg in seg_list) for seg_list in seg_groups]
+    for seg_list, total_text, display_len in zip(seg_groups, total_texts, cnt_display_words_batch(total_texts)):
         if display_len > MAX_DISPLAY_COUNT:
             # 需要分割的分段，传递List[ASRDataSeg]
             split_segs = split_segment_by_display_length(seg_list)
@@ -143,17 +166,21 @@ def merge_segments_based_on_sentences(asr_data: ASRData, sentences: List[str]) -
                 seg_list[-1].end_time
             )
             processed_segments.append(merged_seg)
-    
+    return processed_segments
+
+
+def finalize_segments(processed_segments: List[ASRDataSeg]) -> ASRData:
+    """合并过短分段并修复被拆开的英文单词（需要看到相邻分段，所以在全部分块完成后执行）"""
     print("[+] 正在循环合并过短分段...")
     final_segments = merge_short_segments_iteratively(processed_segments)
     
     # 对最终的句子文本应用英文单词合并
     print("[+] 正在合并分割的英文单词...")
     word_merger = WordMerger()
+    merged_texts = word_merger.merge_texts([seg.text for seg in final_segments])
     merged_final_segments = []
     
-    for seg in final_segments:
-        merged_text = word_merger.merge_text(seg.text)
+    for seg, merged_text in zip(final_segments, merged_texts):
         if merged_text != seg.text:
             print(f"[+] 合并单词: '{seg.text}' -> '{merged_text}'")
         
@@ -173,130 +200,94 @@ def merge_segments_based_on_sentences(asr_data: ASRData, sentences: List[str]) -
 
 def split_segment_by_display_length(seg_list: List[ASRDataSeg]) -> List[ASRDataSeg]:
     """
-    基于display长度分割ASRDataSeg列表，保持token级别的时间信息
+    基于display长度分割ASRDataSeg列表，保持token级别的时间信息。
+    display 宽度用前缀和 O(1) 求区间值，递归只传下标，不再反复拼接子串重新计数。
     """
-    result = []
-    
     if not seg_list:
-        return result
-    
-    # 计算总的display长度
-    total_text = ''.join(seg.text for seg in seg_list)
-    total_display_len = cnt_display_words(total_text)
-    
-    if total_display_len <= MAX_DISPLAY_COUNT:
+        return []
+
+    prefix = DisplayPrefix([seg.text for seg in seg_list])
+    if len(seg_list) > 1 and prefix.width(0, len(seg_list)) > MAX_DISPLAY_COUNT:
+        logger.info(f"[+] 开始分割ASRDataSeg列表，长度为 {len(seg_list)}")
+    result = []
+    _split_range_by_display_length(seg_list, prefix, 0, len(seg_list), result)
+    return result
+
+
+def _split_range_by_display_length(seg_list: List[ASRDataSeg], prefix: DisplayPrefix,
+                                   lo: int, hi: int, result: List[ASRDataSeg]) -> None:
+    """处理 seg_list[lo:hi]，结果追加到 result"""
+    n = hi - lo
+    if n <= 0:
+        return
+    if prefix.width(lo, hi) <= MAX_DISPLAY_COUNT:
         # 不需要分割，合并为单个segment
-        merged_seg = ASRDataSeg(
-            total_text,
-            seg_list[0].start_time,
-            seg_list[-1].end_time
-        )
-        result.append(merged_seg)
-        return result
-    
-    # 需要分割，使用时间间隔寻找最佳分割点
-    n = len(seg_list)
+        result.append(ASRDataSeg(
+            ''.join(seg.text for seg in seg_list[lo:hi]),
+            seg_list[lo].start_time,
+            seg_list[hi - 1].end_time
+        ))
+        return
     if n <= 1:
         # 只有一个segment，直接返回
-        result.extend(seg_list)
-        return result
-    logger.info(f"[+] 开始分割ASRDataSeg列表，长度为 {n}")
-    
-    # 在1/6到5/6之间寻找最佳分割点
-    start_idx = max(1, n // 6)
-    end_idx = min(n - 1, (5 * n) // 6)
-    
+        result.append(seg_list[lo])
+        return
+
+    # 在1/6到5/6之间寻找与前一个token时间间隔最大的分割点
     max_time_diff = 0
     best_split_idx = -1
-    
-    for i in range(start_idx, end_idx + 1):
-        # 计算与前一个token的时间间隔
+    for i in range(lo + max(1, n // 6), lo + min(n - 1, (5 * n) // 6) + 1):
         time_diff = seg_list[i].start_time - seg_list[i - 1].end_time
         if time_diff > max_time_diff:
             max_time_diff = time_diff
             best_split_idx = i
-    
+
     # 如果没有找到合适的分割点或时间差太小，使用中点
     if best_split_idx == -1 or max_time_diff < 50:  # 50毫秒作为阈值
-        best_split_idx = n // 2
-    
-    # 根据找到的分割点分割
-    first_part = seg_list[:best_split_idx]
-    second_part = seg_list[best_split_idx:]
-    
-    # 递归处理两个部分
-    result.extend(split_segment_by_display_length(first_part))
-    result.extend(split_segment_by_display_length(second_part))
-    
-    return result
+        best_split_idx = lo + n // 2
+
+    _split_range_by_display_length(seg_list, prefix, lo, best_split_idx, result)
+    _split_range_by_display_length(seg_list, prefix, best_split_idx, hi, result)
+
 
 def merge_short_segments_iteratively(segments: List[ASRDataSeg]) -> List[ASRDataSeg]:
     """
-    循环合并过短的分段，基于display_words最小值
+    合并过短的分段（display 宽度小于 MIN_DISPLAY_COUNT），与时间间隔较小的一侧合并。
+
+    单次扫描：游标之前的分段都不短（合并只会让宽度变大），所以一遍扫描后不会再有可合并的分段；
+    被合并段的宽度由 DisplaySpan 增量计算，不重新扫描合并后的整段文本。
     """
-    result = segments.copy()
-    changed = True
-    
-    while changed:
-        changed = False
-        i = 0
-        
-        while i < len(result):
-            seg = result[i]
-            display_len = cnt_display_words(seg.text)
-            
-            if display_len < MIN_DISPLAY_COUNT:
-                # 计算与前后分段的时间差
-                prev_time_diff = float('inf')
-                next_time_diff = float('inf')
-                
-                if i > 0:
-                    prev_seg = result[i - 1]
-                    prev_time_diff = seg.start_time - prev_seg.end_time
-                
-                if i < len(result) - 1:
-                    next_seg = result[i + 1]
-                    next_time_diff = next_seg.start_time - seg.end_time
-                
-                # 选择时间差较小的进行合并
-                if prev_time_diff <= next_time_diff and i > 0:
-                    # 与前一个分段合并
-                    prev_seg = result[i - 1]
-                    merged_text = prev_seg.text + seg.text
-                    
-                    merged_seg = ASRDataSeg(
-                        merged_text,
-                        prev_seg.start_time,
-                        seg.end_time,
-                        "",  # 直接翻译
-                        "",  # 自由翻译
-                        ""   # 反思翻译
-                    )
-                    result[i - 1:i + 1] = [merged_seg]
-                    changed = True
-                    # 不增加i，因为列表长度减少了
-                elif next_time_diff < prev_time_diff and i < len(result) - 1:
-                    # 与后一个分段合并
-                    next_seg = result[i + 1]
-                    merged_text = seg.text + next_seg.text
-                    
-                    merged_seg = ASRDataSeg(
-                        merged_text,
-                        seg.start_time,
-                        next_seg.end_time,
-                        "",  # 直接翻译
-                        "",  # 自由翻译
-                        ""   # 反思翻译
-                    )
-                    result[i:i + 2] = [merged_seg]
-                    changed = True
-                    # 不增加i，继续检查合并后的分段
-                else:
-                    # 无法合并（边界情况）
-                    i += 1
-            else:
+    result = []          # 游标之前的分段
+    i = 0
+    n = len(segments)
+    seg = segments[0] if segments else None
+    span = DisplaySpan.of(seg.text) if seg else None
+    while seg is not None:
+        next_seg = segments[i + 1] if i + 1 < n else None
+        if span.width >= MIN_DISPLAY_COUNT:
+            result.append(seg)
+        else:
+            # 计算与前后分段的时间差，选择时间差较小的进行合并
+            prev_time_diff = seg.start_time - result[-1].end_time if result else float('inf')
+            next_time_diff = next_seg.start_time - seg.end_time if next_seg else float('inf')
+
+            if prev_time_diff <= next_time_diff and result:
+                # 与前一个分段合并（合并结果不短，不再检查）
+                prev_seg = result[-1]
+                result[-1] = ASRDataSeg(prev_seg.text + seg.text, prev_seg.start_time, seg.end_time, "", "", "")
+            elif next_time_diff < prev_time_diff and next_seg is not None:
+                # 与后一个分段合并，继续检查合并后的分段
+                seg = ASRDataSeg(seg.text + next_seg.text, seg.start_time, next_seg.end_time, "", "", "")
+                span = span + DisplaySpan.of(next_seg.text)
                 i += 1
-    
+                continue
+            else:
+                # 无法合并（边界情况）
+                result.append(seg)
+        i += 1
+        seg = next_seg
+        span = DisplaySpan.of(seg.text) if seg else None
+
     return result
 
 
@@ -316,53 +307,48 @@ def split_asr_data(asr_data: ASRData, num_segments: int) -> List[ASRData]:
     1. 计算总字数与分段数，并确定每个分段的字数范围。
     2. 确定平均分割点。
     3. 在分割点前后一定范围内，寻找时间间隔最大的点作为实际的分割点。
+    分割点的选择见 chunk_planner.plan_split_points。
     返回：List[ASRData]，即分段列表，每一个ASRData对象代表一个分段,包含其中所有的ASRDataSeg对象。
     """
-    total_segs = len(asr_data.segments)
-    total_word_count = count_words(asr_data.to_txt())
-    words_per_segment = total_word_count // num_segments
-    split_indices = []
-
+    segs = asr_data.segments
+    total_segs = len(segs)
     if num_segments <= 1 or total_segs <= num_segments:
         return [asr_data]
 
     # 计算每个分段的大致字数 根据每段字数计算分割点
     # 比如7047个字，分成8段，每段880个字。
-    split_indices = [i * words_per_segment for i in range(1, num_segments)]
-    # 调整分割点：在每个平均分割点附近寻找时间间隔最大的点
-    adjusted_split_indices = []
-    for split_point in split_indices:
-        # 定义搜索范围
-        start = max(0, split_point - SPLIT_RANGE)
-        end = min(total_segs - 1, split_point + SPLIT_RANGE)
-        # 在范围内找到时间间隔最大的点
-        max_gap = -1
-        best_index = split_point
-        for j in range(start, end):
-            gap = asr_data.segments[j + 1].start_time - asr_data.segments[j].end_time
-            if gap > max_gap:
-                max_gap = gap
-                best_index = j
-        adjusted_split_indices.append(best_index)
-
-    # 移除重复的分割点
-    adjusted_split_indices = sorted(list(set(adjusted_split_indices)))
+    total_word_count = count_words(asr_data.to_txt())
+    words_per_segment = total_word_count // num_segments
+    # 调整分割点：在每个平均分割点附近寻找时间间隔最大的点（已去重、升序）
+    adjusted_split_indices = plan_split_points(segs, words_per_segment, num_segments, SPLIT_RANGE)
 
     # 根据调整后的分割点拆分ASRData
     segments = []
     prev_index = 0
     for index in adjusted_split_indices:
-        part = ASRData(asr_data.segments[prev_index:index + 1])
+        part = ASRData(segs[prev_index:index + 1])
         segments.append(part)
         prev_index = index + 1
     # 添加最后一部分
     if prev_index < total_segs:
-        part = ASRData(asr_data.segments[prev_index:])
+        part = ASRData(segs[prev_index:])
         segments.append(part)
 
     return segments
 
 
+def halve_asr_data(asr_data: ASRData) -> List[ASRData]:
+    """
+    截断重试时按分段下标把 ASRData 对半拆开。
+    split_asr_data 按字数定位分割点，只适用于词级分段，不能用来拆分句级或已切好的块。
+    """
+    segs = asr_data.segments
+    mid = len(segs) // 2
+    if mid == 0:
+        return [asr_data]
+    return [ASRData(segs[:mid]), ASRData(segs[mid:])]
+
+
 def determine_num_segments(word_count: int, threshold: int = 500) -> int:
     """
     根据字数计算分段数，每1000个字为一个分段，至少为1
@@ -373,7 +359,7 @@ def determine_num_segments(word_count: int, threshold: int = 500) -> int:
         num_segments += 1
     return max(1, num_segments)
 
-from video.views.set_setting import load_all_settings
+from video.views.set_setting import get_bool_setting, get_setting
 
 from typing import Callable, List
 def optimise_srt(
@@ -381,20 +367,20 @@ def optimise_srt(
     save_path: str,
     num_threads: int = FIXED_NUM_THREADS,
     progress_cb: Callable[[float], None] | None = None,   # 0.0‒1.0 之间
+    cancel_check: Callable[[], bool] | None = None,       # 返回 True 时取消未完成的 LLM 请求
 ) -> None:
-    settings = load_all_settings()
-    use_proxy = settings.get('DEFAULT', {}).get('use_proxy', 'true').lower() == 'true'
+    use_proxy = get_bool_setting('DEFAULT', 'use_proxy', True)
     if not use_proxy:
         # 禁用HTTP(S)代理请求
         os.environ.pop('http_proxy', None)
         os.environ.pop('https_proxy', None)
     from utils.llm_engines import ENGINES
     # 获取 API 配置
-    selected_model_provider = settings.get('DEFAULT', {}).get('selected_model_provider', 'deepseek')
-    api_key = settings.get('DEFAULT', {}).get(f'{selected_model_provider}_api_key', '')
-    base_url = settings.get('DEFAULT', {}).get(f'{selected_model_provider}_base_url', 'https://api.deepseek.com')
-    enable_thinking = settings.get('DEFAULT', {}).get('enable_thinking', 'true')
-    model = ENGINES[selected_model_provider]["thinking" if enable_thinking == 'true' else "normal"]
+    selected_model_provider = get_setting('DEFAULT', 'selected_model_provider', 'deepseek')
+    api_key = get_setting('DEFAULT', f'{selected_model_provider}_api_key', '')
+    base_url = get_setting('DEFAULT', f'{selected_model_provider}_base_url', 'https://api.deepseek.com')
+    enable_thinking = get_bool_setting('DEFAULT', 'enable_thinking', True)
+    model = ENGINES[selected_model_provider]["thinking" if enable_thinking else "normal"]
     """
     · 将 用于优化字幕。
     · 增加 progress_cb 回调，用于上报阶段内进度（0‑1）
@@ -435,65 +421,72 @@ def optimise_srt(
         logger.debug(f"[DEBUG] ... (还有 {len(asr_data.segments) - 20} 个segments)")
     logger.debug("[DEBUG] ============================================")
 
-    num_segments = determine_num_segments(
-        total_word_count, threshold=SEGMENT_THRESHOLD
+    # 按 token 数和模型输出上限规划分块数
+    num_segments = plan_split_chunks(
+        txt, model, prompt_tokens=count_tokens(VIDEO_SPLIT_PROMPT_TEMPLATE), num_threads=num_threads
     )
-    print(f"[+] 根据字数 {total_word_count}，确定分段数: {num_segments}")
+    print(f"[+] 根据字数 {total_word_count} 和模型 {model} 的输出上限，确定分段数: {num_segments}")
 
-    # 分割ASRData
-    asr_data_segments = split_asr_data(asr_data, num_segments)
+    # 分割ASRData（分割点越界时会产生空块，不提交给 LLM）
+    asr_data_segments = [part for part in split_asr_data(asr_data, num_segments) if part.has_data()]
 
     # ── 10‑85 %： 多线程执行 split_by_llm 获取句子列表 ─────────────────
-    # 🆕 进度追踪变量
-    import threading
+    # 🆕 进度追踪变量（协程都运行在同一个事件循环线程上，无需加锁）
     completed_chunks = 0
     total_chunks = len(asr_data_segments)
-    progress_lock = threading.Lock()
 
-    def process_segment(asr_data_part):
-        nonlocal completed_chunks
+    async def split_part(asr_data_part, allow_truncated):
         part_txt = asr_data_part.to_txt().replace("\n", "")
-        sentences = split_by_llm(part_txt, use_cache=True,api_key=api_key,model=model,base_url=base_url)
+        return await split_by_llm_async(part_txt, use_cache=True, api_key=api_key, model=model, base_url=base_url,
+                                        allow_truncated=allow_truncated)
+
+    async def process_segment(asr_data_part):
+        nonlocal completed_chunks
+        # 输出被截断时只把这一块对半拆开重试
+        results = await run_with_shrink(split_part, asr_data_part, halve_asr_data)
+        sentences = [sentence for part_sentences in results for sentence in part_sentences]
         print(f"[+] 分段的句子提取完成，共 {len(sentences)} 句")
-        # 🆕 线程安全地更新进度 (10% ~ 85%)
-        with progress_lock:
-            completed_chunks += 1
-            progress_percent = 10 + int((completed_chunks / total_chunks) * 75)
-            if progress_cb:
-                progress_cb(progress_percent)
+        # 🆕 更新进度 (10% ~ 85%)
+        completed_chunks += 1
+        progress_percent = 10 + int((completed_chunks / total_chunks) * 75)
+        if progress_cb:
+            progress_cb(progress_percent)
         return sentences
     print("[+] 正在并行请求LLM将每个分段的文本拆分为句子...")
-    all_sentences: List[str] = [] # 一个二维列表
-    """
-    • map ⇒ 顺序固定，适合“一次性拿齐”场景。
-    • submit + as_completed ⇒ 完成顺序随机，如需保持原序必须自己根据索引排队。
-    • 你看到的大量“无法匹配”并非线程池速度问题，而是结果顺序被打乱导致后续算法对不了号。
-    • 既然 map 已经满足性能要求，又天然保证顺序，最简单的就是保留 map 写法。(所以这里只需要提供是否完成，不需要提供进度)
-    """
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        all_sentences = list(executor.map(process_segment, asr_data_segments))
-    logger.info("all_sentences before flatten: %s", all_sentences)
-    all_sentences = [item for sublist in all_sentences for item in sublist] # 摊平元素，all_sentences 被假定为二维列表
-    logger.info("all_sentences after flatten: %s", all_sentences)
-
-    """
-    示例：
-    all_sentences = [
-        ['I', 'am', 'AI'],
-        ['你', '好'],
-        ['hello', 'world']
-    ]
-    # 执行列表推导式后：
-    all_sentences
-    # -> ['I', 'am', 'AI', '你', '好', 'hello', 'world']
-    """
-
-    print(f"[+] 总共提取到 {len(all_sentences)} 句")
-
-    # 基于LLM已经分段的句子，对ASR分段进行合并
-    print("[+] 正在合并ASR分段基于句子列表...")
-    # ── 85‑95 %：合并分段 ──────────────────────
-    merged_asr = merge_segments_based_on_sentences(asr_data, all_sentences)
+    # 流水线：所有分块同时提交给 LLM，主线程按原顺序逐块等待结果，
+    # 每块返回后立即与该块自己的 token 对齐，对齐与后续分块的 LLM 请求重叠进行。
+    # 块尾未被匹配的 token 带入下一块（跨块的句子仍能完整匹配），最多 CARRY_MAX_TOKENS 个；
+    # 超出上限的和最后一块剩下的 token 各自单独成组输出，不丢字。
+    processed_segments: List[ASRDataSeg] = []
+    carry: List[ASRDataSeg] = []
+    total_sentences = 0
+    futures = [llm_async.submit(process_segment(part)) for part in asr_data_segments]
+    try:
+        for part, future in zip(asr_data_segments, futures):
+            sentences = llm_async.wait_result(future, cancel_check)
+            total_sentences += len(sentences)
+            logger.info("chunk sentences: %s", sentences)
+            tokens = carry + part.segments
+            seg_groups, consumed = align_sentences_to_segments(tokens, sentences)
+            carry, overflow = split_carry(tokens[consumed:])
+            if overflow:
+                logger.warning("[-] 块尾 %d 个未匹配 token 超出带入上限，单独成组输出: %s",
+                               len(overflow), ''.join(seg.text for seg in overflow))
+                seg_groups.append(overflow)
+            processed_segments.extend(split_long_groups(seg_groups))
+    except BaseException:
+        for future in futures:
+            future.cancel()
+        raise
+    if carry:
+        logger.warning("[-] 最后一块剩余 %d 个未匹配 token，单独成组输出: %s",
+                       len(carry), ''.join(seg.text for seg in carry))
+        processed_segments.extend(split_long_groups([carry]))
+
+    print(f"[+] 总共提取到 {total_sentences} 句")
+
+    # ── 85‑95 %：合并过短分段 ──────────────────────
+    merged_asr = finalize_segments(processed_segments)
     merged_asr.segments.sort(key=lambda s: s.start_time)
 
     # ── 95‑100 %：写文件 ───────────────────────
@@ -511,9 +504,10 @@ def translate_srt(raw_srt_path,
                   target_lang="zh",
                   use_translation_cache: bool = True,  # Whether to use translation cache
                   num_threads: int = FIXED_NUM_THREADS,  # Number of threads for translation
-                  batch_size: int = 15,  # Batch size for LLM processing (10-20 sentences per batch)
+                  batch_size: int | None = None,  # Max sentences per LLM batch; None = sized by token budget
                   progress_cb: Callable[[float], None] | None = None,
                   terms_to_note: str = "",  # Terms to emphasize in translation
+                  cancel_check: Callable[[], bool] | None = None,  # Return True to cancel pending LLM requests
     ):
     """
     翻译 SRT 文件的主函数
@@ -530,7 +524,7 @@ def translate_srt(raw_srt_path,
     logger.info("原文字幕加载完成")
     
     # 翻译字幕
-    final_asr_data = two_step_translate(raw_asr_data, use_cache=use_translation_cache, num_threads=num_threads, batch_size=batch_size, source_lang=raw_lang, target_lang=target_lang, terms_to_note=terms_to_note)
+    final_asr_data = two_step_translate(raw_asr_data, use_cache=use_translation_cache, num_threads=num_threads, batch_size=batch_size, source_lang=raw_lang, target_lang=target_lang, terms_to_note=terms_to_note, cancel_check=cancel_check)
     logger.info("字幕翻译完成")
     
     # 如果提供了翻译保存路径，则保存翻译字幕
@@ -1,5 +1,98 @@
+import os
 import re
-from typing import List, Tuple, Set
+import threading
+from pathlib import Path
+from typing import FrozenSet, List, Tuple, Set
+
+# 词典全进程共享：首次使用时构建一次，之后所有任务复用同一个 frozenset。
+# 从 pyspellchecker 构建的结果缓存为每行一个小写单词的文本文件，
+# 文件头记录来源版本，pyspellchecker 升级后自动重建。
+LEXICON_DIR = Path(__file__).resolve().parent.parent.parent / "work_dir" / "lexicon"
+LEXICON_FILE = LEXICON_DIR / "en_words.txt"
+
+_lexicon = None                  # (frozenset, dict_source)
+_lexicon_lock = threading.Lock()
+
+_CJK_RE = re.compile(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af]')
+_ENGLISH_RE = re.compile(r'[a-zA-Z]')
+_FRAGMENT_RE = re.compile(r'[a-zA-Z]+(?:\s+[a-zA-Z]+)*')
+
+MINIMAL_WORDS = frozenset({
+    'remote', 'github', 'repository', 'main', 'branch', 'commit',
+    'config', 'clone', 'push', 'pull', 'merge', 'status', 'add',
+    'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had',
+    'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his',
+    'how', 'man', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy'
+})
+
+
+def _spellchecker_source() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+    try:
+        return f"pyspellchecker {version('pyspellchecker')}"
+    except PackageNotFoundError:
+        return "pyspellchecker"
+
+
+def _read_lexicon_file(source: str):
+    """缓存文件存在且来源版本一致时返回单词集合，否则返回 None"""
+    try:
+        with open(LEXICON_FILE, 'r', encoding='utf-8') as f:
+            if f.readline().rstrip('\n') != f"# {source}":
+                return None
+            return frozenset(f.read().split('\n')) - {''}
+    except OSError:
+        return None
+
+
+def _write_lexicon_file(words: FrozenSet[str], source: str) -> None:
+    tmp = LEXICON_FILE.with_name(f"{LEXICON_FILE.name}.{os.getpid()}.part")
+    try:
+        LEXICON_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(f"# {source}\n")
+            f.write('\n'.join(sorted(words)))
+        os.replace(tmp, LEXICON_FILE)
+    except OSError as e:
+        print(f"[WordMerger] 词典缓存写入失败: {e}")
+        if tmp.exists():
+            tmp.unlink()
+
+
+def _build_lexicon() -> Tuple[FrozenSet[str], str]:
+    try:
+        source = _spellchecker_source()
+        words = _read_lexicon_file(source)
+        if words is not None:
+            return words, "pyspellchecker"
+        from spellchecker import SpellChecker
+        spell = SpellChecker()
+        words = frozenset(word.lower() for word in spell.word_frequency.dictionary.keys())
+        _write_lexicon_file(words, source)
+        print(f"成功加载 pyspellchecker 库，包含 {len(words)} 个单词")
+        return words, "pyspellchecker"
+    except ImportError:
+        pass
+
+    # 如果所有库都不可用，输出安装提示
+    print("未找到可用的英文单词库，请安装以下任一库：")
+    print("推荐: pip install english-words")
+    print("或者: pip install nltk")
+    print("或者: pip install pyspellchecker")
+    print("\n正在使用最小化的备用词汇表...")
+    print(f"使用备用词汇表，包含 {len(MINIMAL_WORDS)} 个单词")
+    return MINIMAL_WORDS, "minimal backup"
+
+
+def get_lexicon() -> Tuple[FrozenSet[str], str]:
+    """返回进程共享的 (小写单词集合, 来源)，首次调用时构建"""
+    global _lexicon
+    if _lexicon is None:
+        with _lexicon_lock:
+            if _lexicon is None:
+                _lexicon = _build_lexicon()
+    return _lexicon
+
 
 def has_cjk_and_english(text: str) -> bool:
     """
@@ -16,65 +109,14 @@ def has_cjk_and_english(text: str) -> bool:
     # \u3040-\u309f: 日文平假名
     # \u30a0-\u30ff: 日文片假名
     # \uac00-\ud7af: 韩文字符
-    cjk_pattern = r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\uac00-\ud7af]'
-    english_pattern = r'[a-zA-Z]'
-    
-    has_cjk = bool(re.search(cjk_pattern, text))
-    has_english = bool(re.search(english_pattern, text))
-    
-    return has_cjk and has_english
+    return bool(_CJK_RE.search(text)) and bool(_ENGLISH_RE.search(text))
 
 class WordMerger:
     def __init__(self):
         """
-        初始化词根合并器，尝试使用多种英文单词库
+        初始化词根合并器；词典由所有实例共享（见 get_lexicon），构造本身没有开销
         """
-        self.word_set = set()
-        self.dict_source = ""
-        
-        # 按优先级尝试不同的单词库
-        self._load_word_dict()
-    
-    def _load_word_dict(self):
-        """
-        尝试加载英文单词字典，按优先级使用不同的库
-        """
-        
-        # 使用 pyspellchecker 库
-        try:
-            from spellchecker import SpellChecker
-            spell = SpellChecker()
-            self.word_set = spell.word_frequency.dictionary.keys()
-            self.word_set = set(word.lower() for word in self.word_set)
-            self.dict_source = "pyspellchecker"
-            print(f"成功加载 pyspellchecker 库，包含 {len(self.word_set)} 个单词")
-            return
-        except ImportError:
-            pass
-        
-        # 如果所有库都不可用，输出安装提示
-        if not self.word_set:
-            print("未找到可用的英文单词库，请安装以下任一库：")
-            print("推荐: pip install english-words")
-            print("或者: pip install nltk")
-            print("或者: pip install pyspellchecker")
-            print("\n正在使用最小化的备用词汇表...")
-            self._load_minimal_words()
-    
-    def _load_minimal_words(self):
-        """
-        加载最小化的备用词汇表（仅在无法加载其他库时使用）
-        """
-        # 这只是一个很小的备用集合，建议安装上述库
-        self.word_set = {
-            'remote', 'github', 'repository', 'main', 'branch', 'commit',
-            'config', 'clone', 'push', 'pull', 'merge', 'status', 'add',
-            'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had',
-            'her', 'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his',
-            'how', 'man', 'new', 'now', 'old', 'see', 'two', 'way', 'who', 'boy'
-        }
-        self.dict_source = "minimal backup"
-        print(f"使用备用词汇表，包含 {len(self.word_set)} 个单词")
+        self.word_set, self.dict_source = get_lexicon()
     
     def is_valid_word(self, word: str) -> bool:
         """
@@ -99,10 +141,9 @@ class WordMerger:
             包含(开始位置, 结束位置, 片段内容)的列表
         """
         # 匹配连续的英文字母（可能包含空格）
-        pattern = r'[a-zA-Z]+(?:\s+[a-zA-Z]+)*'
         fragments = []
         
-        for match in re.finditer(pattern, text):
+        for match in _FRAGMENT_RE.finditer(text):
             start, end = match.span()
             fragment = match.group()
             # 只处理包含空格的片段（被分割的单词）
@@ -160,14 +201,31 @@ class WordMerger:
         if not has_cjk_and_english(text):
             return text
         
-        fragments = self.find_english_fragments(text)
-        
-        # 从后往前处理，避免位置偏移
-        for start, end, fragment in reversed(fragments):
-            merged = self.try_merge_words(fragment)
-            text = text[:start] + merged + text[end:]
-        
-        return text
+        return self._merge_fragments(text, {})
+    
+    def merge_texts(self, texts: List[str]) -> List[str]:
+        """
+        批量版本的 merge_text，结果与逐条调用一致。
+        同一批次内相同的英文片段只做一次合并判断（字幕里术语会反复出现）。
+        """
+        cache = {}
+        return [self._merge_fragments(text, cache) if has_cjk_and_english(text) else text
+                for text in texts]
+    
+    def _merge_fragments(self, text: str, cache: dict) -> str:
+        parts = []
+        last = 0
+        for start, end, fragment in self.find_english_fragments(text):
+            merged = cache.get(fragment)
+            if merged is None:
+                merged = cache[fragment] = self.try_merge_words(fragment)
+            parts.append(text[last:start])
+            parts.append(merged)
+            last = end
+        if not parts:
+            return text
+        parts.append(text[last:])
+        return ''.join(parts)
 
 # 使用示例
 def main():
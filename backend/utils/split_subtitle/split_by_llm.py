@@ -4,9 +4,10 @@ import os,math
 import re
 import sys
 from typing import List, Optional
-import openai
 import logging
 from utils.split_subtitle.cnt_tokens import count_words
+from utils.split_subtitle.chunk_planner import LLMOutputTruncated, max_output_tokens
+from utils.llm_async import chat_completion, run_sync
 from utils.split_subtitle.prompt import VIDEO_SPLIT_PROMPT_TEMPLATE 
 
 # 将项目根目录添加到路径以从video.views.set_setting导入
@@ -73,15 +74,23 @@ def set_cache(text: str, model: str, result: List[str]) -> None:
     except IOError:
         pass
 
-def split_by_llm(text: str,
+def split_by_llm(text: str, use_cache: bool = False, **kwargs) -> List[str]:
+    """split_by_llm_async 的同步入口"""
+    return run_sync(split_by_llm_async(text, use_cache, **kwargs))
+
+
+async def split_by_llm_async(text: str,
                  use_cache: bool = False,
                  max_length:int = 20,
                  language:str= "en",
                  api_key="sk-your_api_key",
                  base_url="https://api.deepseek.com",
-                 model="deepseek-chat") -> List[str]:
+                 model="deepseek-chat",
+                 allow_truncated: bool = True) -> List[str]:
     """
     使用LLM进行文本断句
+    allow_truncated=False 时，输出因达到 max_tokens 被截断会抛出 LLMOutputTruncated，
+    由调用方拆小分块重试，而不是修补残缺的 JSON。
     """
     # if use_cache:
     #     cached_result = get_cache(text, MODEL)
@@ -89,8 +98,6 @@ def split_by_llm(text: str,
     #         print(f"[+] 从缓存中获取结果: {cached_result}")
     #         return cached_result
     word_limit=30 # 最大词数限制
-    # 初始化OpenAI客户端
-    client = openai.OpenAI(api_key=api_key, base_url=base_url)
     SYSTEM_PROMPT = f"使用<br>进行段落分割"
     total_word_count = count_words(text)
     logger.info(f"total_word_count: {total_word_count}")
@@ -101,16 +108,21 @@ def split_by_llm(text: str,
     print("using model:",model)
     result = None  # 初始化变量以便在异常处理中使用
     try:
-        response = client.chat.completions.create(
+        response = await chat_completion(
+            api_key=api_key,
+            base_url=base_url,
             model=model,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1,
-            max_tokens=8192  # Ensure sufficient tokens for long responses
+            max_tokens=max_output_tokens(model)
         )
         result = response.choices[0].message.content # 获取LLM返回的内容（OpenAI格式）
+        if response.choices[0].finish_reason == 'length' and not allow_truncated:
+            logger.warning(f"[!] LLM输出达到max_tokens被截断，输入 {total_word_count} 词")
+            raise LLMOutputTruncated(model)
 
         # 调试：打印原始响应
         logger.debug(f"[DEBUG] Raw LLM response content: {repr(result)}")
@@ -160,6 +172,8 @@ def split_by_llm(text: str,
 
         set_cache(text, model, split_result)
         return split_result
+    except LLMOutputTruncated:
+        raise
     except json.JSONDecodeError as e:
         logger.error(f"[!] JSON解析失败: {e}")
         logger.error(f"[!] 原始内容长度: {len(result) if result else 0} chars")
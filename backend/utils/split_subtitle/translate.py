@@ -161,18 +161,22 @@ pythonif load_key("pause_before_translate"):
 用户可以在翻译开始前手动编辑组合术语文件。
 """
 
+import asyncio
 import hashlib
 import json
 import os
 import sys
 import logging
 from typing import Optional
-import openai
 
 # 将项目根目录添加到路径以从video.views.set_setting导入
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
-from video.views.set_setting import load_all_settings
+from video.views.set_setting import get_bool_setting, get_setting
 from utils.split_subtitle.ASRData import ASRData
+from utils.split_subtitle.chunk_planner import (
+    LLMOutputTruncated, MAX_BATCH_SENTENCES, max_output_tokens, plan_translate_batches, run_with_shrink,
+)
+from utils.llm_async import chat_completion, run_sync
 
 # 配置日志
 logger = logging.getLogger('subtitle_translate')
@@ -271,15 +275,19 @@ def clean_json_response(response: str) -> str:
     
     return response
 
-def call_llm(prompt: str, use_cache: bool = True, api_key=None, base_url=None, model=None) -> str:
+def call_llm(prompt: str, use_cache: bool = True, api_key=None, base_url=None, model=None, allow_truncated: bool = True) -> str:
+    """call_llm_async 的同步入口"""
+    return run_sync(call_llm_async(prompt, use_cache, api_key, base_url, model, allow_truncated))
+
+
+async def call_llm_async(prompt: str, use_cache: bool = True, api_key=None, base_url=None, model=None, allow_truncated: bool = True) -> str:
     """
     调用LLM API
+    allow_truncated=False 时，输出达到 max_tokens 被截断会抛出 LLMOutputTruncated
     """
     if api_key is None or base_url is None or model is None:
         raise ValueError("api_key, base_url and model parameters are required")
     
-    # 在函数内部创建客户端
-    client = openai.OpenAI(api_key=api_key, base_url=base_url)
     # 暂时禁用缓存以避免格式问题
     # if use_cache:
     #     cached_result = get_cache(prompt, MODEL)
@@ -291,15 +299,20 @@ def call_llm(prompt: str, use_cache: bool = True, api_key=None, base_url=None, m
         logger.debug(f"发送LLM请求，模型: {model}, 提示词长度: {len(prompt)} 字符")
         logger.debug(f"提示词前200字符: {prompt[:200]}...")
         
-        response = client.chat.completions.create(
+        response = await chat_completion(
+            api_key=api_key,
+            base_url=base_url,
             model=model,
             messages=[
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1,
-            max_tokens=8192  # Ensure sufficient tokens for long responses
+            max_tokens=max_output_tokens(model)
         )
         result = response.choices[0].message.content
+        if response.choices[0].finish_reason == 'length' and not allow_truncated:
+            logger.warning(f"LLM输出达到max_tokens被截断，提示词长度: {len(prompt)} 字符")
+            raise LLMOutputTruncated(model)
         
         # 详细记录LLM响应
         logger.debug(f"LLM响应长度: {len(result)} 字符")
@@ -314,13 +327,20 @@ def call_llm(prompt: str, use_cache: bool = True, api_key=None, base_url=None, m
         #     set_cache(prompt, MODEL, result)
         
         return result
+    except LLMOutputTruncated:
+        raise
     except Exception as e:
         logger.error(f"请求LLM失败: {e}")
         logger.error(f"错误类型: {type(e).__name__}")
         logger.error(f"提示词: {prompt[:100]}...")
         return ""
     
-def step1_direct_translate_batch(batch_segments: ASRData, batch_start_idx: int, batch_size: int, all_segments: ASRData = None, use_cache: bool = True, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None) -> ASRData:
+def step1_direct_translate_batch(*args, **kwargs) -> ASRData:
+    """step1_direct_translate_batch_async 的同步入口"""
+    return run_sync(step1_direct_translate_batch_async(*args, **kwargs))
+
+
+async def step1_direct_translate_batch_async(batch_segments: ASRData, batch_start_idx: int, batch_size: int, all_segments: ASRData = None, use_cache: bool = True, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, allow_truncated: bool = True) -> ASRData:
     """
     批量直译处理函数 - 处理一批sentences (10-20个)
     输入给LLM的序号始终是1到len(batch_segments)
@@ -369,7 +389,7 @@ def step1_direct_translate_batch(batch_segments: ASRData, batch_start_idx: int,
     print("full_prompt:",full_prompt)
 
     # 调用LLM
-    response = call_llm(full_prompt, use_cache, api_key, base_url, model)
+    response = await call_llm_async(full_prompt, use_cache, api_key, base_url, model, allow_truncated)
     
     # 解析LLM返回的JSON
     try:
@@ -422,27 +442,37 @@ def step1_direct_translate_batch(batch_segments: ASRData, batch_start_idx: int,
     
     return batch_segments
 
-def step1_direct_translate(asr_data: ASRData, use_cache: bool = True, batch_size: int = 15, num_threads: int = 4, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None) -> ASRData:
+def step1_direct_translate(asr_data: ASRData, use_cache: bool = True, batch_size: int = None, num_threads: int = 4, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, cancel_check=None) -> ASRData:
     """
-    第一步：直译 - 使用FAITHFUL_PROMPT，支持批处理和多线程
+    第一步：直译 - 使用FAITHFUL_PROMPT，批次在共享事件循环上并发请求
     """
-    from concurrent.futures import ThreadPoolExecutor
-    
-    # 将segments按批次分组
-    batches = []
-    for i in range(0, len(asr_data.segments), batch_size):
-        batch = asr_data.segments[i:i + batch_size]
-        batches.append((batch, i))
-    
-    logger.info(f"直译阶段：将{len(asr_data.segments)}个句子分为{len(batches)}个批次，每批最多{batch_size}句")
+    # 按 token 数规划批次（batch_size 为每批句数上限，None 表示自动）
+    batches = plan_translate_batches(
+        [seg.text for seg in asr_data.segments], model, 'direct', num_threads,
+        max_sentences=batch_size or MAX_BATCH_SENTENCES,
+    )
     
-    # 多线程处理批次
-    def process_batch(batch_data):
-        batch_segments, batch_start_idx = batch_data
-        return step1_direct_translate_batch(batch_segments, batch_start_idx, batch_size, asr_data, use_cache, source_lang, target_lang, terms_to_note, api_key, base_url, model)
+    logger.info(f"直译阶段：将{len(asr_data.segments)}个句子分为{len(batches)}个批次")
     
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        batch_results = list(executor.map(process_batch, batches))
+    async def run_batch(batch_range, allow_truncated):
+        start, end = batch_range
+        return await step1_direct_translate_batch_async(asr_data.segments[start:end], start, end - start, asr_data, use_cache, source_lang, target_lang, terms_to_note, api_key, base_url, model, allow_truncated)
+
+    def halve(batch_range):
+        start, end = batch_range
+        if end - start < 2:
+            return [batch_range]
+        mid = (start + end) // 2
+        return [(start, mid), (mid, end)]
+
+    # 所有批次并发请求（并发度由服务商限速决定）；某批输出被截断时只拆分该批重试
+    async def process_batch(batch_range):
+        return [seg for part in await run_with_shrink(run_batch, batch_range, halve) for seg in part]
+
+    async def process_all():
+        return await asyncio.gather(*(process_batch(batch) for batch in batches))
+
+    batch_results = run_sync(process_all(), cancel_check)
     
     # 合并结果，保持原始顺序
     all_segments = []
@@ -451,7 +481,12 @@ def step1_direct_translate(asr_data: ASRData, use_cache: bool = True, batch_size
     
     return ASRData(all_segments)
 
-def step2_free_translate_batch(batch_segments: ASRData, batch_start_idx: int, batch_size: int, all_segments: ASRData = None, use_cache: bool = True, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None) -> ASRData:
+def step2_free_translate_batch(*args, **kwargs) -> ASRData:
+    """step2_free_translate_batch_async 的同步入口"""
+    return run_sync(step2_free_translate_batch_async(*args, **kwargs))
+
+
+async def step2_free_translate_batch_async(batch_segments: ASRData, batch_start_idx: int, batch_size: int, all_segments: ASRData = None, use_cache: bool = True, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, allow_truncated: bool = True) -> ASRData:
     """
     批量意译和反思处理函数 - 处理一批sentences (10-20个)
     输入给LLM的序号始终是1到len(batch_segments)
@@ -497,7 +532,7 @@ def step2_free_translate_batch(batch_segments: ASRData, batch_start_idx: int, ba
     full_prompt = prompt_with_context + "\n\nINPUT:\n" + json.dumps(input_json, ensure_ascii=False, indent=2)
     
     # 调用LLM
-    response = call_llm(full_prompt, use_cache, api_key, base_url, model)
+    response = await call_llm_async(full_prompt, use_cache, api_key, base_url, model, allow_truncated)
     
     # 解析LLM返回的JSON
     try:
@@ -553,27 +588,37 @@ def step2_free_translate_batch(batch_segments: ASRData, batch_start_idx: int, ba
     
     return batch_segments
 
-def step2_free_translate(asr_data: ASRData, use_cache: bool = True, batch_size: int = 15, num_threads: int = 4, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None) -> ASRData:
+def step2_free_translate(asr_data: ASRData, use_cache: bool = True, batch_size: int = None, num_threads: int = 4, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", api_key=None, base_url=None, model=None, cancel_check=None) -> ASRData:
     """
-    第二步：意译和反思 - 使用FREE_PROMPT，支持批处理和多线程
+    第二步：意译和反思 - 使用FREE_PROMPT，批次在共享事件循环上并发请求
     """
-    from concurrent.futures import ThreadPoolExecutor
-    
-    # 将segments按批次分组
-    batches = []
-    for i in range(0, len(asr_data.segments), batch_size):
-        batch = asr_data.segments[i:i + batch_size]
-        batches.append((batch, i))
-    
-    logger.info(f"意译阶段：将{len(asr_data.segments)}个句子分为{len(batches)}个批次，每批最多{batch_size}句")
+    # 按 token 数规划批次（batch_size 为每批句数上限，None 表示自动）
+    batches = plan_translate_batches(
+        [seg.text + seg.direct for seg in asr_data.segments], model, 'free', num_threads,
+        max_sentences=batch_size or MAX_BATCH_SENTENCES,
+    )
     
-    # 多线程处理批次
-    def process_batch(batch_data):
-        batch_segments, batch_start_idx = batch_data
-        return step2_free_translate_batch(batch_segments, batch_start_idx, batch_size, asr_data, use_cache, source_lang, target_lang, terms_to_note, api_key, base_url, model)
+    logger.info(f"意译阶段：将{len(asr_data.segments)}个句子分为{len(batches)}个批次")
     
-    with ThreadPoolExecutor(max_workers=num_threads) as executor:
-        batch_results = list(executor.map(process_batch, batches))
+    async def run_batch(batch_range, allow_truncated):
+        start, end = batch_range
+        return await step2_free_translate_batch_async(asr_data.segments[start:end], start, end - start, asr_data, use_cache, source_lang, target_lang, terms_to_note, api_key, base_url, model, allow_truncated)
+
+    def halve(batch_range):
+        start, end = batch_range
+        if end - start < 2:
+            return [batch_range]
+        mid = (start + end) // 2
+        return [(start, mid), (mid, end)]
+
+    # 所有批次并发请求（并发度由服务商限速决定）；某批输出被截断时只拆分该批重试
+    async def process_batch(batch_range):
+        return [seg for part in await run_with_shrink(run_batch, batch_range, halve) for seg in part]
+
+    async def process_all():
+        return await asyncio.gather(*(process_batch(batch) for batch in batches))
+
+    batch_results = run_sync(process_all(), cancel_check)
     
     # 合并结果，保持原始顺序
     all_segments = []
@@ -582,26 +627,25 @@ def step2_free_translate(asr_data: ASRData, use_cache: bool = True, batch_size:
     
     return ASRData(all_segments)
 
-def two_step_translate(asr_data: ASRData, use_cache: bool = True, num_threads: int = 4, batch_size: int = 15, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "") -> ASRData:
+def two_step_translate(asr_data: ASRData, use_cache: bool = True, num_threads: int = 4, batch_size: int = None, source_lang: str = 'en', target_lang: str = 'zh', terms_to_note: str = "", cancel_check=None) -> ASRData:
     """
-    两步翻译流程：先直译，再意译和反思，支持批处理和多线程
+    两步翻译流程：先直译，再意译和反思，支持批处理和并发请求
     """
     # 在这里加载设置，每次调用时都获取最新配置
-    settings = load_all_settings()
-    selected_model_provider = settings.get('DEFAULT', {}).get('selected_model_provider', 'deepseek')
-    api_key = settings.get('DEFAULT', {}).get(f'{selected_model_provider}_api_key', '')
-    base_url = settings.get('DEFAULT', {}).get(f'{selected_model_provider}_base_url', 'https://api.deepseek.com')
-    enable_thinking = settings.get('DEFAULT', {}).get('enable_thinking', 'true')
-    model = ENGINES[selected_model_provider]["thinking" if enable_thinking == 'true' else "normal"]
+    selected_model_provider = get_setting('DEFAULT', 'selected_model_provider', 'deepseek')
+    api_key = get_setting('DEFAULT', f'{selected_model_provider}_api_key', '')
+    base_url = get_setting('DEFAULT', f'{selected_model_provider}_base_url', 'https://api.deepseek.com')
+    enable_thinking = get_bool_setting('DEFAULT', 'enable_thinking', True)
+    model = ENGINES[selected_model_provider]["thinking" if enable_thinking else "normal"]
     
     logger.info(f"使用模型: {model}, API地址: {base_url}")
     
     logger.info("开始第一步：批量多线程直译...")
-    asr_data = step1_direct_translate(asr_data, use_cache, batch_size, num_threads, source_lang, target_lang, terms_to_note, api_key, base_url, model)
+    asr_data = step1_direct_translate(asr_data, use_cache, batch_size, num_threads, source_lang, target_lang, terms_to_note, api_key, base_url, model, cancel_check)
     logger.info(f"直译完成，处理了 {len(asr_data.segments)} 个句子")
     
     logger.info("开始第二步：批量多线程意译和反思...")
-    asr_data = step2_free_translate(asr_data, use_cache, batch_size, num_threads, source_lang, target_lang, terms_to_note, api_key, base_url, model)
+    asr_data = step2_free_translate(asr_data, use_cache, batch_size, num_threads, source_lang, target_lang, terms_to_note, api_key, base_url, model, cancel_check)
     logger.info(f"意译和反思完成，处理了 {len(asr_data.segments)} 个句子")
     
     logger.info("两步翻译完成")
@@ -0,0 +1,189 @@
+"""
+Bilibili API 客户端。
+
+- 所有请求共用一个 requests.Session（keep-alive 连接池），并带有连接/读取超时；
+- WBI 签名用的 img_key / sub_key 缓存在内存里，只在签名被拒（或缓存过旧）时重新拉取 nav；
+- Cookie 通过 cookie_provider 注入（返回 dict 的可调用对象），也可以按请求单独传入；
+- base_url 可替换，测试时指向本地的替身 HTTP 服务即可。
+"""
+import threading
+import time
+import urllib.parse
+from functools import reduce
+from hashlib import md5
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_BASE_URL = 'https://api.bilibili.com'
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
+    'Referer': 'https://www.bilibili.com/',
+}
+DEFAULT_TIMEOUT = (5.0, 15.0)           # (连接超时, 读取超时)
+# WBI key 每天轮换；签名被拒时会立即刷新，这里只是兜底的最长缓存时间
+WBI_KEYS_MAX_AGE = 6 * 3600
+# 签名错误 / 风控时接口返回的 code
+WBI_ERROR_CODES = {-403, -352}
+
+mixinKeyEncTab = [
+    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
+    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
+    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
+    36, 20, 34, 44, 52
+]
+
+
+def getMixinKey(orig: str):
+    '对 imgKey 和 subKey 进行字符顺序打乱编码'
+    return reduce(lambda s, i: s + orig[i], mixinKeyEncTab, '')[:32]
+
+
+def encWbi(params: dict, img_key: str, sub_key: str):
+    '为请求参数进行 wbi 签名'
+    mixin_key = getMixinKey(img_key + sub_key)
+    curr_time = round(time.time())
+    params['wts'] = curr_time                                   # 添加 wts 字段
+    params = dict(sorted(params.items()))                       # 按照 key 重排参数
+    # 过滤 value 中的 "!'()*" 字符
+    params = {
+        k : ''.join(filter(lambda chr: chr not in "!'()*", str(v)))
+        for k, v
+        in params.items()
+    }
+    query = urllib.parse.urlencode(params)                      # 序列化参数
+    wbi_sign = md5((query + mixin_key).encode()).hexdigest()    # 计算 w_rid
+    params['w_rid'] = wbi_sign
+    return params
+
+
+class BiliAPIError(Exception):
+    """接口返回 code != 0"""
+
+    def __init__(self, code: int, message: str = ''):
+        super().__init__(f"bilibili api error {code}: {message}")
+        self.code = code
+
+
+class BiliClient:
+    def __init__(self, base_url: str = API_BASE_URL,
+                 cookie_provider: Optional[Callable[[], dict]] = None,
+                 timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.cookie_provider = cookie_provider
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(DEFAULT_HEADERS)
+        self._wbi_keys = None
+        self._wbi_fetched_at = 0.0
+        self._wbi_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # 底层请求
+    # ------------------------------------------------------------------
+    def _cookies(self, cookies: Optional[dict]) -> dict:
+        merged = dict(self.cookie_provider() or {}) if self.cookie_provider else {}
+        if cookies:
+            merged.update(cookies)
+        return {k: v for k, v in merged.items() if v}
+
+    def request(self, method: str, url: str, cookies: Optional[dict] = None, **kwargs) -> requests.Response:
+        """url 可以是 API 路径（/x/...）或完整 URL"""
+        if url.startswith('/'):
+            url = self.base_url + url
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session.request(method, url, cookies=self._cookies(cookies), **kwargs)
+
+    def get_json(self, path: str, params: Optional[dict] = None, wbi: bool = False,
+                 cookies: Optional[dict] = None) -> dict:
+        """
+        GET 一个 API 并返回完整 JSON（含 code/data）。
+        wbi=True 时对参数签名；签名被拒时刷新 WBI key 后重试一次。
+        """
+        for attempt in range(2):
+            query = self.sign(params or {}, force_refresh=attempt > 0) if wbi else params
+            resp = self.request('GET', path, params=query, cookies=cookies)
+            if wbi and attempt == 0 and resp.status_code == 412:
+                # 412 为风控拦截，换新 key 再试一次
+                continue
+            resp.raise_for_status()
+            payload = resp.json()
+            if wbi and attempt == 0 and payload.get('code') in WBI_ERROR_CODES:
+                continue
+            return payload
+
+    def get_data(self, path: str, params: Optional[dict] = None, wbi: bool = False,
+                 cookies: Optional[dict] = None):
+        payload = self.get_json(path, params, wbi=wbi, cookies=cookies)
+        if payload.get('code', 0) != 0:
+            raise BiliAPIError(payload.get('code'), payload.get('message', ''))
+        return payload['data']
+
+    # ------------------------------------------------------------------
+    # WBI 签名
+    # ------------------------------------------------------------------
+    def wbi_keys(self, force_refresh: bool = False) -> tuple[str, str]:
+        """返回缓存的 (img_key, sub_key)，必要时从 nav 接口重新获取"""
+        with self._wbi_lock:
+            stale = time.monotonic() - self._wbi_fetched_at > WBI_KEYS_MAX_AGE
+            if self._wbi_keys is None or stale or force_refresh:
+                resp = self.request('GET', '/x/web-interface/nav')
+                resp.raise_for_status()
+                # 未登录时 nav 返回 code=-101，但 wbi_img 仍然有效
+                wbi_img = resp.json()['data']['wbi_img']
+                img_key = wbi_img['img_url'].rsplit('/', 1)[1].split('.')[0]
+                sub_key = wbi_img['sub_url'].rsplit('/', 1)[1].split('.')[0]
+                self._wbi_keys = (img_key, sub_key)
+                self._wbi_fetched_at = time.monotonic()
+            return self._wbi_keys
+
+    def sign(self, params: dict, force_refresh: bool = False) -> dict:
+        img_key, sub_key = self.wbi_keys(force_refresh)
+        return encWbi(dict(params), img_key, sub_key)
+
+    # ------------------------------------------------------------------
+    # 业务接口
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _id_params(bvid: str = None, avid: str = None) -> dict:
+        if bvid:
+            return {'bvid': bvid}
+        if avid:
+            return {'aid': str(avid).removeprefix('av')}
+        raise ValueError("Either bvid or avid must be provided.")
+
+    def view(self, bvid: str = None, avid: str = None) -> dict:
+        return self.get_data('/x/web-interface/wbi/view', self._id_params(bvid, avid), wbi=True)
+
+    def pagelist(self, bvid: str = None, avid: str = None) -> list:
+        return self.get_data('/x/player/pagelist', self._id_params(bvid, avid))
+
+    def playurl(self, bvid: str, cid: int, qn: int = 0, fnval: int = 80,
+                cookies: Optional[dict] = None) -> dict:
+        """返回 playurl 的完整 JSON（保持旧接口 get_video_url 的返回格式）"""
+        params = {
+            'bvid': bvid, 'cid': cid, 'qn': qn, 'fnval': fnval, 'fnver': 0,
+            'fourk': 1, 'gaia_source': 'view-card',
+        }
+        return self.get_json('/x/player/wbi/playurl', params, wbi=True, cookies=cookies)
+
+    def stream(self, url: str, **kwargs) -> requests.Response:
+        """流式下载 CDN 上的音视频（复用同一连接池和 Referer）"""
+        return self.request('GET', url, stream=True, **kwargs)
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client() -> BiliClient:
+    """进程内共享的客户端"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = BiliClient()
+        return _default_client
@@ -37,54 +37,12 @@ def sanitize_filename(title: str, max_bytes: int = 200) -> str:
 
     return sanitized
 
-from functools import reduce
-from hashlib import md5
+from utils.stream_downloader.bili_client import get_client, getMixinKey, encWbi
 import urllib.parse
-import time
-import requests
-
-mixinKeyEncTab = [
-    46, 47, 18, 2, 53, 8, 23, 32, 15, 50, 10, 31, 58, 3, 45, 35, 27, 43, 5, 49,
-    33, 9, 42, 19, 29, 28, 14, 39, 12, 38, 41, 13, 37, 48, 7, 16, 24, 55, 40,
-    61, 26, 17, 0, 1, 60, 51, 30, 4, 22, 25, 54, 21, 56, 59, 6, 63, 57, 62, 11,
-    36, 20, 34, 44, 52
-]
-
-def getMixinKey(orig: str):
-    '对 imgKey 和 subKey 进行字符顺序打乱编码'
-    return reduce(lambda s, i: s + orig[i], mixinKeyEncTab, '')[:32]
-
-def encWbi(params: dict, img_key: str, sub_key: str):
-    '为请求参数进行 wbi 签名'
-    mixin_key = getMixinKey(img_key + sub_key)
-    curr_time = round(time.time())
-    params['wts'] = curr_time                                   # 添加 wts 字段
-    params = dict(sorted(params.items()))                       # 按照 key 重排参数
-    # 过滤 value 中的 "!'()*" 字符
-    params = {
-        k : ''.join(filter(lambda chr: chr not in "!'()*", str(v)))
-        for k, v 
-        in params.items()
-    }
-    query = urllib.parse.urlencode(params)                      # 序列化参数
-    wbi_sign = md5((query + mixin_key).encode()).hexdigest()    # 计算 w_rid
-    params['w_rid'] = wbi_sign
-    return params
 
 def getWbiKeys() -> tuple[str, str]:
-    '获取最新的 img_key 和 sub_key'
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3',
-        'Referer': 'https://www.bilibili.com/'
-    }
-    resp = requests.get('https://api.bilibili.com/x/web-interface/nav', headers=headers)
-    resp.raise_for_status()
-    json_content = resp.json()
-    img_url: str = json_content['data']['wbi_img']['img_url']
-    sub_url: str = json_content['data']['wbi_img']['sub_url']
-    img_key = img_url.rsplit('/', 1)[1].split('.')[0]
-    sub_key = sub_url.rsplit('/', 1)[1].split('.')[0]
-    return img_key, sub_key
+    '获取 img_key 和 sub_key（共享客户端内缓存，签名失效时才重新请求 nav）'
+    return get_client().wbi_keys()
 
 def get_encrypt_keys():
     img_key, sub_key = getWbiKeys()
@@ -124,35 +82,13 @@ def extract_av_bv_p(url: str) -> tuple:
 
 # 获取视频的 CID 列表（如果有分P会返回列表）
 def get_cid(bvid: str = None, avid: str = None) -> tuple:
-    info_url = "https://api.bilibili.com/x/player/pagelist"
-    headers = {
-        'Referer': 'https://www.bilibili.com',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
-    }
-    if not bvid and not avid:
-        raise ValueError("Either bvid or avid must be provided.")
-    params = {'bvid': bvid} if bvid else {'aid': avid}
-    resp = requests.get(info_url, headers=headers, params=params)
-    j = resp.json()
-    cids = [item['cid'] for item in j['data']]
-    data = j['data']
+    data = get_client().pagelist(bvid=bvid, avid=avid)
+    cids = [item['cid'] for item in data]
     return cids, data
 
 # 获取视频预览图链接，标题，作者等基本信息
 def get_video_info(bvid: str = None, avid: str = None) -> dict:
-    if bvid:
-        url = f"https://api.bilibili.com/x/web-interface/wbi/view?bvid={bvid}"
-    elif avid:
-        url = f"https://api.bilibili.com/x/web-interface/wbi/view?aid={avid}"
-    else:
-        raise ValueError("Either bvid or avid must be provided.")
-    headers = {
-        'Referer': 'https://www.bilibili.com',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
-    }
-    resp = requests.get(url, headers=headers)
-    resp.raise_for_status()
-    data = resp.json()['data']
+    data = get_client().view(bvid=bvid, avid=avid)
     with open('miaowu.txt', 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=4)   # ① obj ② fp
     pic_url = data['pic']
@@ -178,24 +114,20 @@ def get_video_url(bvid: str, cid: int, sessdata: str) -> dict:
     Falls back to http.client if requests gets a 412 error.
     """
     quality_num=80
-    wts,w_rid=get_encrypt_keys()  # 获取最新的 wts 和 w_rid
-    print(wts,w_rid)
-    path = (
-        f"/x/player/wbi/playurl?bvid={bvid}&cid={cid}&qn=0&fnval={quality_num}&fnver=0&fourk=1&gaia_source=view-card&wts={wts}&w_rid={w_rid}" # 新的api
-        # f"/x/player/playurl?bvid={bvid}&cid={cid}&qn=0&fnval={quality_num}&fnver=0&fourk=1" # 旧的api.
-    )
-    headers = {'Cookie': f"SESSDATA={sessdata}"}
+    client = get_client()
     try:
-        # Attempt with requests
-        url = f"https://api.bilibili.com{path}"
-        resp = requests.get(url, headers=headers)
-        resp.raise_for_status()
-        json_data = resp.json()
+        # 用真实请求参数做 WBI 签名（key 已缓存，签名被拒时客户端会刷新 key 重试）
+        json_data = client.playurl(bvid, cid, qn=0, fnval=quality_num, cookies={'SESSDATA': sessdata})
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 412:
             # Fallback to http.client for protected endpoint
-            conn = http.client.HTTPSConnection("api.bilibili.com")
-            conn.request("GET", path, headers=headers)
+            signed = client.sign({'bvid': bvid, 'cid': cid, 'qn': 0, 'fnval': quality_num, 'fnver': 0,
+                                  'fourk': 1, 'gaia_source': 'view-card'})
+            path = f"/x/player/wbi/playurl?{urllib.parse.urlencode(signed)}"
+            parts = urllib.parse.urlsplit(client.base_url)
+            conn_cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+            conn = conn_cls(parts.netloc, timeout=client.timeout[1])
+            conn.request("GET", parts.path + path, headers={'Cookie': f"SESSDATA={sessdata}"})
             res = conn.getresponse()
             raw = res.read().decode('utf-8')
             json_data = json.loads(raw)
@@ -246,28 +178,25 @@ def download_file_with_progress(url: str, filename: str, progress_callback=None)
         filename: 保存文件名
         progress_callback: 进度回调函数 callback(percent: int)，范围 0-100
     """
-    headers = {
-        'Referer': 'https://www.bilibili.com',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)',
-    }
-    resp = requests.get(url, headers=headers, stream=True)
-    total = int(resp.headers.get('content-length', 0))
-    downloaded = 0
-    chunk_size = 512 * 1024  # 优化：从1KB提升到512KB（参考GIL分析）
-
-    with open(filename, 'wb') as f:
-        for chunk in tqdm(resp.iter_content(chunk_size=chunk_size),
-                          total=total // chunk_size,
-                          unit='KB',
-                          desc=f"Downloading {os.path.basename(filename)}"):
-            if chunk:
-                f.write(chunk)
-                downloaded += len(chunk)
-
-                # 🆕 回调进度百分比
-                if progress_callback and total > 0:
-                    percent = int((downloaded / total) * 100)
-                    progress_callback(percent)
+    with get_client().stream(url) as resp:
+        resp.raise_for_status()
+        total = int(resp.headers.get('content-length', 0))
+        downloaded = 0
+        chunk_size = 512 * 1024  # 优化：从1KB提升到512KB（参考GIL分析）
+
+        with open(filename, 'wb') as f:
+            for chunk in tqdm(resp.iter_content(chunk_size=chunk_size),
+                              total=total // chunk_size,
+                              unit='KB',
+                              desc=f"Downloading {os.path.basename(filename)}"):
+                if chunk:
+                    f.write(chunk)
+                    downloaded += len(chunk)
+
+                    # 🆕 回调进度百分比
+                    if progress_callback and total > 0:
+                        percent = int((downloaded / total) * 100)
+                        progress_callback(percent)
 
 # 合并音视频文件
 
@@ -1,3 +1,4 @@
+import copy
 import yt_dlp
 import os
 from typing import Dict, Optional, Any
@@ -13,50 +14,65 @@ class YouTubeDownloader:
             'quiet': True,
         }
 
-    def get_video_info(self, url: str) -> Optional[Dict[str, Any]]:
+    def extract_info(self, url: str) -> Optional[Dict[str, Any]]:
         """
-        Extract video information without downloading
+        Extract the full yt-dlp info dict without downloading
+        
+        The result is sanitized like a --write-info-json file, so it can be
+        cached and later passed to download_video(info_dict=...) instead of
+        extracting again.
         
-        Args:
-            url: YouTube video URL
-            
         Returns:
-            Dictionary containing video metadata or None if failed
+            Info dict or None if failed
         """
         ydl_opts = self.base_ydl_opts.copy()
         
         try:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                 info_dict = ydl.extract_info(url, download=False)
-                
                 if info_dict is None:
                     print("Failed to extract video information")
                     return None
-                
-                # Extract key information
-                video_info = {
-                    'title': info_dict.get('title', ''),
-                    'duration': info_dict.get('duration', 0),
-                    'uploader': info_dict.get('uploader', ''),
-                    'upload_date': info_dict.get('upload_date', ''),
-                    'view_count': info_dict.get('view_count', 0),
-                    'description': info_dict.get('description', ''),
-                    'thumbnail': info_dict.get('thumbnail', ''),
-                    'formats': info_dict.get('formats', []),
-                    'id': info_dict.get('id', ''),
-                    'webpage_url': info_dict.get('webpage_url', ''),
-                    'ext': info_dict.get('ext', 'mp4'),
-                }
-                
-                return video_info
-                
+                return ydl.sanitize_info(info_dict, remove_private_keys=True)
         except Exception as e:
             print(f"Error extracting video info: {e}")
             return None
 
+    def get_video_info(self, url: str, info_dict: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Extract video information without downloading
+        
+        Args:
+            url: YouTube video URL
+            info_dict: Previously extracted info dict (skips extraction)
+            
+        Returns:
+            Dictionary containing video metadata or None if failed
+        """
+        if info_dict is None:
+            info_dict = self.extract_info(url)
+        if info_dict is None:
+            return None
+        
+        # Extract key information
+        return {
+            'title': info_dict.get('title', ''),
+            'duration': info_dict.get('duration', 0),
+            'uploader': info_dict.get('uploader', ''),
+            'upload_date': info_dict.get('upload_date', ''),
+            'view_count': info_dict.get('view_count', 0),
+            'description': info_dict.get('description', ''),
+            'thumbnail': info_dict.get('thumbnail', ''),
+            'formats': info_dict.get('formats', []),
+            'id': info_dict.get('id', ''),
+            'webpage_url': info_dict.get('webpage_url', ''),
+            'ext': info_dict.get('ext', 'mp4'),
+        }
+
     def download_video(self, url: str, output_path: str, 
                       filename_template: Optional[str] = None,
-                      merge_audio_video: bool = True) -> Optional[str]:
+                      merge_audio_video: bool = True,
+                      info_dict: Optional[Dict[str, Any]] = None) -> Optional[str]:
         """
         Download video from YouTube URL
         
@@ -65,6 +81,7 @@ class YouTubeDownloader:
             output_path: Directory to save the video
             filename_template: Custom filename template (optional)
             merge_audio_video: Whether to merge separate audio/video streams with ffmpeg
+            info_dict: Info dict from extract_info() to reuse instead of extracting again
             
         Returns:
             Path to downloaded file or None if failed
@@ -91,6 +108,12 @@ class YouTubeDownloader:
         
         try:
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                if info_dict is not None:
+                    # Re-run format selection on the cached info with this call's
+                    # format/outtmpl, then download (same as --load-info-json)
+                    info_dict = ydl.process_ie_result(copy.deepcopy(info_dict), download=True)
+                    return ydl.prepare_filename(info_dict)
+
                 # First get info to determine output filename
                 info_dict = ydl.extract_info(url, download=False)
                 
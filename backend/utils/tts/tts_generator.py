@@ -208,10 +208,14 @@ def retry_with_backoff(max_retries: int = MAX_RETRIES):
 
 # ===================== Helper Functions =====================
 
+_CHINESE_CHAR_RE = re.compile(r'[\u4e00-\u9fff]')
+_ENGLISH_WORD_RE = re.compile(r'\b[a-zA-Z]+\b')
+
+
 def count_words(text: str) -> int:
     """Count words in text (Chinese characters + English words)"""
-    chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-    english_words = len(re.findall(r'\b[a-zA-Z]+\b', text))
+    chinese_chars = _CHINESE_CHAR_RE.subn('', text)[1]
+    english_words = len(_ENGLISH_WORD_RE.findall(text))
     return chinese_chars + english_words
 
 
@@ -10,7 +10,9 @@ import os
 import requests
 import time
 import tempfile
+import threading
 import uuid
+from urllib.parse import urlparse
 
 
 class TranscriptionEngine(ABC):
@@ -113,7 +115,7 @@ class AlibabaEngine(TranscriptionEngine):
             transcription_settings = self.config.get('Transcription Engine', {})
             recognition = Recognition(
                 model=transcription_settings.get('alibaba_model', 'paraformer-realtime-v2'),
-                format='mp3',
+                format=os.path.splitext(audio_file_path)[1].lstrip('.').lower() or 'mp3',
                 sample_rate=16000,
                 language_hints=['zh', 'en'],
                 enable_words=True,
@@ -237,8 +239,105 @@ class WhisperCppEngine(TranscriptionEngine):
         return "whisper_cpp"
 
 
+# ---------------------------------------------------------------------------
+# Remote VidGo helpers: pooled HTTP sessions, cached health checks and a
+# streaming multipart body so large audio files never sit in memory.
+# ---------------------------------------------------------------------------
+
+_remote_sessions: Dict[str, requests.Session] = {}
+_remote_sessions_lock = threading.Lock()
+
+# base_url -> (checked_at, available)
+_remote_availability: Dict[str, tuple] = {}
+REMOTE_AVAILABILITY_TTL = 60  # seconds
+
+
+def _get_remote_session(base_url: str) -> requests.Session:
+    """Return a keep-alive session shared by every job talking to ``base_url``."""
+    with _remote_sessions_lock:
+        session = _remote_sessions.get(base_url)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _remote_sessions[base_url] = session
+        return session
+
+
+class RemoteVidGoBusy(Exception):
+    """Raised when a remote VidGo host rejects a submission with 429/507."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _MultipartFileStream:
+    """
+    File-like multipart/form-data body for a single file field.
+
+    requests streams objects exposing ``read`` and ``__len__`` chunk by chunk
+    with a fixed Content-Length, so the upload is never buffered in full.
+    """
+
+    def __init__(self, field_name: str, file_path: str):
+        self.boundary = uuid.uuid4().hex
+        filename = os.path.basename(file_path)
+        self._head = (
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field_name}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('utf-8')
+        self._file = open(file_path, 'rb')
+        self._file_size = os.path.getsize(file_path)
+        self._total = len(self._head) + self._file_size + len(self._tail)
+        self._sent = 0
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        return self._total
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._total
+        out = b''
+        while len(out) < size and self._sent < self._total:
+            want = size - len(out)
+            head_len = len(self._head)
+            body_end = head_len + self._file_size
+            if self._sent < head_len:
+                piece = self._head[self._sent:self._sent + want]
+            elif self._sent < body_end:
+                piece = self._file.read(min(want, body_end - self._sent))
+                if not piece:
+                    raise IOError("Audio file shrank during upload")
+            else:
+                offset = self._sent - body_end
+                piece = self._tail[offset:offset + want]
+            out += piece
+            self._sent += len(piece)
+        return out
+
+    def close(self):
+        self._file.close()
+
+
 class RemoteVidGoEngine(TranscriptionEngine):
     """Remote VidGo transcription service engine"""
+
+    # Long-poll window requested from the server; older servers ignore it
+    # and answer immediately, in which case the client backs off locally.
+    LONG_POLL_WAIT = 20
+    POLL_INTERVAL_MIN = 1.0
+    POLL_INTERVAL_MAX = 15.0
+    MAX_WAIT_TIME = 1800  # 30 minutes
+    UPLOAD_TIMEOUT = (10, 120)  # (connect, per-read) – total upload time is unbounded
+    REQUEST_TIMEOUT = (10, 30)
     
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
@@ -261,98 +360,353 @@ class RemoteVidGoEngine(TranscriptionEngine):
                 self.base_url = f"{protocol}://{self.host}:{self.port}"
         else:
             self.base_url = None
+
+    @property
+    def session(self) -> requests.Session:
+        return _get_remote_session(self.base_url)
+
+    def submit_audio(self, audio_file_path: str) -> Dict[str, Any]:
+        """Stream the audio file to the remote host and return its submit response."""
+        submit_url = f"{self.base_url}/api/external_transcription/submit"
+        body = _MultipartFileStream('audio_file', audio_file_path)
+        try:
+            response = self.session.post(
+                submit_url,
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=self.UPLOAD_TIMEOUT,
+            )
+        finally:
+            body.close()
+
+        if response.status_code in (429, 507):
+            try:
+                retry_after = float(response.headers.get('Retry-After', 30))
+            except ValueError:
+                retry_after = 30
+            raise RemoteVidGoBusy(f"Remote VidGo host is busy: {response.text}", retry_after)
+        if response.status_code != 200:
+            raise Exception(f"Failed to submit transcription task: {response.text}")
+        return response.json()
+
+    def wait_for_result(self, task_id: str, progress_cb: Callable[[str], None]) -> str:
+        """
+        Long-poll the remote status endpoint until the task finishes.
+
+        Falls back to exponential backoff when the server answers without
+        any change (e.g. an older VidGo without long-poll support).
+        """
+        status_url = f"{self.base_url}/api/external_transcription/{task_id}/status"
+        start_time = time.time()
+        interval = self.POLL_INTERVAL_MIN
+        last_status, last_progress = 'queued', 0
+
+        while time.time() - start_time < self.MAX_WAIT_TIME:
+            params = {
+                'wait': self.LONG_POLL_WAIT,
+                'status': last_status,
+                'progress': last_progress,
+            }
+            status_response = self.session.get(
+                status_url,
+                params=params,
+                timeout=(self.REQUEST_TIMEOUT[0], self.LONG_POLL_WAIT + self.REQUEST_TIMEOUT[1]),
+            )
+            if status_response.status_code != 200:
+                raise Exception(f"Failed to check transcription status: {status_response.text}")
+
+            status_data = status_response.json()
+            status = status_data['status']
+            progress = status_data.get('progress', 0)
+
+            if status == 'completed':
+                return self._fetch_result(task_id, progress_cb)
+            elif status == 'failed':
+                error_msg = status_data.get('error_message', 'Unknown error')
+                raise Exception(f"Remote transcription failed: {error_msg}")
+            elif status not in ['queued', 'running']:
+                raise Exception(f"Unknown status from remote service: {status}")
+
+            if status != last_status or progress != last_progress:
+                if progress != last_progress:
+                    progress_cb(progress)
+                last_status, last_progress = status, progress
+                interval = self.POLL_INTERVAL_MIN
+                continue
+
+            time.sleep(interval)
+            interval = min(interval * 2, self.POLL_INTERVAL_MAX)
+
+        raise Exception("Remote transcription timed out after 30 minutes")
+
+    def _fetch_result(self, task_id: str, progress_cb: Callable[[str], None]) -> str:
+        result_url = f"{self.base_url}/api/external_transcription/{task_id}/result"
+        result_response = self.session.get(result_url, timeout=self.REQUEST_TIMEOUT)
+        if result_response.status_code != 200:
+            raise Exception(f"Failed to download transcription result: {result_response.text}")
+
+        progress_cb("Completed")
+
+        # Clean up remote task
+        self.delete_task(task_id)
+
+        result_response.encoding = 'utf-8'
+        return result_response.text
     
+    def delete_task(self, task_id: str) -> None:
+        """Best-effort removal of a remote task and its files (finished or abandoned)."""
+        try:
+            delete_url = f"{self.base_url}/api/external_transcription/{task_id}/delete"
+            self.session.delete(delete_url, timeout=10)
+        except requests.RequestException:
+            pass  # Ignore cleanup errors
+
     def transcribe_audio(self, audio_file_path: str, progress_cb: Callable[[str], None], language: Optional[str] = None) -> str:
         if not self.is_available():
             raise Exception("Remote VidGo service is not properly configured")
         
         try:
             progress_cb("Running")
-            
-            # Submit audio file for transcription
-            submit_url = f"{self.base_url}/api/external_transcription/submit"
-            
-            with open(audio_file_path, 'rb') as audio_file:
-                files = {'audio_file': audio_file}
-                response = requests.post(submit_url, files=files, timeout=30)
-            
-            if response.status_code != 200:
-                raise Exception(f"Failed to submit transcription task: {response.text}")
-            
-            task_data = response.json()
-            task_id = task_data['task_id']
-            
-            # Poll for completion
-            status_url = f"{self.base_url}/api/external_transcription/{task_id}/status"
-            max_wait_time = 1800  # 30 minutes
-            start_time = time.time()
-            
-            while time.time() - start_time < max_wait_time:
-                status_response = requests.get(status_url, timeout=30)
-                if status_response.status_code == 200:
-                    status_data = status_response.json()
-                    status = status_data['status']
-                    
-                    if status == 'completed':
-                        # Download result
-                        result_url = f"{self.base_url}/api/external_transcription/{task_id}/result"
-                        result_response = requests.get(result_url, timeout=30)
-                        
-                        if result_response.status_code == 200:
-                            progress_cb("Completed")
-                            
-                            # Clean up remote task
-                            try:
-                                delete_url = f"{self.base_url}/api/external_transcription/{task_id}/delete"
-                                requests.delete(delete_url, timeout=10)
-                            except:
-                                pass  # Ignore cleanup errors
-                            
-                            return result_response.text
-                        else:
-                            raise Exception(f"Failed to download transcription result: {result_response.text}")
-                    
-                    elif status == 'failed':
-                        error_msg = status_data.get('error_message', 'Unknown error')
-                        raise Exception(f"Remote transcription failed: {error_msg}")
-                    
-                    elif status in ['queued', 'running']:
-                        # Continue waiting
-                        time.sleep(5)
-                        continue
-                    else:
-                        raise Exception(f"Unknown status from remote service: {status}")
-                else:
-                    raise Exception(f"Failed to check transcription status: {status_response.text}")
-            
-            # Timeout
-            raise Exception("Remote transcription timed out after 30 minutes")
+            deadline = time.time() + self.MAX_WAIT_TIME
+            while True:
+                try:
+                    task_data = self.submit_audio(audio_file_path)
+                    break
+                except RemoteVidGoBusy as busy:
+                    if time.time() + busy.retry_after > deadline:
+                        raise
+                    print(f"Remote VidGo busy, retrying in {busy.retry_after}s")
+                    time.sleep(busy.retry_after)
+            return self.wait_for_result(task_data['task_id'], progress_cb)
             
         except requests.RequestException as e:
+            _remote_availability.pop(self.base_url, None)
             progress_cb("Failed")
             raise Exception(f"Network error connecting to remote VidGo service: {str(e)}")
         except Exception as e:
             progress_cb("Failed")
             raise
+
+    def probe(self) -> Optional[Dict[str, Any]]:
+        """
+        Hit the remote health endpoint and return its payload, or None if unreachable.
+        Older servers without ``/health`` are probed through the list endpoint.
+        """
+        try:
+            response = self.session.get(f"{self.base_url}/api/external_transcription/health", timeout=10)
+            if response.status_code == 404:
+                response = self.session.get(f"{self.base_url}/api/external_transcription/list", timeout=10)
+            if response.status_code != 200:
+                return None
+            return response.json()
+        except (requests.RequestException, ValueError):
+            return None
     
     def is_available(self) -> bool:
         """Check if remote VidGo service is available and properly configured"""
         if not self.host or not self.base_url:
             return False
-        
-        try:
-            # Test connectivity with a simple request to the list endpoint
-            list_url = f"{self.base_url}/api/external_transcription/list"
-            response = requests.get(list_url, timeout=10)
-            return response.status_code == 200
-        except:
-            return False
+
+        cached = _remote_availability.get(self.base_url)
+        if cached and time.time() - cached[0] < REMOTE_AVAILABILITY_TTL:
+            return cached[1]
+
+        available = self.probe() is not None
+        _remote_availability[self.base_url] = (time.time(), available)
+        return available
     
     @property
     def engine_name(self) -> str:
         return "remote_vidgo"
 
 
+class _EndpointState:
+    """Health and load bookkeeping for one remote VidGo node."""
+
+    def __init__(self):
+        self.healthy = True
+        self.queue_depth = 0      # last queue size reported by the node
+        self.in_flight = 0        # jobs this process currently has on the node
+        self.failures = 0
+        self.checked_at = 0.0
+        self.retry_after = 0.0    # unhealthy nodes are skipped until this time
+
+    @property
+    def load(self) -> int:
+        return self.queue_depth + self.in_flight
+
+
+# base_url -> _EndpointState, shared by every pool engine instance
+_endpoint_states: Dict[str, _EndpointState] = {}
+_endpoint_states_lock = threading.Lock()
+
+
+class RemoteVidGoPoolEngine(TranscriptionEngine):
+    """
+    Load-balanced pool of remote VidGo transcription services.
+
+    Endpoints are the primary ``host`` plus the comma-separated ``extra_hosts``
+    of the ``Remote VidGo Service`` section. Each job goes to the healthy node
+    with the smallest reported queue depth plus local in-flight jobs. When a node
+    cannot be reached or rejects the submission it is put on cooldown and the job
+    fails over to the next one; once a node has accepted the job, a failed or
+    timed-out job is reported as-is (after deleting the remote task) instead of
+    being resubmitted elsewhere.
+    """
+
+    HEALTH_TTL = 15          # seconds between queue-depth refreshes per node
+    FAILURE_COOLDOWN = 30    # base cooldown, doubled per consecutive failure
+    MAX_COOLDOWN = 600
+
+    def __init__(self, config: Dict[str, Any]):
+        super().__init__(config)
+        remote_config = config.get('Remote VidGo Service', {})
+        use_ssl = remote_config.get('use_ssl', 'false')
+        default_port = remote_config.get('port', '8000')
+
+        entries = [remote_config.get('host', '').strip()]
+        entries += remote_config.get('extra_hosts', '').replace('\n', ',').split(',')
+
+        self.nodes: Dict[str, RemoteVidGoEngine] = {}
+        for entry in entries:
+            node = self._build_node(entry.strip(), default_port, use_ssl)
+            if node is not None and node.base_url not in self.nodes:
+                self.nodes[node.base_url] = node
+
+    @staticmethod
+    def _build_node(entry: str, default_port: str, use_ssl: str) -> Optional[RemoteVidGoEngine]:
+        """Parse ``host``, ``host:port`` or ``http(s)://host[:port]`` into a single-node engine."""
+        if not entry:
+            return None
+        if '://' in entry:
+            parsed = urlparse(entry)
+            host = parsed.hostname or ''
+            use_ssl = 'true' if parsed.scheme == 'https' else 'false'
+            port = str(parsed.port or (443 if parsed.scheme == 'https' else default_port))
+        elif entry.count(':') == 1:
+            host, port = entry.split(':')
+        else:
+            host, port = entry, default_port
+        return RemoteVidGoEngine({
+            'Remote VidGo Service': {'host': host, 'port': port, 'use_ssl': use_ssl}
+        })
+
+    @staticmethod
+    def _state(base_url: str) -> _EndpointState:
+        with _endpoint_states_lock:
+            state = _endpoint_states.get(base_url)
+            if state is None:
+                state = _endpoint_states[base_url] = _EndpointState()
+            return state
+
+    def _refresh(self, base_url: str, force: bool = False) -> _EndpointState:
+        """Re-probe a node when its cached state is stale or its cooldown has passed."""
+        state = self._state(base_url)
+        now = time.time()
+        if not force and now - state.checked_at < self.HEALTH_TTL:
+            return state
+        if not state.healthy and now < state.retry_after:
+            return state
+
+        payload = self.nodes[base_url].probe()
+        state.checked_at = time.time()
+        if payload is None:
+            self._mark_failed(base_url)
+        else:
+            state.healthy = True
+            state.failures = 0
+            state.queue_depth = int(payload.get('queue_size', 0) or 0)
+        return state
+
+    def _mark_failed(self, base_url: str):
+        state = self._state(base_url)
+        state.healthy = False
+        state.failures += 1
+        cooldown = min(self.FAILURE_COOLDOWN * (2 ** (state.failures - 1)), self.MAX_COOLDOWN)
+        state.retry_after = time.time() + cooldown
+        _remote_availability.pop(base_url, None)
+
+    def _ranked_nodes(self) -> list:
+        """Healthy nodes ordered from least to most loaded."""
+        states = {url: self._refresh(url) for url in self.nodes}
+        healthy = [url for url, st in states.items() if st.healthy]
+        return sorted(healthy, key=lambda url: states[url].load)
+
+    def transcribe_audio(self, audio_file_path: str, progress_cb: Callable[[str], None], language: Optional[str] = None) -> str:
+        candidates = self._ranked_nodes()
+        if not candidates:
+            raise Exception("No healthy remote VidGo node available")
+
+        progress_cb("Running")
+        errors = []
+        for base_url in candidates:
+            node = self.nodes[base_url]
+            state = self._state(base_url)
+            with _endpoint_states_lock:
+                state.in_flight += 1
+            try:
+                print(f"Remote VidGo pool: routing job to {base_url} (load={state.load - 1})")
+                try:
+                    task_data = node.submit_audio(audio_file_path)
+                except RemoteVidGoBusy as busy:
+                    # Saturated, not broken: skip it until Retry-After without counting a failure
+                    print(f"Remote VidGo pool: node {base_url} busy, retry after {busy.retry_after}s")
+                    errors.append(f"{base_url}: busy")
+                    state.healthy = False
+                    state.retry_after = time.time() + busy.retry_after
+                    continue
+                except Exception as e:
+                    print(f"Remote VidGo pool: submit to {base_url} failed: {e}")
+                    errors.append(f"{base_url}: {e}")
+                    self._mark_failed(base_url)
+                    continue
+
+                state.queue_depth = int(task_data.get('queue_position', state.queue_depth) or 0)
+                task_id = task_data['task_id']
+                try:
+                    return node.wait_for_result(task_id, progress_cb)
+                except requests.RequestException as e:
+                    # The node dropped off mid-job: discard its copy (if it is still
+                    # reachable) before the audio is resubmitted to the next node
+                    print(f"Remote VidGo pool: lost {base_url} while waiting for {task_id}: {e}")
+                    errors.append(f"{base_url}: {e}")
+                    self._mark_failed(base_url)
+                    node.delete_task(task_id)
+                except Exception:
+                    # The node accepted the job and answered: a rejected/failed job or a
+                    # timeout is the job's problem, not the node's, so don't fail over
+                    node.delete_task(task_id)
+                    progress_cb("Failed")
+                    raise
+            finally:
+                with _endpoint_states_lock:
+                    state.in_flight -= 1
+
+        progress_cb("Failed")
+        raise Exception(f"All remote VidGo nodes failed: {'; '.join(errors)}")
+
+    def is_available(self) -> bool:
+        if not self.nodes:
+            return False
+        return any(self._refresh(url).healthy for url in self.nodes)
+
+    def get_pool_status(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of per-node health and load, for diagnostics."""
+        return {
+            url: {
+                'healthy': st.healthy,
+                'queue_depth': st.queue_depth,
+                'in_flight': st.in_flight,
+                'failures': st.failures,
+            }
+            for url, st in ((url, self._state(url)) for url in self.nodes)
+        }
+
+    @property
+    def engine_name(self) -> str:
+        return "remote_vidgo_pool"
+
+
 class TranscriptionEngineFactory:
     """Factory class for creating transcription engines"""
 
@@ -362,6 +716,7 @@ class TranscriptionEngineFactory:
         'alibaba': AlibabaEngine,
         'openai_whisper': OpenAIWhisperEngine,
         'remote_vidgo': RemoteVidGoEngine,
+        'remote_vidgo_pool': RemoteVidGoPoolEngine,
     }
     
     @classmethod
@@ -433,6 +788,16 @@ class TranscriptionEngineFactory:
                 'requires_config': True,
                 'speed': 'Fast',
                 'quality': 'High'
+            },
+            'remote_vidgo_pool': {
+                'name': 'Remote VidGo Subtitle Service (Load-Balanced Pool)',
+                'description': 'Spreads jobs across several remote VidGo hosts, routing each to the least-loaded healthy node and failing over on errors.',
+                'type': 'remote',
+                'languages': 'Multi-language',
+                'requires_api_key': False,
+                'requires_config': True,
+                'speed': 'Fast',
+                'quality': 'High'
             }
         }
 
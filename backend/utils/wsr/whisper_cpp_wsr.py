@@ -26,9 +26,8 @@ from .whisper_cpp_progress import (
 
 def get_configured_model_name() -> str:
     try:
-        from video.views.set_setting import load_all_settings
-        settings_data = load_all_settings()
-        fwsr_model = settings_data.get('Transcription Engine', {}).get('fwsr_model', 'large-v3')
+        from video.views.set_setting import get_setting
+        fwsr_model = get_setting('Transcription Engine', 'fwsr_model', 'large-v3')
 
         # 映射faster-whisper模型名到whisper.cpp GGML模型
         model_mapping = {
@@ -48,11 +47,8 @@ def get_configured_model_name() -> str:
 
 def get_use_gpu_setting() -> bool:
     try:
-        from video.views.set_setting import load_all_settings
-        settings_data = load_all_settings()
-        use_gpu_str = settings_data.get('Transcription Engine', {}).get('use_gpu', 'true')
-        print(f"[whisper.cpp] use_gpu setting: {use_gpu_str}")
-        return use_gpu_str.lower() in ('true', '1', 'yes')
+        from video.views.set_setting import get_bool_setting
+        return get_bool_setting('Transcription Engine', 'use_gpu', True)
     except:
         return True  # 默认启用GPU
 
@@ -38,6 +38,9 @@ def __get_list(env_var, default=None):
 # 允许承载server的 Host,这里全放通
 ALLOWED_HOSTS = __get_list('VIDGO_ALLOWED_HOSTS', ['*'])
 
+# 反向代理地址：只有来自这些地址的请求才信任 X-Forwarded-For（默认不信任）
+TRUSTED_PROXIES = __get_list('VIDGO_TRUSTED_PROXIES')
+
 # 动态CORS和CSRF配置
 CORS_ALLOWED_ORIGINS = __get_list(
     'VIDGO_CORS_ALLOWED_ORIGINS',
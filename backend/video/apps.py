@@ -14,14 +14,14 @@ class VideoConfig(AppConfig):
         if getattr(self, "_worker_started", False):
             return
 
-        from .tasks import process_next_task, process_download_task, process_export_task, process_tts_task
+        from .tasks import process_next_task, process_download_task, process_export_task, process_tts_task, process_hls_task, process_trickplay_task, process_concat_task
 
         # ===== 线程池配置 =====
         # 根据 CPU 核心数动态计算
         cpu_count = os.cpu_count() or 4
 
-        # 字幕任务：注意 optimise_srt 内部会创建 8 个线程（嵌套线程池）
-        # 为避免线程爆炸（4 核 × 8 = 32 个内层线程），限制外层并发数
+        # 字幕任务：LLM 断句/翻译请求在共享事件循环线程上并发（utils/llm_async），不再嵌套线程池；
+        # 转录阶段仍是 CPU 密集，限制外层并发数
         subtitle_pool_size = min(2, cpu_count // 2)  # 最多 2 个，避免过度调度
 
         # 下载任务：I/O 密集（网络下载），建议 2-3 倍 CPU 核心数
@@ -34,6 +34,9 @@ class VideoConfig(AppConfig):
         # TTS任务：CPU密集（音频合成 + FFmpeg），建议等于 CPU 核心数
         tts_pool_size = cpu_count
 
+        # HLS打包 / 预览图生成：ffmpeg 自身已占满多核，串行执行即可
+        hls_pool_size = 1
+
         # 创建线程池
         subtitle_executor = ThreadPoolExecutor(
             max_workers=subtitle_pool_size,
@@ -55,11 +58,17 @@ class VideoConfig(AppConfig):
             thread_name_prefix="tts-worker"
         )
 
-        print(f"[ThreadPool] Subtitle workers: {subtitle_pool_size} (each creates 8 nested threads)")
+        hls_executor = ThreadPoolExecutor(
+            max_workers=hls_pool_size,
+            thread_name_prefix="hls-worker"
+        )
+
+        print(f"[ThreadPool] Subtitle workers: {subtitle_pool_size} (LLM calls share one event loop thread)")
         print(f"[ThreadPool] Download workers: {download_pool_size}")
         print(f"[ThreadPool] Export workers: {export_pool_size}")
         print(f"[ThreadPool] TTS workers: {tts_pool_size}")
-        print(f"[ThreadPool] Total estimated threads: ~{subtitle_pool_size * 8 + download_pool_size + export_pool_size + tts_pool_size + 12}")
+        print(f"[ThreadPool] HLS workers: {hls_pool_size}")
+        print(f"[ThreadPool] Total estimated threads: ~{subtitle_pool_size + 1 + download_pool_size + export_pool_size + tts_pool_size + hls_pool_size + 12}")
 
         # ===== 任务调度器 =====
         def _subtitle_dispatcher():
@@ -106,7 +115,7 @@ class VideoConfig(AppConfig):
                     time.sleep(5)
 
         def _export_dispatcher():
-            """导出任务调度器"""
+            """导出 / 视频合并任务调度器"""
             while True:
                 try:
                     connection.close_if_unusable_or_obsolete()
@@ -115,6 +124,7 @@ class VideoConfig(AppConfig):
                         try:
                             connection.close_if_unusable_or_obsolete()
                             process_export_task()
+                            process_concat_task()
                         except Exception as e:
                             print(f"Export task error: {e}")
 
@@ -143,11 +153,32 @@ class VideoConfig(AppConfig):
                     print(f"TTS dispatcher error: {e}")
                     time.sleep(5)
 
+        def _hls_dispatcher():
+            """HLS打包 / 预览图任务调度器"""
+            while True:
+                try:
+                    connection.close_if_unusable_or_obsolete()
+
+                    def task_wrapper():
+                        try:
+                            connection.close_if_unusable_or_obsolete()
+                            process_hls_task()
+                            process_trickplay_task()
+                        except Exception as e:
+                            print(f"HLS task error: {e}")
+
+                    hls_executor.submit(task_wrapper)
+                    time.sleep(0.1 + random.random() * 0.1)
+                except Exception as e:
+                    print(f"HLS dispatcher error: {e}")
+                    time.sleep(5)
+
         # 启动调度器线程（守护线程）
         threading.Thread(target=_subtitle_dispatcher, daemon=True, name="subtitle-dispatcher").start()
         threading.Thread(target=_download_dispatcher, daemon=True, name="download-dispatcher").start()
         threading.Thread(target=_export_dispatcher, daemon=True, name="export-dispatcher").start()
         threading.Thread(target=_tts_dispatcher, daemon=True, name="tts-dispatcher").start()
+        threading.Thread(target=_hls_dispatcher, daemon=True, name="hls-dispatcher").start()
 
         self._worker_started = True
         print("[Workers] Background task dispatchers with thread pools started")
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from utils.split_subtitle.ASRData import ASRData, ASRDataSeg, from_json, from_srt, from_vtt
+import random
+import time
+import tracemalloc
+
+
+WORDS = 'so today we are going to talk about how the compiler actually works under the hood'.split()
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark for ASRData SRT/VTT/JSON parsing and serialization on word-level transcripts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segments', type=int, default=500000,
+                            help='Number of word-level segments (~3h of speech is 30k-60k words; default stresses 500k)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per operation, best time is reported')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def build(self, count, seed):
+        rng = random.Random(seed)
+        segments = []
+        t = 0
+        for i in range(count):
+            duration = rng.randint(80, 400)
+            segments.append(ASRDataSeg(WORDS[i % len(WORDS)], t, t + duration))
+            t += duration + rng.choice((0, 0, 20, 160, 900))
+        return ASRData(segments)
+
+    def timed(self, label, repeat, func):
+        best = None
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(f'{label:<16} {best * 1000:10.1f} ms')
+        return result
+
+    def handle(self, *args, **options):
+        count, repeat = options['segments'], options['repeat']
+        asr_data = self.build(count, options['seed'])
+        self.stdout.write(f'{count} segments, best of {repeat}')
+
+        srt_text = self.timed('to_srt', repeat, asr_data.to_srt)
+        vtt_text = self.timed('to_vtt', repeat, asr_data.to_vtt)
+        json_data = self.timed('to_json', repeat, asr_data.to_json)
+        self.timed('from_srt', repeat, lambda: from_srt(srt_text))
+        self.timed('from_vtt', repeat, lambda: from_vtt(vtt_text))
+        self.timed('from_json', repeat, lambda: from_json(json_data))
+
+        tracemalloc.start()
+        parsed = from_srt(srt_text)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f'from_srt memory   {current / 1024 / 1024:8.1f} MiB retained, '
+            f'{peak / 1024 / 1024:.1f} MiB peak ({current / max(count, 1):.0f} B/segment)'
+        )
+        if parsed.to_srt() != srt_text:
+            self.stderr.write('round trip mismatch: from_srt(to_srt()) does not reproduce the input')
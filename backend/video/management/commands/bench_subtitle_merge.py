@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from utils.split_subtitle.ASRData import ASRDataSeg
+from utils.split_subtitle import cnt_tokens
+from utils.split_subtitle.cnt_tokens import cnt_display_words, cnt_display_words_batch, count_words, count_words_batch
+from utils.split_subtitle.main import merge_short_segments_iteratively, split_segment_by_display_length
+import random
+import time
+
+
+WORDS = 'so today we are going to talk about how the compiler actually works under the hood'.split()
+
+
+class Command(BaseCommand):
+    help = ('Micro-benchmark for merge_short_segments_iteratively, split_segment_by_display_length '
+            'and the cnt_tokens counters')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segments', type=int, default=20000,
+                            help='Number of word-level segments (a 2-3h transcript)')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per operation, best time is reported')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def build(self, count, seed):
+        rng = random.Random(seed)
+        segments = []
+        t = 0
+        for i in range(count):
+            duration = rng.randint(80, 400)
+            segments.append(ASRDataSeg(WORDS[i % len(WORDS)] + ' ', t, t + duration))
+            t += duration + rng.choice((0, 0, 20, 160, 900))
+        return segments
+
+    def timed(self, label, repeat, func):
+        best = None
+        result = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(f'{label:<16} {best * 1000:10.1f} ms')
+        return result
+
+    def handle(self, *args, **options):
+        count, repeat = options['segments'], options['repeat']
+        segments = self.build(count, options['seed'])
+        self.stdout.write(f'{count} segments, best of {repeat}')
+
+        merged = self.timed('merge_short', repeat, lambda: merge_short_segments_iteratively(segments))
+        self.timed('split_display', repeat, lambda: split_segment_by_display_length(segments))
+        self.stdout.write(f'{len(merged)} segments after merge')
+
+        texts = [seg.text for seg in merged]
+        cnt_tokens._count_words_memo.cache_clear()
+        cnt_tokens._cnt_display_words_memo.cache_clear()
+        self.timed('count_words', repeat, lambda: [count_words(text) for text in texts])
+        self.timed('count_words_batch', 1, lambda: count_words_batch(texts))
+        self.timed('  (memo warm)', repeat, lambda: count_words_batch(texts))
+        self.timed('cnt_display', repeat, lambda: [cnt_display_words(text) for text in texts])
+        self.timed('cnt_display_batch', 1, lambda: cnt_display_words_batch(texts))
+        self.timed('  (memo warm)', repeat, lambda: cnt_display_words_batch(texts))
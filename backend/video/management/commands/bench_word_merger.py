@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from utils.split_subtitle import merge_english_words
+from utils.split_subtitle.merge_english_words import WordMerger
+import random
+import time
+
+
+FRAGMENTS = ['rem ote', 'g it hub', 're p osit ory', 'con f ig', 'cl one', 'ex am ple', 'pro gram ming', 'm ain']
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmark for WordMerger lexicon loading and batched merging'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--segments', type=int, default=5000, help='Mixed CJK/English segments per job')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def timed(self, label, func):
+        start = time.perf_counter()
+        result = func()
+        self.stdout.write(f'{label:<28} {(time.perf_counter() - start) * 1000:10.1f} ms')
+        return result
+
+    def cold_lexicon(self):
+        merge_english_words._lexicon = None
+        return WordMerger()
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        texts = [f"我们先把{rng.choice(FRAGMENTS)} 的内容看一下{rng.choice(FRAGMENTS)}"
+                 for _ in range(options['segments'])]
+
+        if merge_english_words.LEXICON_FILE.exists():
+            merge_english_words.LEXICON_FILE.unlink()
+        self.timed('first job (pyspellchecker)', self.cold_lexicon)
+        self.timed('new process (lexicon file)', self.cold_lexicon)
+        merger = self.timed('later jobs (shared)', WordMerger)
+        self.stdout.write(f'lexicon: {len(merger.word_set)} words from {merger.dict_source}')
+
+        per_text = self.timed('merge_text x N', lambda: [merger.merge_text(text) for text in texts])
+        batched = self.timed('merge_texts', lambda: merger.merge_texts(texts))
+        if per_text != batched:
+            self.stderr.write('merge_texts output differs from merge_text')
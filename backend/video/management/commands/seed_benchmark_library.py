@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from video.models import Video, Collection, Category, LibraryChange
+import random
+import time
+
+
+BENCH_PREFIX = 'bench-'
+
+
+class Command(BaseCommand):
+    help = 'Seeds a synthetic library (default 10k videos) for benchmarking list endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=10000, help='Number of videos to create')
+        parser.add_argument('--categories', type=int, default=20, help='Number of categories to create')
+        parser.add_argument('--collections', type=int, default=200, help='Number of collections to create')
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help=f'Only delete previously seeded rows (names starting with "{BENCH_PREFIX}")'
+        )
+
+    @transaction.atomic
+    def clear(self):
+        videos = Video.objects.filter(name__startswith=BENCH_PREFIX)
+        collections = Collection.objects.filter(name__startswith=BENCH_PREFIX)
+        categories = Category.objects.filter(name__startswith=BENCH_PREFIX)
+        counts = (videos.count(), collections.count(), categories.count())
+        videos.delete()
+        collections.delete()
+        categories.delete()
+        self.stdout.write(f'Deleted {counts[0]} videos, {counts[1]} collections, {counts[2]} categories')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            self.clear()
+            return
+        self.seed(options)
+
+    @transaction.atomic
+    def seed(self, options):
+        start = time.time()
+        now = timezone.now()
+        rng = random.Random(42)
+
+        categories = Category.objects.bulk_create([
+            Category(name=f'{BENCH_PREFIX}category-{i}', created_time=now)
+            for i in range(options['categories'])
+        ])
+        collections = Collection.objects.bulk_create([
+            Collection(
+                name=f'{BENCH_PREFIX}collection-{i}',
+                category=rng.choice(categories + [None]) if categories else None,
+                last_modified=now,
+            )
+            for i in range(options['collections'])
+        ])
+
+        videos = []
+        for i in range(options['videos']):
+            # 一半视频放进合集（沿用合集的分类），其余为散装或未归档
+            collection = rng.choice(collections) if collections and rng.random() < 0.5 else None
+            if collection is not None:
+                category = collection.category
+            else:
+                category = rng.choice(categories + [None]) if categories else None
+            videos.append(Video(
+                name=f'{BENCH_PREFIX}video-{i}',
+                url=f'{BENCH_PREFIX}{i:08d}.mp4',
+                thumbnail_url=f'{BENCH_PREFIX}{i:08d}.jpg',
+                video_length='00:10:00',
+                category=category,
+                collection=collection,
+                last_modified=now,
+            ))
+        Video.objects.bulk_create(videos, batch_size=1000)
+
+        # bulk_create 不触发信号，记录一次分类变更以推进库版本号（使 ETag 失效）
+        LibraryChange.record('category', [c.id for c in categories])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(videos)} videos, {len(collections)} collections, '
+            f'{len(categories)} categories in {time.time() - start:.1f}s'
+        ))
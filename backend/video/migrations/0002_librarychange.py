@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('video', 'Video'), ('collection', 'Collection'), ('category', 'Category')], max_length=16)),
+                ('entity_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('created_time', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'library_change',
+                'ordering': ('id',),
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video', '0002_librarychange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='hls_path',
+            field=models.CharField(blank=True, help_text='HLS 打包输出的 playlist 路径（相对 MEDIA_ROOT），多码率时为 master playlist', max_length=255, null=True),
+        ),
+    ]
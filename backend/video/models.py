@@ -1,6 +1,6 @@
 from django.db import models
 from django.utils import timezone
-from django.db.models.signals import pre_delete
+from django.db.models.signals import pre_delete, post_save, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 import os
@@ -107,6 +107,7 @@ class Video(models.Model):
     translated_srt_path = models.CharField(max_length=128,blank=True, null=True, help_text="翻译字幕文件路径")
     created_time = models.DateTimeField(blank=True, null=True)
     video_length = models.CharField(max_length=128,blank=True, null=True)
+    hls_path = models.CharField(max_length=255, blank=True, null=True, help_text="HLS 打包输出的 playlist 路径（相对 MEDIA_ROOT），多码率时为 master playlist")
     category = models.ForeignKey(
         Category, 
         null=True, 
@@ -185,3 +186,74 @@ def delete_video_files(sender, instance, **kwargs):  # pylint: disable=unused-ar
                 print(f"信号：已删除缩略图 {instance.thumbnail_url}")
         except Exception as e:
             print(f"信号：删除缩略图失败 {instance.thumbnail_url}: {e}")
+
+
+class LibraryChange(models.Model):
+    """
+    视频库变更日志：Video/Collection/Category 每次写入追加一行。
+    自增 id 即“库版本号”，用于 VideoDataView 的 ETag 和 ?since= 增量查询。
+    """
+    ENTITY_CHOICES = [
+        ('video', 'Video'),
+        ('collection', 'Collection'),
+        ('category', 'Category'),
+    ]
+    # 保留最近的变更条数，更早的 since 请求回退为全量返回
+    RETAIN = 10000
+
+    entity = models.CharField(max_length=16, choices=ENTITY_CHOICES)
+    entity_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'library_change'
+        ordering = ("id",)
+
+    @classmethod
+    def record(cls, entity, ids, deleted=False):
+        """记录一批实体变更（bulk update / queryset.update 不触发信号时需手动调用）"""
+        rows = [cls(entity=entity, entity_id=i, deleted=deleted) for i in ids]
+        if not rows:
+            return
+        created = cls.objects.bulk_create(rows)
+        last_id = created[-1].id
+        # 偶尔裁剪旧日志，避免无限增长
+        if last_id and last_id % 1000 < len(rows):
+            cls.objects.filter(id__lte=last_id - cls.RETAIN).delete()
+
+    @classmethod
+    def current_version(cls):
+        last = cls.objects.order_by('-id').values_list('id', flat=True).first()
+        return last or 0
+
+
+_LIBRARY_ENTITIES = {Video: 'video', Collection: 'collection', Category: 'category'}
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_save, sender=Collection)
+@receiver(post_save, sender=Category)
+def record_library_save(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    LibraryChange.record(_LIBRARY_ENTITIES[sender], [instance.pk])
+
+
+@receiver(pre_delete, sender=Collection)
+@receiver(pre_delete, sender=Category)
+def record_library_cascade(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    删除分类/合集时外键 SET_NULL 走的是批量 UPDATE，不会触发子对象的 post_save，
+    这里提前把受影响的子对象记为变更。
+    """
+    if sender is Category:
+        LibraryChange.record('video', list(instance.categories.values_list('id', flat=True)))
+        LibraryChange.record('collection', list(instance.collections.values_list('id', flat=True)))
+    else:
+        LibraryChange.record('video', list(instance.videos.values_list('id', flat=True)))
+
+
+@receiver(post_delete, sender=Video)
+@receiver(post_delete, sender=Collection)
+@receiver(post_delete, sender=Category)
+def record_library_delete(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    LibraryChange.record(_LIBRARY_ENTITIES[sender], [instance.pk], deleted=True)
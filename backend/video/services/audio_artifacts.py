@@ -0,0 +1,182 @@
+"""
+Per-video cache of decoded audio artifacts shared by the waveform and ASR stages.
+
+Each source media file gets a directory under work_dir/audio_artifacts holding:
+
+- asr16k.wav: 16 kHz mono PCM, the single decode of the source; waveform peaks
+  are read from it directly;
+- asr16k.mp3: the transcription input, encoded from asr16k.wav (no second decode
+  of the source). It stays compressed so uploads to remote engines (OpenAI's
+  25 MB limit, ElevenLabs, remote VidGo) keep the size they had before.
+
+A stamp file records the source's size and mtime; artifacts are rebuilt when the
+source changes. Users take a reference with acquire() while they read the files.
+discard() (called when a video is deleted) and the size-bounded LRU eviction only
+remove directories nobody holds; a discard on a held entry is deferred until the
+last reference is released. Per-key build locks live only while a key is held.
+"""
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+
+ARTIFACT_ROOT = os.path.join(settings.BASE_DIR, 'work_dir', 'audio_artifacts')
+MAX_CACHE_BYTES = 4 * 1024 * 1024 * 1024   # 超出后按 LRU 淘汰未被引用的条目
+ASR_SAMPLE_RATE = 16000
+PCM_FILENAME = 'asr16k.wav'
+ASR_FILENAME = 'asr16k.mp3'
+STAMP_FILENAME = 'source.stamp'
+DECODE_TIMEOUT = 3600
+
+_lock = threading.Lock()
+_refs: dict = {}            # key -> 引用计数
+_discarded: set = set()     # 已请求删除、等待最后一个引用释放的 key
+_key_locks: dict = {}       # key -> 生成产物时使用的锁（仅在 key 被引用期间存在）
+
+
+def _key(source_path: str) -> str:
+    return hashlib.sha1(os.path.realpath(source_path).encode('utf-8')).hexdigest()[:20]
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _lock:
+        lock = _key_locks.get(key)
+        if lock is None:
+            lock = _key_locks[key] = threading.Lock()
+        return lock
+
+
+def _run_ffmpeg(cmd: list, target: str) -> None:
+    tmp = target + '.part'
+    try:
+        result = subprocess.run(cmd + [tmp], capture_output=True, text=True, timeout=DECODE_TIMEOUT)
+        if result.returncode != 0 or not os.path.exists(tmp):
+            raise RuntimeError(f"ffmpeg failed: {result.stderr[-500:]}")
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class AudioArtifacts:
+    """一个源文件的音频产物；通过 acquire() 获取"""
+
+    def __init__(self, source_path: str):
+        self.source_path = source_path
+        self.key = _key(source_path)
+        self.dir = os.path.join(ARTIFACT_ROOT, self.key)
+
+    def _sync_stamp(self) -> None:
+        """源文件变化时清空旧产物（调用方持有 key 锁）"""
+        stat = os.stat(self.source_path)
+        stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+        stamp_path = os.path.join(self.dir, STAMP_FILENAME)
+        try:
+            with open(stamp_path, 'r', encoding='utf-8') as f:
+                if f.read() == stamp:
+                    return
+        except OSError:
+            pass
+        shutil.rmtree(self.dir, ignore_errors=True)
+        os.makedirs(self.dir, exist_ok=True)
+        with open(stamp_path, 'w', encoding='utf-8') as f:
+            f.write(stamp)
+
+    def _ensure(self, filename: str, build) -> str:
+        path = os.path.join(self.dir, filename)
+        with _key_lock(self.key):
+            self._sync_stamp()
+            if not os.path.exists(path):
+                build(path)
+        try:
+            os.utime(self.dir)   # LRU：记录最近访问时间
+        except OSError:
+            pass
+        return path
+
+    def pcm_audio(self) -> str:
+        """16 kHz 单声道 PCM WAV（波形峰值），整个生命周期只解码一次源文件"""
+        def build(path):
+            _run_ffmpeg([
+                'ffmpeg', '-v', 'error', '-nostdin', '-i', self.source_path,
+                '-map', '0:a:0', '-vn', '-ac', '1', '-ar', str(ASR_SAMPLE_RATE),
+                '-c:a', 'pcm_s16le', '-f', 'wav', '-y',
+            ], path)
+            _evict()
+        return self._ensure(PCM_FILENAME, build)
+
+    def asr_audio(self) -> str:
+        """转录输入：由 PCM 产物编码的 16 kHz 单声道 MP3，上传体积与原预处理一致"""
+        pcm_path = self.pcm_audio()
+
+        def build(path):
+            _run_ffmpeg([
+                'ffmpeg', '-v', 'error', '-nostdin', '-i', pcm_path,
+                '-ac', '1', '-ar', str(ASR_SAMPLE_RATE), '-ab', '128k', '-acodec', 'mp3',
+                '-f', 'mp3', '-y',
+            ], path)
+            _evict()
+        return self._ensure(ASR_FILENAME, build)
+
+
+@contextmanager
+def acquire(source_path: str):
+    """持有引用期间产物不会被淘汰或删除"""
+    artifacts = AudioArtifacts(source_path)
+    with _lock:
+        _refs[artifacts.key] = _refs.get(artifacts.key, 0) + 1
+    try:
+        yield artifacts
+    finally:
+        remove = False
+        with _lock:
+            _refs[artifacts.key] -= 1
+            if _refs[artifacts.key] == 0:
+                del _refs[artifacts.key]
+                _key_locks.pop(artifacts.key, None)
+                remove = artifacts.key in _discarded
+                _discarded.discard(artifacts.key)
+        if remove:
+            shutil.rmtree(artifacts.dir, ignore_errors=True)
+
+
+def discard(source_path: str) -> None:
+    """删除源文件对应的全部产物；仍被引用时推迟到最后一个引用释放"""
+    key = _key(source_path)
+    with _lock:
+        if _refs.get(key):
+            _discarded.add(key)
+            return
+    shutil.rmtree(os.path.join(ARTIFACT_ROOT, key), ignore_errors=True)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for entry in os.scandir(path):
+        if entry.is_file():
+            total += entry.stat().st_size
+    return total
+
+
+def _evict() -> None:
+    """总大小超过上限时，按最近访问时间淘汰未被引用的条目"""
+    if not os.path.isdir(ARTIFACT_ROOT):
+        return
+    entries = [(entry.stat().st_mtime, entry.name, _dir_size(entry.path))
+               for entry in os.scandir(ARTIFACT_ROOT) if entry.is_dir()]
+    total = sum(size for _, _, size in entries)
+    if total <= MAX_CACHE_BYTES:
+        return
+    target = int(MAX_CACHE_BYTES * 0.9)
+    for _, key, size in sorted(entries):
+        if total <= target:
+            break
+        with _lock:
+            if _refs.get(key):
+                continue
+        shutil.rmtree(os.path.join(ARTIFACT_ROOT, key), ignore_errors=True)
+        total -= size
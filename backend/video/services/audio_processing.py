@@ -3,7 +3,9 @@ Standalone audio and media processing utilities (FFmpeg/ffprobe wrappers, extrac
 """
 import os
 import json
+import shutil
 import subprocess
+import threading
 from pathlib import Path
 
 from django.conf import settings
@@ -41,9 +43,10 @@ def has_waveform_peaks(video_filename: str) -> tuple[bool, str]:
     return (os.path.exists(path), path)
 
 
-def detect_video_audio_format(video_path: str) -> str:
+def probe_audio_codec(video_path: str) -> str | None:
     """
-    Detect the original audio codec in a video file and map to extension
+    Return ffprobe's codec_name for the first audio stream, or None when there is
+    no audio stream or probing fails
     """
     cmd = [
         'ffprobe', '-v', 'quiet', '-print_format', 'json',
@@ -52,19 +55,24 @@ def detect_video_audio_format(video_path: str) -> str:
     try:
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
         if result.returncode == 0:
-            data = json.loads(result.stdout)
-            streams = data.get('streams') or []
+            streams = json.loads(result.stdout).get('streams') or []
             if streams:
-                codec = streams[0].get('codec_name', '')
-                mapping = {
-                    'opus': 'opus', 'aac': 'aac', 'mp3': 'mp3',
-                    'vorbis': 'ogg', 'flac': 'flac', 'pcm_s16le': 'wav',
-                    'ac-3': 'ac3', 'eac3': 'eac3'
-                }
-                return mapping.get(codec, 'aac')
+                return streams[0].get('codec_name') or None
     except Exception:
         pass
-    return 'aac'
+    return None
+
+
+def detect_video_audio_format(video_path: str) -> str:
+    """
+    Detect the original audio codec in a video file and map to extension
+    """
+    mapping = {
+        'opus': 'opus', 'aac': 'aac', 'mp3': 'mp3',
+        'vorbis': 'ogg', 'flac': 'flac', 'pcm_s16le': 'wav',
+        'ac-3': 'ac3', 'eac3': 'eac3'
+    }
+    return mapping.get(probe_audio_codec(video_path), 'aac')
 
 
 def extract_audio_from_video_file(
@@ -160,29 +168,145 @@ def is_hls_compatible(video_path: str) -> tuple[bool, str]:
         return False, str(e)
 
 
-def extract_hls_from_video_file(video_path: str) -> tuple[bool, str, str]:
+# 多码率阶梯：(名称, 高度, 视频码率, 峰值码率, 音频码率)
+HLS_LADDER = [
+    ('1080p', 1080, '5000k', '5350k', '192k'),
+    ('720p', 720, '2800k', '2996k', '128k'),
+    ('360p', 360, '800k', '856k', '96k'),
+]
+HLS_SEGMENT_SECONDS = 6
+
+
+def probe_video_streams(video_path: str) -> dict:
+    """
+    Return {'vcodec', 'acodec', 'height', 'duration'} of the first video/audio streams.
+    Missing values are None / 0.
+    """
+    cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_streams', '-show_format', video_path]
+    res = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr or 'ffprobe failed')
+    info = json.loads(res.stdout)
+    result = {'vcodec': None, 'acodec': None, 'height': 0, 'duration': 0.0}
+    for s in info.get('streams', []):
+        if s.get('codec_type') == 'video' and not result['vcodec']:
+            result['vcodec'] = s.get('codec_name')
+            result['height'] = int(s.get('height') or 0)
+        if s.get('codec_type') == 'audio' and not result['acodec']:
+            result['acodec'] = s.get('codec_name')
+    try:
+        result['duration'] = float(info.get('format', {}).get('duration') or 0)
+    except ValueError:
+        pass
+    return result
+
+
+def select_hls_renditions(source_height: int) -> list:
+    """Ladder rungs not taller than the source; always keep the smallest rung."""
+    rungs = [r for r in HLS_LADDER if not source_height or r[1] <= source_height]
+    return rungs or HLS_LADDER[-1:]
+
+
+def build_hls_command(video_path: str, out_dir: str, streams: dict, renditions: list = None) -> list:
+    """
+    Build the ffmpeg command writing <out_dir>/index.m3u8.
+
+    - renditions 为空：单码率。H264/H265 + 兼容音频时直接封装（-c copy），否则转码为 H264/AAC。
+    - renditions 非空：按阶梯转码，index.m3u8 为 master playlist，
+      各码率写到 <name>.m3u8 / <name>_<n>.ts，关键帧对齐到分片边界以便无缝切换。
+    """
+    playlist = os.path.join(out_dir, 'index.m3u8')
+    has_audio = bool(streams.get('acodec'))
+    cmd = ['ffmpeg', '-y', '-nostats', '-loglevel', 'error', '-progress', 'pipe:1', '-i', video_path]
+    hls_opts = ['-f', 'hls', '-hls_time', str(HLS_SEGMENT_SECONDS), '-hls_list_size', '0',
+                '-hls_playlist_type', 'vod']
+
+    if not renditions:
+        copy_video = streams.get('vcodec') in ('h264', 'hevc', 'h265')
+        copy_audio = streams.get('acodec') in ('aac', 'mp3', 'ac3')
+        cmd += ['-map', '0:v:0']
+        cmd += ['-c:v', 'copy'] if copy_video else ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23']
+        if has_audio:
+            cmd += ['-map', '0:a:0']
+            cmd += ['-c:a', 'copy'] if copy_audio else ['-c:a', 'aac', '-b:a', '128k']
+        return cmd + hls_opts + ['-hls_segment_filename', os.path.join(out_dir, 'seg%d.ts'), playlist]
+
+    count = len(renditions)
+    split = f"[0:v]split={count}" + ''.join(f"[v{i}]" for i in range(count))
+    scales = [f"[v{i}]scale=-2:{height}[v{i}out]" for i, (_, height, *_rest) in enumerate(renditions)]
+    cmd += ['-filter_complex', ';'.join([split] + scales)]
+    stream_map = []
+    for i, (name, _height, v_rate, v_max, a_rate) in enumerate(renditions):
+        bufsize = f"{int(v_max[:-1]) * 2}k"
+        cmd += ['-map', f'[v{i}out]', f'-c:v:{i}', 'libx264', f'-b:v:{i}', v_rate,
+                f'-maxrate:v:{i}', v_max, f'-bufsize:v:{i}', bufsize]
+        if has_audio:
+            cmd += ['-map', '0:a:0', f'-c:a:{i}', 'aac', f'-b:a:{i}', a_rate]
+            stream_map.append(f"v:{i},a:{i},name:{name}")
+        else:
+            stream_map.append(f"v:{i},name:{name}")
+    cmd += ['-preset', 'veryfast', '-sc_threshold', '0',
+            '-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})']
+    return cmd + hls_opts + [
+        '-master_pl_name', 'index.m3u8',
+        '-var_stream_map', ' '.join(stream_map),
+        '-hls_segment_filename', os.path.join(out_dir, '%v_%d.ts'),
+        os.path.join(out_dir, '%v.m3u8'),
+    ]
+
+
+def extract_hls_from_video_file(video_path: str, ladder: bool = False, progress_callback=None) -> tuple[bool, str, str]:
     """
-    Generate HLS segments and playlist for a compatible video file.
+    Package a video file as HLS under MEDIA_ROOT/stream_video/<stem>/index.m3u8.
+
+    ladder=True 时生成多码率（见 HLS_LADDER）和 master playlist。
+    progress_callback(percent: int) 基于 ffmpeg -progress 的真实输出时间回调。
     Returns: (success, error_or_empty, rel_dir)
     """
     if not os.path.exists(video_path):
         return False, 'not found', ''
     name = Path(video_path).stem
-    ok, msg = is_hls_compatible(video_path)
-    if not ok:
-        return False, msg, ''
+    try:
+        streams = probe_video_streams(video_path)
+    except Exception as e:
+        return False, str(e), ''
+    if not streams['vcodec']:
+        return False, 'no video stream', ''
+
     out = os.path.join(settings.MEDIA_ROOT, 'stream_video', name)
-    os.makedirs(out, exist_ok=True)
-    playlist = os.path.join(out, 'index.m3u8')
-    cmd = ['ffmpeg', '-i', video_path, '-c:v', 'copy', '-c:a', 'copy',
-           '-hls_time', '10', '-hls_list_size', '0', '-hls_segment_filename',
-           os.path.join(out, 'seg%d.ts'), playlist]
+    # 先打包到同级临时目录，成功后整体替换：失败时旧的 HLS 仍可播放，也不会残留不同码率的文件
+    tmp = out + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp, exist_ok=True)
+    renditions = select_hls_renditions(streams['height']) if ladder else None
+    cmd = build_hls_command(video_path, tmp, streams, renditions)
+
     try:
-        res = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
-        if res.returncode == 0 and os.path.exists(playlist):
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        # stderr 单独线程读取，避免管道写满卡住 ffmpeg
+        stderr_chunks = []
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_reader.start()
+        duration = streams['duration']
+        for line in process.stdout:
+            # -progress 输出 out_time_ms=<微秒>
+            if progress_callback and duration > 0 and line.startswith('out_time_ms='):
+                try:
+                    seconds = int(line.split('=', 1)[1]) / 1_000_000
+                except ValueError:
+                    continue
+                progress_callback(min(int(seconds / duration * 100), 99))
+        process.wait()
+        stderr_reader.join(timeout=5)
+        stderr = ''.join(stderr_chunks)[-2000:]
+        if process.returncode == 0 and os.path.exists(os.path.join(tmp, 'index.m3u8')):
+            shutil.rmtree(out, ignore_errors=True)
+            os.replace(tmp, out)
             return True, '', f"stream_video/{name}"
-        return False, res.stderr, ''
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False, stderr or f'ffmpeg exited with {process.returncode}', ''
     except Exception as e:
+        shutil.rmtree(tmp, ignore_errors=True)
         return False, str(e), ''
 
 def get_video_file_paths(video_id: int) -> tuple[Video, str, str]:
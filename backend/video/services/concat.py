@@ -0,0 +1,272 @@
+"""
+Video concatenation used by the batch "concat" action.
+
+Every input is probed once up front. When all inputs share the same stream layout
+(codecs, resolution, pixel format, frame rate, time base, audio format) the concat
+demuxer copies the streams; otherwise a filter_complex concat re-encodes them to
+the first input's geometry, so mismatched inputs never produce a broken file.
+
+The probed durations are written into the concat list (copy) or used to trim each
+segment (re-encode), and the same values offset the subtitles, so subtitle timing
+matches the output exactly. ffmpeg writes a regular faststart MP4 (moov atom up
+front, so players can start before the whole file arrives) to a .part file, which is
+hashed afterwards and renamed to <md5>.mp4. faststart needs a seekable output, so the
+extra read pass is the price of a file every player handles.
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+import uuid
+
+CHUNK_SIZE = 1024 * 1024
+PROBE_TIMEOUT = 30
+# 重新编码时的输出参数
+REENCODE_VIDEO_ARGS = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20', '-pix_fmt', 'yuv420p']
+REENCODE_AUDIO_ARGS = ['-c:a', 'aac', '-b:a', '192k']
+REENCODE_SAMPLE_RATE = 48000
+# 普通 mp4，moov 前置便于边下边播
+MP4_OUTPUT_ARGS = ['-f', 'mp4', '-movflags', '+faststart']
+
+# 直接拼接要求完全一致的流参数
+_VIDEO_KEYS = ('codec_name', 'profile', 'width', 'height', 'pix_fmt', 'r_frame_rate', 'time_base')
+_AUDIO_KEYS = ('codec_name', 'sample_rate', 'channels', 'time_base')
+_SRT_TIME_RE = re.compile(r'(\d+):(\d{2}):(\d{2})[,.](\d{3})')
+
+
+class ConcatError(Exception):
+    """探测或 ffmpeg 拼接失败"""
+
+
+def probe_input(path: str) -> dict:
+    """
+    Return {'video': {...} or None, 'audio': {...} or None, 'duration': seconds}
+    for the first video/audio streams of path.
+    """
+    cmd = ['ffprobe', '-v', 'error', '-print_format', 'json', '-show_streams', '-show_format', path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=PROBE_TIMEOUT)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise ConcatError(f"ffprobe failed for {os.path.basename(path)}: {e}")
+    if result.returncode != 0:
+        raise ConcatError(f"ffprobe failed for {os.path.basename(path)}: {result.stderr.strip()}")
+    info = json.loads(result.stdout or '{}')
+
+    probe = {'video': None, 'audio': None, 'duration': 0.0}
+    stream_durations = []
+    for stream in info.get('streams', []):
+        kind = stream.get('codec_type')
+        if kind not in ('video', 'audio') or probe[kind] is not None:
+            continue
+        if kind == 'video' and stream.get('disposition', {}).get('attached_pic'):
+            continue   # 封面图不是视频流
+        keys = _VIDEO_KEYS if kind == 'video' else _AUDIO_KEYS
+        probe[kind] = {key: stream.get(key) for key in keys}
+        try:
+            stream_durations.append(float(stream['duration']))
+        except (KeyError, TypeError, ValueError):
+            pass
+    try:
+        probe['duration'] = float(info.get('format', {})['duration'])
+    except (KeyError, TypeError, ValueError):
+        probe['duration'] = max(stream_durations, default=0.0)
+    if probe['video'] is None:
+        raise ConcatError(f"{os.path.basename(path)} has no video stream")
+    if probe['duration'] <= 0:
+        raise ConcatError(f"{os.path.basename(path)} has no duration")
+    return probe
+
+
+def plan_concat(probes: list) -> tuple[str, list]:
+    """
+    Pick 'copy' when every input matches the first one, else 'reencode'.
+    Returns (strategy, reasons) where reasons lists the mismatches found.
+    """
+    first = probes[0]
+    reasons = []
+    for index, probe in enumerate(probes[1:], start=2):
+        for kind in ('video', 'audio'):
+            a, b = first[kind], probe[kind]
+            if (a is None) != (b is None):
+                reasons.append(f"input {index}: {kind} stream {'missing' if b is None else 'unexpected'}")
+                continue
+            if a is None:
+                continue
+            diffs = [f"{key} {a[key]} != {b[key]}" for key in a if a[key] != b[key]]
+            if diffs:
+                reasons.append(f"input {index} {kind}: {', '.join(diffs)}")
+    return ('reencode' if reasons else 'copy'), reasons
+
+
+def _escape_concat_path(path: str) -> str:
+    return path.replace("'", "'\\''")
+
+
+def build_copy_command(paths: list, probes: list, list_path: str, output_path: str) -> list:
+    """concat demuxer；每个文件写入探测到的时长，保证下一段的起点与字幕偏移一致"""
+    with open(list_path, 'w', encoding='utf-8') as f:
+        f.write('ffconcat version 1.0\n')
+        for path, probe in zip(paths, probes):
+            f.write(f"file '{_escape_concat_path(path)}'\n")
+            f.write(f"duration {probe['duration']:.6f}\n")
+    return ['ffmpeg', '-nostdin', '-v', 'error', '-nostats', '-progress', 'pipe:2',
+            '-f', 'concat', '-safe', '0', '-i', list_path,
+            '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy', *MP4_OUTPUT_ARGS, '-y', output_path]
+
+
+def build_reencode_command(paths: list, probes: list, output_path: str) -> list:
+    """
+    filter_complex concat：统一到第一个输入的分辨率和帧率，
+    每段按探测时长裁剪/补齐；没有音轨的输入用静音补上。
+    """
+    target = probes[0]['video']
+    width, height = int(target['width']), int(target['height'])
+    fps = target.get('r_frame_rate') or '30/1'
+    has_audio = any(probe['audio'] for probe in probes)
+
+    cmd = ['ffmpeg', '-nostdin', '-v', 'error', '-nostats', '-progress', 'pipe:2']
+    for path in paths:
+        cmd += ['-i', path]
+    filters = []
+    segments = ''
+    silence_index = len(paths)
+    for i, probe in enumerate(probes):
+        duration = f"{probe['duration']:.6f}"
+        filters.append(
+            f"[{i}:v:0]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},format=yuv420p,"
+            f"trim=duration={duration},setpts=PTS-STARTPTS[v{i}]"
+        )
+        segments += f"[v{i}]"
+        if not has_audio:
+            continue
+        if probe['audio']:
+            source = f"[{i}:a:0]"
+        else:
+            cmd += ['-f', 'lavfi', '-t', duration,
+                    '-i', f"anullsrc=channel_layout=stereo:sample_rate={REENCODE_SAMPLE_RATE}"]
+            source = f"[{silence_index}:a:0]"
+            silence_index += 1
+        filters.append(
+            f"{source}aresample={REENCODE_SAMPLE_RATE},aformat=channel_layouts=stereo,"
+            f"atrim=duration={duration},apad=whole_dur={duration},asetpts=PTS-STARTPTS[a{i}]"
+        )
+        segments += f"[a{i}]"
+    filters.append(f"{segments}concat=n={len(paths)}:v=1:a={1 if has_audio else 0}[outv]" + ('[outa]' if has_audio else ''))
+
+    cmd += ['-filter_complex', ';'.join(filters), '-map', '[outv]', *REENCODE_VIDEO_ARGS]
+    if has_audio:
+        cmd += ['-map', '[outa]', *REENCODE_AUDIO_ARGS]
+    return cmd + [*MP4_OUTPUT_ARGS, '-y', output_path]
+
+
+def concat_videos(paths: list, probes: list, strategy: str, output_dir: str,
+                  progress_callback=None, timeout: float = None) -> str:
+    """
+    Concatenate paths into output_dir/<md5>.mp4 and return the file name.
+
+    progress_callback(percent: int) 基于 ffmpeg -progress 的输出时间回调（0-99）。
+    """
+    total = sum(probe['duration'] for probe in probes)
+    part_path = os.path.join(output_dir, f"concat_{uuid.uuid4().hex}.mp4.part")
+    list_path = part_path + '.txt'
+    if strategy == 'copy':
+        cmd = build_copy_command(paths, probes, list_path, part_path)
+    else:
+        cmd = build_reencode_command(paths, probes, part_path)
+    print(f"[Concat] {strategy}: {' '.join(cmd)}")
+
+    stderr_lines = []
+
+    def read_progress(stream):
+        # -progress 写到 stderr：key=value 行是进度，其余是错误信息
+        for raw in stream:
+            line = raw.decode('utf-8', 'replace').strip()
+            if line.startswith('out_time_ms=') or line.startswith('out_time_us='):
+                if progress_callback and total > 0:
+                    try:
+                        seconds = int(line.split('=', 1)[1]) / 1_000_000
+                    except ValueError:
+                        continue
+                    progress_callback(max(0, min(int(seconds / total * 100), 99)))
+            elif line and not re.match(r'^\w+=', line):
+                stderr_lines.append(line)
+
+    try:
+        try:
+            process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise ConcatError(f"ffmpeg failed to start: {e}")
+        reader = threading.Thread(target=read_progress, args=(process.stderr,), daemon=True)
+        reader.start()
+        try:
+            process.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+            raise ConcatError(f"FFmpeg concatenation timed out after {timeout} seconds")
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            reader.join(timeout=5)
+        if process.returncode != 0:
+            detail = '\n'.join(stderr_lines[-20:]) or f"ffmpeg exited with {process.returncode}"
+            raise ConcatError(f"FFmpeg concatenation failed: {detail}")
+
+        md5 = hashlib.md5()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                md5.update(chunk)
+        output_name = f"{md5.hexdigest()}.mp4"
+        os.replace(part_path, os.path.join(output_dir, output_name))
+        return output_name
+    finally:
+        for path in (part_path, list_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _format_srt_time(ms: int) -> str:
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+
+def shift_srt_blocks(content: str, offset_ms: int) -> list:
+    """把一个 SRT 的每条字幕平移 offset_ms 毫秒，返回去掉序号的 [时间行, 文本...] 块"""
+    blocks = []
+    for block in re.split(r'\n\s*\n', content.replace('\r\n', '\n').strip()):
+        lines = block.split('\n')
+        # 序号行可有可无，从时间行开始取
+        for index, line in enumerate(lines):
+            if '-->' in line:
+                break
+        else:
+            continue
+        times = _SRT_TIME_RE.findall(lines[index])
+        if len(times) != 2:
+            continue
+        start, end = (
+            int(h) * 3_600_000 + int(m) * 60_000 + int(s) * 1000 + int(ms) + offset_ms
+            for h, m, s, ms in times
+        )
+        blocks.append([f"{_format_srt_time(start)} --> {_format_srt_time(end)}", *lines[index + 1:]])
+    return blocks
+
+
+def concat_srt(parts: list) -> str:
+    """
+    parts: [(SRT 内容, 偏移秒数)]，按顺序拼接并重新编号。
+    偏移按毫秒取整一次，避免逐条累加浮点误差。
+    """
+    blocks = []
+    for content, offset in parts:
+        blocks.extend(shift_srt_blocks(content, int(round(offset * 1000))))
+    return '\n\n'.join(
+        '\n'.join([str(number), *block]) for number, block in enumerate(blocks, start=1)
+    ) + ('\n' if blocks else '')
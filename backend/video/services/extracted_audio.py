@@ -0,0 +1,235 @@
+"""
+Disk cache for audio extracted from videos (the "download as MP3" button).
+
+Entries live in work_dir/extracted_audio, keyed on (video hash, codec, bitrate),
+where the video hash covers path, size and mtime so a replaced video never
+serves stale audio. When the source track is already in the requested codec the
+stream is copied instead of re-encoded; anything else (unknown codecs, failed
+probes) is re-encoded.
+
+A miss starts one ffmpeg job that writes stdout into a .part file; every request
+for that key (including the first) tails the growing file, so the download starts
+immediately, concurrent clicks share one encode, and a client that disconnects
+does not abort filling the cache. Total size is bounded with LRU eviction.
+"""
+import hashlib
+import os
+import subprocess
+import threading
+
+from django.conf import settings
+
+from .audio_processing import probe_audio_codec
+
+CACHE_DIR = os.path.join(settings.BASE_DIR, 'work_dir', 'extracted_audio')
+MAX_CACHE_BYTES = 2 * 1024 * 1024 * 1024   # 超出后按 LRU 淘汰到 90%
+CHUNK_SIZE = 64 * 1024
+DEFAULT_BITRATE = '192k'
+FIRST_CHUNK_TIMEOUT = 30                   # 等待 ffmpeg 产出第一块数据的最长时间
+EXTRACT_TIMEOUT = 3600
+
+# codec -> (ffmpeg 编码器, 输出封装, 扩展名, Content-Type)
+CODECS = {
+    'mp3': ('libmp3lame', 'mp3', 'mp3', 'audio/mpeg'),
+    'aac': ('aac', 'adts', 'aac', 'audio/aac'),
+}
+
+_jobs: dict = {}                            # key -> _ExtractJob（进行中的提取）
+_jobs_lock = threading.Lock()
+_size_lock = threading.Lock()
+
+
+class ExtractionError(Exception):
+    """ffmpeg 没有产出任何音频数据"""
+
+
+class _ExtractJob:
+    def __init__(self, key: str, final_path: str):
+        self.key = key
+        self.final_path = final_path
+        self.part_path = final_path + '.part'
+        self.written = 0
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+
+    def _advance(self, size: int = 0, done: bool = False, error: str = None) -> None:
+        with self.cond:
+            self.written += size
+            if done:
+                self.done = True
+                self.error = error
+            self.cond.notify_all()
+
+    def run(self, video_path: str, codec: str, bitrate: str) -> None:
+        try:
+            cmd = _build_command(video_path, codec, bitrate)
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            self._advance(done=True, error=str(e))
+            self._finish()
+            return
+        # stderr 单独线程读取，避免管道写满卡住 ffmpeg
+        stderr_chunks = []
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+        stderr_reader.start()
+        error = None
+        try:
+            with open(self.part_path, 'wb') as f:
+                while True:
+                    chunk = proc.stdout.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    f.flush()
+                    self._advance(len(chunk))
+            proc.wait(timeout=EXTRACT_TIMEOUT)
+            stderr_reader.join(timeout=5)
+            if proc.returncode != 0:
+                error = b''.join(stderr_chunks).decode('utf-8', 'replace')[-500:] or f'ffmpeg exit {proc.returncode}'
+        except Exception as e:
+            proc.kill()
+            error = str(e)
+
+        if error is None:
+            os.replace(self.part_path, self.final_path)
+            _track_size()
+        else:
+            print(f"[ExtractedAudio] ffmpeg failed for {self.key}: {error}")
+            _remove(self.part_path)
+        self._advance(done=True, error=error)
+        self._finish()
+
+    def _finish(self) -> None:
+        with _jobs_lock:
+            if _jobs.get(self.key) is self:
+                del _jobs[self.key]
+
+    def wait_first_chunk(self, timeout: float) -> None:
+        with self.cond:
+            self.cond.wait_for(lambda: self.written > 0 or self.done, timeout=timeout)
+            if self.done and self.written == 0:
+                raise ExtractionError(self.error or 'no audio output')
+
+    def iter_chunks(self):
+        """跟随 .part 文件读取，直到提取结束"""
+        try:
+            f = open(self.part_path, 'rb')
+        except FileNotFoundError:
+            # 提取刚好结束：成功时 .part 已被重命名为正式文件，失败时已被删除
+            with self.cond:
+                self.cond.wait_for(lambda: self.done, timeout=5)
+            if self.error:
+                raise ExtractionError(self.error)
+            yield from _iter_file(open(self.final_path, 'rb'))
+            return
+        with f:
+            position = 0
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if chunk:
+                    position += len(chunk)
+                    yield chunk
+                    continue
+                with self.cond:
+                    self.cond.wait_for(lambda: self.written > position or self.done, timeout=5)
+                    if self.done and self.written <= position:
+                        break
+        if self.error:
+            # 响应头已发出：抛出异常让服务器异常断开连接，客户端不会把截断的文件当作完整下载
+            print(f"[ExtractedAudio] stream for {self.key} ended early: {self.error}")
+            raise ExtractionError(self.error)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _track_size() -> None:
+    """缓存总大小超过上限时，淘汰最久未访问的条目（正在写入的 .part 不计）"""
+    with _size_lock:
+        entries = [entry for entry in os.scandir(CACHE_DIR)
+                   if entry.is_file() and not entry.name.endswith('.part')]
+        total = sum(entry.stat().st_size for entry in entries)
+        if total <= MAX_CACHE_BYTES:
+            return
+        target = int(MAX_CACHE_BYTES * 0.9)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total <= target:
+                break
+            total -= entry.stat().st_size
+            _remove(entry.path)
+
+
+def cache_key(video_path: str, codec: str, bitrate: str) -> str:
+    stat = os.stat(video_path)
+    digest = hashlib.sha1(
+        f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8')
+    ).hexdigest()[:20]
+    return f"{digest}_{codec}_{bitrate}"
+
+
+def _build_command(video_path: str, codec: str, bitrate: str) -> list:
+    encoder, container, _, _ = CODECS[codec]
+    cmd = ['ffmpeg', '-v', 'error', '-nostdin', '-i', video_path, '-map', '0:a:0', '-vn', '-sn', '-dn']
+    if probe_audio_codec(video_path) == codec:
+        cmd += ['-c:a', 'copy']           # 源音轨正是目标编码（按 ffprobe codec_name 精确匹配），直接封装
+    else:
+        cmd += ['-c:a', encoder, '-b:a', bitrate]
+    return cmd + ['-f', container, 'pipe:1']
+
+
+def cached_size(video_path: str, codec: str = 'mp3', bitrate: str = DEFAULT_BITRATE):
+    """已缓存时返回文件大小，否则返回 None（HEAD 请求用）"""
+    _, _, ext, _ = CODECS[codec]
+    path = os.path.join(CACHE_DIR, f"{cache_key(video_path, codec, bitrate)}.{ext}")
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def open_extracted_audio(video_path: str, codec: str = 'mp3', bitrate: str = DEFAULT_BITRATE):
+    """
+    返回 (chunk 迭代器, 大小或 None, content_type)。
+    命中缓存时大小已知；否则边提取边输出，大小未知。
+    ffmpeg 启动后没有产出任何数据时抛出 ExtractionError。
+    """
+    _, _, ext, content_type = CODECS[codec]
+    key = cache_key(video_path, codec, bitrate)
+    final_path = os.path.join(CACHE_DIR, f"{key}.{ext}")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    with _jobs_lock:
+        job = _jobs.get(key)
+        if job is None and os.path.exists(final_path):
+            try:
+                os.utime(final_path)   # LRU：记录最近访问时间
+                f = open(final_path, 'rb')
+            except OSError:
+                f = None
+            if f is not None:
+                return _iter_file(f), os.fstat(f.fileno()).st_size, content_type
+        if job is None:
+            job = _jobs[key] = _ExtractJob(key, final_path)
+            # 先创建 .part，读者可以立即打开
+            open(job.part_path, 'wb').close()
+            threading.Thread(
+                target=job.run, args=(video_path, codec, bitrate),
+                name=f"extract-audio-{key[:8]}", daemon=True,
+            ).start()
+
+    job.wait_first_chunk(FIRST_CHUNK_TIMEOUT)
+    return job.iter_chunks(), None, content_type
+
+
+def _iter_file(f):
+    with f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
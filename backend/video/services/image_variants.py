@@ -0,0 +1,165 @@
+"""
+On-demand resized / re-encoded image variants (`?w=240&fmt=webp`).
+
+Variants are generated with Pillow on a small worker pool and cached under
+work_dir/image_variants. The cache key includes the source file's size and
+mtime, so a replaced source gets a new variant and the old one is never served.
+The key doubles as the ETag: URLs carry no version, so clients revalidate every
+time (cheap 304s) instead of caching a cover that may be overwritten in place.
+Total size is bounded with LRU eviction.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps, features
+from django.conf import settings
+
+VARIANT_DIR = os.path.join(settings.BASE_DIR, 'work_dir', 'image_variants')
+# 请求宽度向上取整到这些档位，避免任意宽度把缓存撑爆
+VARIANT_WIDTHS = (120, 240, 360, 480, 720, 960, 1280, 1920)
+ENCODE_WORKERS = 2
+ENCODE_TIMEOUT = 30
+MAX_CACHE_BYTES = 512 * 1024 * 1024   # 超出后按 LRU 淘汰到 90%
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+if features.check('avif'):
+    FORMATS['avif'] = ('AVIF', 'image/avif', {'quality': 60})
+
+_pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="image-variant")
+_inflight: dict = {}
+_inflight_lock = threading.Lock()
+_size_lock = threading.Lock()
+
+
+def negotiate_format(fmt: str, accept: str) -> str:
+    """fmt=auto 时按 Accept 头选择 avif > webp > jpeg"""
+    fmt = (fmt or '').lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+    if fmt != 'auto':
+        return fmt if fmt in FORMATS else ''
+    accept = accept or ''
+    if 'image/avif' in accept and 'avif' in FORMATS:
+        return 'avif'
+    if 'image/webp' in accept:
+        return 'webp'
+    return 'jpeg'
+
+
+def snap_width(width: int) -> int:
+    for candidate in VARIANT_WIDTHS:
+        if width <= candidate:
+            return candidate
+    return VARIANT_WIDTHS[-1]
+
+
+def _encode(source_path: str, target_path: str, width: int, fmt: str) -> None:
+    pil_format, _, options = FORMATS[fmt]
+    with Image.open(source_path) as img:
+        img = ImageOps.exif_transpose(img)
+        if width and img.width > width:
+            height = max(1, round(img.height * width / img.width))
+            img = img.resize((width, height), Image.LANCZOS)
+        if pil_format == 'JPEG' and img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        elif img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+        tmp = target_path + '.part'
+        try:
+            img.save(tmp, pil_format, **options)
+            os.replace(tmp, target_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _track_size(keep: str) -> None:
+    """缓存总大小超过上限时，淘汰最久未访问的 variant（正在写入的 .part 和刚生成的 keep 不淘汰）"""
+    with _size_lock:
+        entries = [entry for entry in os.scandir(VARIANT_DIR)
+                   if entry.is_file() and not entry.name.endswith('.part')]
+        total = sum(entry.stat().st_size for entry in entries)
+        if total <= MAX_CACHE_BYTES:
+            return
+        target = int(MAX_CACHE_BYTES * 0.9)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total <= target:
+                break
+            if entry.name == keep:
+                continue
+            total -= entry.stat().st_size
+            _remove(entry.path)
+
+
+def variant_key(source_path: str, width: int, fmt: str) -> str:
+    """variant 的缓存文件名（同时用作 ETag），不需要先生成 variant"""
+    stat = os.stat(source_path)
+    width = snap_width(width) if width else 0
+    digest = hashlib.sha1(
+        f"{os.path.abspath(source_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8')
+    ).hexdigest()[:20]
+    return f"{digest}_w{width}.{fmt}"
+
+
+def get_variant(source_path: str, width: int, fmt: str):
+    """
+    返回 (variant 路径, content_type, etag)。
+    动图等不适合转换的图片返回 None，调用方直接返回原图。
+    """
+    key = variant_key(source_path, width, fmt)
+    width = snap_width(width) if width else 0
+    target_path = os.path.join(VARIANT_DIR, key)
+    content_type = FORMATS[fmt][1]
+
+    if os.path.exists(target_path):
+        try:
+            os.utime(target_path)   # LRU：记录最近访问时间
+        except OSError:
+            pass
+    else:
+        with Image.open(source_path) as img:
+            if getattr(img, 'is_animated', False):
+                return None
+        os.makedirs(VARIANT_DIR, exist_ok=True)
+        # 同一 variant 的并发请求共享一次编码
+        with _inflight_lock:
+            future = _inflight.get(key)
+            if future is None:
+                future = _inflight[key] = _pool.submit(_encode, source_path, target_path, width, fmt)
+        try:
+            future.result(timeout=ENCODE_TIMEOUT)
+        finally:
+            with _inflight_lock:
+                if _inflight.get(key) is future and future.done():
+                    del _inflight[key]
+        _track_size(keep=key)
+    return target_path, content_type, f'"{key}"'
+
+
+def open_variant(source_path: str, width: int, fmt: str):
+    """
+    同 get_variant，但返回已打开的文件 (file, content_type, etag)，调用方负责关闭。
+    variant 在返回路径和打开之间可能被 LRU 淘汰，此时重新生成一次。
+    """
+    for attempt in range(2):
+        variant = get_variant(source_path, width, fmt)
+        if variant is None:
+            return None
+        variant_path, content_type, etag = variant
+        try:
+            return open(variant_path, 'rb'), content_type, etag
+        except FileNotFoundError:
+            if attempt:
+                raise
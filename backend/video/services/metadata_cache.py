@@ -0,0 +1,157 @@
+"""
+In-memory TTL cache for stream metadata (Bilibili view / pagelist API, yt-dlp info dicts).
+
+InfoView previews a URL and the download task that follows looks the same item up
+again; both go through get_or_fetch() so a preview-then-download pays for a single
+extraction. Keys are normalized (BV id / YouTube id / URL without tracking params),
+concurrent lookups of the same key share one fetch, and entries expire after
+METADATA_TTL so stale stream URLs are not reused for long.
+
+Cached values are shared between threads: treat them as read-only and deepcopy
+before handing them to anything that mutates (e.g. yt-dlp's process_ie_result).
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from yt_dlp import YoutubeDL
+
+from utils.stream_downloader import bili_download
+from utils.stream_downloader.youtube_download import YouTubeDownloader
+
+METADATA_TTL = 15 * 60      # yt-dlp 解析出的直链通常数小时后失效，15 分钟内复用是安全的
+MAX_ENTRIES = 128           # info dict 带完整 formats 列表，条目数不宜过多
+
+# 不影响内容的跟踪参数，归一化 URL 时去掉
+_TRACKING_PARAMS = {'si', 'feature', 'pp', 'fbclid', 'gclid', 'spm_id_from', 'vd_source',
+                    'from_spmid', 'share_source', 'share_medium', 'share_plat', 'share_tag',
+                    'share_session_id', 'unique_k', 'timestamp', 'ls', 'uo'}
+_YOUTUBE_ID_RE = re.compile(
+    r'(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)([0-9A-Za-z_-]{11})'
+)
+
+_entries: "OrderedDict[str, tuple[float, object]]" = OrderedDict()
+_lock = threading.Lock()
+_inflight: dict = {}        # key -> threading.Event，同一 key 只抓取一次
+
+
+def normalize_url(url: str) -> str:
+    """小写 host、去掉 www./m.、片段和跟踪参数，其余查询参数排序"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ('www.', 'm.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k not in _TRACKING_PARAMS and not k.startswith('utm_')
+    )
+    return urlunsplit(('https', host, parts.path.rstrip('/'), urlencode(query), ''))
+
+
+def bili_key(bvid: str = None, avid: str = None) -> str:
+    if bvid:
+        return f"bili:{bvid}"
+    if avid:
+        return f"bili:av{str(avid).removeprefix('av')}"
+    raise ValueError("Either bvid or avid must be provided.")
+
+
+def youtube_key(url: str) -> str:
+    match = _YOUTUBE_ID_RE.search(url)
+    return f"yt:{match.group(1)}" if match else f"yt:{normalize_url(url)}"
+
+
+def podcast_key(url: str) -> str:
+    return f"podcast:{normalize_url(url)}"
+
+
+def _lookup_locked(key: str):
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+    expires_at, value = entry
+    if expires_at <= time.monotonic():
+        del _entries[key]
+        return None
+    _entries.move_to_end(key)
+    return value
+
+
+def get(key: str):
+    with _lock:
+        return _lookup_locked(key)
+
+
+def put(key: str, value, ttl: float = METADATA_TTL) -> None:
+    with _lock:
+        _entries[key] = (time.monotonic() + ttl, value)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def invalidate(key: str) -> None:
+    with _lock:
+        _entries.pop(key, None)
+
+
+def get_or_fetch(key: str, fetch):
+    """
+    命中缓存直接返回；否则调用 fetch() 并缓存非 None 的结果。
+    同一 key 的并发请求等待第一个请求的结果，fetch 抛出的异常只传给发起抓取的调用方。
+    """
+    while True:
+        with _lock:
+            value = _lookup_locked(key)
+            if value is not None:
+                return value
+            event = _inflight.get(key)
+            if event is None:
+                event = _inflight[key] = threading.Event()
+                break
+        # 等待进行中的抓取；它失败时下一轮由当前线程自己抓取
+        event.wait()
+
+    try:
+        value = fetch()
+        if value is not None:
+            put(key, value)
+        return value
+    finally:
+        with _lock:
+            _inflight.pop(key, None)
+        event.set()
+
+
+# ---------------------------------------------------------------------------
+# 各平台的缓存查询
+# ---------------------------------------------------------------------------
+def bili_video_info(bvid: str = None, avid: str = None) -> dict:
+    """bili_download.get_video_info + get_cid，返回 {'info': ..., 'cids': [...], 'pages': [...]}"""
+    def fetch():
+        info = bili_download.get_video_info(bvid=bvid, avid=avid)
+        cids, pages = bili_download.get_cid(bvid=info['bvid'])
+        return {'info': info, 'cids': cids, 'pages': pages}
+
+    entry = get_or_fetch(bili_key(bvid, avid), fetch)
+    if not bvid:
+        # 通过 av 号查询的结果同时登记到 BV 号下，下载任务只带 BV 号
+        put(bili_key(entry['info']['bvid']), entry)
+    return entry
+
+
+def youtube_info(url: str):
+    """完整的 yt-dlp info dict（已 sanitize，可直接交给 process_ie_result 下载）；失败返回 None"""
+    return get_or_fetch(youtube_key(url), lambda: YouTubeDownloader().extract_info(url))
+
+
+def podcast_info(url: str) -> dict:
+    def fetch():
+        with YoutubeDL({'quiet': True, 'no_download': True}) as ydl:
+            info = ydl.extract_info(url, download=False)
+            return ydl.sanitize_info(info, remove_private_keys=True) if info else None
+
+    return get_or_fetch(podcast_key(url), fetch)
@@ -0,0 +1,191 @@
+"""
+Batch frame extraction for chapter thumbnails and screenshots.
+
+Frames are cached on disk under MEDIA_ROOT/screenshot, keyed on
+(video file, timestamp, width), so repeated requests never re-run ffmpeg.
+Missing frames are extracted either in a single ffmpeg pass with a `select`
+filter (dense timestamps) or by a small pool of seeking ffmpeg processes
+(sparse timestamps). Large batches run in the background and are tracked
+by a job id, which is only answered for the video that submitted it.
+"""
+import glob
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+SCREENSHOT_SUBDIR = 'screenshot'
+# 平均间隔不超过该秒数时用单次 select 解码，否则逐个 -ss 跳转更快
+DENSE_GAP_SECONDS = 30
+SEEK_WORKERS = 4
+# 待生成的帧数超过该值时转为后台任务，接口立即返回 job_id
+ASYNC_BATCH_THRESHOLD = 12
+JOB_TTL = 600
+
+_seek_pool = ThreadPoolExecutor(max_workers=SEEK_WORKERS, thread_name_prefix="screenshot-seek")
+_job_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="screenshot-batch")
+_jobs: dict = {}
+_jobs_lock = threading.Lock()
+
+
+def screenshot_dir() -> str:
+    path = os.path.join(settings.MEDIA_ROOT, SCREENSHOT_SUBDIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def screenshot_filename(video_url: str, timestamp: float, width: int = 0) -> str:
+    """
+    缓存文件名：<视频文件名(md5)>_<毫秒>ms_w<宽度>.jpg
+    视频文件名本身就是内容 md5，包含它也便于 delete_all_related_files 按文件名清理。
+    """
+    base = os.path.splitext(os.path.basename(video_url))[0]
+    return f"{base}_{int(round(float(timestamp) * 1000))}ms_w{int(width or 0)}.jpg"
+
+
+def screenshot_url(filename: str) -> str:
+    return f"/media/{SCREENSHOT_SUBDIR}/{filename}"
+
+
+def _scale_args(width: int) -> list:
+    return ['-vf', f'scale={int(width)}:-2'] if width else []
+
+
+def _extract_one(video_path: str, timestamp: float, output_path: str, width: int) -> bool:
+    cmd = ['ffmpeg', '-v', 'error', '-ss', str(timestamp), '-i', video_path,
+           '-frames:v', '1', *_scale_args(width), '-q:v', '2', '-y', output_path]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+    except subprocess.TimeoutExpired:
+        print(f"[Screenshot] ffmpeg timeout at {timestamp}s")
+        return False
+    except OSError as e:
+        print(f"[Screenshot] ffmpeg failed to start: {e}")
+        return False
+    if result.returncode != 0:
+        print(f"[Screenshot] ffmpeg error at {timestamp}s: {result.stderr}")
+    return result.returncode == 0 and os.path.exists(output_path)
+
+
+def _extract_select(video_path: str, items: list, width: int) -> bool:
+    """
+    一次 ffmpeg 解码，用 select 选出每个时间点之后的第一帧。
+    items 需按时间升序；输出帧数与时间点数量不一致（两个时间点落在同一帧等）时返回 False，
+    由调用方回退到逐个提取。
+    """
+    terms = []
+    for ts, _ in items:
+        if ts <= 0:
+            terms.append('eq(n,0)')
+        else:
+            terms.append(f'gte(t,{ts:.3f})*lt(prev_pts*TB,{ts:.3f})')
+    vf = f"select='{'+'.join(terms)}'"
+    if width:
+        vf += f",scale={int(width)}:-2"
+
+    tmp_dir = tempfile.mkdtemp(prefix='shots_', dir=screenshot_dir())
+    try:
+        cmd = ['ffmpeg', '-v', 'error', '-i', video_path, '-an', '-sn',
+               '-to', str(items[-1][0] + 1), '-vf', vf, '-vsync', 'vfr',
+               '-q:v', '2', '-y', os.path.join(tmp_dir, '%04d.jpg')]
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=60 + 10 * len(items))
+        except subprocess.TimeoutExpired:
+            print("[Screenshot] batch ffmpeg timeout")
+            return False
+        except OSError as e:
+            print(f"[Screenshot] ffmpeg failed to start: {e}")
+            return False
+        frames = sorted(glob.glob(os.path.join(tmp_dir, '*.jpg')))
+        if result.returncode != 0 or len(frames) != len(items):
+            print(f"[Screenshot] batch select produced {len(frames)}/{len(items)} frames, falling back")
+            return False
+        for frame, (_, output_path) in zip(frames, items):
+            os.replace(frame, output_path)
+        return True
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def extract_frames(video_path: str, video_url: str, timestamps: list, width: int = 0) -> dict:
+    """
+    保证每个时间点都有缓存截图，返回 {timestamp: filename 或 None(失败)}。
+    """
+    out_dir = screenshot_dir()
+    results = {}
+    missing = []
+    for ts in sorted({float(t) for t in timestamps}):
+        filename = screenshot_filename(video_url, ts, width)
+        path = os.path.join(out_dir, filename)
+        if os.path.exists(path):
+            results[ts] = filename
+        else:
+            missing.append((ts, path))
+
+    if not missing:
+        return results
+
+    span = missing[-1][0] - missing[0][0]
+    dense = len(missing) > 1 and span / (len(missing) - 1) <= DENSE_GAP_SECONDS
+    if dense and _extract_select(video_path, missing, width):
+        for ts, path in missing:
+            results[ts] = os.path.basename(path)
+        return results
+
+    futures = {ts: _seek_pool.submit(_extract_one, video_path, ts, path, width) for ts, path in missing}
+    for ts, path in missing:
+        results[ts] = os.path.basename(path) if futures[ts].result() else None
+    return results
+
+
+def count_missing(video_url: str, timestamps: list, width: int = 0) -> int:
+    out_dir = screenshot_dir()
+    return sum(
+        not os.path.exists(os.path.join(out_dir, screenshot_filename(video_url, ts, width)))
+        for ts in {float(t) for t in timestamps}
+    )
+
+
+# ---------- 后台批量任务 ----------
+
+def _purge_jobs():
+    now = time.time()
+    with _jobs_lock:
+        for job_id in [j for j, job in _jobs.items() if job["finished_at"] and now - job["finished_at"] > JOB_TTL]:
+            del _jobs[job_id]
+
+
+def submit_job(video_path: str, video_url: str, timestamps: list, width: int = 0, context=None) -> str:
+    """后台提取；context 原样保存在任务里，供查询状态时组装响应（如章节列表）"""
+    _purge_jobs()
+    job_id = uuid.uuid4().hex[:12]
+    with _jobs_lock:
+        _jobs[job_id] = {"status": "Queued", "results": {}, "error": "", "finished_at": 0, "context": context,
+                         "video_url": video_url}
+
+    def run():
+        with _jobs_lock:
+            _jobs[job_id]["status"] = "Running"
+        try:
+            results = extract_frames(video_path, video_url, timestamps, width)
+            status, error = "Completed", ""
+        except Exception as e:
+            results, status, error = {}, "Failed", str(e)
+        with _jobs_lock:
+            _jobs[job_id].update(status=status, results=results, error=error, finished_at=time.time())
+
+    _job_pool.submit(run)
+    return job_id
+
+
+def get_job(job_id: str, video_url: str):
+    """只返回属于 video_url 的任务，其他视频的 job_id 一律视为不存在"""
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job and job["video_url"] == video_url else None
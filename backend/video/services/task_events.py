@@ -0,0 +1,134 @@
+"""
+In-process task event bus shared by the subtitle / download / export / TTS workers.
+
+Status updaters call publish(kind, task_id) after mutating a task; the bus only
+records "this task changed at version N" and wakes waiting readers. Readers ask
+for everything newer than their cursor and get the *current* state of each
+changed task, so a burst of progress updates collapses into a single entry.
+
+Every request that blocks on the bus (long-poll, SSE, the external status
+long-poll) takes a slot from blocking_waiters first. The cap is derived from
+the gunicorn thread count so at least two threads stay free for normal requests.
+"""
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+# 保留的变更记录上限；游标早于被裁掉的记录时客户端需要重新拉全量
+MAX_TRACKED_CHANGES = 2000
+# gunicorn gthread 线程数：run_all.sh 为 2*nproc+1，可用 GUNICORN_THREADS 覆盖
+WORKER_THREADS = int(os.getenv('GUNICORN_THREADS') or 2 * (os.cpu_count() or 1) + 1)
+# 所有阻塞等待（长轮询 / SSE）共用的名额，名额用完时请求立即返回
+MAX_BLOCKING_WAITERS = max(0, WORKER_THREADS - 2)
+blocking_waiters = threading.BoundedSemaphore(MAX_BLOCKING_WAITERS)
+# 没有锁的状态字典被工作线程并发修改时，深拷贝可能抛 RuntimeError，重试几次
+COPY_RETRIES = 5
+
+_cond = threading.Condition()
+_version = 0
+_floor = 0                       # 已被裁掉的最大版本号
+_changes: "OrderedDict[tuple[str, str], int]" = OrderedDict()  # (kind, task_id) -> version，按版本升序
+_sources: dict = {}              # kind -> (status dict, lock or None)
+
+
+def register_source(kind: str, status: dict, lock=None) -> None:
+    """登记一类任务的状态字典，读取快照时从这里取当前值"""
+    _sources[kind] = (status, lock)
+
+
+def publish(kind: str, task_id) -> int:
+    """记录任务变更并唤醒等待者，返回新的版本号"""
+    global _version, _floor
+    key = (kind, str(task_id))
+    with _cond:
+        _version += 1
+        _changes[key] = _version
+        _changes.move_to_end(key)
+        while len(_changes) > MAX_TRACKED_CHANGES:
+            _, dropped = _changes.popitem(last=False)
+            _floor = dropped
+        _cond.notify_all()
+        return _version
+
+
+def wait_for(predicate, timeout: float) -> bool:
+    """阻塞直到 predicate() 为真（每次 publish 后重新检查）或超时，返回最终结果"""
+    with _cond:
+        return _cond.wait_for(predicate, timeout)
+
+
+def current_version() -> int:
+    with _cond:
+        return _version
+
+
+def _copy(read, lock):
+    """
+    在来源的锁内执行 read()（读取并深拷贝）；没有锁的来源在工作线程并发
+    增删字段时可能抛 RuntimeError（dictionary changed size），重试即可。
+    """
+    if lock is not None:
+        with lock:
+            return read()
+    for attempt in range(COPY_RETRIES):
+        try:
+            return read()
+        except RuntimeError:
+            if attempt == COPY_RETRIES - 1:
+                raise
+
+
+def _read_task(kind: str, task_id: str):
+    """返回任务当前状态的拷贝；任务已删除时返回 None"""
+    status, lock = _sources[kind]
+    keys = (task_id, int(task_id)) if task_id.lstrip('-').isdigit() else (task_id,)
+
+    def read():
+        for key in keys:
+            data = status.get(key)   # 用 get，避免 defaultdict 凭空创建任务
+            if data is not None:
+                return copy.deepcopy(data)
+        return None
+    return _copy(read, lock)
+
+
+def snapshot() -> dict:
+    """所有任务的全量状态，按 kind 分组"""
+    result = {}
+    for kind, (status, lock) in list(_sources.items()):
+        result[kind] = _copy(
+            lambda: {str(tid): copy.deepcopy(data) for tid, data in list(status.items())}, lock
+        )
+    return result
+
+
+def changes_since(cursor: int, timeout: float = 0) -> dict:
+    """
+    取 cursor 之后的变更；没有变更时最多阻塞 timeout 秒。
+
+    Returns:
+        {"version": int, "reset": bool, "events": [{"kind", "task_id", "data"}]}
+        reset 为 True 表示游标过旧（或来自上一次进程），调用方应改用 snapshot()。
+        data 为 None 表示任务已被删除。
+    """
+    with _cond:
+        if cursor > _version or cursor < _floor:
+            return {"version": _version, "reset": True, "events": []}
+        if timeout > 0 and cursor == _version:
+            _cond.wait_for(lambda: _version != cursor, timeout)
+        if cursor > _version:
+            return {"version": _version, "reset": True, "events": []}
+        version = _version
+        changed = []
+        for key, ver in reversed(_changes.items()):
+            if ver <= cursor:
+                break
+            changed.append(key)
+
+    events = [
+        {"kind": kind, "task_id": task_id, "data": _read_task(kind, task_id)}
+        for kind, task_id in reversed(changed)
+        if kind in _sources
+    ]
+    return {"version": version, "reset": False, "events": events}
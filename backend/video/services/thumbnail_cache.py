@@ -0,0 +1,239 @@
+"""
+Disk-backed cache for the remote cover proxy (Bilibili / YouTube CDNs).
+
+Each URL is stored as <sha256>.img plus a <sha256>.json sidecar carrying the
+upstream Content-Type, ETag / Last-Modified and an expiry derived from
+Cache-Control / Expires. Stale entries are revalidated with a conditional GET;
+if the CDN is unreachable the stale copy is still served. Total size is bounded
+with LRU eviction (file mtime is bumped on every hit).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import BinaryIO
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+CACHE_DIR = os.path.join(settings.BASE_DIR, 'work_dir', 'thumbnail_cache')
+MAX_CACHE_BYTES = 256 * 1024 * 1024   # 缓存总大小上限，超出后按 LRU 淘汰到 90%
+MAX_IMAGE_BYTES = 10 * 1024 * 1024    # 单张图片上限，防止代理被当作下载通道
+DEFAULT_TTL = 24 * 3600               # 上游未给出缓存策略时的默认有效期
+CHUNK_SIZE = 64 * 1024
+REQUEST_TIMEOUT = (3.0, 5.0)          # (连接超时, 读取超时)
+UPSTREAM_HEADERS = {"Referer": "https://www.bilibili.com"}
+
+_session = None
+_session_lock = threading.Lock()
+_key_locks: dict = {}                 # key -> 锁；条目被淘汰时一并删除
+_key_locks_guard = threading.Lock()
+_cache_bytes = None                   # 惰性统计的缓存总大小
+_size_lock = threading.Lock()
+
+
+class UpstreamError(Exception):
+    """上游取图失败；status 为需要返回给前端的状态码"""
+
+    def __init__(self, status: int):
+        super().__init__(f"upstream status {status}")
+        self.status = status
+
+
+def _get_session() -> requests.Session:
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update(UPSTREAM_HEADERS)
+            _session = session
+        return _session
+
+
+def _key_lock(key: str) -> threading.Lock:
+    with _key_locks_guard:
+        lock = _key_locks.get(key)
+        if lock is None:
+            lock = _key_locks[key] = threading.Lock()
+        return lock
+
+
+@contextmanager
+def _locked(key: str):
+    """持有 key 锁；拿到的锁已被淘汰移出 _key_locks 时换新锁重试"""
+    while True:
+        lock = _key_lock(key)
+        lock.acquire()
+        with _key_locks_guard:
+            if _key_locks.get(key) is lock:
+                break
+        lock.release()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def _paths(key: str) -> tuple[str, str]:
+    return os.path.join(CACHE_DIR, f"{key}.img"), os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _read_meta(meta_path: str):
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(meta_path: str, meta: dict) -> None:
+    tmp = meta_path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp, meta_path)
+
+
+def _expires_at(headers) -> float:
+    """从 Cache-Control max-age / Expires 推算过期时间"""
+    now = time.time()
+    cache_control = headers.get('Cache-Control', '')
+    for part in cache_control.split(','):
+        part = part.strip().lower()
+        if part in ('no-store', 'no-cache'):
+            return now
+        if part.startswith('max-age='):
+            try:
+                return now + int(part.split('=', 1)[1])
+            except ValueError:
+                break
+    expires = headers.get('Expires')
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return now + DEFAULT_TTL
+
+
+def _track_size(delta: int) -> None:
+    """
+    更新缓存总大小，超过上限时淘汰最久未访问的条目。
+    淘汰时持有条目的 key 锁（非阻塞获取，正在读写的条目跳过），删除后移除其锁。
+    """
+    global _cache_bytes
+    with _size_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(
+                entry.stat().st_size for entry in os.scandir(CACHE_DIR) if entry.name.endswith('.img')
+            )
+        else:
+            _cache_bytes += delta
+        if _cache_bytes <= MAX_CACHE_BYTES:
+            return
+
+        entries = sorted(
+            (entry for entry in os.scandir(CACHE_DIR) if entry.name.endswith('.img')),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        target = int(MAX_CACHE_BYTES * 0.9)
+        for entry in entries:
+            if _cache_bytes <= target:
+                break
+            key = entry.name[:-len('.img')]
+            lock = _key_lock(key)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    continue
+                for path in _paths(key):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                with _key_locks_guard:
+                    _key_locks.pop(key, None)
+            finally:
+                lock.release()
+            _cache_bytes -= size
+
+
+def _download(url: str, img_path: str, meta: dict = None) -> dict:
+    """
+    拉取（或用 ETag/Last-Modified 重新验证）上游图片，流式写入缓存文件。
+    返回新的 meta；上游 304 时沿用旧文件。
+    """
+    headers = {}
+    if meta:
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    with _get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True) as resp:
+        if resp.status_code == 304 and meta:
+            return {**meta, 'expires_at': _expires_at(resp.headers)}
+        if resp.status_code != 200:
+            raise UpstreamError(resp.status_code)
+
+        old_size = os.path.getsize(img_path) if os.path.exists(img_path) else 0
+        tmp = img_path + '.part'
+        size = 0
+        try:
+            with open(tmp, 'wb') as f:
+                for chunk in resp.iter_content(CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_IMAGE_BYTES:
+                        raise UpstreamError(502)
+                    f.write(chunk)
+            os.replace(tmp, img_path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        _track_size(size - old_size)
+        return {
+            'url': url,
+            'content_type': resp.headers.get('Content-Type', 'image/jpeg'),
+            'etag': resp.headers.get('ETag', ''),
+            'last_modified': resp.headers.get('Last-Modified', ''),
+            'expires_at': _expires_at(resp.headers),
+            'size': size,
+        }
+
+
+def get_cached_thumbnail(url: str) -> tuple[BinaryIO, dict]:
+    """
+    返回 (已打开的缓存文件, meta)，调用方负责关闭文件。meta['etag'] 为空时调用方可用 meta['key'] 生成 ETag。
+    文件在持有 key 锁时打开，之后即使条目被淘汰删除也能读完。
+    上游失败且没有任何缓存时抛出 UpstreamError / requests.RequestException。
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    img_path, meta_path = _paths(key)
+
+    with _locked(key):
+        meta = _read_meta(meta_path) if os.path.exists(img_path) else None
+        if meta is None or meta.get('expires_at', 0) <= time.time():
+            try:
+                meta = _download(url, img_path, meta)
+                _write_meta(meta_path, meta)
+            except (UpstreamError, requests.RequestException):
+                # CDN 不可用时继续提供过期副本
+                if meta is None:
+                    raise
+        try:
+            os.utime(img_path)   # LRU：记录最近访问时间
+        except OSError:
+            pass
+        img_file = open(img_path, 'rb')
+    return img_file, {**meta, 'key': key}
@@ -0,0 +1,120 @@
+"""
+Trickplay (seek preview) sprite sheets.
+
+For each video one ffmpeg pass samples a frame every N seconds, scales it to a
+small tile and packs the tiles into JPEG mosaics. A WebVTT index maps every time
+range to a tile (`sprite_000.jpg#xywh=x,y,w,h`), so the player needs one static
+fetch per sheet instead of an ffmpeg round trip per hover.
+
+Output: MEDIA_ROOT/trickplay/<video file stem>/index.vtt + sprite_NNN.jpg
+"""
+import math
+import os
+import shutil
+import subprocess
+
+from django.conf import settings
+
+TRICKPLAY_SUBDIR = 'trickplay'
+TILE_WIDTH = 160
+TILE_COLUMNS = 10
+TILE_ROWS = 10
+# 单个视频最多生成的缩略图数量；短视频按 MIN_INTERVAL 取样，长视频拉大间隔
+MAX_TILES = 400
+MIN_INTERVAL = 2
+
+
+def trickplay_dir(video_url: str) -> str:
+    stem = os.path.splitext(os.path.basename(video_url))[0]
+    return os.path.join(settings.MEDIA_ROOT, TRICKPLAY_SUBDIR, stem)
+
+
+def trickplay_vtt_url(video_url: str) -> str:
+    stem = os.path.splitext(os.path.basename(video_url))[0]
+    return f"/media/{TRICKPLAY_SUBDIR}/{stem}/index.vtt"
+
+
+def has_trickplay(video_url: str) -> bool:
+    return os.path.exists(os.path.join(trickplay_dir(video_url), 'index.vtt'))
+
+
+def choose_interval(duration: float) -> int:
+    """按时长选择取样间隔（秒），使缩略图数量不超过 MAX_TILES"""
+    return max(MIN_INTERVAL, math.ceil(duration / MAX_TILES))
+
+
+def _format_vtt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    secs, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{ms:03d}"
+
+
+def build_vtt(duration: float, interval: int, tile_width: int, tile_height: int) -> str:
+    per_sheet = TILE_COLUMNS * TILE_ROWS
+    tiles = max(1, math.ceil(duration / interval))
+    lines = ['WEBVTT', '']
+    for i in range(tiles):
+        start = i * interval
+        end = min((i + 1) * interval, duration)
+        sheet, pos = divmod(i, per_sheet)
+        x = (pos % TILE_COLUMNS) * tile_width
+        y = (pos // TILE_COLUMNS) * tile_height
+        lines.append(f"{_format_vtt_time(start)} --> {_format_vtt_time(end)}")
+        lines.append(f"sprite_{sheet:03d}.jpg#xywh={x},{y},{tile_width},{tile_height}")
+        lines.append('')
+    return '\n'.join(lines)
+
+
+def _probe(video_path: str) -> tuple[float, int, int]:
+    """返回 (时长, 宽, 高)"""
+    cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+           '-show_entries', 'stream=width,height:format=duration', '-of', 'csv=p=0:s=x', video_path]
+    res = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+    if res.returncode != 0:
+        raise RuntimeError(res.stderr or 'ffprobe failed')
+    lines = [line.strip() for line in res.stdout.splitlines() if line.strip()]
+    width, height = (int(v) for v in lines[0].split('x')[:2])
+    duration = float(lines[-1])
+    return duration, width, height
+
+
+def generate_trickplay(video_path: str, video_url: str) -> tuple[bool, str]:
+    """
+    Generate sprite sheets and index.vtt for one video.
+    Returns: (success, error_or_empty)
+    """
+    if not os.path.exists(video_path):
+        return False, 'not found'
+    try:
+        duration, width, height = _probe(video_path)
+    except Exception as e:
+        return False, str(e)
+    if duration <= 0 or not width or not height:
+        return False, 'no video stream'
+
+    tile_height = max(2, int(round(TILE_WIDTH * height / width / 2)) * 2)
+    interval = choose_interval(duration)
+
+    out = trickplay_dir(video_url)
+    tmp = out + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp, exist_ok=True)
+    # 只解码关键帧：预览图对精度要求不高，长视频也能很快完成
+    cmd = ['ffmpeg', '-v', 'error', '-skip_frame', 'nokey', '-i', video_path, '-an', '-sn',
+           '-vf', f'fps=1/{interval},scale={TILE_WIDTH}:{tile_height},tile={TILE_COLUMNS}x{TILE_ROWS}',
+           '-q:v', '5', '-start_number', '0', '-y', os.path.join(tmp, 'sprite_%03d.jpg')]
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)
+        if res.returncode != 0:
+            raise RuntimeError(res.stderr or f'ffmpeg exited with {res.returncode}')
+        with open(os.path.join(tmp, 'index.vtt'), 'w', encoding='utf-8') as f:
+            f.write(build_vtt(duration, interval, TILE_WIDTH, tile_height))
+        # 生成完整后再替换，避免播放器读到半成品
+        shutil.rmtree(out, ignore_errors=True)
+        os.replace(tmp, out)
+        return True, ''
+    except Exception as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        return False, str(e)
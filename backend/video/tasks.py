@@ -1,15 +1,20 @@
 from django.views import View
 import os, time
+import threading
+from contextlib import contextmanager
 from queue import Queue, Empty
 from collections import defaultdict
 from django.http import JsonResponse
 from django.db import transaction
+from django.utils import timezone
 from .models import Video
 from utils.split_subtitle.main import optimise_srt
+from utils.llm_async import LLMCancelled
 from django.conf import settings  # 确保这个在顶部
 import hashlib
 from .views.set_setting import load_all_settings
 from utils.wsr.transcription_engine import transcribe_with_engine
+from .services import task_events, metadata_cache, audio_artifacts
 """
 该文件用于定义和 存储项目的 所有task，
 包括字幕撰写/翻译；
@@ -27,12 +32,18 @@ from utils.wsr.transcription_engine import transcribe_with_engine
 """
 
 subtitle_task_queue: Queue[str] = Queue()  # 改为 str 类型，支持 video_id 和 external_task_id
+# 外部转录任务单独排队：有界队列，内部任务优先出队，避免远程请求挤占本地字幕任务
+EXTERNAL_QUEUE_MAXSIZE = 32            # 外部队列上限，满时返回 429
+EXTERNAL_PER_CLIENT_LIMIT = 4          # 每个客户端同时排队/运行的任务上限
+EXTERNAL_RETRY_AFTER = 30              # 429 响应中 Retry-After 秒数
+EXTERNAL_MIN_FREE_BYTES = 2 * 1024 ** 3  # work_dir 剩余空间低于 2GB 时拒绝新任务
+EXTERNAL_TASK_TTL = 3600               # 已完成/失败的外部任务保留 1 小时后自动清理
+external_task_queue: Queue[str] = Queue(maxsize=EXTERNAL_QUEUE_MAXSIZE)
 download_queue: Queue[int] = Queue()
 tts_queue: Queue[str] = Queue()  # TTS任务队列
 SAVE_DIR = 'media/saved_srt'
 
 # 线程锁保护 download_status 的并发访问
-import threading
 download_status_lock = threading.RLock()
 
 # 外部转录任务状态跟踪
@@ -43,9 +54,14 @@ external_task_status = defaultdict(lambda: {
     "task_type": "external",  # 标识为外部任务
     "created_at": 0,
     "status": "Queued",  # 队列中、运行中、已完成、失败
+    "progress": 0,  # 转录进度百分比 (0-100)，供远程调用方透传
+    "client": "",  # 提交方地址，用于按客户端限额
     "result_file": "",
     "error_message": "",
+    "finished_at": 0,  # 完成/失败时间，用于 TTL 清理
 })
+external_task_lock = threading.RLock()
+task_events.register_source("external", external_task_status, external_task_lock)
 
 # 🆕 实时字幕流状态跟踪（sentence-by-sentence）
 realtime_subtitle_status = defaultdict(lambda: {
@@ -161,68 +177,32 @@ def _update(video_id: int, stage: str, status: str, progress: int = None, detail
         for s in task["stage_progress"]
     )
     task["total_progress"] = round(total, 1)
+    task_events.publish("subtitle", video_id)
 
+@contextmanager
 def preprocess_audio_for_transcription(video_id):
     """
-    预处理音频文件：转换为单声道MP3格式，优化转录效果
-    返回: preprocessed_audio_path (string)
+    预处理音频文件：16kHz 单声道 MP3，优化转录效果并控制上传体积
+    产物由 audio_artifacts 按源文件缓存，由波形峰值共用的 PCM 解码编码而来；
+    with 块内持有引用，转录期间不会被淘汰。
+    产出: preprocessed_audio_path (string)
     """
-    import subprocess
-    import os
-    from .views.videos import get_transcription_audio_path
-    
-    # 获取原始音频文件路径
-    original_audio_path = get_transcription_audio_path(video_id)
-    
-    # 创建临时音频目录
-    temp_audio_dir = 'work_dir/temp_audio'
-    os.makedirs(temp_audio_dir, exist_ok=True)
-    
-    # 生成预处理后的音频文件路径
-    preprocessed_audio_path = os.path.join(temp_audio_dir, f"{video_id}.mp3")
-    
-    # 检查是否已经存在预处理后的文件
-    if os.path.exists(preprocessed_audio_path):
-        print(f"Preprocessed audio already exists: {preprocessed_audio_path}")
-        return preprocessed_audio_path
-    
-    print(f"Preprocessing audio: {original_audio_path} -> {preprocessed_audio_path}")
-    
-    # 使用FFmpeg转换为单声道MP3格式
-    ffmpeg_cmd = [
-        'ffmpeg',
-        '-i', original_audio_path,
-        '-ac', '1',          # 转换为单声道
-        '-ar', '16000',      # 设置采样率为16kHz (Whisper推荐)
-        '-ab', '128k',       # 音频比特率128k (平衡质量和大小)
-        '-acodec', 'mp3',    # 使用MP3编码器
-        '-y',                # 覆盖输出文件
-        preprocessed_audio_path
-    ]
-    
-    try:
-        print(f"FFmpeg command: {' '.join(ffmpeg_cmd)}")
-        result = subprocess.run(
-            ffmpeg_cmd,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5分钟超时
-        )
-        
-        if result.returncode == 0 and os.path.exists(preprocessed_audio_path):
-            audio_size = os.path.getsize(preprocessed_audio_path)
-            print(f"Audio preprocessing successful: {preprocessed_audio_path} ({audio_size} bytes)")
-            return preprocessed_audio_path
-        else:
-            print(f"FFmpeg preprocessing failed: {result.stderr}")
-            raise Exception(f"Audio preprocessing failed: {result.stderr}")
-    
-    except subprocess.TimeoutExpired:
-        raise Exception("Audio preprocessing timed out")
-    except Exception as e:
-        raise Exception(f"Audio preprocessing error: {str(e)}")
+    from .services.audio_processing import get_video_file_paths
+
+    _, source_path, _ = get_video_file_paths(video_id)
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"Media file not found: {source_path}")
+
+    with audio_artifacts.acquire(source_path) as artifacts:
+        print(f"Preprocessing audio: {source_path}")
+        try:
+            preprocessed_audio_path = artifacts.asr_audio()
+        except Exception as e:
+            raise Exception(f"Audio preprocessing error: {str(e)}")
+        print(f"Audio preprocessing ready: {preprocessed_audio_path} ({os.path.getsize(preprocessed_audio_path)} bytes)")
+        yield preprocessed_audio_path
 
-def handle_translation_only(video_id: int, video, src_lang: str, trans_lang: str, emphasize_dst: str = "") -> None:
+def handle_translation_only(video_id: int, video, src_lang: str, trans_lang: str, emphasize_dst: str = "", cancel_check=None) -> None:
     """处理仅翻译模式的字幕任务"""
     try:
         # 获取视频的原始语言，如果没有设置则使用src_lang
@@ -265,6 +245,7 @@ def handle_translation_only(video_id: int, video, src_lang: str, trans_lang: str
             num_threads=FIXED_NUM_THREADS,
             progress_cb=lambda status: _update(video_id, "translate", status),
             terms_to_note=emphasize_dst,
+            cancel_check=cancel_check,
         )
         _update(video_id, "translate", "Completed")
         
@@ -275,6 +256,8 @@ def handle_translation_only(video_id: int, video, src_lang: str, trans_lang: str
         
         print(f"Translation completed for video {video_id}: {original_lang} -> {trans_lang}")
         
+    except LLMCancelled:
+        print(f"Translation-only cancelled for video {video_id}: task deleted")
     except Exception as exc:
         print(f"Translation-only failed for video {video_id}: {exc}")
         _update(video_id, "translate", "Failed")
@@ -282,10 +265,18 @@ def handle_translation_only(video_id: int, video, src_lang: str, trans_lang: str
 
 def generate_external_transcription(task_id: str) -> None:
     """处理外部转录任务，只输出字级时间戳字幕"""
+    if task_id not in external_task_status:
+        # 排队期间已被删除或清理
+        return
     task = external_task_status[task_id]
-    
+
+    def update(**fields):
+        # 状态接口的长轮询在任务事件总线上等待
+        task.update(fields)
+        task_events.publish("external", task_id)
+
     try:
-        task["status"] = "Running"
+        update(status="Running")
         audio_file_path = task["audio_file_path"]
         
         print(f"Starting external transcription for task {task_id}: {task['filename']}")
@@ -293,8 +284,12 @@ def generate_external_transcription(task_id: str) -> None:
         # 外部转录任务强制使用本地faster_whisper引擎，避免递归调用
         from utils.wsr.fast_wsr import transcribe_audio
         
-        # 状态更新回调
+        # 状态更新回调：整数进度记录下来，供远程调用方通过状态接口读取
         def progress_cb(status):
+            if isinstance(status, (int, float)):
+                progress = min(100, max(0, int(status)))
+                if progress != task["progress"]:
+                    update(progress=progress)
             print(f"External task {task_id} progress: {status}")
         
         # 直接使用本地faster_whisper引擎执行转录
@@ -310,15 +305,65 @@ def generate_external_transcription(task_id: str) -> None:
             f.write(srt_content)
         
         # 更新任务状态
-        task["status"] = "Completed"
-        task["result_file"] = result_file
+        update(status="Completed", progress=100, result_file=result_file, finished_at=int(time.time()))
         
         print(f"External transcription completed for task {task_id}")
         
     except Exception as exc:
         print(f"External transcription failed for task {task_id}: {exc}")
-        task["status"] = "Failed"
-        task["error_message"] = str(exc)
+        update(status="Failed", error_message=str(exc), finished_at=int(time.time()))
+    finally:
+        # 音频只在转录时需要，结束后立即释放磁盘
+        audio_file_path = task.get("audio_file_path")
+        if audio_file_path and os.path.exists(audio_file_path):
+            try:
+                os.remove(audio_file_path)
+            except OSError:
+                pass
+
+
+def count_active_external_tasks(client: str) -> int:
+    """统计某个客户端处于排队/运行中的外部任务数"""
+    with external_task_lock:
+        return sum(
+            1 for t in external_task_status.values()
+            if t["client"] == client and t["status"] in ("Queued", "Running")
+        )
+
+
+_last_external_purge = 0.0
+
+
+def purge_expired_external_tasks(force: bool = False) -> int:
+    """
+    清理超过 TTL 的已完成/失败外部任务及其音频、结果文件。
+    非强制调用时最多每分钟执行一次。返回清理的任务数。
+    """
+    global _last_external_purge
+    now = time.time()
+    with external_task_lock:
+        if not force and now - _last_external_purge < 60:
+            return 0
+        _last_external_purge = now
+
+        expired = [
+            task_id for task_id, t in external_task_status.items()
+            if t["status"] in ("Completed", "Failed")
+            and t["finished_at"] and now - t["finished_at"] > EXTERNAL_TASK_TTL
+        ]
+        for task_id in expired:
+            task = external_task_status.pop(task_id)
+            task_events.publish("external", task_id)
+            for path in (task.get("audio_file_path"), task.get("result_file")):
+                if path and os.path.exists(path):
+                    try:
+                        os.remove(path)
+                    except OSError as e:
+                        print(f"Error purging file {path} for task {task_id}: {e}")
+
+    if expired:
+        print(f"Purged {len(expired)} expired external transcription tasks")
+    return len(expired)
 
 def generate_subtitles_for_video(video_id: int) -> None:
     """内部字幕生成，字幕生成中真正干活的函数,也是每个video_id的Task在做的事"""
@@ -334,6 +379,10 @@ def generate_subtitles_for_video(video_id: int) -> None:
         raise Exception('Video not found')
     video_path = video.url  
 
+    def cancelled() -> bool:
+        # 任务被删除（或被重试替换）后，取消尚未完成的 LLM 请求
+        return subtitle_task_status.get(video_id) is not task
+
     # 检查是否为仅翻译模式
     if translation_only:
         print(f"Translation-only mode for video {video_id}")
@@ -342,7 +391,7 @@ def generate_subtitles_for_video(video_id: int) -> None:
         _update(video_id, "optimize", "Skipped")
         
         # 执行翻译
-        handle_translation_only(video_id, video, src_lang, trans_lang, emphasize_dst)
+        handle_translation_only(video_id, video, src_lang, trans_lang, emphasize_dst, cancel_check=cancelled)
         return
 
     # 1. 音频转录阶段
@@ -377,10 +426,6 @@ def generate_subtitles_for_video(video_id: int) -> None:
     try:
         _update(video_id, "transcribe", "Running")
         
-        # 预处理音频文件：转换为单声道MP3格式
-        preprocessed_audio_path = preprocess_audio_for_transcription(video_id)
-        print(f"Transcribing preprocessed audio file: {preprocessed_audio_path}")
-        
         # 使用统一的转录引擎接口
         from utils.wsr.transcription_engine import transcribe_with_engine, load_transcription_settings
         
@@ -395,14 +440,17 @@ def generate_subtitles_for_video(video_id: int) -> None:
         if fallback_engine and fallback_engine != primary_engine:
             print(f"Fallback engine configured: {fallback_engine}")
         
-        # 执行转录（包含自动fallback机制）
-        srt_content = transcribe_with_engine(
-            engine_type=primary_engine,
-            audio_file_path=preprocessed_audio_path,
-            progress_cb=transcribe_cb,
-            fallback_engine=fallback_engine,
-            language=src_lang  # 传递用户指定的源语言
-        )
+        # 预处理音频文件：16kHz 单声道 MP3（由波形共用的 PCM 解码编码而来）
+        with preprocess_audio_for_transcription(video_id) as preprocessed_audio_path:
+            print(f"Transcribing preprocessed audio file: {preprocessed_audio_path}")
+            # 执行转录（包含自动fallback机制）
+            srt_content = transcribe_with_engine(
+                engine_type=primary_engine,
+                audio_file_path=preprocessed_audio_path,
+                progress_cb=transcribe_cb,
+                fallback_engine=fallback_engine,
+                language=src_lang  # 传递用户指定的源语言
+            )
         timestamp=int(time.time()*1000)
         os.makedirs('work_dir/temp', exist_ok=True)
         # Debug: Check SRT content encoding before writing
@@ -458,6 +506,7 @@ def generate_subtitles_for_video(video_id: int) -> None:
             save_path=original_srt_path,  # 保存优化后的原文字幕
             num_threads=FIXED_NUM_THREADS,
             progress_cb=optimize_progress_cb,  # 🆕 使用支持进度的回调
+            cancel_check=cancelled,
         )
         _update(video_id, "optimize", "Completed")
         
@@ -486,11 +535,15 @@ def generate_subtitles_for_video(video_id: int) -> None:
                 use_translation_cache=True,
                 num_threads=FIXED_NUM_THREADS,  # 使用多线程翻译
                 progress_cb=translate_progress_cb,  # 🆕 使用支持进度的回调
+                cancel_check=cancelled,
             )
             _update(video_id, "translate", "Completed")
         else:
             _update(video_id, "translate", "Completed")
             
+    except LLMCancelled:
+        print(f"字幕任务 {video_id} 已删除，取消处理")
+        return
     except Exception as exc:
         print(f"字幕处理失败: {exc}")
         _update(video_id, "optimize", "Failed")
@@ -511,11 +564,18 @@ def generate_subtitles_for_video(video_id: int) -> None:
 如果启用了SSL，并使用域名，则无需填写端口号。
 """
 def process_next_task() -> None:
-    """被后台线程循环调用，逐个执行"""
+    """被后台线程循环调用，逐个执行；内部任务优先于外部任务"""
+    purge_expired_external_tasks()
+
+    queue = subtitle_task_queue
     try:
-        task_identifier = subtitle_task_queue.get_nowait()
+        task_identifier = queue.get_nowait()
     except Empty:
-        return
+        queue = external_task_queue
+        try:
+            task_identifier = queue.get_nowait()
+        except Empty:
+            return
 
     try:
         # 判断是内部任务还是外部任务
@@ -527,13 +587,12 @@ def process_next_task() -> None:
             video_id = int(task_identifier)
             generate_subtitles_for_video(video_id)
     finally:
-        subtitle_task_queue.task_done()
+        queue.task_done()
 
 class SubtitleTaskStatusView(View):
     http_method_names = ["get"]
 
     def get(self, request, *args, **kwargs):
-        print(subtitle_task_status)
         return JsonResponse(subtitle_task_status, safe=False)
 
 
@@ -594,6 +653,12 @@ export_task_status = defaultdict(lambda: {
     "error_message": "",
 })
 
+# 登记到任务事件总线，前端通过 /api/tasks/events 增量获取变更
+task_events.register_source("subtitle", subtitle_task_status)
+task_events.register_source("download", download_status, download_status_lock)
+task_events.register_source("export", export_task_status)
+task_events.register_source("tts", tts_task_status)
+
 
 def dl_set(task_id: str, stage: str, status: str, progress: int = None):
     """
@@ -630,13 +695,16 @@ def dl_set(task_id: str, stage: str, status: str, progress: int = None):
         task["finished"] = all(
             s == "Completed" for s in task["stages"].values()
         )
+    task_events.publish("download", task_id)
 
 from utils.stream_downloader.bili_download import get_direct_media_link,download_file_with_progress,merge_audio_video,get_video_info
 from utils.stream_downloader.youtube_download import YouTubeDownloader
 from .utils import format_duration
 from utils.video_converter import VideoConverter
 import requests
+import copy
 from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadError, ReExtractInfo
 
 def download_thumbnail(thumbnail_url: str, md5_value: str) -> str:
     """下载缩略图并保存到本地，返回保存的文件路径"""
@@ -695,9 +763,10 @@ def download_youtube_video(task_id: str):
     
     downloader = YouTubeDownloader()
     
-    # 获取视频信息包括缩略图
+    # 获取视频信息包括缩略图（预览时已解析过的 info 直接复用）
     try:
-        video_info = downloader.get_video_info(url)
+        info_dict = metadata_cache.youtube_info(url)
+        video_info = downloader.get_video_info(url, info_dict=info_dict) if info_dict else None
         if not video_info:
             dl_set(task_id, "video", "Failed")
             return
@@ -717,7 +786,11 @@ def download_youtube_video(task_id: str):
     try:
         # 下载视频到临时目录
         dl_set(task_id, "video", "Running")
-        output_path = downloader.download_video(url, work_dir)
+        output_path = downloader.download_video(url, work_dir, info_dict=info_dict)
+        if not output_path or not os.path.exists(output_path):
+            # 缓存的直链可能已失效，丢弃缓存后按 URL 重新解析下载一次
+            metadata_cache.invalidate(metadata_cache.youtube_key(url))
+            output_path = downloader.download_video(url, work_dir)
         if not output_path or not os.path.exists(output_path):
             dl_set(task_id, "video", "Failed")
             return
@@ -758,13 +831,14 @@ def download_youtube_video(task_id: str):
         formatted_duration = format_duration(duration_seconds) if duration_seconds > 0 else None
         
         # 保存到Video数据库中
-        Video.objects.create(
+        new_video = Video.objects.create(
             name=title,
             url=f"{md5_value}.mp4",
             thumbnail_url=thumbnail_filename,
             video_length=formatted_duration,
             category=None,  # 临时分类，后续可以修改
         )
+        enqueue_trickplay(new_video.id)
         print(f"YouTube video created with thumbnail: {thumbnail_filename}, duration: {formatted_duration}")
         
     except Exception as e:
@@ -797,7 +871,7 @@ def download_bilibili_video(task_id: str):
     
     # 获取视频基本信息，包括缩略图URL和时长
     try:
-        video_info = get_video_info(bvid=bvid)
+        video_info = metadata_cache.bili_video_info(bvid=bvid)['info']
         thumbnail_url = video_info.get('pic_url', '')
         duration_seconds = video_info.get('duration', 0)
         print(f"Thumbnail URL: {thumbnail_url}")
@@ -911,13 +985,14 @@ def download_bilibili_video(task_id: str):
     
     # 处理流程完成后不需要再次设置merge状态
     # 保存到Video数据库中
-    Video.objects.create(
+    new_video = Video.objects.create(
         name=title,
         url=f"{md5_value}.mp4",
         thumbnail_url=thumbnail_filename,  # 保存缩略图文件名
         video_length=formatted_duration,   # 保存视频时长
         category=None,     # temperaryly no,Can be set later
     )
+    enqueue_trickplay(new_video.id)
     print(f"Video created with thumbnail: {thumbnail_filename}, duration: {formatted_duration}")
 
 def download_podcast_audio(task_id: str):
@@ -942,10 +1017,8 @@ def download_podcast_audio(task_id: str):
             'writeinfojson': False,  # 不保存元数据
         }
         
-        # 获取音频信息包括缩略图
-        info = None
-        with YoutubeDL({'quiet': True, 'no_download': True}) as ydl:
-            info = ydl.extract_info(url, download=False)
+        # 获取音频信息包括缩略图（预览时已解析过的 info 直接复用）
+        info = metadata_cache.podcast_info(url)
         
         if not info:
             dl_set(task_id, "video", "Failed")
@@ -954,9 +1027,15 @@ def download_podcast_audio(task_id: str):
         thumbnail_url = info.get('thumbnail', '')
         duration_seconds = info.get('duration', 0)
         
-        # 下载音频文件
+        # 下载音频文件：用缓存的 info 重新选择格式后下载，不再重复解析
         with YoutubeDL(ydl_opts) as ydl:
-            ydl.download([url])
+            try:
+                ydl.process_ie_result(copy.deepcopy(info), download=True)
+            except (DownloadError, ReExtractInfo) as e:
+                # 直链过期等情况，退回到按 URL 重新解析下载
+                print(f"Cached podcast info failed to download: {e}; retrying with URL")
+                metadata_cache.invalidate(metadata_cache.podcast_key(url))
+                ydl.download([url])
         
         # 查找下载的音频文件
         downloaded_files = [f for f in os.listdir(work_dir) if f.endswith(('.m4a', '.mp3'))]
@@ -1063,6 +1142,7 @@ def export_update_status(task_id: str, status: str, progress: int = 0, error_mes
     export_task_status[task_id]["progress"] = progress
     if error_message:
         export_task_status[task_id]["error_message"] = error_message
+    task_events.publish("export", task_id)
 
 def get_video_bitrate(video_path: str) -> str:
     """使用 ffprobe 获取视频比特率"""
@@ -1450,6 +1530,11 @@ def process_export_task() -> None:
     finally:
         export_queue.task_done()
 
+def tts_update_status(task_id: str, **fields):
+    """更新TTS任务字段并通知任务事件总线"""
+    tts_task_status[task_id].update(fields)
+    task_events.publish("tts", task_id)
+
 def generate_tts_audio(task_id: str) -> None:
     """
     TTS配音生成任务处理函数
@@ -1459,8 +1544,7 @@ def generate_tts_audio(task_id: str) -> None:
     task = tts_task_status[task_id]
 
     try:
-        task["status"] = "Running"
-        task["progress"] = 5
+        tts_update_status(task_id, status="Running", progress=5)
 
         video_id = task["video_id"]
         language = task["language"]
@@ -1477,7 +1561,7 @@ def generate_tts_audio(task_id: str) -> None:
         print(f"[TTS] SRT file: {srt_path}, Voice: {voice}")
 
         # 获取API密钥和配置
-        from .views.set_setting import load_all_settings
+        from .views.set_setting import get_float_setting, get_int_setting, load_all_settings
         settings_data = load_all_settings()
         tts_settings = settings_data.get('TTS settings', {})
 
@@ -1486,13 +1570,13 @@ def generate_tts_audio(task_id: str) -> None:
             raise ValueError("DashScope API key not configured")
 
         # 加载TTS配置参数
-        max_retries = int(tts_settings.get('max_retries', '5'))
+        max_retries = get_int_setting('TTS settings', 'max_retries', 5)
         enable_checkpointing = tts_settings.get('enable_checkpointing', 'true').lower() == 'true'
 
         # Time-stretch configuration
         time_stretch_algorithm = tts_settings.get('time_stretch_algorithm', 'librosa')
         time_stretch_quality = tts_settings.get('time_stretch_quality', 'high')
-        max_compression_ratio = float(tts_settings.get('max_compression_ratio', '2.0'))
+        max_compression_ratio = get_float_setting('TTS settings', 'max_compression_ratio', 2.0)
 
         print(f"[TTS] Config: max_retries={max_retries}, checkpointing={enable_checkpointing}")
         print(f"[TTS] Time-stretch: algorithm={time_stretch_algorithm}, quality={time_stretch_quality}, max_ratio={max_compression_ratio}")
@@ -1506,11 +1590,9 @@ def generate_tts_audio(task_id: str) -> None:
 
         # 进度回调
         def progress_callback(completed: int, total: int):
-            task["total_segments"] = total
-            task["completed_segments"] = completed
             # 进度从5%到85%（留15%给视频合成）
             progress = 5 + int((completed / total) * 80)
-            task["progress"] = progress
+            tts_update_status(task_id, total_segments=total, completed_segments=completed, progress=progress)
             print(f"[TTS] Progress: {completed}/{total} segments ({progress}%)")
 
         # 调用TTS生成器（带重试和检查点支持）
@@ -1521,7 +1603,7 @@ def generate_tts_audio(task_id: str) -> None:
         audio_reference_url = task.get("audio_reference_url", None)
         reference_text = task.get("reference_text", None)
 
-        task["progress"] = 10
+        tts_update_status(task_id, progress=10)
         segment_count, duration_ms = synthesize_audio_from_srt(
             srt_path=srt_path,
             output_wav=temp_audio_path,
@@ -1539,7 +1621,7 @@ def generate_tts_audio(task_id: str) -> None:
         )
 
         print(f"[TTS] Audio generation completed: {segment_count} segments, {duration_ms}ms")
-        task["progress"] = 85
+        tts_update_status(task_id, progress=85)
 
         # 获取原视频
         video = Video.objects.get(pk=video_id)
@@ -1576,7 +1658,7 @@ def generate_tts_audio(task_id: str) -> None:
         ]
 
         print(f"[TTS] Merging audio with video: {' '.join(ffmpeg_cmd)}")
-        task["progress"] = 90
+        tts_update_status(task_id, progress=90)
 
         result = subprocess.run(
             ffmpeg_cmd,
@@ -1599,17 +1681,14 @@ def generate_tts_audio(task_id: str) -> None:
             pass
 
         # 更新任务状态
-        task["status"] = "Completed"
-        task["progress"] = 100
-        task["output_file"] = output_filename
+        tts_update_status(task_id, status="Completed", progress=100, output_file=output_filename)
 
         print(f"[TTS] Task completed: {task_id}, output: {output_filename}")
 
     except Exception as exc:
         error_msg = str(exc)
         print(f"[TTS] Task failed: {task_id}, error: {error_msg}")
-        task["status"] = "Failed"
-        task["error_message"] = error_msg
+        tts_update_status(task_id, status="Failed", error_message=error_msg)
 
 def process_tts_task() -> None:
     """被后台线程循环调用处理TTS任务"""
@@ -1621,4 +1700,292 @@ def process_tts_task() -> None:
     try:
         generate_tts_audio(task_id)
     finally:
-        tts_queue.task_done()
\ No newline at end of file
+        tts_queue.task_done()
+
+"""
+HLS 打包流程：
+
+按需把视频封装/转码为 HLS，输出到 MEDIA_ROOT/stream_video/{文件名}/index.m3u8
+单码率：兼容编码直接封装，否则转码为 H264/AAC
+多码率：按 HLS_LADDER 转码（不超过原始分辨率），index.m3u8 为 master playlist
+完成后把 playlist 路径写入 Video.hls_path
+"""
+
+hls_queue: Queue[int] = Queue()
+hls_task_status = defaultdict(lambda: {
+    "video_id": 0,
+    "video_name": "",
+    "ladder": False,      # 是否生成多码率
+    "status": "Queued",   # Queued/Running/Completed/Failed
+    "progress": 0,        # ffmpeg 实际处理时长 / 视频总时长
+    "hls_path": "",
+    "error_message": "",
+})
+task_events.register_source("hls", hls_task_status)
+
+
+def hls_update_status(video_id: int, **fields):
+    """更新HLS任务字段并通知任务事件总线"""
+    hls_task_status[video_id].update(fields)
+    task_events.publish("hls", video_id)
+
+
+def package_video_hls(video_id: int) -> None:
+    from .services.audio_processing import get_video_file_paths, extract_hls_from_video_file
+
+    task = hls_task_status[video_id]
+    try:
+        hls_update_status(video_id, status="Running", progress=0, error_message="")
+        video, video_path, _ = get_video_file_paths(video_id)
+
+        ok, err, rel_dir = extract_hls_from_video_file(
+            video_path,
+            ladder=task["ladder"],
+            progress_callback=lambda percent: hls_update_status(video_id, progress=percent),
+        )
+        if not ok:
+            raise RuntimeError(err or "HLS conversion failed")
+
+        video.hls_path = f"{rel_dir}/index.m3u8"
+        video.save(update_fields=["hls_path"])
+        hls_update_status(video_id, status="Completed", progress=100, hls_path=video.hls_path)
+        print(f"[HLS] Packaged video {video_id} -> {video.hls_path}")
+    except Exception as exc:
+        print(f"[HLS] Packaging failed for video {video_id}: {exc}")
+        hls_update_status(video_id, status="Failed", error_message=str(exc))
+
+
+def process_hls_task() -> None:
+    """被后台线程循环调用处理HLS打包任务"""
+    try:
+        video_id = hls_queue.get_nowait()
+    except Empty:
+        return
+
+    try:
+        package_video_hls(video_id)
+    finally:
+        hls_queue.task_done()
+
+
+"""
+预览图（trickplay）生成流程：
+
+视频入库后排队生成 WebVTT 索引的雪碧图，输出到 MEDIA_ROOT/trickplay/{文件名}/
+播放器拖动进度条时直接取 index.vtt 和对应的 sprite_NNN.jpg，无需再调用 ffmpeg
+"""
+
+trickplay_queue: Queue[int] = Queue()
+_trickplay_pending = set()       # 已排队或正在生成的 video_id，避免重复排队
+_trickplay_failed = {}           # video_id -> 生成失败时源文件的 mtime_ns，文件未变时不再重试
+_trickplay_lock = threading.Lock()
+
+
+def _trickplay_source_mtime(video_id: int):
+    from .services.audio_processing import get_video_file_paths
+    try:
+        _, video_path, _ = get_video_file_paths(video_id)
+        return os.stat(video_path).st_mtime_ns
+    except (Video.DoesNotExist, OSError):
+        return None
+
+
+def trickplay_failed(video_id: int) -> bool:
+    """上次生成失败且源文件之后没有变化"""
+    with _trickplay_lock:
+        return video_id in _trickplay_failed
+
+
+def enqueue_trickplay(video_id: int) -> bool:
+    """排队生成预览图；已在队列中，或上次失败后源文件未变时返回 False"""
+    with _trickplay_lock:
+        failed_mtime = _trickplay_failed.get(video_id)
+    if failed_mtime is not None:
+        if _trickplay_source_mtime(video_id) == failed_mtime:
+            return False
+    with _trickplay_lock:
+        if video_id in _trickplay_pending:
+            return False
+        _trickplay_failed.pop(video_id, None)
+        _trickplay_pending.add(video_id)
+    trickplay_queue.put(video_id)
+    return True
+
+
+def generate_video_trickplay(video_id: int) -> None:
+    from .services.audio_processing import get_video_file_paths, is_audio_file
+    from .services.trickplay import generate_trickplay
+
+    try:
+        video, video_path, _ = get_video_file_paths(video_id)
+        if is_audio_file(video.url):
+            return
+        source_mtime = _trickplay_source_mtime(video_id)
+        ok, err = generate_trickplay(video_path, video.url)
+        if ok:
+            print(f"[Trickplay] Generated sprite sheets for video {video_id}")
+        else:
+            print(f"[Trickplay] Failed for video {video_id}: {err}")
+            with _trickplay_lock:
+                _trickplay_failed[video_id] = source_mtime
+    except Video.DoesNotExist:
+        pass
+    finally:
+        with _trickplay_lock:
+            _trickplay_pending.discard(video_id)
+
+
+def process_trickplay_task() -> None:
+    """被后台线程循环调用处理预览图任务"""
+    try:
+        video_id = trickplay_queue.get_nowait()
+    except Empty:
+        return
+
+    try:
+        generate_video_trickplay(video_id)
+    finally:
+        trickplay_queue.task_done()
+
+
+"""
+视频合并流程：
+
+BatchVideoActionView 的 concat 操作只做校验并排队，由导出线程池执行：
+1. ffprobe 探测所有输入，流参数一致时直接拼接（-c copy），否则 filter_complex 重新编码
+2. ffmpeg 输出 faststart mp4，完成后计算 md5 并命名为 <md5>.mp4
+3. 按探测时长平移并拼接字幕，创建新视频记录，删除原视频
+"""
+
+concat_queue: Queue[str] = Queue()
+CONCAT_MIN_TIMEOUT = 3600      # ffmpeg 至少允许运行 1 小时
+CONCAT_TIMEOUT_FACTOR = 10     # 或输入总时长的 10 倍，取较大者
+concat_task_status = defaultdict(lambda: {
+    "video_ids": [],
+    "video_name": "",
+    "status": "Queued",   # Queued/Running/Completed/Failed
+    "progress": 0,        # ffmpeg 实际处理时长 / 总时长
+    "strategy": "",       # copy / reencode
+    "output_filename": "",
+    "new_video_id": None,
+    "warnings": [],
+    "error_message": "",
+})
+task_events.register_source("concat", concat_task_status)
+
+
+def concat_update_status(task_id: str, **fields):
+    """更新合并任务字段并通知任务事件总线"""
+    concat_task_status[task_id].update(fields)
+    task_events.publish("concat", task_id)
+
+
+def _concat_subtitles(videos, durations, field: str, output_name: str):
+    """把每个视频 field 对应的字幕按前面视频的总时长平移后拼接，返回新字幕文件名；都没有字幕时返回 None"""
+    from .services.concat import concat_srt
+
+    srt_dir = os.path.join(settings.MEDIA_ROOT, 'saved_srt')
+    parts = []
+    offset = 0.0
+    for video, duration in zip(videos, durations):
+        name = getattr(video, field)
+        path = os.path.join(srt_dir, name) if name else None
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                parts.append((f.read(), offset))
+        offset += duration
+    if not parts:
+        return None
+
+    suffix = '' if field == 'srt_path' else '_translated'
+    subtitle_name = f"{os.path.splitext(output_name)[0]}{suffix}.srt"
+    with open(os.path.join(srt_dir, subtitle_name), 'w', encoding='utf-8') as f:
+        f.write(concat_srt(parts))
+    return subtitle_name
+
+
+def _create_concatenated_video(videos, output_name: str, durations) -> Video:
+    """以第一个视频的分类/合集/语言为准创建合并后的视频记录"""
+    total = int(sum(durations))
+    first = videos[0]
+    names = [v.name for v in videos[:3]]
+    if len(videos) > 3:
+        concat_name = f"Merged: {', '.join(names)}... ({len(videos)} videos)"
+    else:
+        concat_name = f"Merged: {', '.join(names)}"
+    return Video.objects.create(
+        name=concat_name[:128],
+        url=output_name,
+        video_length=f"{total // 3600:02d}:{total % 3600 // 60:02d}:{total % 60:02d}",
+        category=first.category,
+        collection=first.collection,
+        description=f"Concatenated from {len(videos)} videos: {', '.join(v.name for v in videos)}",
+        video_source='upload',
+        raw_lang=first.raw_lang,
+        created_time=timezone.now(),
+        last_modified=timezone.now(),
+    )
+
+
+def concat_videos_task(task_id: str) -> None:
+    from .services.concat import ConcatError, concat_videos, plan_concat, probe_input
+    from .views.videos import delete_all_related_files
+
+    task = concat_task_status[task_id]
+    try:
+        concat_update_status(task_id, status="Running", progress=0, error_message="")
+        videos_by_id = Video.objects.in_bulk(task["video_ids"])
+        missing = [vid for vid in task["video_ids"] if vid not in videos_by_id]
+        if missing:
+            raise ConcatError(f"Videos not found: {missing}")
+        videos = [videos_by_id[vid] for vid in task["video_ids"]]
+
+        video_dir = os.path.join(settings.MEDIA_ROOT, 'saved_video')
+        paths = [os.path.join(video_dir, video.url) for video in videos]
+        probes = [probe_input(path) for path in paths]
+        strategy, reasons = plan_concat(probes)
+        if reasons:
+            print(f"[Concat] {task_id} re-encoding: {'; '.join(reasons)}")
+        concat_update_status(task_id, strategy=strategy, warnings=task["warnings"] + reasons)
+
+        durations = [probe['duration'] for probe in probes]
+        output_name = concat_videos(
+            paths, probes, strategy, video_dir,
+            progress_callback=lambda percent: concat_update_status(task_id, progress=percent),
+            timeout=max(CONCAT_MIN_TIMEOUT, sum(durations) * CONCAT_TIMEOUT_FACTOR),
+        )
+
+        new_video = _create_concatenated_video(videos, output_name, durations)
+        if len({video.raw_lang for video in videos if video.raw_lang}) <= 1:
+            new_video.srt_path = _concat_subtitles(videos, durations, 'srt_path', output_name)
+            new_video.translated_srt_path = _concat_subtitles(videos, durations, 'translated_srt_path', output_name)
+            new_video.save(update_fields=['srt_path', 'translated_srt_path'])
+        else:
+            print(f"[Concat] {task_id}: multiple subtitle languages, subtitles not merged")
+
+        for video in videos:
+            try:
+                delete_all_related_files(video)
+                video.delete()
+            except Exception as e:
+                print(f"[Concat] Failed to delete video {video.name}: {e}")
+
+        concat_update_status(task_id, status="Completed", progress=100,
+                             output_filename=output_name, new_video_id=new_video.id)
+        print(f"[Concat] {task_id} -> {output_name} (video {new_video.id})")
+    except Exception as exc:
+        print(f"[Concat] {task_id} failed: {exc}")
+        concat_update_status(task_id, status="Failed", error_message=str(exc))
+
+
+def process_concat_task() -> None:
+    """被后台线程循环调用处理视频合并任务"""
+    try:
+        task_id = concat_queue.get_nowait()
+    except Empty:
+        return
+
+    try:
+        concat_videos_task(task_id)
+    finally:
+        concat_queue.task_done()
@@ -1,3 +1,1437 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import queue
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from hashlib import md5, sha256
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qsl, urlencode, urlsplit
 
-# Create your tests here.
+import numpy as np
+
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import Category, Collection, Video
+from .views import external_transcription
+from .views.task_events import TaskEventStreamView, TaskEventsView
+from .views.collection import CollectionActionView
+from .views.media import MediaActionView
+from .views.videos import VideoDataView
+from .views import set_setting
+from utils.stream_downloader.bili_client import BiliClient, getMixinKey
+from utils import llm_async
+from utils.wsr import transcription_engine
+from utils.audio import waveform_generator
+from .services import audio_processing, concat, extracted_audio, image_variants, metadata_cache, screenshots, task_events, thumbnail_cache
+from . import tasks
+from .tasks import external_task_status
+from .services.concat import ConcatError, build_reencode_command, concat_srt, plan_concat
+from utils.split_subtitle.ASRData import ASRData, ASRDataSeg, from_json, from_srt, from_vtt
+from utils.split_subtitle import main as split_main
+from utils.split_subtitle import chunk_planner, cnt_tokens
+from utils.split_subtitle.cnt_tokens import cnt_display_words
+from utils.split_subtitle import merge_english_words
+
+
+class SettingsSnapshotTests(SimpleTestCase):
+    """config.ini 的内存快照只读，文件变化或保存设置后重新加载"""
+
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        self.path = os.path.join(tmp, 'config.ini')
+        for patcher in (
+            mock.patch.object(set_setting, 'SETTINGS_FILE', self.path),
+            mock.patch.object(set_setting, 'RELOAD_CHECK_INTERVAL', 0),
+            mock.patch.object(set_setting, '_snapshot', None),
+            mock.patch.object(set_setting, '_snapshot_stamp', None),
+        ):
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+
+    def write(self, text):
+        with open(self.path, 'w') as f:
+            f.write(text)
+
+    def test_snapshot_is_read_only_and_cached(self):
+        first = set_setting.load_all_settings()
+        self.assertIs(set_setting.load_all_settings(), first)
+        with self.assertRaises(TypeError):
+            first['DEFAULT']['selected_model_provider'] = 'glm'
+        with self.assertRaises(TypeError):
+            first['New section'] = {}
+        # settings_to_dict 给出可修改的副本
+        copy = set_setting.settings_to_dict()
+        copy['DEFAULT']['selected_model_provider'] = 'glm'
+        self.assertEqual(set_setting.get_setting('DEFAULT', 'selected_model_provider'), 'deepseek')
+
+    def test_reloads_after_file_changes(self):
+        set_setting.load_all_settings()
+        self.write('[DEFAULT]\nselected_model_provider = qwen\n\n[TTS settings]\nmax_retries = 7\n'
+                   'max_compression_ratio = 1.5\n')
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertEqual(set_setting.get_setting('DEFAULT', 'selected_model_provider'), 'qwen')
+        self.assertEqual(set_setting.get_int_setting('TTS settings', 'max_retries', 5), 7)
+        self.assertEqual(set_setting.get_float_setting('TTS settings', 'max_compression_ratio', 2.0), 1.5)
+
+    def test_reloads_after_save(self):
+        data = set_setting.settings_to_dict()
+        data['TTS settings']['max_retries'] = 'not a number'
+        data['DEFAULT']['enable_thinking'] = 'False'
+        set_setting.save_all_settings(data)
+        with mock.patch.object(set_setting, 'RELOAD_CHECK_INTERVAL', 3600):
+            self.assertEqual(set_setting.get_int_setting('TTS settings', 'max_retries', 5), 5)
+            self.assertFalse(set_setting.get_bool_setting('DEFAULT', 'enable_thinking', True))
+            self.assertEqual(set_setting.get_float_setting('TTS settings', 'missing', 2.0), 2.0)
+
+
+class ListQueryCountTests(TestCase):
+    """列表接口的 SQL 查询数不应随视频库规模增长"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def seed(self, videos, collections, categories):
+        call_command(
+            'seed_benchmark_library',
+            videos=videos, collections=collections, categories=categories,
+            stdout=io.StringIO(),
+        )
+
+    def count_queries(self, view, path, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            response = view(self.factory.get(path), **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def assert_constant_queries(self, view, path, **kwargs):
+        self.seed(videos=100, collections=20, categories=3)
+        small = self.count_queries(view, path, **kwargs)
+        call_command('seed_benchmark_library', clear=True, stdout=io.StringIO())
+        self.seed(videos=500, collections=60, categories=10)
+        large = self.count_queries(view, path, **kwargs)
+        self.assertEqual(small, large)
+        return large
+
+    def test_collection_list_all(self):
+        view = CollectionActionView.as_view()
+        queries = self.assert_constant_queries(view, '/api/collection/list', action='list', collection_id=0)
+        self.assertEqual(queries, 1)
+
+    def test_collection_query(self):
+        self.seed(videos=200, collections=2, categories=1)
+        collection = Collection.objects.first()
+        view = CollectionActionView.as_view()
+        self.assertEqual(self.count_queries(view, '/', action='query', collection_id=collection.id), 2)
+        self.assertEqual(self.count_queries(view, '/', action='videos', collection_id=collection.id), 2)
+
+    def test_video_tree(self):
+        self.assert_constant_queries(VideoDataView.as_view(), '/api/videos/')
+
+    def test_video_tree_lazy(self):
+        self.assert_constant_queries(VideoDataView.as_view(), '/api/videos/?lazy=1')
+
+
+class VideoTreeVersionTests(TestCase):
+    """视频树接口的 ETag/304 与 ?since= 增量返回"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.view = VideoDataView.as_view()
+
+    def get(self, path, **headers):
+        return self.view(self.factory.get(path, headers=headers))
+
+    def test_unchanged_library_returns_304(self):
+        Video.objects.create(name='a')
+        first = self.get('/api/videos/')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.get('/api/videos/', if_none_match=first['ETag']).status_code, 304)
+
+        Video.objects.create(name='b')
+        changed = self.get('/api/videos/', if_none_match=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_delta_lists_changed_and_deleted_entities(self):
+        kept = Video.objects.create(name='kept')
+        edited = Video.objects.create(name='edited')
+        removed = Video.objects.create(name='removed')
+        removed_id = removed.id
+        since = json.loads(self.get('/api/videos/').content)['version']
+
+        category = Category.objects.create(name='new')
+        added = Video.objects.create(name='added', category=category)
+        edited.name = 'edited again'
+        edited.save()
+        removed.delete()
+
+        body = json.loads(self.get(f'/api/videos/?since={since}').content)
+        self.assertFalse(body['full'])
+        self.assertGreater(body['version'], since)
+        videos = {v['id']: v for v in body['videos']}
+        self.assertEqual(set(videos), {added.id, edited.id})
+        self.assertNotIn(kept.id, videos)
+        self.assertEqual(videos[added.id]['category_id'], category.id)
+        self.assertEqual(videos[edited.id]['name'], 'edited again')
+        self.assertEqual([c['id'] for c in body['categories']], [category.id])
+        self.assertEqual(body['deleted']['videos'], [removed_id])
+
+        empty = json.loads(self.get(f"/api/videos/?since={body['version']}").content)
+        self.assertEqual((empty['videos'], empty['deleted']['videos']), ([], []))
+
+    def test_unknown_version_falls_back_to_full_payload(self):
+        Video.objects.create(name='a')
+        version = json.loads(self.get('/api/videos/').content)['version']
+        body = json.loads(self.get(f'/api/videos/?since={version + 100}').content)
+        self.assertTrue(body['full'])
+        self.assertIn('data', body)
+
+
+class TrickplayRetryTests(TestCase):
+    """预览图生成失败后，视频文件不变就不再重复排队"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        os.makedirs(os.path.join(media_root, 'saved_video'))
+        self.video_path = os.path.join(media_root, 'saved_video', 'clip.mp4')
+        with open(self.video_path, 'wb') as f:
+            f.write(b'not really a video')
+        for patcher in (
+            override_settings(MEDIA_ROOT=media_root),
+            mock.patch.object(tasks, 'trickplay_queue', queue.Queue()),
+            mock.patch.dict(tasks._trickplay_failed, clear=True),
+            mock.patch('video.services.trickplay.generate_trickplay', return_value=(False, 'ffmpeg failed')),
+        ):
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+        self.video = Video.objects.create(name='clip', url='clip.mp4')
+
+    def test_failure_is_not_requeued_until_the_file_changes(self):
+        self.assertTrue(tasks.enqueue_trickplay(self.video.id))
+        tasks.generate_video_trickplay(tasks.trickplay_queue.get_nowait())
+        self.assertTrue(tasks.trickplay_failed(self.video.id))
+        self.assertFalse(tasks.enqueue_trickplay(self.video.id))
+        self.assertTrue(tasks.trickplay_queue.empty())
+
+        stat = os.stat(self.video_path)
+        os.utime(self.video_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        self.assertTrue(tasks.enqueue_trickplay(self.video.id))
+        self.assertFalse(tasks.trickplay_failed(self.video.id))
+        self.assertEqual(tasks.trickplay_queue.get_nowait(), self.video.id)
+        tasks._trickplay_pending.discard(self.video.id)
+
+
+class MetadataCacheTests(SimpleTestCase):
+    """预览和下载共用一次元数据抓取"""
+
+    def setUp(self):
+        for patcher in (mock.patch.dict(metadata_cache._entries, clear=True),
+                        mock.patch.dict(metadata_cache._inflight, clear=True)):
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+
+    def run_callers(self, count, fetch, release):
+        """count 个线程同时查询同一 key，都已开始等待后再放行第一个抓取"""
+        results, threads = [], []
+
+        def call():
+            try:
+                results.append(metadata_cache.get_or_fetch('k', fetch))
+            except Exception as e:
+                results.append(e)
+
+        for _ in range(count):
+            threads.append(threading.Thread(target=call))
+            threads[-1].start()
+        deadline = time.monotonic() + 5
+        while 'k' not in metadata_cache._inflight and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    def test_concurrent_callers_share_one_fetch(self):
+        release, calls = threading.Event(), []
+
+        def fetch():
+            calls.append(1)
+            release.wait(5)
+            return {'title': 'x'}
+
+        results = self.run_callers(5, fetch, release)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(metadata_cache._inflight, {})
+
+    def test_waiter_fetches_again_after_a_failure(self):
+        release, calls = threading.Event(), []
+
+        def fetch():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(5)
+                raise RuntimeError('extractor failed')
+            return {'title': 'x'}
+
+        results = self.run_callers(2, fetch, release)
+        self.assertEqual(len(calls), 2)
+        # 异常只交给发起抓取的调用方，等待者自己重新抓取
+        self.assertEqual(sorted(type(result).__name__ for result in results), ['RuntimeError', 'dict'])
+        self.assertEqual(metadata_cache.get('k'), {'title': 'x'})
+
+    def test_expired_entry_is_fetched_again(self):
+        clock = [1000.0]
+        fetch = mock.Mock(side_effect=[{'n': 1}, {'n': 2}])
+        with mock.patch.object(metadata_cache, 'time', mock.Mock(monotonic=lambda: clock[0])):
+            self.assertEqual(metadata_cache.get_or_fetch('k', fetch), {'n': 1})
+            clock[0] += metadata_cache.METADATA_TTL - 1
+            self.assertEqual(metadata_cache.get_or_fetch('k', fetch), {'n': 1})
+            clock[0] += 1
+            self.assertEqual(metadata_cache.get_or_fetch('k', fetch), {'n': 2})
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_av_lookup_is_aliased_to_bv_id(self):
+        info = {'bvid': 'BV1xx411c7mD', 'title': 'x'}
+        with mock.patch.object(metadata_cache.bili_download, 'get_video_info', return_value=info) as get_info, \
+                mock.patch.object(metadata_cache.bili_download, 'get_cid', return_value=([1], ['P1'])) as get_cid:
+            by_av = metadata_cache.bili_video_info(avid='av170001')
+            self.assertIs(metadata_cache.bili_video_info(bvid='BV1xx411c7mD'), by_av)
+            self.assertIs(metadata_cache.bili_video_info(avid='170001'), by_av)
+        get_info.assert_called_once_with(bvid=None, avid='av170001')
+        get_cid.assert_called_once_with(bvid='BV1xx411c7mD')
+        self.assertEqual(by_av, {'info': info, 'cids': [1], 'pages': ['P1']})
+
+
+class _FakeBiliHandler(BaseHTTPRequestHandler):
+    """本地替身：返回固定的 nav / playurl 响应，并校验 WBI 签名"""
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        server.requests.append((parts.path, self.headers.get('Cookie', '')))
+        if parts.path == '/x/web-interface/nav':
+            img_key, sub_key = server.keys
+            self._send({'code': -101, 'data': {'wbi_img': {
+                'img_url': f'https://i0.hdslb.com/bfs/wbi/{img_key}.png',
+                'sub_url': f'https://i0.hdslb.com/bfs/wbi/{sub_key}.png',
+            }}})
+        elif parts.path == '/x/player/wbi/playurl':
+            params = dict(parse_qsl(parts.query))
+            w_rid = params.pop('w_rid', '')
+            query = urlencode(sorted(params.items()))
+            if w_rid != md5((query + getMixinKey(''.join(server.keys))).encode()).hexdigest():
+                self._send({'code': -403, 'message': 'bad sign'})
+            else:
+                self._send({'code': 0, 'data': {'dash': {'video': [], 'audio': []}}})
+        else:
+            self.send_error(404)
+
+
+class BiliClientTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeBiliHandler)
+        self.server.keys = ('a' * 32, 'b' * 32)
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        host, port = self.server.server_address
+        self.client = BiliClient(base_url=f'http://{host}:{port}',
+                                 cookie_provider=lambda: {'SESSDATA': 'from-provider'})
+
+    def paths(self):
+        return [path for path, _ in self.server.requests]
+
+    def test_wbi_keys_cached_across_requests(self):
+        for _ in range(3):
+            self.assertEqual(self.client.playurl('BV1xx', 1)['code'], 0)
+        self.assertEqual(self.paths().count('/x/web-interface/nav'), 1)
+
+    def test_rotated_keys_refreshed_on_signature_error(self):
+        self.client.playurl('BV1xx', 1)
+        self.server.keys = ('c' * 32, 'd' * 32)
+        self.assertEqual(self.client.playurl('BV1xx', 1)['code'], 0)
+        self.assertEqual(self.paths().count('/x/web-interface/nav'), 2)
+
+    def test_cookie_injection(self):
+        self.client.playurl('BV1xx', 1)
+        self.client.playurl('BV1xx', 1, cookies={'SESSDATA': 'per-request'})
+        cookies = [cookie for path, cookie in self.server.requests if path == '/x/player/wbi/playurl']
+        self.assertEqual(cookies, ['SESSDATA=from-provider', 'SESSDATA=per-request'])
+
+
+class _FakeVidGoHandler(BaseHTTPRequestHandler):
+    """本地替身：一个远程 VidGo 转录节点，server.mode 控制提交/状态接口的行为"""
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload, status=200, headers=None):
+        body = payload.encode('utf-8') if isinstance(payload, str) else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        self.server.requests.append(('GET', path))
+        mode = self.server.mode
+        if path.endswith('/health'):
+            self._send({'status': 'ok', 'queue_size': 0})
+        elif path.endswith('/status'):
+            if mode == 'disconnect':
+                self.close_connection = True   # 不回应就断开，模拟节点掉线
+            elif mode == 'job_failed':
+                self._send({'status': 'failed', 'progress': 0, 'error_message': 'bad audio'})
+            else:
+                self._send({'status': 'completed', 'progress': 100})
+        elif path.endswith('/result'):
+            self._send(f'1\n00:00:00,000 --> 00:00:01,000\n{self.server.name}\n')
+        else:
+            self._send({'error': 'not found'}, status=404)
+
+    def do_POST(self):
+        path = urlsplit(self.path).path
+        self.server.requests.append(('POST', path))
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.server.mode == 'busy':
+            self._send({'error': 'queue full'}, status=429, headers={'Retry-After': '5'})
+        elif self.server.mode == 'submit_error':
+            self._send({'error': 'boom'}, status=500)
+        else:
+            self._send({'task_id': f'ext_{self.server.name}', 'queue_position': 0})
+
+    def do_DELETE(self):
+        self.server.requests.append(('DELETE', urlsplit(self.path).path))
+        self._send({'message': 'Task deleted successfully'})
+
+
+class RemoteVidGoPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.nodes = []
+        for name in ('a', 'b'):
+            server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeVidGoHandler)
+            server.name, server.mode, server.requests = name, 'ok', []
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.addCleanup(server.server_close)
+            self.addCleanup(server.shutdown)
+            self.nodes.append(server)
+        urls = [f'http://127.0.0.1:{server.server_address[1]}' for server in self.nodes]
+        for patcher in (mock.patch.dict(transcription_engine._endpoint_states, clear=True),
+                        mock.patch.dict(transcription_engine._remote_availability, clear=True)):
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+        self.engine = transcription_engine.RemoteVidGoPoolEngine(
+            {'Remote VidGo Service': {'host': urls[0], 'extra_hosts': urls[1]}})
+        self.urls = urls
+        audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+        audio.write(b'RIFF0000WAVE')
+        audio.close()
+        self.addCleanup(os.remove, audio.name)
+        self.audio = audio.name
+
+    def transcribe(self):
+        return self.engine.transcribe_audio(self.audio, lambda progress: None)
+
+    def posts(self, node):
+        return [path for method, path in node.requests if method == 'POST']
+
+    def test_submit_error_fails_over(self):
+        self.nodes[0].mode = 'submit_error'
+        self.assertIn('\nb\n', self.transcribe())
+        self.assertFalse(self.engine.get_pool_status()[self.urls[0]]['healthy'])
+        self.assertEqual(self.engine.get_pool_status()[self.urls[0]]['failures'], 1)
+
+    def test_busy_node_skipped_without_failure(self):
+        self.nodes[0].mode = 'busy'
+        self.assertIn('\nb\n', self.transcribe())
+        status = self.engine.get_pool_status()[self.urls[0]]
+        self.assertFalse(status['healthy'])
+        self.assertEqual(status['failures'], 0)
+
+    def test_job_failure_is_not_resubmitted(self):
+        self.nodes[0].mode = 'job_failed'
+        with self.assertRaisesRegex(Exception, 'bad audio'):
+            self.transcribe()
+        self.assertEqual(self.posts(self.nodes[1]), [])
+        self.assertIn(('DELETE', '/api/external_transcription/ext_a/delete'), self.nodes[0].requests)
+        self.assertTrue(self.engine.get_pool_status()[self.urls[0]]['healthy'])
+
+    def test_lost_node_task_deleted_before_failover(self):
+        self.nodes[0].mode = 'disconnect'
+        self.assertIn('\nb\n', self.transcribe())
+        self.assertIn(('DELETE', '/api/external_transcription/ext_a/delete'), self.nodes[0].requests)
+        self.assertFalse(self.engine.get_pool_status()[self.urls[0]]['healthy'])
+
+
+class TaskEventBusTests(SimpleTestCase):
+    """任务事件总线：按游标取增量、游标过期时重置、SSE 推送"""
+
+    def setUp(self):
+        self.status = {}
+        for patcher in (
+            mock.patch.dict(task_events._sources, clear=True),
+            mock.patch.object(task_events, 'blocking_waiters', threading.BoundedSemaphore(2)),
+        ):
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+        task_events.register_source('demo', self.status)
+
+    def update(self, task_id, **fields):
+        self.status.setdefault(task_id, {}).update(fields)
+        return task_events.publish('demo', task_id)
+
+    def test_changes_since_collapses_updates_to_current_state(self):
+        cursor = task_events.current_version()
+        self.update('a', progress=10)
+        self.update('b', progress=5)
+        version = self.update('a', progress=20)
+        result = task_events.changes_since(cursor)
+        self.assertEqual(result['version'], version)
+        self.assertFalse(result['reset'])
+        self.assertEqual([(e['task_id'], e['data']) for e in result['events']],
+                         [('b', {'progress': 5}), ('a', {'progress': 20})])
+        # 已删除的任务以 data=None 通知
+        del self.status['b']
+        task_events.publish('demo', 'b')
+        self.assertEqual(task_events.changes_since(version)['events'], [{'kind': 'demo', 'task_id': 'b', 'data': None}])
+        self.assertEqual(task_events.changes_since(task_events.current_version())['events'], [])
+
+    def test_stale_or_future_cursor_resets(self):
+        self.update('a', progress=1)
+        self.assertTrue(task_events.changes_since(task_events.current_version() + 5)['reset'])
+        cursor = task_events.current_version()
+        with mock.patch.object(task_events, 'MAX_TRACKED_CHANGES', 2):
+            for task_id in ('x', 'y', 'z'):
+                self.update(task_id, progress=1)
+        self.assertTrue(task_events.changes_since(cursor)['reset'])
+        response = TaskEventsView.as_view()(RequestFactory().get('/', {'cursor': cursor}))
+        body = json.loads(response.content)
+        self.assertTrue(body['reset'])
+        self.assertEqual(body['snapshot']['demo']['z'], {'progress': 1})
+
+    def test_long_poll_wakes_on_publish(self):
+        cursor = task_events.current_version()
+        threading.Timer(0.2, self.update, args=('a',), kwargs={'progress': 50}).start()
+        started = time.monotonic()
+        result = task_events.changes_since(cursor, timeout=5)
+        self.assertLess(time.monotonic() - started, 3)
+        self.assertEqual(result['events'][0]['data'], {'progress': 50})
+
+    def test_snapshot_survives_concurrent_inserts(self):
+        stop = threading.Event()
+
+        def writer():
+            index = 0
+            while not stop.is_set():
+                self.status[f'w{index % 500}'] = {'progress': index}
+                self.status.pop(f'w{(index + 250) % 500}', None)
+                index += 1
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            for _ in range(200):
+                task_events.snapshot()
+        finally:
+            stop.set()
+            thread.join()
+
+    def test_sse_stream_sends_snapshot_then_task_events(self):
+        self.update('a', progress=1)
+        with mock.patch('video.views.task_events.STREAM_KEEPALIVE', 0.2):
+            stream = TaskEventStreamView().stream(None)
+            self.assertTrue(next(stream).startswith('retry:'))
+            snapshot = next(stream)
+            self.assertIn('event: snapshot', snapshot)
+            self.assertIn('"a": {"progress": 1}', snapshot)
+            self.assertEqual(next(stream), ': keepalive\n\n')
+            version = self.update('a', progress=2)
+            self.assertEqual(next(stream), TaskEventStreamView.format_event(
+                'task', version, {'kind': 'demo', 'task_id': 'a', 'data': {'progress': 2}}))
+            stream.close()
+        # 生成器关闭后名额归还
+        self.assertTrue(task_events.blocking_waiters.acquire(blocking=False))
+        self.assertTrue(task_events.blocking_waiters.acquire(blocking=False))
+
+    def test_stream_refused_when_no_slots(self):
+        with mock.patch.object(task_events, 'blocking_waiters', threading.BoundedSemaphore(0)):
+            stream = TaskEventStreamView().stream(None)
+            next(stream)
+            self.assertIn('event: busy', next(stream))
+
+
+class ExternalStatusLongPollTests(SimpleTestCase):
+    """外部转录状态接口的长轮询在任务事件总线上等待，并限制同时等待的请求数"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.view = external_transcription.ExternalTranscriptionStatusView.as_view()
+        self.task = external_task_status['ext_poll']
+        self.task.update(task_id='ext_poll', filename='a.mp3', status='Running', progress=10)
+        self.addCleanup(external_task_status.pop, 'ext_poll', None)
+
+    def poll(self):
+        request = self.factory.get('/', {'wait': 5, 'status': 'running', 'progress': 10})
+        started = time.monotonic()
+        body = json.loads(self.view(request, task_id='ext_poll').content)
+        return body, time.monotonic() - started
+
+    def test_wakes_on_published_change(self):
+        def advance():
+            time.sleep(0.2)
+            self.task['progress'] = 40
+            task_events.publish('external', 'ext_poll')
+        threading.Thread(target=advance).start()
+        body, elapsed = self.poll()
+        self.assertEqual(body['progress'], 40)
+        self.assertLess(elapsed, 3)
+
+    def test_returns_immediately_when_waiters_are_exhausted(self):
+        with mock.patch.object(task_events, 'blocking_waiters', threading.BoundedSemaphore(1)) as waiters:
+            waiters.acquire()
+            body, elapsed = self.poll()
+        self.assertEqual(body['progress'], 10)
+        self.assertLess(elapsed, 1)
+
+
+class ExternalClientIdTests(SimpleTestCase):
+    """按客户端限额时不能被伪造的 X-Forwarded-For 绕过"""
+
+    def client_id(self, remote, forwarded=None):
+        headers = {'x_forwarded_for': forwarded} if forwarded else {}
+        request = RequestFactory().post('/', REMOTE_ADDR=remote, headers=headers)
+        return external_transcription._client_id(request)
+
+    def test_forwarded_header_ignored_from_untrusted_peer(self):
+        self.assertEqual(self.client_id('203.0.113.9', '10.0.0.1'), '203.0.113.9')
+
+    @override_settings(TRUSTED_PROXIES=['127.0.0.1', '10.0.0.2'])
+    def test_forwarded_header_used_behind_trusted_proxy(self):
+        # 客户端自己伪造的最左侧地址被忽略，取最右侧的非代理地址
+        self.assertEqual(self.client_id('127.0.0.1', '1.2.3.4, 198.51.100.7, 10.0.0.2'), '198.51.100.7')
+        self.assertEqual(self.client_id('127.0.0.1'), '127.0.0.1')
+
+
+def _probe(width=1920, fps='30/1', audio=True, duration=10.0):
+    video = {'codec_name': 'h264', 'profile': 'High', 'width': width, 'height': 1080,
+             'pix_fmt': 'yuv420p', 'r_frame_rate': fps, 'time_base': '1/15360'}
+    audio_stream = {'codec_name': 'aac', 'sample_rate': '48000', 'channels': 2, 'time_base': '1/48000'}
+    return {'video': video, 'audio': audio_stream if audio else None, 'duration': duration}
+
+
+class ConcatPlanTests(SimpleTestCase):
+    def test_matching_inputs_are_copied(self):
+        self.assertEqual(plan_concat([_probe(), _probe(duration=3.5)]), ('copy', []))
+
+    def test_mismatched_inputs_are_reencoded(self):
+        strategy, reasons = plan_concat([_probe(), _probe(width=1280), _probe(audio=False)])
+        self.assertEqual(strategy, 'reencode')
+        self.assertEqual(len(reasons), 2)
+
+    def test_missing_audio_is_filled_with_silence(self):
+        cmd = build_reencode_command(['a.mp4', 'b.mp4'], [_probe(), _probe(audio=False, duration=2.5)], 'out.mp4')
+        self.assertIn('anullsrc=channel_layout=stereo:sample_rate=48000', cmd)
+        self.assertIn('[v0][a0][v1][a1]concat=n=2:v=1:a=1[outv][outa]', cmd[cmd.index('-filter_complex') + 1])
+        self.assertEqual(cmd[-4:], ['-movflags', '+faststart', '-y', 'out.mp4'])
+
+    def test_stalled_ffmpeg_hits_the_timeout(self):
+        stalled = [sys.executable, '-c', 'import time; time.sleep(30)']
+        with tempfile.TemporaryDirectory() as output_dir, \
+                mock.patch.object(concat, 'build_reencode_command', return_value=stalled):
+            started = time.monotonic()
+            with self.assertRaises(ConcatError):
+                concat.concat_videos(['a.mp4'], [_probe()], 'reencode', output_dir, timeout=0.5)
+            self.assertLess(time.monotonic() - started, 10)
+            self.assertEqual(os.listdir(output_dir), [])
+
+    def test_subtitles_offset_by_probed_durations(self):
+        first = "1\n00:00:01,000 --> 00:00:02,500\nhello\n\n2\n00:00:03,000 --> 00:00:04,000\nworld\n"
+        second = "1\n00:00:00,100 --> 00:00:01,000\nagain\n"
+        merged = concat_srt([(first, 0.0), (second, 3723.4567)])
+        self.assertEqual(merged.split('\n\n')[2], "3\n01:02:03,557 --> 01:02:04,457\nagain\n")
+
+
+class _FakeFFmpeg:
+    """subprocess.Popen 的替身：成功时在输出目录写出 index.m3u8"""
+
+    def __init__(self, cmd, returncode, **kwargs):
+        self.returncode = returncode
+        self.stdout = io.StringIO('out_time_ms=5000000\nprogress=end\n')
+        self.stderr = io.StringIO('' if returncode == 0 else 'boom')
+        out_dir = os.path.dirname(cmd[-1])
+        if returncode == 0:
+            for name in ('index.m3u8', 'seg0.ts'):
+                Path(out_dir, name).write_text('new')
+
+    def wait(self):
+        return self.returncode
+
+
+class HlsPackagingTests(SimpleTestCase):
+    def test_renditions_never_upscale(self):
+        names = lambda height: [r[0] for r in audio_processing.select_hls_renditions(height)]
+        self.assertEqual(names(2160), ['1080p', '720p', '360p'])
+        self.assertEqual(names(720), ['720p', '360p'])
+        # 比最小档还矮的源保留最小档；高度未知时给出全部档位
+        self.assertEqual(names(240), ['360p'])
+        self.assertEqual(names(0), ['1080p', '720p', '360p'])
+
+    def test_single_rendition_copies_compatible_streams(self):
+        copy = audio_processing.build_hls_command('in.mp4', 'out', {'vcodec': 'h264', 'acodec': 'aac'})
+        self.assertEqual(copy[copy.index('-c:v') + 1], 'copy')
+        self.assertEqual(copy[copy.index('-c:a') + 1], 'copy')
+        self.assertEqual(copy[-1], os.path.join('out', 'index.m3u8'))
+        self.assertIn(os.path.join('out', 'seg%d.ts'), copy)
+
+        encode = audio_processing.build_hls_command('in.webm', 'out', {'vcodec': 'vp9', 'acodec': 'opus'})
+        self.assertEqual(encode[encode.index('-c:v') + 1], 'libx264')
+        self.assertEqual(encode[encode.index('-c:a') + 1], 'aac')
+
+        silent = audio_processing.build_hls_command('in.mp4', 'out', {'vcodec': 'h264', 'acodec': None})
+        self.assertNotIn('0:a:0', silent)
+        self.assertNotIn('-c:a', silent)
+
+    def test_ladder_writes_master_playlist(self):
+        renditions = audio_processing.select_hls_renditions(720)
+        cmd = audio_processing.build_hls_command('in.mp4', 'out', {'vcodec': 'h264', 'acodec': 'aac'}, renditions)
+        self.assertEqual(cmd[cmd.index('-filter_complex') + 1],
+                         '[0:v]split=2[v0][v1];[v0]scale=-2:720[v0out];[v1]scale=-2:360[v1out]')
+        self.assertEqual(cmd[cmd.index('-var_stream_map') + 1], 'v:0,a:0,name:720p v:1,a:1,name:360p')
+        self.assertEqual(cmd[cmd.index('-master_pl_name') + 1], 'index.m3u8')
+        self.assertEqual(cmd[cmd.index('-b:v:1') + 1], '800k')
+        self.assertEqual(cmd[cmd.index('-bufsize:v:0') + 1], '5992k')
+        self.assertEqual(cmd[-1], os.path.join('out', '%v.m3u8'))
+        silent = audio_processing.build_hls_command('in.mp4', 'out', {'vcodec': 'h264'}, renditions)
+        self.assertEqual(silent[silent.index('-var_stream_map') + 1], 'v:0,name:720p v:1,name:360p')
+
+    def _package(self, returncode):
+        probe = {'vcodec': 'h264', 'acodec': 'aac', 'height': 720, 'duration': 10.0}
+        with mock.patch.object(audio_processing, 'probe_video_streams', return_value=probe), \
+                mock.patch.object(audio_processing.subprocess, 'Popen',
+                                  lambda cmd, **kwargs: _FakeFFmpeg(cmd, returncode, **kwargs)):
+            return audio_processing.extract_hls_from_video_file(self.video_path)
+
+    def test_repackaging_swaps_in_only_on_success(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.video_path = os.path.join(media_root, 'clip.mp4')
+        Path(self.video_path).write_bytes(b'video')
+        live = Path(media_root, 'stream_video', 'clip')
+        live.mkdir(parents=True)
+        (live / 'index.m3u8').write_text('old')
+        (live / '720p_0.ts').write_text('old')
+
+        with override_settings(MEDIA_ROOT=media_root):
+            ok, error, _ = self._package(1)
+            self.assertEqual((ok, error), (False, 'boom'))
+            # 失败时正在播放的旧 HLS 保持不动
+            self.assertEqual(sorted(p.name for p in live.iterdir()), ['720p_0.ts', 'index.m3u8'])
+            self.assertEqual((live / 'index.m3u8').read_text(), 'old')
+
+            self.assertEqual(self._package(0), (True, '', 'stream_video/clip'))
+            self.assertEqual(sorted(p.name for p in live.iterdir()), ['index.m3u8', 'seg0.ts'])
+            self.assertEqual((live / 'index.m3u8').read_text(), 'new')
+        self.assertEqual(os.listdir(os.path.join(media_root, 'stream_video')), ['clip'])
+
+
+SUBTITLE_FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'subtitles')
+
+
+def _read_fixture(name, newline=None):
+    with open(os.path.join(SUBTITLE_FIXTURES, name), encoding='utf-8', newline=newline) as f:
+        return f.read()
+
+
+class ASRDataCodecTests(SimpleTestCase):
+    """*.expected.srt 由改写前的 ASRData 生成，输出必须逐字节一致"""
+
+    def test_srt_fixtures_round_trip(self):
+        for name in ('words_en', 'chars_zh', 'sentences_crlf'):
+            expected = _read_fixture(f'{name}.expected.srt', newline='')
+            for newline in (None, ''):   # 文本模式读入 / 保留原始 CRLF
+                with self.subTest(name=name, newline=newline):
+                    self.assertEqual(from_srt(_read_fixture(f'{name}.srt', newline)).to_srt(), expected)
+            self.assertEqual(from_srt(expected).to_srt(), expected)
+
+    def test_vtt_fixture(self):
+        asr_data = from_vtt(_read_fixture('captions.vtt'))
+        self.assertEqual(asr_data.to_srt(), _read_fixture('captions.expected.srt', newline=''))
+        self.assertEqual(from_vtt(asr_data.to_vtt()).to_srt(), asr_data.to_srt())
+
+    def test_translation_and_json(self):
+        asr_data = from_srt(_read_fixture('sentences_crlf.expected.srt'))
+        asr_data.segments[0].free = '你好，世界'
+        asr_data.segments[0].direct = '你好世界'
+        srt = asr_data.to_srt(use_translation=True)
+        self.assertTrue(srt.startswith('1\n00:00:01,000 --> 00:00:04,250\n你好，世界\n\n2\n'))
+        self.assertEqual(from_json(asr_data.to_json()).to_json(), asr_data.to_json())
+
+    def test_fractional_and_invalid_times(self):
+        self.assertEqual(ASRDataSeg('x', 3599999.9, 3600000.5).to_srt_ts(), '00:59:59,999 --> 01:00:00,000')
+        with self.assertRaises(ValueError):
+            from_srt('1\n00:00:01,000 -> 00:00:02,000\nbroken arrow\n')
+
+
+def _reference_merge_short(segments):
+    """merge_short_segments_iteratively 改写前的逐轮重扫实现"""
+    result = segments.copy()
+    changed = True
+    while changed:
+        changed = False
+        i = 0
+        while i < len(result):
+            seg = result[i]
+            if cnt_display_words(seg.text) >= split_main.MIN_DISPLAY_COUNT:
+                i += 1
+                continue
+            prev_diff = seg.start_time - result[i - 1].end_time if i > 0 else float('inf')
+            next_diff = result[i + 1].start_time - seg.end_time if i < len(result) - 1 else float('inf')
+            if prev_diff <= next_diff and i > 0:
+                prev = result[i - 1]
+                result[i - 1:i + 1] = [ASRDataSeg(prev.text + seg.text, prev.start_time, seg.end_time, "", "", "")]
+                changed = True
+            elif next_diff < prev_diff and i < len(result) - 1:
+                nxt = result[i + 1]
+                result[i:i + 2] = [ASRDataSeg(seg.text + nxt.text, seg.start_time, nxt.end_time, "", "", "")]
+                changed = True
+            else:
+                i += 1
+    return result
+
+
+def _reference_split(seg_list):
+    """split_segment_by_display_length 改写前的递归拼接实现"""
+    if not seg_list:
+        return []
+    total_text = ''.join(seg.text for seg in seg_list)
+    if cnt_display_words(total_text) <= split_main.MAX_DISPLAY_COUNT:
+        return [ASRDataSeg(total_text, seg_list[0].start_time, seg_list[-1].end_time)]
+    n = len(seg_list)
+    if n <= 1:
+        return list(seg_list)
+    max_diff, best = 0, -1
+    for i in range(max(1, n // 6), min(n - 1, (5 * n) // 6) + 1):
+        diff = seg_list[i].start_time - seg_list[i - 1].end_time
+        if diff > max_diff:
+            max_diff, best = diff, i
+    if best == -1 or max_diff < 50:
+        best = n // 2
+    return _reference_split(seg_list[:best]) + _reference_split(seg_list[best:])
+
+
+class SegmentMergeSplitTests(SimpleTestCase):
+    """合并/拆分的线性实现与改写前的实现在随机语料上输出一致"""
+    VOCAB = ['the ', 'a', 'word', '好', '中文', 'の', ' ', '. ', ',', 'hello ', '1', '，', 'compiler ', '   ', '']
+
+    def _corpus(self, seed, count=400):
+        rng = random.Random(seed)
+        for _ in range(count):
+            segments, t = [], 0
+            for _ in range(rng.randint(0, 40)):
+                duration = rng.randint(0, 500)
+                text = ''.join(rng.choice(self.VOCAB) for _ in range(rng.choice([0, 1, 1, 2, 3, 6, 15])))
+                segments.append(ASRDataSeg(text, t, t + duration))
+                t += duration + rng.choice([0, 0, 10, 49, 50, 51, 200, 900, -30])
+            yield segments
+
+    @staticmethod
+    def _dump(result, source):
+        # 未被合并的分段应原样返回同一个对象
+        return [(s.text, s.start_time, s.end_time, s.direct, s.free, s.reflected, any(s is x for x in source))
+                for s in result]
+
+    def test_merge_short_segments_matches_reference(self):
+        for segments in self._corpus(1):
+            self.assertEqual(self._dump(split_main.merge_short_segments_iteratively(list(segments)), segments),
+                             self._dump(_reference_merge_short(list(segments)), segments))
+
+    def test_split_by_display_length_matches_reference(self):
+        for segments in self._corpus(2):
+            self.assertEqual(self._dump(split_main.split_segment_by_display_length(segments), segments),
+                             self._dump(_reference_split(segments), segments))
+
+    def test_short_segment_joins_nearer_neighbour(self):
+        def merge(gap_before, gap_after):
+            segments = [ASRDataSeg('This is a full sentence here ', 0, 1000),
+                        ASRDataSeg('ok ', 1000 + gap_before, 1300),
+                        ASRDataSeg('Another complete sentence follows ', 1300 + gap_after, 2000)]
+            return [(s.text, s.start_time, s.end_time) for s in split_main.merge_short_segments_iteratively(segments)]
+
+        self.assertEqual(merge(100, 10)[1], ('ok Another complete sentence follows ', 1100, 2000))
+        # 前后间隔相同时并入前一段
+        self.assertEqual(merge(100, 100)[0], ('This is a full sentence here ok ', 0, 1300))
+
+    def test_split_keeps_short_runs_whole(self):
+        segments = [ASRDataSeg('short ', 0, 100), ASRDataSeg('text ', 100, 200)]
+        result = split_main.split_segment_by_display_length(segments)
+        self.assertEqual([(s.text, s.start_time, s.end_time) for s in result], [('short text ', 0, 200)])
+        self.assertEqual(split_main.split_segment_by_display_length([]), [])
+
+    def test_carry_overflow_is_kept(self):
+        leftover = [ASRDataSeg(f'w{i} ', i * 100, i * 100 + 90) for i in range(split_main.CARRY_MAX_TOKENS + 3)]
+        carry, overflow = split_main.split_carry(leftover)
+        self.assertEqual(overflow + carry, leftover)
+        self.assertEqual(len(carry), split_main.CARRY_MAX_TOKENS)
+        self.assertEqual(split_main.split_carry(leftover[:2]), (leftover[:2], []))
+
+
+class WordMergerLexiconTests(SimpleTestCase):
+    def test_lexicon_is_built_once_and_reloaded_from_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            lexicon_file = Path(tmp) / 'en_words.txt'
+            with mock.patch.object(merge_english_words, 'LEXICON_DIR', Path(tmp)), \
+                    mock.patch.object(merge_english_words, 'LEXICON_FILE', lexicon_file), \
+                    mock.patch.object(merge_english_words, '_lexicon', None):
+                first, second = merge_english_words.WordMerger(), merge_english_words.WordMerger()
+                self.assertIs(first.word_set, second.word_set)
+                self.assertIsInstance(first.word_set, frozenset)
+                if first.dict_source == 'pyspellchecker':
+                    self.assertTrue(lexicon_file.exists())
+                    merge_english_words._lexicon = None
+                    self.assertEqual(merge_english_words.WordMerger().word_set, first.word_set)
+
+    def test_merge_texts_matches_merge_text(self):
+        lexicon = (merge_english_words.MINIMAL_WORDS, 'minimal backup')
+        with mock.patch.object(merge_english_words, '_lexicon', lexicon):
+            merger = merge_english_words.WordMerger()
+        texts = [
+            "第一件事就是要把rem ote 仓库复制到本地",
+            "也就是g it hub 叫做rem ote",
+            "然后这个re p osit ory 的主分支是m ain，再看rem ote",
+            "rem ote rep osit ory",
+            "这是纯中文句子",
+            "",
+            "Hello こんにちは",
+        ]
+        self.assertEqual(merger.merge_texts(texts), [merger.merge_text(text) for text in texts])
+        self.assertEqual(merger.merge_text("也就是g it hub 叫做rem ote"), "也就是github 叫做remote")
+
+
+def _reference_count_words(text):
+    """count_words 改写前的多次正则扫描实现"""
+    chinese = len(re.findall(r'[\u4e00-\u9fff]', text))
+    japanese = len(re.findall(r'[\u3040-\u309f\u30a0-\u30ff\u31f0-\u31ff]', text))
+    korean = len(re.findall(r'[\uac00-\ud7af\u1100-\u11ff\u3130-\u318f]', text))
+    english_text = re.sub(r'[\u4e00-\u9fff\u3040-\u309f\u30a0-\u30ff\u31f0-\u31ff\uac00-\ud7af\u1100-\u11ff\u3130-\u318f]', ' ', text)
+    return len(re.findall(r'\b[a-zA-Z]{2,}\b', english_text.lower())) + chinese + japanese + korean
+
+
+def _reference_display_words(text):
+    """cnt_display_words 改写前的逐字符实现"""
+    tokens = text.split()
+    total = 0.0
+    for i, token in enumerate(tokens):
+        for char in token:
+            total += cnt_tokens.get_char_display_width(char)
+        if i < len(tokens) - 1:
+            last = token[-1]
+            if cnt_tokens.is_english_char(last) or cnt_tokens.is_digit(last) or cnt_tokens.is_english_punctuation(last):
+                total += 0.5
+    return total
+
+
+class TokenCountTests(SimpleTestCase):
+    """正则计数与改写前的实现在随机语料上结果一致"""
+    # 中日韩、拉丁、全角、上标/带圈数字、emoji、各种 Unicode 空白
+    ALPHABET = (list("abcXYZ019 ,.!?'-_\\中文字の日本語カタカナ한국어ㄱᄀ㐀\u3000\t\n\r\x1c\x85\xa0é²①０٣，。！「」İKſ\u0307")
+                + ['😀', '👍🏽', 'hello ', 'the ', '  '])
+
+    def _corpus(self, count=5000):
+        rng = random.Random(7)
+        for _ in range(count):
+            yield ''.join(rng.choice(self.ALPHABET) for _ in range(rng.randint(0, 30)))
+
+    def test_count_words_matches_reference(self):
+        texts = list(self._corpus())
+        expected = [_reference_count_words(text) for text in texts]
+        self.assertEqual([cnt_tokens.count_words(text) for text in texts], expected)
+        self.assertEqual(cnt_tokens.count_words_batch(texts + texts[:100]), expected + expected[:100])
+
+    def test_display_words_matches_reference(self):
+        texts = list(self._corpus())
+        expected = [_reference_display_words(text) for text in texts]
+        self.assertEqual([cnt_display_words(text) for text in texts], expected)
+        self.assertEqual(cnt_tokens.cnt_display_words_batch(texts), expected)
+
+    def test_count_words_edge_cases(self):
+        # 单个字母不算词；中日韩按字计数
+        self.assertEqual(cnt_tokens.count_words('a b c'), 0)
+        self.assertEqual(cnt_tokens.count_words("don't stop"), 2)
+        self.assertEqual(cnt_tokens.count_words('中文abc'), 3)
+        self.assertEqual(cnt_tokens.count_words('こんにちは 한국어'), 8)
+        self.assertEqual(cnt_tokens.count_words(''), 0)
+
+    def test_display_width_edge_cases(self):
+        # 英文词之间的空格按半个宽度计
+        self.assertEqual(cnt_display_words('hello world'), 10.5)
+        self.assertEqual(cnt_display_words('hello,world'), 10.5)
+        self.assertEqual(cnt_display_words('hello 中文'), 9.0)
+        self.assertEqual(cnt_display_words(''), 0.0)
+
+
+def _reference_split_asr_data(asr_data, num_segments):
+    """split_asr_data 改写前的实现（逐窗口重新计算时间间隔）"""
+    total_segs = len(asr_data.segments)
+    words_per_segment = cnt_tokens.count_words(asr_data.to_txt()) // num_segments
+    if num_segments <= 1 or total_segs <= num_segments:
+        return [asr_data]
+    adjusted = []
+    for split_point in [i * words_per_segment for i in range(1, num_segments)]:
+        start = max(0, split_point - split_main.SPLIT_RANGE)
+        end = min(total_segs - 1, split_point + split_main.SPLIT_RANGE)
+        max_gap, best_index = -1, split_point
+        for j in range(start, end):
+            gap = asr_data.segments[j + 1].start_time - asr_data.segments[j].end_time
+            if gap > max_gap:
+                max_gap, best_index = gap, j
+        adjusted.append(best_index)
+    parts, prev_index = [], 0
+    for index in sorted(set(adjusted)):
+        parts.append(ASRData(asr_data.segments[prev_index:index + 1]))
+        prev_index = index + 1
+    if prev_index < total_segs:
+        parts.append(ASRData(asr_data.segments[prev_index:]))
+    return parts
+
+
+class SplitAsrDataTests(SimpleTestCase):
+    """分段边界搜索与改写前的实现在样例和随机语料上给出相同切分"""
+
+    @staticmethod
+    def _chunks(parts):
+        return [[id(seg) for seg in part.segments] for part in parts]
+
+    @staticmethod
+    def _lengths(parts):
+        return [len(part.segments) for part in parts]
+
+    def _assert_same(self, asr_data, num_segments):
+        self.assertEqual(self._chunks(split_main.split_asr_data(asr_data, num_segments)),
+                         self._chunks(_reference_split_asr_data(asr_data, num_segments)))
+
+    def test_fixtures_match_reference(self):
+        for name in ('words_en.srt', 'chars_zh.srt', 'sentences_crlf.srt', 'captions.vtt'):
+            text = _read_fixture(name)
+            asr_data = from_vtt(text) if name.endswith('.vtt') else from_srt(text)
+            for num_segments in range(1, 30):
+                with self.subTest(name=name, num_segments=num_segments):
+                    self._assert_same(asr_data, num_segments)
+
+    def test_random_transcripts_match_reference(self):
+        rng = random.Random(3)
+        vocab = ['hello ', '中文', '好', 'the quick ', 'a', ' ', '']
+        for _ in range(100):
+            segments, t = [], 0
+            for _ in range(rng.randint(0, 600)):
+                duration = rng.randint(0, 300)
+                text = ''.join(rng.choice(vocab) for _ in range(rng.choice([0, 1, 1, 3])))
+                segments.append(ASRDataSeg(text, t, t + duration))
+                # 负间隔（重叠的分段）和并列的最大间隔都要与原实现一致
+                t += duration + rng.choice([0, 0, 5, -1, -3, 100, 700])
+            for num_segments in (2, 3, 5, 8, 13, 40):
+                self._assert_same(ASRData(segments), num_segments)
+
+    def test_tied_gaps_split_at_the_first(self):
+        segments, t = [], 0
+        for index in range(10):
+            segments.append(ASRDataSeg('word ', t, t + 100))
+            t += 100 + (500 if index in (3, 6) else 0)
+        parts = split_main.split_asr_data(ASRData(segments), 2)
+        self.assertEqual(self._lengths(parts), [4, 6])
+        self.assertTrue(all(a is b for a, b in zip([seg for part in parts for seg in part.segments], segments)))
+        self.assertEqual(self._lengths(split_main.split_asr_data(ASRData(segments), 1)), [10])
+
+
+class ChunkPlannerTests(SimpleTestCase):
+    """按 token 预算规划分块/批次，截断时只拆分出问题的块"""
+
+    def setUp(self):
+        # 每个字符计 1 个 token，预算可以手算
+        patcher = mock.patch.object(chunk_planner, 'count_tokens', len)
+        patcher.__enter__()
+        self.addCleanup(patcher.__exit__, None, None, None)
+
+    def test_split_chunks_follow_output_budget(self):
+        # deepseek-chat：(8192 * 0.7 - 50) / 1.15 ≈ 4942 token 一块
+        self.assertEqual(chunk_planner.plan_split_chunks('x' * 10000, 'deepseek-chat', 100, 1), 3)
+        # 思考模型的输出额度有一部分留给推理过程
+        self.assertEqual(chunk_planner.plan_split_chunks('x' * 10000, 'deepseek-reasoner', 100, 1), 2)
+        # 提示词占满上下文时退回最小分块
+        self.assertEqual(chunk_planner.plan_split_chunks('x' * 10000, 'deepseek-chat', 60000, 1), 25)
+
+    def test_split_chunks_fill_threads_but_not_below_min_size(self):
+        self.assertEqual(chunk_planner.plan_split_chunks('x' * 2000, 'deepseek-chat', 100, 8), 5)
+        self.assertEqual(chunk_planner.plan_split_chunks('x' * 10, 'deepseek-chat', 100, 8), 1)
+        self.assertEqual(chunk_planner.plan_split_chunks('', 'deepseek-chat', 100, 8), 1)
+
+    def test_translate_batches(self):
+        texts = ['x' * 100] * 100   # 直译每句估 100 * 2.5 + 20 = 270 token，预算内最多 21 句
+        self.assertEqual(chunk_planner.plan_translate_batches(texts, 'deepseek-chat', 'direct', 1),
+                         [(0, 21), (21, 42), (42, 63), (63, 84), (84, 100)])
+        self.assertEqual(chunk_planner.plan_translate_batches(texts, 'deepseek-chat', 'direct', 10),
+                         [(i, i + 10) for i in range(0, 100, 10)])
+        self.assertEqual(chunk_planner.plan_translate_batches(texts[:5], 'deepseek-chat', 'free', 1, max_sentences=2),
+                         [(0, 2), (2, 4), (4, 5)])
+        # 超出预算的单句自成一批
+        self.assertEqual(chunk_planner.plan_translate_batches(['x' * 5000, 'a'], 'deepseek-chat', 'direct', 1),
+                         [(0, 1), (1, 2)])
+        self.assertEqual(chunk_planner.plan_translate_batches([], 'deepseek-chat', 'direct', 4), [])
+
+    @staticmethod
+    def _halve(chunk):
+        mid = len(chunk) // 2
+        return [chunk[:mid], chunk[mid:]] if mid else [chunk]
+
+    def test_shrink_retries_only_truncated_chunks(self):
+        calls = []
+
+        async def run(chunk, allow_truncated):
+            calls.append((chunk, allow_truncated))
+            if len(chunk) > 2 and not allow_truncated:
+                raise chunk_planner.LLMOutputTruncated()
+            return chunk
+
+        results = asyncio.run(chunk_planner.run_with_shrink(run, list(range(8)), self._halve))
+        self.assertEqual(results, [[0, 1], [2, 3], [4, 5], [6, 7]])
+        self.assertEqual(len(calls), 7)
+        self.assertFalse(any(allow for _, allow in calls))
+
+    def test_shrink_accepts_truncated_output_at_the_limit(self):
+        calls = []
+
+        async def run(chunk, allow_truncated):
+            calls.append((chunk, allow_truncated))
+            if not allow_truncated:
+                raise chunk_planner.LLMOutputTruncated()
+            return chunk
+
+        # 深度用尽后以 allow_truncated=True 使用已有输出
+        self.assertEqual(asyncio.run(chunk_planner.run_with_shrink(run, list(range(4)), self._halve, depth=1)),
+                         [[0, 1], [2, 3]])
+        self.assertEqual(calls[1:], [([0, 1], True), ([2, 3], True)])
+        # 无法再拆分的块直接接受截断输出
+        calls.clear()
+        self.assertEqual(asyncio.run(chunk_planner.run_with_shrink(run, [9], self._halve)), [[9]])
+        self.assertEqual(calls, [([9], False), ([9], True)])
+
+    def test_halve_sentence_level_asr_data(self):
+        # 句级分段（每段 10 个词）：split_asr_data 按字数定位会切不开，截断重试改按下标对半
+        segments = [ASRDataSeg('one two three four five six seven eight nine ten ', i * 1000, i * 1000 + 900)
+                    for i in range(200)]
+        asr_data = ASRData(segments)
+        self.assertEqual([len(part.segments) for part in split_main.halve_asr_data(asr_data)], [100, 100])
+        single = ASRData(segments[:1])
+        self.assertEqual(split_main.halve_asr_data(single), [single])
+        self.assertTrue(any(not part.has_data() for part in split_main.split_asr_data(asr_data, 8)))
+
+
+class _StubCompletions:
+    """AsyncOpenAI().chat.completions 的替身：依次抛出 errors 中的异常，之后返回 'ok'"""
+
+    def __init__(self, errors=(), hang=False):
+        self.errors = list(errors)
+        self.hang = hang
+        self.calls = []
+        self.cancelled = threading.Event()
+
+    async def create(self, **kwargs):
+        self.calls.append(time.monotonic())
+        if self.hang:
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                self.cancelled.set()
+                raise
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def _api_error(cls, status, headers=None):
+    return cls('error', response=mock.Mock(status_code=status, headers=headers or {}), body=None)
+
+
+class LLMAsyncTests(SimpleTestCase):
+    """共享事件循环上的 LLM 调用：重试/限速/取消"""
+
+    def use_stub(self, completions):
+        client = mock.Mock()
+        client.chat.completions = completions
+        for patcher in (mock.patch.object(llm_async, '_get_client', return_value=client),
+                        mock.patch.dict(llm_async._providers, clear=True)):
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+
+    def call(self, **kwargs):
+        return llm_async.chat_completion('key', 'https://llm.test', 'model', [], **kwargs)
+
+    def test_retry_after_is_honoured(self):
+        completions = _StubCompletions([_api_error(llm_async.openai.RateLimitError, 429, {'retry-after': '0.3'})])
+        self.use_stub(completions)
+        with mock.patch.object(llm_async.random, 'uniform', side_effect=AssertionError('jitter used')):
+            self.assertEqual(llm_async.run_sync(self.call()), 'ok')
+        self.assertEqual(len(completions.calls), 2)
+        self.assertGreaterEqual(completions.calls[1] - completions.calls[0], 0.3)
+
+    def test_server_errors_retry_with_backoff_but_client_errors_do_not(self):
+        completions = _StubCompletions([_api_error(llm_async.openai.InternalServerError, 503)])
+        self.use_stub(completions)
+        with mock.patch.object(llm_async.random, 'uniform', return_value=0) as jitter:
+            self.assertEqual(llm_async.run_sync(self.call()), 'ok')
+        jitter.assert_called_once_with(0, llm_async.BASE_BACKOFF)
+
+        completions = _StubCompletions([_api_error(llm_async.openai.BadRequestError, 400)])
+        self.use_stub(completions)
+        with self.assertRaises(llm_async.openai.BadRequestError):
+            llm_async.run_sync(self.call())
+        self.assertEqual(len(completions.calls), 1)
+
+    def test_gives_up_after_max_retries(self):
+        errors = [_api_error(llm_async.openai.RateLimitError, 429, {'retry-after': '0'}) for _ in range(3)]
+        completions = _StubCompletions(errors)
+        self.use_stub(completions)
+        with mock.patch.object(llm_async, 'MAX_RETRIES', 2), self.assertRaises(llm_async.openai.RateLimitError):
+            llm_async.run_sync(self.call())
+        self.assertEqual(len(completions.calls), 3)
+
+    def test_token_bucket_throttles_bursts(self):
+        completions = _StubCompletions()
+        self.use_stub(completions)
+
+        async def burst():
+            return await asyncio.gather(*(self.call() for _ in range(5)))
+
+        # 每秒补充 10 个令牌、突发 2 个：前两个立即发出，其余约每 0.1 秒一个
+        with mock.patch.object(llm_async, 'PROVIDER_REQUESTS_PER_MINUTE', 600), \
+                mock.patch.object(llm_async, 'PROVIDER_BURST', 2):
+            self.assertEqual(llm_async.run_sync(burst()), ['ok'] * 5)
+        start = completions.calls[0]
+        self.assertLess(completions.calls[1] - start, 0.08)
+        self.assertGreaterEqual(completions.calls[4] - start, 0.28)
+
+    def test_cancel_check_cancels_the_request(self):
+        completions = _StubCompletions(hang=True)
+        self.use_stub(completions)
+        future = llm_async.submit(self.call())
+        with mock.patch.object(llm_async, 'CANCEL_POLL_INTERVAL', 0.05), self.assertRaises(llm_async.LLMCancelled):
+            llm_async.wait_result(future, cancel_check=lambda: bool(completions.calls))
+        self.assertTrue(completions.cancelled.wait(5))
+        self.assertTrue(future.cancelled())
+
+
+class WaveformPeaksTests(SimpleTestCase):
+    """从共享 PCM 分块计算的峰值应与整段读入的结果一致"""
+
+    def write_wav(self, samples):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, True)
+        path = os.path.join(tmp, 'audio.wav')
+        with wave.open(path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(16000)
+            wav.writeframes(samples.astype('<i2').tobytes())
+        return path
+
+    def test_chunked_peaks_match_whole_file(self):
+        rng = np.random.default_rng(5)
+        samples = rng.integers(-32768, 32767, 16000 * 7 + 123)
+        path = self.write_wav(samples)
+        expected = waveform_generator._calculate_peaks(
+            samples.astype(np.float32) / 32768.0, 20, len(samples) / 16000)
+
+        # 读取块远小于文件，覆盖跨块和尾部不满窗口的情况
+        with mock.patch.object(waveform_generator, 'PEAK_READ_FRAMES', 5000):
+            peaks, duration = waveform_generator._pcm_wav_peaks(path, 20)
+
+        self.assertAlmostEqual(duration, len(samples) / 16000)
+        self.assertEqual(len(peaks), len(expected))
+        np.testing.assert_allclose(peaks, expected, rtol=1e-5)
+
+    def test_empty_wav(self):
+        path = self.write_wav(np.array([], dtype=np.int16))
+        self.assertEqual(waveform_generator._pcm_wav_peaks(path, 20), ([], 0.0))
+
+
+class ImageVariantTests(SimpleTestCase):
+    def setUp(self):
+        from PIL import Image
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.image = os.path.join(tmp.name, 'cover.jpg')
+        Image.new('RGB', (1000, 600), 'red').save(self.image)
+        for patcher in (override_settings(MEDIA_ROOT=tmp.name),
+                        mock.patch.object(image_variants, 'VARIANT_DIR', os.path.join(tmp.name, 'variants'))):
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+        self.factory = RequestFactory()
+
+    def _get(self, etag=None, w=480):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return MediaActionView().serve_image_file(self.factory.get(f'/x?w={w}&fmt=webp', **headers), self.image)
+
+    def test_variants_revalidate_and_change_with_source(self):
+        first = self._get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Cache-Control'], 'no-cache')
+        self.assertEqual(self._get(first['ETag']).status_code, 304)
+        # 封面被原地覆盖后 ETag 改变，浏览器拿到新图
+        os.utime(self.image, (1, 1))
+        updated = self._get(first['ETag'])
+        self.assertEqual(updated.status_code, 200)
+        self.assertNotEqual(updated['ETag'], first['ETag'])
+
+    def test_cache_is_bounded(self):
+        with mock.patch.object(image_variants, 'MAX_CACHE_BYTES', 1):
+            self._get(w=240)
+            response = self._get(w=480)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(os.listdir(image_variants.VARIANT_DIR), [response['ETag'].strip('"')])
+
+    def test_variant_evicted_before_open_is_regenerated(self):
+        get_variant = image_variants.get_variant
+        calls = []
+
+        def evicting_get_variant(*args):
+            variant = get_variant(*args)
+            calls.append(variant[0])
+            if len(calls) == 1:
+                os.remove(variant[0])   # 模拟返回路径后、打开前被 LRU 淘汰
+            return variant
+
+        with mock.patch.object(image_variants, 'get_variant', evicting_get_variant):
+            response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertTrue(b''.join(response.streaming_content))
+        self.assertEqual(len(calls), 2)
+        self.assertTrue(os.path.exists(calls[1]))
+
+
+class ThumbnailCacheEvictionTests(SimpleTestCase):
+    """封面缓存淘汰时持有条目锁：正在使用的条目不删，删掉的条目同时移除其锁"""
+
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        for patcher in (
+            mock.patch.object(thumbnail_cache, 'CACHE_DIR', cache_dir),
+            mock.patch.object(thumbnail_cache, '_cache_bytes', None),
+            mock.patch.dict(thumbnail_cache._key_locks, clear=True),
+        ):
+            patcher.__enter__()
+            self.addCleanup(patcher.__exit__, None, None, None)
+        for index, key in enumerate(('busy', 'old', 'new')):
+            img_path, meta_path = thumbnail_cache._paths(key)
+            for path in (img_path, meta_path):
+                with open(path, 'wb') as f:
+                    f.write(b'x' * 100)
+                os.utime(path, (1000 + index, 1000 + index))
+            thumbnail_cache._key_lock(key)
+
+    def test_eviction_skips_locked_entries_and_drops_their_locks(self):
+        busy = thumbnail_cache._key_lock('busy')
+        with busy, mock.patch.object(thumbnail_cache, 'MAX_CACHE_BYTES', 250):
+            thumbnail_cache._track_size(0)
+        self.assertEqual(sorted(os.listdir(thumbnail_cache.CACHE_DIR)), ['busy.img', 'busy.json', 'new.img', 'new.json'])
+        self.assertEqual(sorted(thumbnail_cache._key_locks), ['busy', 'new'])
+
+    def test_hit_returns_a_handle_that_survives_eviction(self):
+        url = 'https://i0.hdslb.com/bfs/cover.jpg'
+        img_path, meta_path = thumbnail_cache._paths(sha256(url.encode()).hexdigest())
+        with open(img_path, 'wb') as f:
+            f.write(b'cover')
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump({'expires_at': time.time() + 60, 'content_type': 'image/jpeg', 'etag': '"e"'}, f)
+
+        img_file, meta = thumbnail_cache.get_cached_thumbnail(url)
+        with img_file:
+            with mock.patch.object(thumbnail_cache, 'MAX_CACHE_BYTES', 0):
+                thumbnail_cache._track_size(0)
+            self.assertFalse(os.path.exists(img_path))
+            self.assertEqual(img_file.read(), b'cover')
+        self.assertEqual(meta['etag'], '"e"')
+
+
+class ExtractedAudioStreamTests(SimpleTestCase):
+    """边提取边输出时，ffmpeg 中途失败要让流异常结束，而不是正常结束在截断处"""
+
+    def test_failure_after_first_chunk_raises_in_stream(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            job = extracted_audio._ExtractJob('k', os.path.join(cache_dir, 'k.mp3'))
+            with open(job.part_path, 'wb') as f:
+                f.write(b'first')
+            job._advance(5)
+            chunks = job.iter_chunks()
+            self.assertEqual(next(chunks), b'first')
+            job._advance(done=True, error='ffmpeg exit 1')
+            with self.assertRaises(extracted_audio.ExtractionError):
+                next(chunks)
+
+    def test_stream_copy_only_on_exact_codec_match(self):
+        def audio_args(probed, codec):
+            with mock.patch.object(extracted_audio, 'probe_audio_codec', return_value=probed):
+                cmd = extracted_audio._build_command('in.mkv', codec, '192k')
+            return cmd[cmd.index('-c:a') + 1]
+
+        self.assertEqual(audio_args('aac', 'aac'), 'copy')
+        self.assertEqual(audio_args('mp3', 'mp3'), 'copy')
+        # 未识别的编码和探测失败都要转码，不能把非 AAC 音轨直接封装成 ADTS
+        for probed in ('ac3', 'alac', 'pcm_s24le', 'wmav2', None):
+            with self.subTest(probed=probed):
+                self.assertEqual(audio_args(probed, 'aac'), 'aac')
+        self.assertEqual(audio_args('aac', 'mp3'), 'libmp3lame')
+
+    def test_probe_returns_none_when_ffprobe_fails(self):
+        def run(stdout, returncode=0):
+            result = mock.Mock(stdout=stdout, returncode=returncode)
+            with mock.patch.object(audio_processing.subprocess, 'run', return_value=result):
+                return audio_processing.probe_audio_codec('in.mkv'), audio_processing.detect_video_audio_format('in.mkv')
+
+        self.assertEqual(run('{"streams": [{"codec_name": "alac"}]}'), ('alac', 'aac'))
+        self.assertEqual(run('{"streams": [{"codec_name": "opus"}]}'), ('opus', 'opus'))
+        self.assertEqual(run('{"streams": []}'), (None, 'aac'))
+        self.assertEqual(run('', returncode=1), (None, 'aac'))
+
+
+class ScreenshotJobTests(SimpleTestCase):
+    def test_job_is_only_visible_to_its_video(self):
+        with mock.patch.dict(screenshots._jobs, clear=True), \
+                mock.patch.object(screenshots, 'extract_frames', return_value={1.0: 'a_1000ms_w0.jpg'}), \
+                mock.patch.object(screenshots, '_job_pool', mock.Mock(submit=lambda run: run())):
+            job_id = screenshots.submit_job('/tmp/a.mp4', 'a.mp4', [1.0])
+            self.assertEqual(screenshots.get_job(job_id, 'a.mp4')['status'], 'Completed')
+            self.assertIsNone(screenshots.get_job(job_id, 'b.mp4'))
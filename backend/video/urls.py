@@ -23,11 +23,13 @@ from .views.external_transcription import (
     ExternalTranscriptionStatusView,
     ExternalTranscriptionResultView,
     ExternalTranscriptionListView,
+    ExternalTranscriptionHealthView,
     ExternalTranscriptionDeleteView
 )
 from .views.realtime_subtitles import RealtimeSubtitleView, RealtimeSubtitleStreamView
 from .views.tts import TTSGenerateView, AllTTSStatusView, TTSStatusView, DeleteTTSTaskView, RetryTTSTaskView, VideoLanguageTracksView
 from .views.tts_audio_upload import TTSAudioUploadView
+from .views.task_events import TaskEventsView, TaskEventStreamView
 from django.views.decorators.csrf import csrf_exempt,get_token,ensure_csrf_cookie
 from .tasks import SubtitleTaskStatusView
 from .views import stream_media
@@ -43,8 +45,9 @@ def get_csrf_token(request):
   token = django.middleware.csrf.get_token(request)
   return JsonResponse({'csrf_token': token})
 
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, HttpResponseNotModified, FileResponse, Http404
 import requests
+from .services.thumbnail_cache import get_cached_thumbnail, UpstreamError
 
 # 放到模块顶层，避免每次函数调用都重新创建列表
 THUMBNAIL_ALLOWED_HOSTS = {
@@ -58,14 +61,15 @@ THUMBNAIL_ALLOWED_HOSTS = {
     "img.youtube.com",
 }
 
-# 设置一个合理的超时时间，防止代理卡死
-REQUEST_TIMEOUT = (3.0, 5.0)   # (连接超时, 读取超时)
+# 浏览器端缓存时间：封面基本不变，缓存一天
+THUMBNAIL_BROWSER_MAX_AGE = 24 * 3600
 
 @require_GET
 def thumbnail_proxy(request):
     """
-    代理拉取 B 站 CDN 缩略图，并返回给前端。
+    代理拉取 B 站 / YouTube CDN 缩略图，并返回给前端。
     只允许访问 `THUMBNAIL_ALLOWED_HOSTS` 中的域名。
+    远端图片缓存在磁盘（见 services/thumbnail_cache.py），响应带 ETag/Cache-Control 并流式输出。
     """
     raw_url = request.GET.get("url")
     if not raw_url:
@@ -85,21 +89,27 @@ def thumbnail_proxy(request):
     if parsed.hostname not in THUMBNAIL_ALLOWED_HOSTS:
         raise Http404("非法域名")
 
-    # 3) 代理请求
+    # 3) 从磁盘缓存取图，缺失或过期时才请求上游
     try:
-        headers = {"Referer": "https://www.bilibili.com"}
-        resp = requests.get(raw_url, headers=headers, timeout=REQUEST_TIMEOUT, stream=True)
+        img_file, meta = get_cached_thumbnail(raw_url)
+    except UpstreamError as e:
+        # 把远端状态码原样返回即可
+        return HttpResponse(status=e.status)
     except requests.RequestException:
         # 网络层面出错：返回 502 让前端知道服务端取图失败
         return HttpResponse(status=502)
 
-    if resp.status_code != 200:
-        # 把远端状态码原样返回即可
-        return HttpResponse(status=resp.status_code)
-
-    # 4) 把内容透传给前端
-    content_type = resp.headers.get("Content-Type", "image/jpeg")
-    return HttpResponse(resp.content, content_type=content_type)
+    etag = meta.get("etag") or f'"{meta["key"][:32]}"'
+    cache_control = f"public, max-age={THUMBNAIL_BROWSER_MAX_AGE}"
+    if etag in request.headers.get("If-None-Match", ""):
+        img_file.close()
+        response = HttpResponseNotModified()
+    else:
+        # 4) 流式返回缓存文件（已在缓存锁内打开，不怕被淘汰删除）
+        response = FileResponse(img_file, content_type=meta.get("content_type", "image/jpeg"))
+    response["ETag"] = etag
+    response["Cache-Control"] = cache_control
+    return response
 """
 在urls.py中需要展示
 """
@@ -167,6 +177,7 @@ urlpatterns = [
     path('api/external_transcription/<str:task_id>/status', ExternalTranscriptionStatusView.as_view(), name='external_transcription_status'),
     path('api/external_transcription/<str:task_id>/result', ExternalTranscriptionResultView.as_view(), name='external_transcription_result'),
     path('api/external_transcription/list', ExternalTranscriptionListView.as_view(), name='external_transcription_list'),
+    path('api/external_transcription/health', ExternalTranscriptionHealthView.as_view(), name='external_transcription_health'),
     path('api/external_transcription/<str:task_id>/delete', ExternalTranscriptionDeleteView.as_view(), name='external_transcription_delete'),
 
     # 任务管理（字幕）
@@ -174,6 +185,8 @@ urlpatterns = [
     path('api/tasks/subtitle_generate/add', subtitles.SubtitleGenerationAddView.as_view()),
     path('api/tasks/subtitle_translation/add', subtitles.SubtitleTranslationAddView.as_view()),
     path('api/tasks/subtitle_generate/<int:video_id>/<str:action>', subtitles.SubtitleGenerationTaskView.as_view(), name='subtitle-task-action'),
+    path('api/tasks/events', TaskEventsView.as_view(), name='task_events'),
+    path('api/tasks/events/stream', TaskEventStreamView.as_view(), name='task_event_stream'),
 
     # TTS配音生成
     path('api/tts/generate/<int:video_id>', TTSGenerateView.as_view(), name='tts_generate'),
@@ -4,7 +4,7 @@ from django.http import JsonResponse,HttpResponse,HttpResponseNotAllowed,HttpRes
 from django.core.exceptions import ObjectDoesNotExist
 from .base import JsonView
 from django.views import View
-from ..models import Category, Video          # parent dir -> app root
+from ..models import Category, Video, LibraryChange          # parent dir -> app root
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 import json
@@ -139,8 +139,10 @@ class CategoryActionView(View):
                     {'error': 'Old category name does not exist'},
                     status=404
                 )
-            Category.objects.filter(name__iexact=old_name).update(name=new_name)
-            updated = Video.objects.filter(category__name__iexact=new_name)
+            renamed_ids = list(Category.objects.filter(name__iexact=old_name).values_list('id', flat=True))
+            Category.objects.filter(id__in=renamed_ids).update(name=new_name)
+            LibraryChange.record('category', renamed_ids)
+            updated = Video.objects.filter(category_id__in=renamed_ids).count()
             # if updated == 0:
             #     return JsonResponse(
             #         {'error': 'No videos found with the specified category'},
@@ -179,7 +181,9 @@ class CategoryActionView(View):
                 )
 
             # Set category to null for all videos in this category
-            Video.objects.filter(category=category).update(category=None)
+            video_ids = list(Video.objects.filter(category=category).values_list('id', flat=True))
+            Video.objects.filter(id__in=video_ids).update(category=None)
+            LibraryChange.record('video', video_ids)
 
             # Delete category
             category.delete()
@@ -6,11 +6,12 @@ from django.shortcuts import get_object_or_404,render
 from django.urls import reverse
 from .base import JsonView
 from django.views import View
-from ..models import Collection, Category
+from ..models import Collection, Category, LibraryChange
 from ..utils import calc_diff_time
 from .videos import get_user_combined_hidden_categories
 import os
 import json
+from django.db.models import Count
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
@@ -58,18 +59,18 @@ class CollectionActionView(View):
         hidden_category_ids = get_user_combined_hidden_categories(request)
         
         # Build query conditions
+        # Category is joined and video counts are annotated, so the whole list costs one query
+        collections = Collection.objects.select_related('category').annotate(video_count=Count('videos'))
         if category_id:
             if category_id == '0':  # 0 means no category
-                collections = Collection.objects.filter(category__isnull=True)
+                collections = collections.filter(category__isnull=True)
             else:
                 try:
-                    collections = Collection.objects.filter(category_id=category_id)
+                    collections = collections.filter(category_id=int(category_id))
                 except ValueError:
                     return JsonResponse(
                         {"success": False, "message": "Invalid category_id"}, status=400
                     )
-        else:
-            collections = Collection.objects.all()
         
         # Filter out collections belonging to hidden categories
         if hidden_category_ids:
@@ -80,7 +81,6 @@ class CollectionActionView(View):
         
         collection_list = []
         for collection in collections:
-            video_count = collection.videos.count()
             collection_list.append({
                 "id": collection.id,
                 "name": collection.name,
@@ -89,7 +89,7 @@ class CollectionActionView(View):
                 "thumbnail_url": collection.thumbnail_url,
                 "created_time": collection.created_time.isoformat() if collection.created_time else None,
                 "last_modified": collection.last_modified.isoformat() if collection.last_modified else None,
-                "video_count": video_count
+                "video_count": collection.video_count
             })
 
         return JsonResponse({
@@ -131,7 +131,7 @@ class CollectionActionView(View):
         Query Collection details, including its associated video list
         """
         try:
-            collection = Collection.objects.get(pk=collection_id)
+            collection = Collection.objects.select_related('category').get(pk=collection_id)
         except Collection.DoesNotExist:
             return JsonResponse(
                 {"success": False, "message": "Collection not found"}, status=404
@@ -160,7 +160,7 @@ class CollectionActionView(View):
                 "thumbnail_url": collection.thumbnail_url,
                 "created_time": collection.created_time.isoformat(),
                 "last_modified": collection.last_modified.isoformat(),
-                "video_count": videos.count(),
+                "video_count": len(video_list),
                 "videos": video_list
             }
         }, status=200)
@@ -342,10 +342,12 @@ class CollectionActionView(View):
         videos_in_collection = collection.videos.all()
         videos_updated = 0
         if videos_in_collection.exists():
+            video_ids = list(videos_in_collection.values_list('id', flat=True))
             videos_updated = videos_in_collection.update(
                 category=new_category,
                 last_modified=timezone.now()
             )
+            LibraryChange.record('video', video_ids)
 
         return JsonResponse({
             "success": True,
@@ -436,7 +438,12 @@ class CollectionActionView(View):
             collection = get_object_or_404(Collection, pk=collection_id)
             
             # Get all videos in the collection, sorted by last_modified in descending order
-            videos = collection.videos.all().order_by('-last_modified')
+            # Only the listed columns are loaded; notes/mindmap/chapters JSON can be large
+            videos = (
+                collection.videos
+                .only('id', 'name', 'url', 'thumbnail_url', 'video_length', 'last_modified', 'collection')
+                .order_by('-last_modified')
+            )
             
             video_list = []
             for video in videos:
@@ -5,9 +5,8 @@ from django.utils.decorators import method_decorator
 from django.conf import settings
 from ..models import Video
 from .videos import is_audio_file, get_media_path_info
+from ..services import extracted_audio
 import os
-import subprocess
-import tempfile
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -68,15 +67,25 @@ class VideoDownloadView(View):
             return HttpResponse(status=404)
         
         # Get file size
-        file_size = os.path.getsize(file_path)
-        
-        # Set appropriate content type
-        content_type = 'video/mp4' if format_type == 'mp4' else 'audio/mpeg'
+        if format_type == 'mp3' and not is_audio_file(filename):
+            # 提取出的音频只有缓存后才知道大小
+            codec = request.GET.get('codec', 'mp3')
+            if codec not in extracted_audio.CODECS:
+                return HttpResponse(status=400)
+            file_size = extracted_audio.cached_size(file_path, codec)
+            content_type = extracted_audio.CODECS[codec][3]
+            accept_ranges = False   # GET 边提取边输出，不支持 Range
+        else:
+            file_size = os.path.getsize(file_path)
+            content_type = 'video/mp4' if format_type == 'mp4' else 'audio/mpeg'
+            accept_ranges = True
         
         response = HttpResponse(status=200)
-        response['Content-Length'] = str(file_size)
+        if file_size is not None:
+            response['Content-Length'] = str(file_size)
         response['Content-Type'] = content_type
-        response['Accept-Ranges'] = 'bytes'
+        if accept_ranges:
+            response['Accept-Ranges'] = 'bytes'
         return response
 
     def get(self, request, video_id: int, format_type: str):
@@ -95,7 +104,10 @@ class VideoDownloadView(View):
         
         # For MP3 format from video file, we need to extract audio
         if format_type == 'mp3' and not is_audio_file(filename):
-            return self.stream_extracted_audio(file_path, filename)
+            codec = request.GET.get('codec', 'mp3')
+            if codec not in extracted_audio.CODECS:
+                return JsonResponse({'error': f'不支持的音频编码: {codec}'}, status=400)
+            return self.stream_extracted_audio(file_path, filename, codec)
         
         # Direct file streaming
         return self.stream_file(file_path, filename, format_type)
@@ -130,72 +142,25 @@ class VideoDownloadView(View):
         response['Cache-Control'] = 'no-cache'
         return response
 
-    def stream_extracted_audio(self, video_path: str, original_filename: str):
-        """Extract audio from video and stream as MP3 using StreamingHttpResponse"""
+    def stream_extracted_audio(self, video_path: str, original_filename: str, codec: str = 'mp3'):
+        """Stream audio extracted from a video, served from / filled into the extracted-audio cache"""
         from django.http import StreamingHttpResponse
-        
-        # Create temporary file for extracted audio
-        with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_file:
-            temp_audio_path = temp_file.name
-        
+
         try:
-            # Extract audio using ffmpeg
-            cmd = [
-                'ffmpeg', '-i', video_path,
-                '-vn',  # No video
-                '-acodec', 'mp3',
-                '-ab', '192k',  # Audio bitrate
-                '-y',  # Overwrite output file
-                temp_audio_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            if result.returncode != 0:
-                try:
-                    os.unlink(temp_audio_path)
-                except:
-                    pass
-                return JsonResponse({'error': '音频提取失败'}, status=500)
-            
-            # Stream the extracted audio
-            file_size = os.path.getsize(temp_audio_path)
-            
-            def audio_iterator(chunk_size=8192):
-                """Generator for streaming extracted audio without memory overhead"""
-                try:
-                    with open(temp_audio_path, 'rb') as f:
-                        while True:
-                            chunk = f.read(chunk_size)
-                            if not chunk:
-                                break
-                            yield chunk
-                except IOError as e:
-                    print(f"Error reading extracted audio {temp_audio_path}: {e}")
-                    yield b''
-                finally:
-                    # Clean up temporary file after streaming
-                    try:
-                        os.unlink(temp_audio_path)
-                    except Exception as e:
-                        print(f"Error cleaning up temp file {temp_audio_path}: {e}")
-            
-            # Generate appropriate filename for MP3
-            mp3_filename = os.path.splitext(original_filename)[0] + '.mp3'
-            
-            response = StreamingHttpResponse(
-                audio_iterator(),
-                content_type='audio/mpeg'
-            )
-            response['Content-Length'] = str(file_size)
-            response['Content-Disposition'] = f'attachment; filename="{mp3_filename}"'
-            response['Accept-Ranges'] = 'bytes'
-            response['Cache-Control'] = 'no-cache'
-            return response
-            
+            chunks, size, content_type = extracted_audio.open_extracted_audio(video_path, codec)
+        except extracted_audio.ExtractionError as e:
+            print(f"Audio extraction failed for {video_path}: {e}")
+            return JsonResponse({'error': '音频提取失败'}, status=500)
         except Exception as e:
-            # Clean up temp file on error
-            try:
-                os.unlink(temp_audio_path)
-            except:
-                pass
-            return JsonResponse({'error': f'音频提取异常: {str(e)}'}, status=500)
\ No newline at end of file
+            return JsonResponse({'error': f'音频提取异常: {str(e)}'}, status=500)
+
+        # Generate appropriate filename for the extracted audio
+        audio_filename = os.path.splitext(original_filename)[0] + '.' + extracted_audio.CODECS[codec][2]
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        if size is not None:
+            # 命中缓存时大小已知；首次提取边转码边输出，不带 Content-Length
+            response['Content-Length'] = str(size)
+        response['Content-Disposition'] = f'attachment; filename="{audio_filename}"'
+        response['Cache-Control'] = 'no-cache'
+        return response
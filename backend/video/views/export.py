@@ -8,6 +8,7 @@ import time
 import os
 import mimetypes
 from ..tasks import export_queue, export_task_status, export_update_status
+from ..services import task_events
 from ..models import Video
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -61,6 +62,7 @@ class ExportTaskAddView(View):
                 "output_filename": "",
                 "error_message": "",
             })
+            task_events.publish("export", task_id)
             
             # Add to queue
             export_queue.put(task_id)
@@ -131,6 +133,7 @@ class DeleteExportTaskView(View):
         
         # Delete from task status
         del export_task_status[task_id]
+        task_events.publish("export", task_id)
         
         return JsonResponse({
             'success': True,
@@ -151,8 +154,8 @@ class RetryExportTaskView(View):
         task = export_task_status[task_id]
         
         # Reset task status
-        export_update_status(task_id, "Queued", 0, "")
         task['output_filename'] = ""
+        export_update_status(task_id, "Queued", 0, "")
         
         # Re-add to queue
         export_queue.put(task_id)
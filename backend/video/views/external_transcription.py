@@ -7,13 +7,54 @@ import os
 import uuid
 import time
 import json
+import shutil
 import requests
 from django.views import View
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.conf import settings
-from ..tasks import external_task_status, subtitle_task_queue
+from queue import Full
+from ..services import task_events
+from ..tasks import (
+    external_task_status,
+    external_task_lock,
+    external_task_queue,
+    subtitle_task_queue,
+    count_active_external_tasks,
+    purge_expired_external_tasks,
+    EXTERNAL_PER_CLIENT_LIMIT,
+    EXTERNAL_RETRY_AFTER,
+    EXTERNAL_MIN_FREE_BYTES,
+)
+
+EXTERNAL_AUDIO_DIR = 'work_dir/external_audio'
+
+
+def _client_id(request) -> str:
+    """
+    Identify the submitting client by its address.
+
+    X-Forwarded-For is client-controlled, so it is only honoured when the
+    connection comes from one of settings.TRUSTED_PROXIES; the client is then
+    the right-most forwarded address that is not itself a trusted proxy.
+    """
+    client = request.META.get('REMOTE_ADDR', '')
+    trusted = settings.TRUSTED_PROXIES
+    if client not in trusted:
+        return client
+    forwarded = request.META.get('HTTP_X_FORWARDED_FOR', '')
+    for address in reversed([a.strip() for a in forwarded.split(',') if a.strip()]):
+        client = address
+        if address not in trusted:
+            break
+    return client
+
+
+def _too_many_requests(message: str) -> JsonResponse:
+    response = JsonResponse({'error': message}, status=429)
+    response['Retry-After'] = str(EXTERNAL_RETRY_AFTER)
+    return response
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -25,6 +66,22 @@ class ExternalTranscriptionSubmitView(View):
     http_method_names = ["post"]
     
     def post(self, request):
+        purge_expired_external_tasks()
+
+        # Backpressure: reject before touching the disk
+        client = _client_id(request)
+        if external_task_queue.full():
+            return _too_many_requests('External transcription queue is full')
+        if count_active_external_tasks(client) >= EXTERNAL_PER_CLIENT_LIMIT:
+            return _too_many_requests(
+                f'Client has reached the limit of {EXTERNAL_PER_CLIENT_LIMIT} active tasks'
+            )
+        os.makedirs(EXTERNAL_AUDIO_DIR, exist_ok=True)
+        if shutil.disk_usage(EXTERNAL_AUDIO_DIR).free < EXTERNAL_MIN_FREE_BYTES:
+            response = JsonResponse({'error': 'Insufficient disk space on transcription host'}, status=507)
+            response['Retry-After'] = str(EXTERNAL_RETRY_AFTER * 10)
+            return response
+
         try:
             # Parse request data
             if request.content_type and request.content_type.startswith('application/json'):
@@ -58,12 +115,8 @@ class ExternalTranscriptionSubmitView(View):
             # Generate unique task ID with 'ext_' prefix
             task_id = f'ext_{str(uuid.uuid4())}'
             
-            # Create external transcription work directory
-            external_audio_dir = 'work_dir/external_audio'
-            os.makedirs(external_audio_dir, exist_ok=True)
-            
             # Save file path
-            file_path = os.path.join(external_audio_dir, f"{task_id}_{filename}")
+            file_path = os.path.join(EXTERNAL_AUDIO_DIR, f"{task_id}_{filename}")
             
             if source_type == "upload":
                 # Save uploaded file
@@ -84,23 +137,34 @@ class ExternalTranscriptionSubmitView(View):
                     }, status=400)
             
             # Update task status
-            external_task_status[task_id].update({
-                "task_id": task_id,
-                "filename": filename,
-                "audio_file_path": file_path,
-                "task_type": "external",
-                "created_at": int(time.time()),
-                "status": "Queued",
-            })
+            with external_task_lock:
+                external_task_status[task_id].update({
+                    "task_id": task_id,
+                    "filename": filename,
+                    "audio_file_path": file_path,
+                    "task_type": "external",
+                    "client": client,
+                    "created_at": int(time.time()),
+                    "status": "Queued",
+                })
+            task_events.publish("external", task_id)
             
-            # Add to unified queue (same priority as internal tasks)
-            subtitle_task_queue.put(task_id)
+            # Add to the bounded external lane (internal tasks are served first)
+            try:
+                external_task_queue.put_nowait(task_id)
+            except Full:
+                with external_task_lock:
+                    external_task_status.pop(task_id, None)
+                task_events.publish("external", task_id)
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+                return _too_many_requests('External transcription queue is full')
             
             return JsonResponse({
                 'task_id': task_id,
                 'status': 'queued',
                 'message': 'Audio file queued for transcription',
-                'queue_position': subtitle_task_queue.qsize()
+                'queue_position': external_task_queue.qsize() + subtitle_task_queue.qsize()
             })
             
         except json.JSONDecodeError:
@@ -109,9 +173,19 @@ class ExternalTranscriptionSubmitView(View):
             return JsonResponse({'error': str(e)}, status=500)
 
 
+# Upper bound for long-poll waits so a request never outlives the gunicorn timeout
+LONG_POLL_MAX_WAIT = 25
+
+
 class ExternalTranscriptionStatusView(View):
     """
     Query transcription task status and results
+
+    Supports long-polling: with ``?wait=<seconds>`` the request blocks until the
+    task's status or progress differs from the ``status``/``progress`` values the
+    caller last saw, or until the wait expires. Waiters sleep on the task event
+    bus and share its blocking_waiters slots with the task event feeds; when
+    they are all taken, the current status is returned at once.
     """
     http_method_names = ["get"]
     
@@ -120,10 +194,30 @@ class ExternalTranscriptionStatusView(View):
             return JsonResponse({'error': 'Task not found'}, status=404)
         
         task = external_task_status[task_id]
+
+        try:
+            wait = min(float(request.GET.get('wait', 0)), LONG_POLL_MAX_WAIT)
+        except ValueError:
+            wait = 0
+        waiters = task_events.blocking_waiters
+        if wait > 0 and waiters.acquire(blocking=False):
+            seen_status = request.GET.get('status', '').lower()
+            seen_progress = request.GET.get('progress', '')
+            try:
+                task_events.wait_for(
+                    lambda: task['status'].lower() != seen_status
+                    or str(task.get('progress', 0)) != seen_progress
+                    or task_id not in external_task_status,
+                    wait,
+                )
+            finally:
+                waiters.release()
+
         response_data = {
             'task_id': task_id,
             'filename': task['filename'],
             'status': task['status'].lower(),
+            'progress': task.get('progress', 0),
             'created_at': task['created_at'],
         }
         
@@ -137,7 +231,7 @@ class ExternalTranscriptionStatusView(View):
         
         # Add queue information
         if task['status'] == 'Queued':
-            response_data['queue_size'] = subtitle_task_queue.qsize()
+            response_data['queue_size'] = external_task_queue.qsize() + subtitle_task_queue.qsize()
         
         return JsonResponse(response_data)
 
@@ -172,6 +266,21 @@ class ExternalTranscriptionResultView(View):
             return JsonResponse({'error': f'Error reading result file: {str(e)}'}, status=500)
 
 
+class ExternalTranscriptionHealthView(View):
+    """
+    Lightweight liveness probe for remote callers.
+    Unlike the list endpoint it does not serialize the task table.
+    """
+    http_method_names = ["get"]
+
+    def get(self, request):
+        return JsonResponse({
+            'status': 'ok',
+            'queue_size': external_task_queue.qsize() + subtitle_task_queue.qsize(),
+            'queue_full': external_task_queue.full(),
+        })
+
+
 class ExternalTranscriptionListView(View):
     """
     List all external transcription tasks with their status
@@ -180,7 +289,9 @@ class ExternalTranscriptionListView(View):
     
     def get(self, request):
         tasks = []
-        for task_id, task_data in external_task_status.items():
+        with external_task_lock:
+            items = list(external_task_status.items())
+        for task_id, task_data in items:
             tasks.append({
                 'task_id': task_id,
                 'filename': task_data['filename'],
@@ -194,7 +305,7 @@ class ExternalTranscriptionListView(View):
         
         return JsonResponse({
             'tasks': tasks,
-            'queue_size': subtitle_task_queue.qsize()
+            'queue_size': external_task_queue.qsize() + subtitle_task_queue.qsize()
         })
 
 
@@ -228,6 +339,8 @@ class ExternalTranscriptionDeleteView(View):
             print(f"Error cleaning up files for task {task_id}: {e}")
         
         # Remove from status tracking
-        del external_task_status[task_id]
+        with external_task_lock:
+            external_task_status.pop(task_id, None)
+        task_events.publish("external", task_id)
         
         return JsonResponse({'message': 'Task deleted successfully'})
\ No newline at end of file
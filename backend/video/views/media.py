@@ -12,6 +12,7 @@ import json
 import os
 import mimetypes
 import subprocess
+from ..services import image_variants
 
 def detect_video_codec(file_path):
     """
@@ -86,6 +87,8 @@ class MediaActionView(View):
             return self.serve_attachments(request, filename)
         elif self.type == 'stream_video':
             return self.serve_stream_video(request, filename)
+        elif self.type == 'trickplay':
+            return self.serve_trickplay(request, filename)
         
         return HttpResponseNotAllowed(['GET'])
     # Memory-efficient chunked streaming for large video files
@@ -353,13 +356,75 @@ class MediaActionView(View):
             
         except IOError:
             raise Http404('Cannot read file')
+    def serve_trickplay(self, request, filename):
+        """
+        Serve seek-preview sprites: '<md5>/index.vtt' or '<md5>/sprite_NNN.jpg'.
+        Output is derived from the (content-addressed) video file, so it can be cached for a year.
+        """
+        base = os.path.realpath(os.path.join(settings.MEDIA_ROOT, 'trickplay'))
+        file_path = os.path.realpath(os.path.join(base, filename))
+        if not file_path.startswith(base + os.sep) or not os.path.isfile(file_path):
+            raise Http404('Trickplay file not found')
+
+        content_type = 'text/vtt' if file_path.endswith('.vtt') else 'image/jpeg'
+        response = FileResponse(open(file_path, 'rb'), content_type=content_type)
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        response['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    VARIANT_SOURCE_EXTS = ('.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif', '.avif')
+
+    def serve_image_file(self, request, file_path):
+        """
+        Serve an image, optionally as a resized / re-encoded variant:
+            ?w=240            resize (width snapped to image_variants.VARIANT_WIDTHS)
+            ?fmt=webp|avif|jpeg|auto   auto picks by the Accept header
+        Without these params (or for non-image files) the original is served unchanged.
+        """
+        width = request.GET.get('w')
+        fmt = request.GET.get('fmt')
+        if (width or fmt) and file_path.lower().endswith(self.VARIANT_SOURCE_EXTS):
+            media_root = os.path.realpath(settings.MEDIA_ROOT)
+            if not os.path.realpath(file_path).startswith(media_root + os.sep):
+                raise Http404("File not found")
+            try:
+                width = max(0, int(width or 0))
+            except ValueError:
+                width = 0
+            variant_fmt = image_variants.negotiate_format(fmt or 'jpeg', request.headers.get('Accept', ''))
+            if not variant_fmt:
+                return JsonResponse({'error': f'Unsupported format: {fmt}'}, status=400)
+            # URL 里没有版本号（封面会被原地覆盖），所以每次都让浏览器带 ETag 重新验证；
+            # ETag 由源文件大小和修改时间决定，命中时不用生成 variant 就能返回 304
+            etag = f'"{image_variants.variant_key(file_path, width, variant_fmt)}"'
+            if request.headers.get('If-None-Match') == etag:
+                variant = (None, None, etag)
+            else:
+                try:
+                    variant = image_variants.open_variant(file_path, width, variant_fmt)
+                except Exception as e:
+                    print(f"[MediaActionView] Image variant failed for {file_path}: {e}")
+                    variant = None
+            if variant:
+                variant_file, content_type, etag = variant
+                if variant_file is None:
+                    response = HttpResponse(status=304)
+                else:
+                    response = FileResponse(variant_file, content_type=content_type)
+                response['ETag'] = etag
+                response['Cache-Control'] = 'no-cache'
+                if fmt == 'auto':
+                    response['Vary'] = 'Accept'
+                return response
+        return serve(request, os.path.basename(file_path), document_root=os.path.dirname(file_path))
+
     def serve_img(self,request, filename):
         file_path = os.path.join(settings.MEDIA_ROOT, "thumbnail", filename)
         if not os.path.exists(file_path):
             from django.http import Http404
             raise Http404("File not found")
         # Serve the image file
-        return serve(request, os.path.basename(file_path), document_root=os.path.dirname(file_path))
+        return self.serve_image_file(request, file_path)
 
     def serve_screenshot(self, request, filename):
         """
@@ -370,7 +435,7 @@ class MediaActionView(View):
             from django.http import Http404
             raise Http404("Screenshot file not found")
         # Serve the screenshot image file
-        return serve(request, os.path.basename(file_path), document_root=os.path.dirname(file_path))
+        return self.serve_image_file(request, file_path)
 
     def serve_note_image(self, request, filename):
         """
@@ -381,7 +446,7 @@ class MediaActionView(View):
             from django.http import Http404
             raise Http404("Note image file not found")
         # Serve the note image file
-        return serve(request, os.path.basename(file_path), document_root=os.path.dirname(file_path))
+        return self.serve_image_file(request, file_path)
 
     def serve_attachments(self, request, filename):
         """
@@ -393,4 +458,4 @@ class MediaActionView(View):
             from django.http import Http404
             raise Http404("Attachment file not found")
         # Serve the attachment file
-        return serve(request, os.path.basename(file_path), document_root=os.path.dirname(file_path))
+        return self.serve_image_file(request, file_path)
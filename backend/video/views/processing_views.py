@@ -2,6 +2,7 @@
 Views for standalone audio/HLS conversion endpoints.
 """
 import os
+import json
 
 from django.http import JsonResponse, HttpRequest
 from django.views import View
@@ -13,9 +14,9 @@ from ..services.audio_processing import (
     get_video_file_paths,
     detect_video_audio_format,
     extract_audio_from_video_file,
-    extract_hls_from_video_file,
 )
 from ..models import Video
+from ..tasks import hls_queue, hls_task_status, hls_update_status
 
 
 @method_decorator(csrf_exempt, name='dispatch')
@@ -54,19 +55,41 @@ class ConvertAudioView(View):
 
 @method_decorator(csrf_exempt, name='dispatch')
 class ConvertHLSView(View):
-    """Convert a video file to HLS (m3u8+ts) and update the DB with HLS path."""
-    http_method_names = ['post']
+    """
+    POST: queue HLS packaging for a video, body {"ladder": true} for 1080p/720p/360p renditions.
+    GET:  packaging progress, plus the packaged playlist path once recorded on the model.
+    """
+    http_method_names = ['get', 'post']
+
+    def get(self, request: HttpRequest, video_id: int, *args, **kwargs):
+        video = get_object_or_404(Video, pk=video_id)
+        task = hls_task_status.get(video_id)
+        return JsonResponse({
+            'success': True,
+            'hls_path': video.hls_path or '',
+            'task': task,
+        })
 
     def post(self, request: HttpRequest, video_id: int, *args, **kwargs):
         video = get_object_or_404(Video, pk=video_id)
-        _, video_path, _ = get_video_file_paths(video_id)
+        try:
+            payload = json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            payload = {}
 
-        ok, err, rel_dir = extract_hls_from_video_file(video_path)
-        if not ok:
-            return JsonResponse(
-                {'success': False, 'error': err or 'HLS conversion failed'},
-                status=500,
-            )
+        task = hls_task_status.get(video_id)
+        if task and task['status'] in ('Queued', 'Running'):
+            return JsonResponse({'success': True, 'message': 'HLS task already in progress', 'task': task})
 
-        video.save(update_fields=['url'])
-        return JsonResponse({'success': True, 'hls_path': rel_dir})
+        hls_update_status(
+            video_id,
+            video_id=video_id,
+            video_name=video.name,
+            ladder=bool(payload.get('ladder', False)),
+            status='Queued',
+            progress=0,
+            hls_path='',
+            error_message='',
+        )
+        hls_queue.put(video_id)
+        return JsonResponse({'success': True, 'message': 'HLS task queued', 'task': hls_task_status[video_id]}, status=202)
@@ -1,5 +1,8 @@
 import os
 import configparser
+import threading
+import time
+from types import MappingProxyType
 from django.conf import settings as dj_settings
 from django.views import View
 from django.http import JsonResponse, HttpRequest
@@ -12,6 +15,29 @@ from utils.wsr.transcription_engine import TranscriptionEngineFactory
 
 SETTINGS_FILE = os.path.join(dj_settings.BASE_DIR, './config/config.ini')
 
+# 配置快照：热路径直接返回内存中的只读副本，文件 mtime 变化或保存设置时才重新解析
+RELOAD_CHECK_INTERVAL = 1.0           # 两次检查文件 mtime 的最小间隔（秒）
+_settings_lock = threading.RLock()    # 读写 config.ini 的唯一入口
+_snapshot = None
+_snapshot_stamp = None
+_last_check = 0.0
+
+
+def _write_ini(cfg: configparser.ConfigParser):
+    """先写临时文件再替换，避免并发读取到写了一半的 config.ini"""
+    tmp = SETTINGS_FILE + '.tmp'
+    with open(tmp, 'w') as fp:
+        cfg.write(fp)
+    os.replace(tmp, SETTINGS_FILE)
+
+
+def _file_stamp():
+    try:
+        st = os.stat(SETTINGS_FILE)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return None
+
 
 def _ensure_ini():
     """Create a default settings.ini if it doesn't exist."""
@@ -83,7 +109,8 @@ def _ensure_ini():
         cfg['Remote VidGo Service'] = {
             'host': '',
             'port': '8000',
-            'use_ssl': 'false'
+            'use_ssl': 'false',
+            'extra_hosts': ''
         }
         cfg['TTS settings'] = {
             'dashscope_api_key': '',
@@ -104,12 +131,11 @@ def _ensure_ini():
             'oss_bucket': 'vidgo-test',
             'oss_region': 'cn-beijing'
         }
-        with open(SETTINGS_FILE, 'w') as fp:
-            cfg.write(fp)
+        _write_ini(cfg)
 
 
-def load_all_settings():
-    """Return all settings from config.ini as a dictionary."""
+def _read_settings() -> dict:
+    """Parse config.ini (creating / upgrading it if needed). Caller must hold _settings_lock."""
     _ensure_ini()
     cfg = configparser.ConfigParser(interpolation=None)
     cfg.read(SETTINGS_FILE)
@@ -146,8 +172,7 @@ def load_all_settings():
 
     # Save config if sections were added
     if modified:
-        with open(SETTINGS_FILE, 'w') as fp:
-            cfg.write(fp)
+        _write_ini(cfg)
 
     result = {}
     for section_name in cfg.sections():
@@ -159,6 +184,66 @@ def load_all_settings():
     return result
 
 
+def reload_settings():
+    """Re-parse config.ini and replace the in-memory snapshot."""
+    global _snapshot, _snapshot_stamp, _last_check
+    with _settings_lock:
+        data = _read_settings()
+        _snapshot = MappingProxyType({
+            section: MappingProxyType(values) for section, values in data.items()
+        })
+        _snapshot_stamp = _file_stamp()
+        _last_check = time.monotonic()
+        return _snapshot
+
+
+def load_all_settings():
+    """
+    Return all settings from config.ini as a read-only mapping
+    ({section: {key: value}}; use settings_to_dict() for a mutable / JSON-able copy).
+    Cached in memory; the file is re-parsed only when its mtime changes.
+    """
+    global _last_check
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() - _last_check < RELOAD_CHECK_INTERVAL:
+        return snapshot
+    with _settings_lock:
+        if _snapshot is not None and _file_stamp() == _snapshot_stamp:
+            _last_check = time.monotonic()
+            return _snapshot
+        return reload_settings()
+
+
+def settings_to_dict(snapshot=None) -> dict:
+    snapshot = load_all_settings() if snapshot is None else snapshot
+    return {section: dict(values) for section, values in snapshot.items()}
+
+
+def get_setting(section: str, key: str, default: str = '') -> str:
+    return load_all_settings().get(section, {}).get(key, default)
+
+
+def get_bool_setting(section: str, key: str, default: bool = False) -> bool:
+    value = get_setting(section, key, None)
+    if value is None or value == '':
+        return default
+    return value.strip().lower() in ('true', '1', 'yes', 'on')
+
+
+def get_int_setting(section: str, key: str, default: int = 0) -> int:
+    try:
+        return int(get_setting(section, key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def get_float_setting(section: str, key: str, default: float = 0.0) -> float:
+    try:
+        return float(get_setting(section, key, default))
+    except (TypeError, ValueError):
+        return default
+
+
 def save_all_settings(settings_dict: dict):
     """Save all settings to config.ini."""
     cfg = configparser.ConfigParser(interpolation=None)
@@ -169,8 +254,9 @@ def save_all_settings(settings_dict: dict):
         else:
             cfg[section_name] = section_data
     
-    with open(SETTINGS_FILE, 'w') as fp:
-        cfg.write(fp)
+    with _settings_lock:
+        _write_ini(cfg)
+        reload_settings()
 
 
 client = None
@@ -194,7 +280,7 @@ class ConfigAPIView(View):
     def get(self, request: HttpRequest, *args, **kwargs):
         """Get all configuration settings."""
         try:
-            settings_data = load_all_settings()
+            settings_data = settings_to_dict()
             return JsonResponse({'success': True, 'data': settings_data})
         except Exception as exc:
             return JsonResponse({'error': str(exc)}, status=500)
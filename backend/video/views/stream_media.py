@@ -10,7 +10,7 @@ from utils.stream_downloader import bili_download
 from utils.stream_downloader.youtube_download import YouTubeDownloader
 from django.views.decorators.http import require_POST
 from ..tasks import download_queue, download_status, download_status_lock
-from yt_dlp import YoutubeDL
+from ..services import task_events, metadata_cache
 """
 这个文件用于下载流媒体和查询流媒体信息，作为中间件继承download_status中的变量
 区分是油管还是B站，
@@ -82,14 +82,15 @@ class InfoView(View):
         """
         print("startbiliinfo")
         bvid, avid, p=bili_download.extract_av_bv_p(url)
-        info = bili_download.get_video_info(bvid=bvid, avid=avid)
+        cached = metadata_cache.bili_video_info(bvid=bvid, avid=avid)
+        info = cached['info']
         bvid = info['bvid']
         owner = info['owner']
         pic_url = info['pic_url']
         title = info['title']
         duration = info['duration']
         # author = info['author']
-        cids, data=bili_download.get_cid(bvid=bvid, avid=avid)
+        cids, data = cached['cids'], cached['pages']
         print(bvid,pic_url,title,len(cids))
         return {
             "bvid":bvid,
@@ -107,8 +108,8 @@ class InfoView(View):
         返回视频的基本信息。
         """
         print("start youtubeinfo")
-        downloader = YouTubeDownloader()
-        info = downloader.get_video_info(url)
+        info_dict = metadata_cache.youtube_info(url)
+        info = YouTubeDownloader().get_video_info(url, info_dict=info_dict) if info_dict else None
         
         if not info:
             return {"error": "Failed to fetch YouTube video info"}
@@ -139,41 +140,35 @@ class InfoView(View):
         返回播客的基本信息。
         """
         print("start podcastinfo")
-        ydl_opts = {
-            'quiet': True,
-            'no_download': True,  # Only extract info, don't download
-        }
-        
         try:
-            with YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                
-                title = info.get('title', '')
-                duration = info.get('duration', 0)
-                series = info.get('series', '')
-                episode = info.get('episode', '')
-                description = info.get('description', '')
-                thumbnail = info.get('thumbnail', '')
-                
-                # 创建简单的 audio_data 结构
-                audio_data = [{
-                    "cid": info.get('id', ''),
-                    "part": title,
-                    "page": 1
-                }]
-                
-                return {
-                    "bvid": info.get('id', ''),  # Podcast episode ID
-                    "owner": series or info.get('uploader', ''),
-                    "duration": duration,
-                    "thumbnail": thumbnail,
-                    "title": title,
-                    "collectionCount": 1,  # 播客通常是单个音频
-                    "video_data": audio_data,
-                    "episode": episode,
-                    "description": description[:200] + '...' if len(description) > 200 else description
-                }
-                
+            info = metadata_cache.podcast_info(url)
+            
+            title = info.get('title', '')
+            duration = info.get('duration', 0)
+            series = info.get('series', '')
+            episode = info.get('episode', '')
+            description = info.get('description', '')
+            thumbnail = info.get('thumbnail', '')
+            
+            # 创建简单的 audio_data 结构
+            audio_data = [{
+                "cid": info.get('id', ''),
+                "part": title,
+                "page": 1
+            }]
+            
+            return {
+                "bvid": info.get('id', ''),  # Podcast episode ID
+                "owner": series or info.get('uploader', ''),
+                "duration": duration,
+                "thumbnail": thumbnail,
+                "title": title,
+                "collectionCount": 1,  # 播客通常是单个音频
+                "video_data": audio_data,
+                "episode": episode,
+                "description": description[:200] + '...' if len(description) > 200 else description
+            }
+            
         except Exception as e:
             print(f"Error extracting podcast info: {e}")
             return {"error": f"Failed to fetch Apple Podcast info: {str(e)}"}
@@ -239,6 +234,7 @@ class DownloadActionView(View):
                     "cid": cid,
                     **_new_download_status(),
                 }
+            task_events.publish("download", task_id_per_cid)
             print(idx,cid,filename)
 
             # 4. 推送到后台队列
@@ -262,6 +258,7 @@ class DownloadActionView(View):
                 **_new_download_status(),
             }
 
+        task_events.publish("download", task_id)
         print(f"YouTube download task created: {task_id}, {filename}")
 
         # 3. 推送到后台队列
@@ -286,6 +283,7 @@ class DownloadActionView(View):
                 **_new_download_status(),
             }
 
+        task_events.publish("download", task_id)
         print(f"Apple Podcast download task created: {task_id}, {filename}")
 
         # 3. 推送到后台队列
@@ -342,6 +340,7 @@ class RetryDownloadTaskView(View):
             }
             # 覆写回 download_status 同一个 key
             download_status[old_id] = new_status
+        task_events.publish("download", old_id)
         download_queue.put(old_id)
         return JsonResponse({"task_id": old_id,'message': 'Retry scheduled'})
 
@@ -363,6 +362,7 @@ class DeleteDownloadTaskView(View):
 
             # 最终从状态表里删掉
             download_status.pop(task_id, None)
+        task_events.publish("download", task_id)
         return JsonResponse({'message': 'Download task deleted'})
 
     def post(self, request, *args, **kwargs):
@@ -11,6 +11,7 @@ import json,copy
 import os
 import time
 from ..tasks import subtitle_task_queue, subtitle_task_status
+from ..services import task_events
 
 def _new_subtitle_task():
     """
@@ -192,6 +193,7 @@ class SubtitleGenerationAddView(View):
                 "video_id":vid,
                 **_new_subtitle_task()
             }
+            task_events.publish("subtitle", vid)
             subtitle_task_queue.put(str(vid))
 
         return JsonResponse({"success": True})
@@ -237,6 +239,7 @@ class SubtitleGenerationTaskView(View):
         }
         # 覆写回 download_status 同一个 key
         subtitle_task_status[old_id] = new_status
+        task_events.publish("subtitle", old_id)
         subtitle_task_queue.put(str(old_id))
         return JsonResponse({"task_id": old_id,'message': 'Retry scheduled'})
     # DELETE 方法 
@@ -256,6 +259,7 @@ class SubtitleGenerationTaskView(View):
             pass  
 
         subtitle_task_status.pop(video_id, None)
+        task_events.publish("subtitle", video_id)
         return JsonResponse({'message': 'Download task deleted'})
         
 
@@ -361,6 +365,7 @@ class SubtitleTranslationAddView(View):
                 "translate_total_chunks": 0,
                 "translate_completed_chunks": 0,
             }
+            task_events.publish("subtitle", vid)
             subtitle_task_queue.put(str(vid))
 
         return JsonResponse({"success": True, "message": f"Translation tasks queued for {len(video_id_list)} videos"})
\ No newline at end of file
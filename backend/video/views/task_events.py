@@ -0,0 +1,121 @@
+"""
+Unified task progress feed for subtitle / download / export / TTS tasks.
+
+Replaces blind polling of the four "all status" endpoints: clients keep a
+version cursor and only receive tasks that changed since then.
+"""
+import json
+import time
+
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+
+from ..services import task_events
+
+# 单个请求最长阻塞时间，必须小于 gunicorn 的超时
+LONG_POLL_MAX_WAIT = 25
+# SSE 连接的最长存活时间，到期后由浏览器带 Last-Event-ID 自动重连
+STREAM_MAX_DURATION = 300
+STREAM_KEEPALIVE = 15
+# 阻塞名额与外部转录状态长轮询共用 task_events.blocking_waiters，超过上限时立即返回
+
+
+def _parse_cursor(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class TaskEventsView(View):
+    """
+    GET /api/tasks/events?cursor=<version>&wait=<seconds>
+
+    不带 cursor（或 cursor 已过期）时返回全量:
+        {"version": 12, "reset": true, "snapshot": {"subtitle": {...}, "download": {...}, "export": {...}, "tts": {...}}}
+    否则返回 cursor 之后发生变化的任务（data 为 null 表示任务已删除）:
+        {"version": 15, "reset": false, "events": [{"kind": "download", "task_id": "...", "data": {...}}]}
+    没有变化时最多阻塞 wait 秒（长轮询）。
+    """
+    http_method_names = ["get"]
+
+    def get(self, request):
+        cursor = _parse_cursor(request.GET.get('cursor'))
+        if cursor is None:
+            return self.snapshot_response()
+
+        try:
+            wait = min(max(float(request.GET.get('wait', 0)), 0), LONG_POLL_MAX_WAIT)
+        except ValueError:
+            wait = 0
+
+        waiters = task_events.blocking_waiters
+        if wait > 0 and waiters.acquire(blocking=False):
+            try:
+                result = task_events.changes_since(cursor, timeout=wait)
+            finally:
+                waiters.release()
+        else:
+            result = task_events.changes_since(cursor)
+
+        if result["reset"]:
+            return self.snapshot_response()
+        return JsonResponse(result)
+
+    @staticmethod
+    def snapshot_response():
+        version = task_events.current_version()
+        return JsonResponse({
+            "version": version,
+            "reset": True,
+            "snapshot": task_events.snapshot(),
+        })
+
+
+class TaskEventStreamView(View):
+    """
+    GET /api/tasks/events/stream  (text/event-stream)
+
+    先推送一个 snapshot 事件，之后每次变更推送 task 事件，id 为版本号。
+    重连时浏览器会带上 Last-Event-ID，只补发缺失的变更。
+    """
+    http_method_names = ["get"]
+
+    def get(self, request):
+        cursor = _parse_cursor(request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('cursor'))
+        response = StreamingHttpResponse(self.stream(cursor), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    @staticmethod
+    def format_event(event: str, version: int, payload) -> str:
+        return f"id: {version}\nevent: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+    def stream(self, cursor):
+        yield f"retry: {STREAM_KEEPALIVE * 1000}\n\n"
+        # 在生成器内部占用名额，保证连接断开（生成器被关闭）时一定释放
+        waiters = task_events.blocking_waiters
+        if not waiters.acquire(blocking=False):
+            yield 'event: busy\ndata: {"error": "Too many event streams, use /api/tasks/events"}\n\n'
+            return
+        try:
+            deadline = time.time() + STREAM_MAX_DURATION
+            if cursor is None:
+                cursor = task_events.current_version()
+                yield self.format_event("snapshot", cursor, task_events.snapshot())
+
+            while time.time() < deadline:
+                result = task_events.changes_since(cursor, timeout=STREAM_KEEPALIVE)
+                if result["reset"]:
+                    cursor = task_events.current_version()
+                    yield self.format_event("snapshot", cursor, task_events.snapshot())
+                    continue
+                if not result["events"]:
+                    yield ": keepalive\n\n"
+                    continue
+                cursor = result["version"]
+                for event in result["events"]:
+                    yield self.format_event("task", cursor, event)
+        finally:
+            waiters.release()
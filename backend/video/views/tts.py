@@ -8,7 +8,8 @@ from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.conf import settings
 from ..models import Video
-from ..tasks import tts_queue, tts_task_status
+from ..tasks import tts_queue, tts_task_status, tts_update_status
+from ..services import task_events
 import json
 import os
 import time
@@ -111,6 +112,7 @@ class TTSGenerateView(View):
                 "audio_reference_url": audio_reference_url,
                 "reference_text": reference_text,
             })
+            task_events.publish("tts", task_id)
 
             # 添加到任务队列
             tts_queue.put(task_id)
@@ -233,6 +235,7 @@ class DeleteTTSTaskView(View):
 
             # 删除任务状态
             del tts_task_status[task_id]
+            task_events.publish("tts", task_id)
 
             print(f"[TTS API] Task deleted: {task_id}")
 
@@ -279,10 +282,7 @@ class RetryTTSTaskView(View):
                 )
 
             # 重置任务状态
-            task["status"] = "Queued"
-            task["progress"] = 0
-            task["completed_segments"] = 0
-            task["error_message"] = ""
+            tts_update_status(task_id, status="Queued", progress=0, completed_segments=0, error_message="")
 
             # 重新加入队列
             tts_queue.put(task_id)
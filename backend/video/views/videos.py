@@ -46,8 +46,10 @@ def get_user_combined_hidden_categories(request):
     return hidden_category_ids
 import hashlib
 import os
+import shutil
 import json
 import urllib
+import uuid
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.utils.decorators import method_decorator
@@ -67,6 +69,8 @@ from ..services.audio_processing import (
     get_transcription_audio_path,
     get_video_file_paths,
 )
+from ..services import audio_artifacts
+from ..tasks import enqueue_trickplay, trickplay_failed, concat_queue, concat_task_status, concat_update_status
 
 # 删除视频的缩略图文件  
 def delete_video_thumbnail(video):
@@ -102,6 +106,8 @@ def delete_all_related_files(video):
             save_dir = os.path.join(settings.MEDIA_ROOT, directory_name)
             file_path = os.path.join(save_dir, video.url)
             
+            # 解码缓存按源文件路径索引，需在删除源文件之前清理
+            audio_artifacts.discard(file_path)
             if os.path.exists(file_path):
                 os.remove(file_path)
                 deleted_files.append(f"{directory_name}/{video.url}")
@@ -202,6 +208,34 @@ def delete_all_related_files(video):
         except Exception as e:
             errors.append(f"Stream video deletion failed: {e}")
     
+    # 7.1 删除拖动预览雪碧图
+    if video.url:
+        try:
+            from ..services.trickplay import trickplay_dir
+            sprite_dir = trickplay_dir(video.url)
+            if os.path.isdir(sprite_dir):
+                shutil.rmtree(sprite_dir)
+                deleted_files.append(f"trickplay/{os.path.basename(sprite_dir)}/")
+        except Exception as e:
+            errors.append(f"Trickplay deletion failed: {e}")
+
+    # 7.2 删除HLS打包输出目录（Video.hls_path 所在目录，以及按文件名生成的旧目录）
+    try:
+        stream_dir = os.path.realpath(os.path.join(settings.MEDIA_ROOT, 'stream_video'))
+        hls_dirs = set()
+        if video.hls_path:
+            hls_dirs.add(os.path.dirname(video.hls_path))
+        if base_filename:
+            hls_dirs.add(f"stream_video/{base_filename}")
+        for rel_dir in hls_dirs:
+            hls_dir = os.path.realpath(os.path.join(settings.MEDIA_ROOT, rel_dir))
+            # 只删除 stream_video 下的一级子目录，防止路径穿越
+            if os.path.dirname(hls_dir) == stream_dir and os.path.isdir(hls_dir):
+                shutil.rmtree(hls_dir)
+                deleted_files.append(f"{rel_dir}/")
+    except Exception as e:
+        errors.append(f"HLS output deletion failed: {e}")
+    
     # 8. 删除截图文件（查找包含视频ID的文件）
     try:
         screenshot_dir = os.path.join(settings.MEDIA_ROOT, 'screenshot')
@@ -272,15 +306,31 @@ def record_collection_last_open(video_id):
     return time_open
 
 from collections import defaultdict
-from django.db.models import Prefetch
+from django.db.models import Prefetch, Count, Q
+from django.http import HttpResponseNotModified
 from django.utils import timezone
+import time
 
 # 获取完整的全部视频信息，提取 Folder --> Collection --> Video 的三级视频数据。
 class VideoDataView(JsonView):
+    """
+    GET /api/videos/ → Category → Collection → Video 树
+
+    可选参数：
+    • hidden_categories=1,2   未登录用户需要隐藏的分类
+    • lazy=1                  只返回分类/合集骨架和数量，不含视频列表
+    • category=<id>           只展开一个分类（0 为“未归档”），散装视频支持 offset/limit 分页
+    • since=<version>         增量模式：只返回该版本之后变更/删除的实体
+
+    响应带 version 字段与 ETag（库版本号 + 参数），If-None-Match 命中时返回 304。
+    """
     # 需要补全三种情况：
-    # 1. 有 Folder(Category) 且在 Collection 里的视频；
-    # 2. 有 Folder 但不在 Collection 里的散装(loose)视频；
-    # 3. 既没有 Folder 也没有 Collection 的“未归档”视频。
+    # 1. 有 Folder(Category) 且在 Collection 里的视频；
+    # 2. 有 Folder 但不在 Collection 里的散装(loose)视频；
+    # 3. 既没有 Folder 也没有 Collection 的“未归档”视频。
+    UNCATEGORIZED_NAME = "未归档"
+    DEFAULT_PAGE_SIZE = 200
+
     # ------------ 辅助 JSON ------------
     def video_json(self, v):
         return {
@@ -301,6 +351,16 @@ class VideoDataView(JsonView):
             "last_modified": calc_diff_time(col.last_modified or timezone.now()),
         }
 
+    def collection_summary_json(self, col):
+        """lazy 模式：合集不带视频列表，只带数量"""
+        return {
+            "id": col.id,
+            "name": col.name,
+            "thumbnail": f"img/{col.thumbnail_url}",
+            "video_count": col.video_count,
+            "last_modified": calc_diff_time(col.last_modified or timezone.now()),
+        }
+
     def category_json(self, cat):
         """cat.categories  =  该分类下 *不在任何 Collection* 的散装视频"""
         loose_videos = cat.categories.all()      # ← 注意 related_name
@@ -313,54 +373,213 @@ class VideoDataView(JsonView):
             "loose_videos": [self.video_json(v) for v in loose_videos],
         }
 
+    # ------------ ETag ------------
+    def _etag(self, request, version, hidden_category_ids):
+        # last_modified 是相对时间（精确到分钟），因此 ETag 也带上分钟桶，避免文案过期
+        params = sorted(
+            (k, v) for k, v in request.GET.items() if k != "hidden_categories"
+        )
+        raw = f"{version}|{sorted(hidden_category_ids)}|{params}|{int(time.time() // 60)}"
+        return f'W/"lib-{hashlib.md5(raw.encode()).hexdigest()}"'
+
     # ------------ 主入口 ------------
     def get(self, request):
+        from ..models import LibraryChange
+
         # 获取用户的组合隐藏分类ID列表（系统设置 + 用户自定义）
         hidden_category_ids = get_user_combined_hidden_categories(request)
-        
+
+        version = LibraryChange.current_version()
+        etag = self._etag(request, version, hidden_category_ids)
+        if etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponseNotModified()
+            response["ETag"] = etag
+            return response
+
+        try:
+            if "since" in request.GET:
+                body = self.delta_payload(int(request.GET["since"]), version, hidden_category_ids)
+            elif "category" in request.GET:
+                body = self.category_page_payload(
+                    int(request.GET["category"]),
+                    int(request.GET.get("offset", 0)),
+                    int(request.GET.get("limit", self.DEFAULT_PAGE_SIZE)),
+                    hidden_category_ids,
+                )
+            elif request.GET.get("lazy") in ("1", "true"):
+                body = {"data": self.lazy_payload(hidden_category_ids)}
+            else:
+                body = {"data": self.full_payload(hidden_category_ids)}
+        except ValueError:
+            return self.json_err("Invalid query parameter", status=400)
+
+        if body is None:
+            return self.json_err("Category not found", status=404)
+        body["version"] = version
+        response = self.json_ok(body)
+        response["ETag"] = etag
+        response["Cache-Control"] = "no-cache"
+        return response
+
+    def _categories(self, hidden_category_ids):
+        cats_query = Category.objects.exclude(id__in=hidden_category_ids) if hidden_category_ids else Category.objects.all()
+        return cats_query.order_by("id")
+
+    def full_payload(self, hidden_category_ids):
         # ① 预加载：Category → Collection → Video（Collection 外的散装视频单独 Prefetch）
         # 过滤掉隐藏的分类
-        cats_query = Category.objects.exclude(id__in=hidden_category_ids) if hidden_category_ids else Category.objects
-        cats = (
-            cats_query
-            .prefetch_related(
-                Prefetch(
-                    "collections",                        # Folder → Collections
-                    queryset=Collection.objects.prefetch_related("videos"),
-                ),
-                Prefetch(                                # Folder → "散装"Videos
-                    "categories",
-                    queryset=Video.objects.filter(collection__isnull=True),
-                ),
-            )
-            .order_by("id")
+        cats = self._categories(hidden_category_ids).prefetch_related(
+            Prefetch(
+                "collections",                        # Folder → Collections
+                queryset=Collection.objects.prefetch_related("videos"),
+            ),
+            Prefetch(                                # Folder → "散装"Videos
+                "categories",
+                queryset=Video.objects.filter(collection__isnull=True),
+            ),
         )
 
         payload = [self.category_json(cat) for cat in cats]
 
         # ② "未归档"——既没有 Folder 也没有 Collection
-        # 过滤掉属于隐藏分类的未归档项目
-        uncated_cols = (
+        # 直接求值为列表，省去额外的 exists() 查询
+        uncated_cols = list(
             Collection.objects
             .filter(category__isnull=True)
             .prefetch_related("videos")
         )
-        uncated_vids_query = Video.objects.filter(category__isnull=True, collection__isnull=True)
-        if hidden_category_ids:
-            # 排除属于隐藏分类的视频（如果视频的分类在隐藏列表中）
-            uncated_vids = uncated_vids_query.exclude(category_id__in=hidden_category_ids)
-        else:
-            uncated_vids = uncated_vids_query
+        uncated_vids = list(Video.objects.filter(category__isnull=True, collection__isnull=True))
 
-        if uncated_cols.exists() or uncated_vids.exists():
+        if uncated_cols or uncated_vids:
             payload.append({
                 "id": 0,
-                "name": "未归档",
+                "name": self.UNCATEGORIZED_NAME,
                 "collections": [self.collection_json(c) for c in uncated_cols],
                 "loose_videos": [self.video_json(v) for v in uncated_vids],
             })
-        # print(payload)
-        return self.json_ok({"data": payload})
+        return payload
+
+    def lazy_payload(self, hidden_category_ids):
+        """分类/合集骨架 + 数量，视频通过 ?category=<id> 按需展开"""
+        cols = (
+            Collection.objects
+            .annotate(video_count=Count("videos"))
+            .order_by("-created_time")
+        )
+        cols_by_cat = defaultdict(list)
+        for col in cols:
+            cols_by_cat[col.category_id].append(col)
+
+        loose_counts = dict(
+            Video.objects.filter(collection__isnull=True)
+            .values_list("category_id")
+            .annotate(n=Count("id"))
+            .values_list("category_id", "n")
+        )
+
+        payload = [
+            {
+                "id": cat.id,
+                "name": cat.name,
+                "collections": [self.collection_summary_json(c) for c in cols_by_cat.get(cat.id, [])],
+                "loose_count": loose_counts.get(cat.id, 0),
+            }
+            for cat in self._categories(hidden_category_ids)
+        ]
+        if cols_by_cat.get(None) or loose_counts.get(None):
+            payload.append({
+                "id": 0,
+                "name": self.UNCATEGORIZED_NAME,
+                "collections": [self.collection_summary_json(c) for c in cols_by_cat.get(None, [])],
+                "loose_count": loose_counts.get(None, 0),
+            })
+        return payload
+
+    def category_page_payload(self, category_id, offset, limit, hidden_category_ids):
+        """展开单个分类：全部合集（含视频）+ 分页的散装视频"""
+        if category_id:
+            if category_id in hidden_category_ids:
+                return None
+            cat = Category.objects.filter(pk=category_id).first()
+            if cat is None:
+                return None
+            name = cat.name
+            cat_filter = Q(category_id=category_id)
+        else:
+            name = self.UNCATEGORIZED_NAME
+            cat_filter = Q(category__isnull=True)
+
+        cols = Collection.objects.filter(cat_filter).prefetch_related("videos")
+        loose_query = Video.objects.filter(cat_filter, collection__isnull=True).order_by("id")
+        loose_total = loose_query.count()
+        loose_videos = loose_query[offset:offset + limit]
+        return {
+            "data": {
+                "id": category_id,
+                "name": name,
+                "collections": [self.collection_json(c) for c in cols],
+                "loose_videos": [self.video_json(v) for v in loose_videos],
+                "loose_total": loose_total,
+                "offset": offset,
+                "limit": limit,
+            }
+        }
+
+    def delta_payload(self, since, version, hidden_category_ids):
+        """
+        增量模式：返回 since 之后变更的实体（带父级 id，便于前端就地更新）。
+        since 早于保留的变更日志时回退为全量返回（full=True）。
+        """
+        from ..models import LibraryChange
+
+        oldest = LibraryChange.objects.order_by("id").values_list("id", flat=True).first()
+        if since > version or (oldest is not None and since < oldest - 1):
+            return {"full": True, "data": self.full_payload(hidden_category_ids)}
+
+        changed = defaultdict(set)
+        for entity, entity_id in (
+            LibraryChange.objects.filter(id__gt=since).values_list("entity", "entity_id")
+        ):
+            changed[entity].add(entity_id)
+
+        hidden = set(hidden_category_ids)
+        videos = [
+            v for v in Video.objects.filter(id__in=changed["video"])
+            if v.category_id not in hidden
+        ]
+        collections = [
+            c for c in Collection.objects.filter(id__in=changed["collection"])
+            if c.category_id not in hidden
+        ]
+        categories = [
+            c for c in Category.objects.filter(id__in=changed["category"])
+            if c.id not in hidden
+        ]
+
+        # 已删除或被移入隐藏分类的实体，对前端而言都视为删除
+        return {
+            "full": False,
+            "videos": [
+                {**self.video_json(v), "category_id": v.category_id or 0, "collection_id": v.collection_id or 0}
+                for v in videos
+            ],
+            "collections": [
+                {
+                    "id": c.id,
+                    "name": c.name,
+                    "thumbnail": f"img/{c.thumbnail_url}",
+                    "category_id": c.category_id or 0,
+                    "last_modified": calc_diff_time(c.last_modified or timezone.now()),
+                }
+                for c in collections
+            ],
+            "categories": [{"id": c.id, "name": c.name} for c in categories],
+            "deleted": {
+                "videos": sorted(changed["video"] - {v.id for v in videos}),
+                "collections": sorted(changed["collection"] - {c.id for c in collections}),
+                "categories": sorted(changed["category"] - {c.id for c in categories}),
+            },
+        }
 
 
 # 获取最近访问的视频列表，按last_modified属性，时间倒序排序，最多返回50个视频
@@ -513,6 +732,8 @@ class VideoActionView(View):
             return self.has_waveform_peaks(request, video_id)
         elif self.action == 'get_dimensions':
             return self.get_dimensions(request, video_id)
+        elif self.action == 'trickplay':
+            return self.get_trickplay(request, video_id)
 
     def upload(self, request, video_id):
         # 检查是否有文件上传
@@ -675,6 +896,8 @@ class VideoActionView(View):
                 video_length=formatted_duration,
                 category=None,
             )
+            if not is_audio:
+                enqueue_trickplay(new_video.id)
 
             # 自动生成波形数据（无论是音频还是视频文件）
             try:
@@ -1107,87 +1330,124 @@ class VideoActionView(View):
 
     def get_screenshot(self, request, video_id):
         """
-        获取视频指定时间点的截图
+        获取视频指定时间点的截图（磁盘缓存，按 视频文件/时间点/宽度 命名）
         POST /videos/get_screenshot/<video_id>
         请求体 JSON:
         {
             "timestamp": 30,  // 秒
-            "chapters": [...]  // 可选：批量获取多个章节的截图
+            "chapters": [...],  // 可选：批量获取多个章节的截图
+            "width": 320        // 可选：缩放宽度，0 为原始尺寸
         }
+        章节较多且未缓存时转为后台任务，返回 {"pending": true, "job_id": ...}，
+        之后用 GET ?job_id=<id>（或 POST {"job_id": ...}）查询结果。
         """
+        from ..services import screenshots
         try:
-            data = json.loads(request.body)
+            if request.method == 'GET':
+                data = request.GET.dict()
+            else:
+                data = json.loads(request.body or b'{}')
             video = get_object_or_404(Video, pk=video_id)
-            
-            # 创建截图目录
-            screenshot_dir = os.path.join(settings.MEDIA_ROOT, 'screenshot')
-            os.makedirs(screenshot_dir, exist_ok=True)
-            
+            if data.get('job_id'):
+                return self._screenshot_job_response(data['job_id'], video.url)
+
+            width = int(data.get('width') or 0)
+
             # 媒体文件路径 - 根据文件类型选择正确的目录
             directory_name, _ = get_media_path_info(video.url)
             video_path = os.path.join(settings.MEDIA_ROOT, directory_name, video.url)
-            
+
             if not os.path.exists(video_path):
                 return JsonResponse({'success': False, 'error': 'Video file not found'}, status=404)
-            
-            # 批量处理章节截图
+
+            # 批量处理章节截图：一次提取所有时间点
             if 'chapters' in data:
-                chapters = data['chapters']
-                results = []
-                
-                for chapter in chapters:
-                    timestamp = chapter.get('startTime', 0)
-                    chapter_id = chapter.get('id', '')
-                    
-                    # 生成截图文件名：视频ID_章节ID_时间戳.jpg
-                    screenshot_filename = f"{video_id}_{chapter_id}_{timestamp}.jpg"
-                    screenshot_path = os.path.join(screenshot_dir, screenshot_filename)
-                    
-                    # 使用FFmpeg生成截图
-                    success = self._generate_screenshot_ffmpeg(video_path, timestamp, screenshot_path)
-                    
-                    if success:
-                        screenshot_url = f"/media/screenshot/{screenshot_filename}"
-                        print(f"Screenshot generated successfully: {screenshot_url}")
-                        results.append({
-                            'chapterId': chapter_id,
-                            'timestamp': timestamp,
-                            'screenshot': screenshot_url
-                        })
-                    else:
-                        print(f"Failed to generate screenshot for chapter {chapter_id} at {timestamp}s")
-                        results.append({
-                            'chapterId': chapter_id,
-                            'timestamp': timestamp,
-                            'error': 'Failed to generate screenshot'
-                        })
-                
+                chapters = [
+                    {'id': c.get('id', ''), 'startTime': c.get('startTime', 0)}
+                    for c in data['chapters']
+                ]
+                timestamps = [c['startTime'] for c in chapters]
+
+                if screenshots.count_missing(video.url, timestamps, width) > screenshots.ASYNC_BATCH_THRESHOLD:
+                    job_id = screenshots.submit_job(video_path, video.url, timestamps, width, context=chapters)
+                    return JsonResponse({'success': True, 'pending': True, 'job_id': job_id}, status=202)
+
+                files = screenshots.extract_frames(video_path, video.url, timestamps, width)
                 return JsonResponse({
                     'success': True,
-                    'screenshots': results
+                    'screenshots': self._chapter_screenshot_results(chapters, files)
                 }, status=200)
-            
+
             # 单个截图
-            else:
-                timestamp = data.get('timestamp', 0)
-                screenshot_filename = f"{video_id}_{timestamp}.jpg"
-                screenshot_path = os.path.join(screenshot_dir, screenshot_filename)
-                
-                success = self._generate_screenshot_ffmpeg(video_path, timestamp, screenshot_path)
-                
-                if success:
-                    return JsonResponse({
-                        'success': True,
-                        'screenshot': f"/media/screenshot/{screenshot_filename}"
-                    }, status=200)
-                else:
-                    return JsonResponse({'success': False, 'error': 'Failed to generate screenshot'}, status=500)
-                    
+            timestamp = data.get('timestamp', 0)
+            filename = screenshots.extract_frames(video_path, video.url, [timestamp], width).get(float(timestamp))
+            if filename:
+                return JsonResponse({
+                    'success': True,
+                    'screenshot': screenshots.screenshot_url(filename)
+                }, status=200)
+            return JsonResponse({'success': False, 'error': 'Failed to generate screenshot'}, status=500)
+
         except json.JSONDecodeError:
             return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
+    @staticmethod
+    def _chapter_screenshot_results(chapters, files):
+        from ..services.screenshots import screenshot_url
+        results = []
+        for chapter in chapters:
+            timestamp = chapter['startTime']
+            filename = files.get(float(timestamp))
+            if filename:
+                results.append({
+                    'chapterId': chapter['id'],
+                    'timestamp': timestamp,
+                    'screenshot': screenshot_url(filename)
+                })
+            else:
+                results.append({
+                    'chapterId': chapter['id'],
+                    'timestamp': timestamp,
+                    'error': 'Failed to generate screenshot'
+                })
+        return results
+
+    def _screenshot_job_response(self, job_id, video_url):
+        from ..services.screenshots import get_job
+        job = get_job(job_id, video_url)
+        if not job:
+            return JsonResponse({'success': False, 'error': 'Job not found'}, status=404)
+        if job['status'] in ('Queued', 'Running'):
+            return JsonResponse({'success': True, 'pending': True, 'job_id': job_id, 'status': job['status']})
+        if job['status'] == 'Failed':
+            return JsonResponse({'success': False, 'job_id': job_id, 'error': job['error']}, status=500)
+        return JsonResponse({
+            'success': True,
+            'pending': False,
+            'job_id': job_id,
+            'screenshots': self._chapter_screenshot_results(job['context'] or [], job['results'])
+        })
+
+    def get_trickplay(self, request, video_id):
+        """
+        拖动预览用的雪碧图索引
+        GET /videos/<video_id>/trickplay
+        已生成时返回 {"ready": true, "vtt": "/media/trickplay/<md5>/index.vtt"}；
+        未生成时排队生成（兼容入库较早的视频），返回 {"ready": false}；
+        上次生成失败且视频文件未变时不再排队，返回 {"ready": false, "failed": true}
+        """
+        from ..services.trickplay import has_trickplay, trickplay_vtt_url
+        video = get_object_or_404(Video, pk=video_id)
+        if not video.url or is_audio_file(video.url):
+            return JsonResponse({'success': False, 'error': 'Not a video'}, status=400)
+        if has_trickplay(video.url):
+            return JsonResponse({'success': True, 'ready': True, 'vtt': trickplay_vtt_url(video.url)})
+        if not enqueue_trickplay(video.id) and trickplay_failed(video.id):
+            return JsonResponse({'success': True, 'ready': False, 'failed': True})
+        return JsonResponse({'success': True, 'ready': False}, status=202)
+
     def _auto_generate_thumbnail(self, video_path, md5_value):
         try:
             thumbnail_dir = os.path.join(settings.MEDIA_ROOT, 'thumbnail')
@@ -1220,33 +1480,6 @@ class VideoActionView(View):
             print(f"[Auto-thumbnail] {e}")
             return ''
 
-    def _generate_screenshot_ffmpeg(self, video_path, timestamp, output_path):
-        try:
-            cmd = [
-                'ffmpeg',
-                '-ss', str(timestamp),
-                '-i', video_path,
-                '-frames:v', '1',
-                '-q:v', '2',
-                '-y',
-                output_path
-            ]
-
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-
-            if result.returncode == 0 and os.path.exists(output_path):
-                return True
-            else:
-                print(f"FFmpeg error: {result.stderr}")
-                return False
-
-        except subprocess.TimeoutExpired:
-            print("FFmpeg timeout")
-            return False
-        except Exception as e:
-            print(f"Screenshot generation error: {e}")
-            return False
-
     def save_notes(self, request, video_id):
         """
         保存视频笔记
@@ -1920,98 +2153,11 @@ class VideoActionView(View):
             # 检查是否已有波形文件
             waveform_exists_before, waveform_path = has_waveform_peaks(video.url)
             
-            # 确定用于生成波形的文件名
+            # 视频文件也直接生成波形：峰值取自 audio_artifacts 中与转录共用的 16kHz 解码，
+            # 不再先把音轨提取到 saved_audio
             target_filename = video.url
             audio_extracted = False
             
-            # 如果是视频文件，需要先检查/提取音频
-            if not is_audio_file(video.url):
-                print(f"[Waveform Generation] Video file detected: {video.url}, checking for audio file...")
-                
-                # 检查是否已有对应的音频文件
-                video_name_without_ext = os.path.splitext(video.url)[0]
-                audio_dir = os.path.join(settings.MEDIA_ROOT, 'saved_audio')
-                
-                # 查找已存在的音频文件（支持多种格式）
-                audio_formats = ['mp3', 'm4a', 'aac', 'wav', 'alac']
-                existing_audio_filename = None
-                
-                for fmt in audio_formats:
-                    test_filename = f"{video_name_without_ext}.{fmt}"
-                    test_path = os.path.join(audio_dir, test_filename)
-                    if os.path.exists(test_path):
-                        existing_audio_filename = test_filename
-                        print(f"[Waveform Generation] Found existing audio file: {existing_audio_filename}")
-                        break
-                
-                if existing_audio_filename:
-                    # 使用已存在的音频文件
-                    target_filename = existing_audio_filename
-                else:
-                    # 需要提取音频文件，调用现有的 extract_audio 方法
-                    print(f"[Waveform Generation] No audio file found, extracting audio from video...")
-                    
-                    try:
-                        # 调用现有的 extract_audio 方法
-                        extraction_response = self.extract_audio(request, video_id)
-                        
-                        # 解析 JsonResponse 内容
-                        import json
-                        if hasattr(extraction_response, 'content'):
-                            response_data = json.loads(extraction_response.content.decode('utf-8'))
-                        else:
-                            response_data = extraction_response
-                        
-                        if response_data.get('success'):
-                            # 音频提取成功
-                            audio_filename = response_data.get('audio_filename')
-                            if audio_filename:
-                                target_filename = audio_filename
-                                audio_extracted = True
-                                print(f"[Waveform Generation] Audio extraction successful: {audio_filename}")
-                            else:
-                                return JsonResponse({
-                                    'success': False,
-                                    'error': 'Audio extraction succeeded but no filename returned'
-                                }, status=500)
-                        else:
-                            # 检查是否是文件已存在的情况 (status 409)
-                            if extraction_response.status_code == 409:
-                                # 文件已存在，尝试获取文件名
-                                audio_path = response_data.get('audio_path', '')
-                                if audio_path:
-                                    # 从路径中提取文件名
-                                    audio_filename = os.path.basename(audio_path.replace('/media/saved_audio/', ''))
-                                    target_filename = audio_filename
-                                    print(f"[Waveform Generation] Using existing audio file: {audio_filename}")
-                                else:
-                                    # 回退：根据视频文件名推断音频文件名
-                                    audio_filename = f"{video_name_without_ext}.mp3"
-                                    test_path = os.path.join(audio_dir, audio_filename)
-                                    if os.path.exists(test_path):
-                                        target_filename = audio_filename
-                                        print(f"[Waveform Generation] Found audio file by inference: {audio_filename}")
-                                    else:
-                                        return JsonResponse({
-                                            'success': False,
-                                            'error': 'Audio file exists but cannot determine filename'
-                                        }, status=500)
-                            else:
-                                # 音频提取失败
-                                return JsonResponse({
-                                    'success': False,
-                                    'error': 'Audio extraction failed',
-                                    'details': response_data.get('error', 'Unknown error')
-                                }, status=500)
-                                
-                    except Exception as e:
-                        print(f"[Waveform Generation] Audio extraction error: {str(e)}")
-                        return JsonResponse({
-                            'success': False,
-                            'error': 'Audio extraction failed',
-                            'details': str(e)
-                        }, status=500)
-            
             try:
                 # 使用 waveform_generator 中的函数生成波形
                 from utils.audio.waveform_generator import get_waveform_for_file
@@ -2148,6 +2294,16 @@ class VideoActionView(View):
 
 @method_decorator(csrf_exempt, name="dispatch")
 class BatchVideoActionView(View):
+    def get(self, request):
+        """
+        合并任务进度
+        GET /api/videos/batch_action?task_id=<concat task id>
+        """
+        task = concat_task_status.get(request.GET.get('task_id', ''))
+        if task is None:
+            return JsonResponse({'success': False, 'error': 'Task not found'}, status=404)
+        return JsonResponse({'success': True, 'task': task})
+    
     @requires_delete_permission
     def post(self, request):
         try:
@@ -2310,48 +2466,34 @@ class BatchVideoActionView(View):
         if validation_errors:
             return JsonResponse({'success': False, 'error': 'Video file validation failed', 'details': validation_errors}, status=400)
         
-        # Generate temporary filename first, will rename after MD5 calculation
-        import time
-        temp_output_name = f"temp_merge_{int(time.time())}.mp4"
-        
         # Check video properties for compatibility (optional validation)
         compatibility_warnings = self._check_video_compatibility(videos)
         
-        # Perform concatenation
-        try:
-            result = self._concatenate_videos_with_subtitles(videos, temp_output_name)
-            
-            if result['success']:
-                # Get the actual output filename from the result
-                actual_output_name = result.get('output_name', temp_output_name)
-                
-                # Delete original videos
-                deleted_videos = []
-                for video in videos:
-                    try:
-                        # Delete files
-                        delete_all_related_files(video)
-                        deleted_videos.append(video.name)
-                        video.delete()
-                    except Exception as e:
-                        print(f"Warning: Failed to delete video {video.name}: {e}")
-                
-                message = f"Successfully concatenated {len(videos)} videos into {actual_output_name}"
-                if compatibility_warnings:
-                    message += f". Warnings: {'; '.join(compatibility_warnings)}"
-                
-                return JsonResponse({
-                    'success': True,
-                    'message': message,
-                    'outputFile': actual_output_name,
-                    'deletedVideos': deleted_videos,
-                    'warnings': compatibility_warnings
-                }, status=200)
-            else:
-                return JsonResponse({'success': False, 'error': result['error']}, status=500)
-                
-        except Exception as e:
-            return JsonResponse({'success': False, 'error': f'Concatenation failed: {str(e)}'}, status=500)
+        # 合并在后台执行：探测流参数、拼接、处理字幕、删除原视频，进度见 concat 任务
+        task_id = f"concat_{uuid.uuid4().hex[:12]}"
+        concat_update_status(
+            task_id,
+            video_ids=[video.id for video in videos],
+            video_name=videos[0].name,
+            status='Queued',
+            progress=0,
+            strategy='',
+            output_filename='',
+            new_video_id=None,
+            warnings=compatibility_warnings,
+            error_message='',
+        )
+        concat_queue.put(task_id)
+        
+        message = f"Concatenation of {len(videos)} videos queued"
+        if compatibility_warnings:
+            message += f". Warnings: {'; '.join(compatibility_warnings)}"
+        return JsonResponse({
+            'success': True,
+            'message': message,
+            'taskId': task_id,
+            'warnings': compatibility_warnings
+        }, status=202)
     
     def _check_video_compatibility(self, videos):
         """Check if videos have compatible properties for smooth concatenation"""
@@ -2366,257 +2508,9 @@ class BatchVideoActionView(View):
         if len(subtitle_languages) > 1:
             warnings.append(f"Videos have different subtitle languages: {', '.join(subtitle_languages)}")
         
-        # Note: Full video codec/resolution checking would require ffprobe
-        # For now, we just return warnings about subtitle languages
+        # 编码/分辨率等流参数由合并任务用 ffprobe 检查，不一致时自动转为重新编码
         
         return warnings
-    
-    def _concatenate_videos_with_subtitles(self, videos, output_name):
-        """Concatenate videos and their subtitles"""
-        try:
-            import tempfile
-            from datetime import timedelta
-            
-            # Create temporary directory for processing
-            with tempfile.TemporaryDirectory() as temp_dir:
-                # Step 1: Create file list for FFmpeg
-                file_list_path = os.path.join(temp_dir, 'file_list.txt')
-                video_paths = []
-                
-                with open(file_list_path, 'w', encoding='utf-8') as f:
-                    for video in videos:
-                        video_path = os.path.join(settings.MEDIA_ROOT, 'saved_video', video.url)
-                        # Escape single quotes for FFmpeg
-                        escaped_path = video_path.replace("'", "'\"'\"'")
-                        f.write(f"file '{escaped_path}'\n")
-                        video_paths.append(video_path)
-                
-                # Step 2: Concatenate videos using FFmpeg (to temporary file)
-                temp_output_path = os.path.join(settings.MEDIA_ROOT, 'saved_video', output_name)
-                
-                ffmpeg_cmd = [
-                    'ffmpeg', '-y',  # -y to overwrite existing files
-                    '-f', 'concat',
-                    '-safe', '0',
-                    '-i', file_list_path,
-                    '-c', 'copy',  # Copy streams without re-encoding for speed
-                    temp_output_path
-                ]
-                
-                print(f"FFmpeg concat command: {' '.join(ffmpeg_cmd)}")
-                
-                result = subprocess.run(
-                    ffmpeg_cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=1800  # 30 minutes timeout
-                )
-                
-                if result.returncode != 0:
-                    return {
-                        'success': False,
-                        'error': f'FFmpeg concatenation failed: {result.stderr}'
-                    }
-                
-                # Step 2.5: Calculate MD5 of the merged video file and rename it
-                md5_hash = hashlib.md5()
-                with open(temp_output_path, 'rb') as f:
-                    for chunk in iter(lambda: f.read(4096), b""):
-                        md5_hash.update(chunk)
-                md5_value = md5_hash.hexdigest()
-                
-                # Create final filename with MD5
-                final_output_name = f"{md5_value}.mp4"
-                final_output_path = os.path.join(settings.MEDIA_ROOT, 'saved_video', final_output_name)
-                
-                # Rename the file to use MD5 as filename
-                os.rename(temp_output_path, final_output_path)
-                
-                # Update output_name for later use in subtitles and database
-                output_name = final_output_name
-                
-                # Step 3: Get video duration for subtitle timing
-                video_durations = []
-                for video_path in video_paths:
-                    duration = self._get_video_duration(video_path)
-                    video_durations.append(duration)
-                
-                # Step 4: Concatenate subtitles if they exist and have same language
-                self._concatenate_subtitles(videos, video_durations, output_name)
-                
-                # Step 5: Create new Video database entry
-                self._create_concatenated_video_record(videos, output_name, video_durations)
-                
-                return {'success': True, 'output_name': output_name}
-                
-        except subprocess.TimeoutExpired:
-            return {'success': False, 'error': 'Video concatenation timed out'}
-        except Exception as e:
-            return {'success': False, 'error': str(e)}
-    
-    def _get_video_duration(self, video_path):
-        """Get video duration in seconds using ffprobe"""
-        try:
-            cmd = [
-                'ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format',
-                video_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            if result.returncode == 0:
-                import json
-                data = json.loads(result.stdout)
-                duration = float(data['format']['duration'])
-                return duration
-            else:
-                print(f"Failed to get duration for {video_path}: {result.stderr}")
-                return 0.0
-        except Exception as e:
-            print(f"Error getting video duration: {e}")
-            return 0.0
-    
-    def _concatenate_subtitles(self, videos, video_durations, output_name):
-        """Concatenate subtitle files with adjusted timestamps"""
-        try:
-            # Check if all videos have subtitles with same language
-            subtitle_languages = set()
-            videos_with_subtitles = []
-            
-            for video in videos:
-                if video.srt_path and os.path.exists(os.path.join(settings.MEDIA_ROOT, 'saved_srt', video.srt_path)):
-                    videos_with_subtitles.append((video, 'srt_path'))
-                    if video.raw_lang:
-                        subtitle_languages.add(video.raw_lang)
-                
-                if video.translated_srt_path and os.path.exists(os.path.join(settings.MEDIA_ROOT, 'saved_srt', video.translated_srt_path)):
-                    videos_with_subtitles.append((video, 'translated_srt_path'))
-            
-            if not videos_with_subtitles:
-                print("No subtitle files found for concatenation")
-                return
-            
-            if len(subtitle_languages) > 1:
-                print(f"Warning: Multiple subtitle languages detected: {subtitle_languages}")
-                return
-            
-            # Concatenate subtitles with adjusted timestamps
-            cumulative_time = 0.0
-            concatenated_subtitles = []
-            
-            for i, (video, subtitle_field) in enumerate(videos_with_subtitles):
-                subtitle_path = getattr(video, subtitle_field)
-                full_subtitle_path = os.path.join(settings.MEDIA_ROOT, 'subtitle', subtitle_path)
-                
-                try:
-                    with open(full_subtitle_path, 'r', encoding='utf-8') as f:
-                        subtitle_content = f.read()
-                    
-                    # Parse and adjust timestamps
-                    adjusted_content = self._adjust_subtitle_timestamps(subtitle_content, cumulative_time)
-                    concatenated_subtitles.append(adjusted_content)
-                    
-                    # Add this video's duration to cumulative time
-                    if i < len(video_durations):
-                        cumulative_time += video_durations[i]
-                    
-                except Exception as e:
-                    print(f"Error processing subtitle file {subtitle_path}: {e}")
-            
-            if concatenated_subtitles:
-                # Save concatenated subtitle file
-                output_subtitle_name = output_name.replace('.mp4', '.srt').replace('.mkv', '.srt').replace('.webm', '.srt')
-                output_subtitle_path = os.path.join(settings.MEDIA_ROOT, 'subtitle', output_subtitle_name)
-                
-                with open(output_subtitle_path, 'w', encoding='utf-8') as f:
-                    f.write('\n\n'.join(concatenated_subtitles))
-                
-                print(f"Successfully created concatenated subtitle file: {output_subtitle_name}")
-                return output_subtitle_name
-                
-        except Exception as e:
-            print(f"Error concatenating subtitles: {e}")
-            return None
-    
-    def _adjust_subtitle_timestamps(self, subtitle_content, time_offset):
-        """Adjust SRT subtitle timestamps by adding time_offset seconds"""
-        import re
-        
-        def adjust_timestamp(match):
-            timestamp = match.group(0)
-            # Parse timestamp format: HH:MM:SS,mmm
-            time_parts = timestamp.replace(',', '.').split(':')
-            hours = int(time_parts[0])
-            minutes = int(time_parts[1])
-            seconds = float(time_parts[2])
-            
-            # Convert to total seconds and add offset
-            total_seconds = hours * 3600 + minutes * 60 + seconds + time_offset
-            
-            # Convert back to timestamp format
-            new_hours = int(total_seconds // 3600)
-            new_minutes = int((total_seconds % 3600) // 60)
-            new_seconds = total_seconds % 60
-            
-            return f"{new_hours:02d}:{new_minutes:02d}:{new_seconds:06.3f}".replace('.', ',')
-        
-        # Regex pattern to match SRT timestamps
-        timestamp_pattern = r'\d{2}:\d{2}:\d{2},\d{3}'
-        
-        # Adjust all timestamps in the subtitle content
-        adjusted_content = re.sub(timestamp_pattern, adjust_timestamp, subtitle_content)
-        
-        return adjusted_content
-    
-    def _create_concatenated_video_record(self, original_videos, output_name, video_durations):
-        """Create a new Video database record for the concatenated video"""
-        try:
-            # Calculate total duration
-            total_duration = sum(video_durations)
-            
-            # Format duration as HH:MM:SS
-            hours = int(total_duration // 3600)
-            minutes = int((total_duration % 3600) // 60)
-            seconds = int(total_duration % 60)
-            formatted_duration = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-            
-            # Use first video's metadata as base
-            first_video = original_videos[0]
-            
-            # Create concatenated video name
-            video_names = [v.name for v in original_videos[:3]]  # Limit to first 3 names
-            if len(original_videos) > 3:
-                concat_name = f"Merged: {', '.join(video_names)}... ({len(original_videos)} videos)"
-            else:
-                concat_name = f"Merged: {', '.join(video_names)}"
-            
-            # Create new video record
-            new_video = Video.objects.create(
-                name=concat_name[:128],  # Respect max_length constraint
-                url=output_name,
-                video_length=formatted_duration,
-                category=first_video.category,
-                collection=first_video.collection,
-                description=f"Concatenated from {len(original_videos)} videos: {', '.join([v.name for v in original_videos])}",
-                video_source='upload',  # Mark as upload since it's processed
-                raw_lang=first_video.raw_lang,  # Use first video's language
-                created_time=timezone.now(),
-                last_modified=timezone.now()
-            )
-            
-            # Check if concatenated subtitle was created
-            output_subtitle_name = output_name.replace('.mp4', '.srt').replace('.mkv', '.srt').replace('.webm', '.srt')
-            output_subtitle_path = os.path.join(settings.MEDIA_ROOT, 'subtitle', output_subtitle_name)
-            
-            if os.path.exists(output_subtitle_path):
-                new_video.srt_path = output_subtitle_name
-                new_video.save(update_fields=['srt_path'])
-            
-            print(f"Created new video record: {new_video.name} (ID: {new_video.id})")
-            return new_video
-            
-        except Exception as e:
-            print(f"Error creating concatenated video record: {e}")
-            return None
 
 @method_decorator(csrf_exempt, name='dispatch')
 class VideoSearchView(JsonView):
@@ -11,6 +11,8 @@ export interface Chapter {
 
 import { BACKEND } from '@/composables/ConfigAPI'
 
+const SCREENSHOT_JOB_POLL_INTERVAL = 1_000 // ms
+
 export class ChapterAPI {
   /**
    * 保存章节信息到后端
@@ -137,7 +139,17 @@ export class ChapterAPI {
         body: JSON.stringify({ chapters }),
       })
 
-      const data = await response.json()
+      let data = await response.json()
+
+      // 章节较多时后端转为后台任务，轮询 job_id 直到完成
+      while (data.success && data.pending) {
+        await new Promise((resolve) => setTimeout(resolve, SCREENSHOT_JOB_POLL_INTERVAL))
+        const jobResponse = await fetch(
+          `${BACKEND}/api/videos/${videoId}/get_screenshot?job_id=${encodeURIComponent(data.job_id)}`,
+          { credentials: 'include' },
+        )
+        data = await jobResponse.json()
+      }
 
       if (data.success && data.screenshots) {
         console.log('Chapter screenshots generated successfully:', data.screenshots)
@@ -176,6 +176,7 @@ export interface ConfigData {
     host: string
     port: string
     use_ssl: string
+    extra_hosts: string
   }
 }
 
@@ -241,6 +242,7 @@ export interface FrontendSettings {
   remoteVidGoHost: string
   remoteVidGoPort: string
   remoteVidGoUseSsl: boolean
+  remoteVidGoExtraHosts: string
   // OSS Service settings
   ossAccessKeyId: string
   ossAccessKeySecret: string
@@ -355,6 +357,7 @@ export async function loadConfig(): Promise<FrontendSettings> {
       remoteVidGoHost: data['Remote VidGo Service']?.host || '',
       remoteVidGoPort: data['Remote VidGo Service']?.port || '8000',
       remoteVidGoUseSsl: data['Remote VidGo Service']?.use_ssl === 'true',
+      remoteVidGoExtraHosts: data['Remote VidGo Service']?.extra_hosts || '',
       // OSS Service settings
       ossAccessKeyId: data['OSS Service']?.oss_access_key_id || '',
       ossAccessKeySecret: data['OSS Service']?.oss_access_key_secret || '',
@@ -441,6 +444,7 @@ export async function saveConfig(settings: FrontendSettings): Promise<void> {
         host: settings.remoteVidGoHost,
         port: settings.remoteVidGoPort,
         use_ssl: settings.remoteVidGoUseSsl.toString(),
+        extra_hosts: settings.remoteVidGoExtraHosts,
       },
       'OSS Service': {
         oss_access_key_id: settings.ossAccessKeyId,